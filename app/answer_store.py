@@ -0,0 +1,327 @@
+"""
+Хранилище подтверждённых результатов в одном файле SQLite вместо отдельного JSON-файла на сессию.
+
+Запись — {"session_id", "form_id", "form_version", "saved_at", "state"}: state — тот же JSON-вид,
+что в answers/<форма>_<время>.json, saved_at — время сохранения (unix, секунды).
+Ключ — session_id, поэтому одновременные сессии одной формы не перезаписывают друг друга,
+а повторное сохранение сессии (исправление после подтверждения) заменяет её запись.
+Индексы по (form_id, saved_at) и saved_at: выборка результатов формы за период не перебирает всё хранилище.
+
+Групповая фиксация: put() сериализует запись и кладёт её в очередь, фоновый поток забирает
+всё накопившееся (до batch_size записей) и фиксирует одной транзакцией. Один коммит — одна синхронизация
+WAL на пачку, а не на каждую запись: при массовой загрузке и при многих сессиях, сохраняющихся одновременно,
+пропускная способность растёт на порядки. put(wait=True) возвращается, когда пачка с записью зафиксирована.
+
+Чтение — через отдельные соединения (по одному на поток): режим WAL позволяет читать,
+пока фоновый поток пишет. query() и экспорт в JSONL/CSV идут курсором, не загружая выборку в память.
+"""
+
+import atexit
+import csv
+import json
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, TextIO
+from app.models import Form, FormState
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS answers ("
+    "session_id TEXT PRIMARY KEY, form_id TEXT NOT NULL, form_version TEXT, saved_at REAL NOT NULL, state TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS answers_form_time ON answers (form_id, saved_at)",
+    "CREATE INDEX IF NOT EXISTS answers_time ON answers (saved_at)",
+)
+_COLUMNS = "session_id, form_id, form_version, saved_at, state"
+_CLOSE = object()
+
+
+def answer_record(form: Form, session_id: str, state: FormState, saved_at: Optional[float] = None) -> Dict[str, Any]:
+    """Запись результата сессии для хранилища."""
+    return {
+        "session_id": session_id,
+        "form_id": form["id"],
+        "form_version": getattr(form, "version", None),
+        "saved_at": time.time() if saved_at is None else saved_at,
+        "state": state,
+    }
+
+
+def _record(row) -> Dict[str, Any]:
+    return {"session_id": row[0], "form_id": row[1], "form_version": row[2], "saved_at": row[3], "state": json.loads(row[4])}
+
+
+class AnswerStore:
+    """
+    Результаты сессий в SQLite с групповой фиксацией (см. описание модуля). Потокобезопасно.
+
+    - batch_size — не больше стольких записей в одной транзакции
+    - synchronous — PRAGMA synchronous: 'NORMAL' (по умолчанию, как у кэша ответов) или 'FULL'
+    """
+    def __init__(self, path: str, batch_size: int = 1000, synchronous: str = "NORMAL", timeout: float = 5.0):
+        if batch_size < 1:
+            raise ValueError("batch_size должен быть не меньше 1")
+        self.path = path
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self._conn = self._connect()
+        self._conn.execute(f"PRAGMA synchronous={synchronous}")
+        for statement in SCHEMA:
+            self._conn.execute(statement)
+        self._local = threading.local()
+        self._readers: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._closed = False
+        self._stopped = False  # фоновый поток больше не забирает очередь (закрыт или упал)
+        self._error: Optional[BaseException] = None
+        self._stats = dict.fromkeys(("records", "commits", "max_batch", "failed"), 0)
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._writer = threading.Thread(target=self._drain, name="answer-store", daemon=True)
+        self._writer.start()
+        # Очередь дописывается и при обычном завершении процесса без close()
+        atexit.register(self.close)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def location(self, session_id: str) -> str:
+        """Где лежит результат сессии — для сообщений пользователю и контрольной точки."""
+        return f"{self.path}#{session_id}"
+
+    # --- Запись ---
+
+    def put(self, record: Dict[str, Any], wait: bool = False):
+        """
+        Ставит запись в очередь на фиксацию (state сериализуется сразу — дальнейшие изменения его не затронут).
+        wait=True — дождаться фиксации пачки с этой записью; ошибка записи бросается здесь же.
+        """
+        row = (
+            record["session_id"], record["form_id"], record.get("form_version"),
+            record["saved_at"], json.dumps(record["state"], ensure_ascii=False)
+        )
+        done = Future() if wait else None
+        # Проверка и постановка в очередь под одной блокировкой: запись не может оказаться после _CLOSE
+        with self._lock:
+            if self._closed or self._stopped:
+                raise ValueError("Хранилище результатов закрыто")
+            self._queue.put((row, done))
+        if done is not None:
+            done.result()
+
+    def flush(self):
+        """Дожидается фиксации всего, что уже передано в put(); бросает ошибку записи, если она была."""
+        done = None
+        with self._lock:
+            if not self._stopped:
+                done = Future()
+                self._queue.put((None, done))
+        if done is not None:
+            done.result()
+        with self._lock:
+            error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    def close(self):
+        """Фиксирует очередь и закрывает соединения. Повторный вызов ничего не делает."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            if not self._stopped:
+                self._queue.put(_CLOSE)
+        self._writer.join()
+        self._conn.close()
+        with self._lock:
+            for conn in self._readers:
+                conn.close()
+            self._readers.clear()
+        atexit.unregister(self.close)
+
+    def __enter__(self) -> "AnswerStore":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def stats(self) -> Dict[str, int]:
+        """Счётчики: records, commits, max_batch (записей в самой большой транзакции), failed."""
+        with self._lock:
+            return dict(self._stats)
+
+    def _drain(self):
+        """
+        Фоновый поток: каждая транзакция забирает из очереди всё накопившееся, до batch_size записей.
+        Если поток падает не на ошибке SQLite, хранилище перестаёт принимать записи, а все ожидающие
+        put(wait=True) и flush() получают эту ошибку — никто не ждёт фиксации вечно.
+        """
+        batch = []
+        error = None
+        try:
+            while True:
+                item = self._queue.get()
+                batch = []
+                while item is not _CLOSE:
+                    batch.append(item)
+                    if len(batch) >= self.batch_size:
+                        break
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                if batch:
+                    self._commit(batch)
+                batch = []
+                if item is _CLOSE:
+                    return
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            with self._lock:
+                self._stopped = True
+            # После этой точки в очередь ничего не попадает — разбираем остаток
+            pending = list(batch)
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not _CLOSE:
+                    pending.append(item)
+            if error is not None:
+                with self._lock:
+                    self._error = error
+                    self._stats["failed"] += sum(1 for row, _ in pending if row is not None)
+            for row, done in pending:
+                if done is None or done.done():
+                    continue
+                if error is None and row is None:
+                    done.set_result(None)
+                else:
+                    done.set_exception(error or ValueError("Хранилище результатов закрыто"))
+
+    def _commit(self, batch):
+        rows = [row for row, _ in batch if row is not None]
+        error = None
+        if rows:
+            try:
+                self._conn.execute("BEGIN")
+                self._conn.executemany(f"INSERT OR REPLACE INTO answers ({_COLUMNS}) VALUES (?, ?, ?, ?, ?)", rows)
+                self._conn.execute("COMMIT")
+            except sqlite3.Error as e:
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+                error = e
+        with self._lock:
+            if error is None:
+                self._stats["records"] += len(rows)
+                self._stats["commits"] += 1 if rows else 0
+                self._stats["max_batch"] = max(self._stats["max_batch"], len(rows))
+            else:
+                self._stats["failed"] += len(rows)
+        for row, done in batch:
+            if done is None:
+                continue
+            if error is not None and row is not None:
+                done.set_exception(error)
+            else:
+                done.set_result(None)
+        # Ошибку записей без ожидания сообщит следующий flush()
+        if error is not None and any(row is not None and done is None for row, done in batch):
+            with self._lock:
+                self._error = error
+
+    # --- Чтение ---
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+            with self._lock:
+                self._readers.append(conn)
+        return conn
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Запись сессии или None (видны только зафиксированные записи)."""
+        row = self._reader().execute(f"SELECT {_COLUMNS} FROM answers WHERE session_id = ?", (session_id,)).fetchone()
+        return _record(row) if row is not None else None
+
+    def query(
+        self,
+        form_id: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        limit: Optional[int] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """Записи по порядку saved_at: формы form_id (если задана) за [since, until). Читаются курсором по мере обхода."""
+        conditions, params = [], []
+        if form_id is not None:
+            conditions.append("form_id = ?")
+            params.append(form_id)
+        if since is not None:
+            conditions.append("saved_at >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("saved_at < ?")
+            params.append(until)
+        sql = f"SELECT {_COLUMNS} FROM answers"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY saved_at"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        for row in self._reader().execute(sql, params):
+            yield _record(row)
+
+    def count(self, form_id: Optional[str] = None) -> int:
+        if form_id is None:
+            return self._reader().execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        return self._reader().execute("SELECT COUNT(*) FROM answers WHERE form_id = ?", (form_id,)).fetchone()[0]
+
+
+# --- Экспорт ---
+
+def export_jsonl(records: Iterable[Dict[str, Any]], out: TextIO) -> int:
+    """Пишет записи в out по одной JSON-строке; возвращает их число."""
+    count = 0
+    for record in records:
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        count += 1
+    return count
+
+
+def _cell(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        return "; ".join(map(str, value))
+    return value
+
+
+def export_csv(records: Iterable[Dict[str, Any]], out: TextIO, fields: Optional[Sequence[str]] = None) -> int:
+    """
+    Пишет записи в out как CSV: session_id, form_id, saved_at (ISO), затем значения полей.
+    fields — столбцы полей; по умолчанию — поля первой записи (экспорт одной формы).
+    Незаполненные поля — пустые ячейки, списки — через '; '. Возвращает число записей.
+    """
+    writer = None
+    count = 0
+    for record in records:
+        if writer is None:
+            columns = list(fields) if fields is not None else list(record["state"])
+            writer = csv.writer(out)
+            writer.writerow(["session_id", "form_id", "saved_at", *columns])
+        state = record["state"]
+        writer.writerow([
+            record["session_id"], record["form_id"],
+            datetime.fromtimestamp(record["saved_at"]).isoformat(timespec="seconds"),
+            *(_cell(state[name]["value"]) if name in state and state[name]["status"] == "filled" else "" for name in columns)
+        ])
+        count += 1
+    return count
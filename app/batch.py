@@ -0,0 +1,202 @@
+"""
+Пакетное (неинтерактивное) извлечение полей формы из готовых текстов.
+
+Вход — JSONL, по документу на строку: {"id": "...", "text": "..."} (id необязателен —
+тогда им служит номер строки). Каждый документ — отдельный вызов extract_fields
+с пустым state формы. Документы обрабатываются пулом потоков с ограничением
+числа одновременных запросов; результаты построчно дописываются в выходной JSONL
+(в порядке входа или по мере готовности).
+
+Запуск возобновляем: документы, для которых в выходном файле уже есть успешный результат,
+пропускаются, ошибочные — повторяются.
+"""
+
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+from app.models import Form
+from app.form_loader import init_state
+from app.extractor import extract_fields
+from app.sharding import extract_sharded
+from app.metrics import metrics, percentile
+from app.response_cache import ResponseCache
+
+
+@dataclass
+class BatchReport:
+    """Итог пакетного запуска."""
+    total: int = 0
+    skipped: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    elapsed: float = 0.0
+    latencies: List[float] = field(default_factory=list)
+
+    @property
+    def processed(self) -> int:
+        return self.succeeded + self.failed
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "total": self.total,
+            "skipped": self.skipped,
+            "processed": self.processed,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "error_rate": round(self.failed / self.processed, 4) if self.processed else 0.0,
+            "elapsed_s": round(self.elapsed, 3),
+            "throughput_per_s": round(self.processed / self.elapsed, 2) if self.elapsed else 0.0,
+            "latency_p50_ms": round(percentile(self.latencies, 50) * 1000, 1),
+            "latency_p95_ms": round(percentile(self.latencies, 95) * 1000, 1),
+            "latency_max_ms": round(max(self.latencies, default=0.0) * 1000, 1),
+        }
+
+
+def read_items(input_path: str) -> Iterator[Tuple[str, Any]]:
+    """
+    Читает входной JSONL. Отдаёт (id, text); для строки, которую не удалось разобрать, — (id, исключение).
+    """
+    with open(input_path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+                if not isinstance(item, dict):
+                    raise ValueError("строка должна быть JSON-объектом")
+                item_id = str(item.get("id", line_number))
+                text = item.get("text")
+                if not isinstance(text, str) or not text.strip():
+                    raise ValueError("нет текста документа (ключ 'text')")
+                yield item_id, text
+            except ValueError as e:
+                yield str(line_number), ValueError(f"Строка {line_number}: {e}")
+
+
+def completed_ids(output_path: str) -> Set[str]:
+    """
+    id документов, для которых в выходном файле уже есть успешный результат.
+    Оборванная при падении последняя строка игнорируется.
+    """
+    done: Set[str] = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict) and record.get("status") == "ok":
+                done.add(str(record.get("id")))
+    return done
+
+
+def process_item(
+    form: Form, item_id: str, text, llm_client=None, delta: bool = False, cache: Optional[ResponseCache] = None,
+    shard_size: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Извлекает поля формы из одного документа. Ошибки не бросаются, а возвращаются в записи.
+    shard_size — извлекать параллельно по шардам формы (см. app/sharding.py).
+    """
+    started = time.perf_counter()
+    if isinstance(text, Exception):
+        return {"id": item_id, "status": "error", "error": str(text), "latency_ms": 0.0}
+    messages = [{"role": "user", "content": text}]
+    try:
+        options = dict(
+            llm_client=llm_client, delta=delta, cache=cache,
+            on_response=lambda result: metrics.record(form["id"], None, result)
+        )
+        if shard_size:
+            state, next_question = extract_sharded(messages, form, init_state(form), shard_size=shard_size, **options)
+        else:
+            state, next_question = extract_fields(messages, form, init_state(form), **options)
+        record = {"id": item_id, "status": "ok", "state": state, "next_question": next_question}
+    except Exception as e:
+        record = {"id": item_id, "status": "error", "error": str(e)}
+    record["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return record
+
+
+def run_batch(
+    form: Form,
+    input_path: str,
+    output_path: str,
+    llm_client=None,
+    concurrency: int = 8,
+    ordered: bool = True,
+    delta: bool = False,
+    cache: Optional[ResponseCache] = None,
+    shard_size: Optional[int] = None
+) -> BatchReport:
+    """
+    Обрабатывает все документы input_path и дописывает результаты в output_path.
+    concurrency — число одновременных запросов к LLM;
+    ordered=True — результаты пишутся в порядке входного файла, иначе по мере готовности.
+    В памяти одновременно не больше 2 * concurrency документов.
+    shard_size — см. process_item; запросов к LLM тогда до concurrency на каждый документ.
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency должен быть не меньше 1")
+    report = BatchReport()
+    done = completed_ids(output_path)
+    started = time.perf_counter()
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    # Если прошлый запуск оборвался посреди строки — начинаем с новой
+    if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
+        with open(output_path, "rb+") as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+
+    with open(output_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        pending = {}
+        ready: Dict[int, Dict[str, Any]] = {}
+        next_to_write = 0
+        submitted = 0
+
+        def write(record: Dict[str, Any]):
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            report.latencies.append(record["latency_ms"] / 1000)
+            if record["status"] == "ok":
+                report.succeeded += 1
+            else:
+                report.failed += 1
+
+        def collect():
+            nonlocal next_to_write
+            finished, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            for future in finished:
+                sequence = pending.pop(future)
+                if ordered:
+                    ready[sequence] = future.result()
+                else:
+                    write(future.result())
+            while next_to_write in ready:
+                write(ready.pop(next_to_write))
+                next_to_write += 1
+
+        for item_id, text in read_items(input_path):
+            report.total += 1
+            if item_id in done:
+                report.skipped += 1
+                continue
+            while len(pending) + len(ready) >= 2 * concurrency:
+                collect()
+            future = pool.submit(process_item, form, item_id, text, llm_client, delta, cache, shard_size)
+            pending[future] = submitted
+            submitted += 1
+        while pending:
+            collect()
+
+    report.elapsed = time.perf_counter() - started
+    return report
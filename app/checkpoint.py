@@ -0,0 +1,131 @@
+"""
+Контрольные точки диалога: сессию можно продолжить после падения процесса или выхода пользователя,
+не задавая вопросы и не вызывая LLM заново.
+
+Файл checkpoints/<session_id>.jsonl дописывается после каждого хода, по строке JSON на запись:
+- header — id сессии, id и версия формы, путь к форме, файлы ответа и журнала;
+- turn — изменившиеся с прошлого хода поля state, изменения истории сообщений
+  (keep — сколько прежних сообщений сохранить, messages — новые) и заданный вопрос.
+Каждая запись пишется одним write() в файл, открытый на дозапись, поэтому ход либо записан целиком,
+либо (при падении посреди записи) оборванная последняя строка отбрасывается при чтении.
+Когда записей становится много, файл атомарно (через временный файл и os.replace)
+переписывается в header и один полный turn.
+"""
+
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+CHECKPOINT_DIR = "checkpoints"
+
+
+class Checkpoint:
+    """
+    Файл контрольных точек одной сессии.
+
+    - fsync=True — os.fsync после каждой записи (переживает и отключение питания, но дороже)
+    - compact_every — после скольких записей turn переписывать файл одним снимком
+    """
+    def __init__(self, path: str, fsync: bool = False, compact_every: int = 200):
+        self.path = path
+        self.fsync = fsync
+        self.compact_every = compact_every
+        self.records = 0
+        self._fd: Optional[int] = None
+
+    @classmethod
+    def for_session(cls, session_id: str, directory: str = CHECKPOINT_DIR, **kwargs) -> "Checkpoint":
+        """Файл сессии в каталоге directory; fsync по умолчанию — из CHECKPOINT_FSYNC (1 — включён)."""
+        kwargs.setdefault("fsync", os.getenv("CHECKPOINT_FSYNC", "0").lower() in ("1", "true", "yes"))
+        return cls(os.path.join(directory, f"{session_id}.jsonl"), **kwargs)
+
+    def start(self, header: Dict[str, Any], snapshot: Optional[Dict[str, Any]] = None):
+        """Создаёт файл заново: заголовок и (если есть) полный снимок сессии."""
+        self._rewrite([dict(header, kind="header")] + ([dict(snapshot, kind="turn")] if snapshot else []))
+
+    def append(self, record: Dict[str, Any]):
+        """Дописывает запись turn одним write()."""
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        data = (json.dumps(dict(record, kind="turn"), ensure_ascii=False) + "\n").encode("utf-8")
+        os.write(self._fd, data)
+        if self.fsync:
+            os.fsync(self._fd)
+        self.records += 1
+
+    def needs_compaction(self) -> bool:
+        return self.records >= self.compact_every
+
+    def compact(self, header: Dict[str, Any], snapshot: Dict[str, Any]):
+        """Атомарно заменяет файл заголовком и одним полным снимком."""
+        self.start(header, snapshot)
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def remove(self):
+        """Удаляет файл (сессия завершена и сохранена)."""
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def _rewrite(self, records: List[Dict[str, Any]]):
+        self.close()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self.records = 0
+
+
+def load_checkpoint(path: str) -> Dict[str, Any]:
+    """
+    Восстанавливает сессию из файла: header, state, messages, question, asked_field, correcting, turns.
+    Оборванная последняя строка (падение посреди записи) пропускается; повреждение в середине — ValueError.
+    """
+    with open(path, encoding="utf-8") as f:
+        lines = [line for line in f.read().split("\n") if line.strip()]
+    records = []
+    for i, line in enumerate(lines):
+        try:
+            records.append(json.loads(line))
+        except json.JSONDecodeError:
+            if i == len(lines) - 1:
+                break
+            raise ValueError(f"Файл контрольных точек повреждён: {path}, строка {i + 1}")
+    if not records or records[0].get("kind") != "header":
+        raise ValueError(f"В файле контрольных точек нет заголовка: {path}")
+
+    session: Dict[str, Any] = {
+        "header": records[0], "state": {}, "messages": [],
+        "question": None, "asked_field": None, "correcting": False, "turns": 0
+    }
+    messages = session["messages"]
+    for record in records[1:]:
+        session["state"].update(record.get("state", {}))
+        del messages[record.get("keep", len(messages)):]
+        messages.extend(record.get("messages", []))
+        session["question"] = record.get("question")
+        session["asked_field"] = record.get("asked_field")
+        session["correcting"] = record.get("correcting", False)
+        session["turns"] += 1
+    return session
+
+
+def find_checkpoint(session_id: str, directory: str = CHECKPOINT_DIR) -> str:
+    """Путь к контрольной точке сессии; нет такой — FileNotFoundError."""
+    path = os.path.join(directory, f"{session_id}.jsonl")
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"Сессия '{session_id}' не найдена в каталоге {directory}/")
+    return path
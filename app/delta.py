@@ -0,0 +1,47 @@
+"""
+Дельта-протокол ответа LLM: модель возвращает только изменившиеся поля,
+а они сливаются с предыдущим FormState с проверкой допустимых переходов статусов.
+"""
+
+from typing import Dict, Optional
+from app.models import FormState, FieldStatus, ALLOWED_TRANSITIONS
+from app.tokens import estimate_tokens, estimate_json_tokens
+
+
+def merge_delta(state: FormState, delta: FormState) -> FormState:
+    """
+    Возвращает новый state: предыдущий state с применёнными изменениями из delta.
+    Ключ 'optional' в delta можно опускать — он берётся из предыдущего state.
+    Недопустимый переход статуса (например, filled → not_started) — ValueError.
+    """
+    merged: FormState = dict(state)
+    for name, change in delta.items():
+        if name not in state:
+            raise ValueError(f"В ответе LLM неизвестное поле: '{name}'")
+        previous = state[name]
+        old_status = FieldStatus(previous["status"])
+        new_status = FieldStatus(change["status"])
+        if new_status not in ALLOWED_TRANSITIONS[old_status]:
+            raise ValueError(
+                f"Недопустимый переход статуса поля '{name}': {old_status.value} → {new_status.value}"
+            )
+        merged[name] = {
+            "value": change["value"],
+            "status": new_status.value,
+            "optional": change.get("optional", previous["optional"])
+        }
+    return merged
+
+
+def delta_savings(raw_response: str, merged_state: FormState, next_question: Optional[str]) -> Dict[str, int]:
+    """
+    Оценивает, сколько выходных токенов сэкономил дельта-ответ
+    по сравнению с полным ответом, повторяющим state целиком.
+    """
+    response_tokens = estimate_tokens(raw_response)
+    full_echo_tokens = estimate_json_tokens({"state": merged_state, "next_question": next_question})
+    return {
+        "response_tokens": response_tokens,
+        "full_echo_tokens": full_echo_tokens,
+        "saved_tokens": full_echo_tokens - response_tokens
+    }
@@ -4,13 +4,29 @@ DialogManager — основной управляющий класс диало
 """
 
 import os
+import threading
 import time
+import uuid
+from collections import deque
 from typing import Optional
-from app.models import Form, FormState
-from app import form_loader
-from app.extractor import extract_fields
+from app.models import Form
+from app.form_registry import compile_form, get_registry
+from app import extractor
+from app.extractor import extract_fields, extract_fields_stream
+from app.fast_path import fast_path_stats
+from app.response_cache import ResponseCache
+from app.state_store import StateStore
+from app.history import HistoryWindow
+from app.metrics import metrics, percentile
+from app.response_parser import parser_stats
+from app.session_log import SessionLog
+from app.checkpoint import CHECKPOINT_DIR, Checkpoint, find_checkpoint, load_checkpoint
+from app import dialog_step
+from app.dialog_step import CORRECTION_QUESTION, add_exchange, apply_extraction, drop_failed_exchange, field_question, next_step
+from app.pipeline import ExtractionPipeline
+from app.sharding import extract_sharded
+from app.answer_store import AnswerStore, answer_record
 import json
-from datetime import datetime
 
 class DialogManager:
     """
@@ -21,36 +37,215 @@ class DialogManager:
     - Взаимодействует с LLM через extractor
     - Сохраняет результат
     """
-    def __init__(self, form_path: str):
+    def __init__(
+        self,
+        form_path: Optional[str] = None,
+        prewarm: bool = False,
+        stream: bool = False,
+        delta: bool = False,
+        form: Optional[Form] = None,
+        fast_path: bool = True,
+        cache: Optional[ResponseCache] = None,
+        history: Optional[HistoryWindow] = None,
+        llm_client=None,
+        session_log: Optional[SessionLog] = None,
+        checkpoint_dir: Optional[str] = None,
+        pipeline: bool = False,
+        relevant_schema: bool = False,
+        shard_size: Optional[int] = None,
+        answer_store: Optional[AnswerStore] = None
+    ):
         """
         Инициализация менеджера:
-        - Загружает форму по пути
+        - Берёт скомпилированную форму из общего реестра по пути (или использует переданную form)
         - Создаёт начальный state
         - Подготавливает путь сохранения ответа
+        - При prewarm=True в фоне открывает соединение с LLM, пока пользователь отвечает на первый вопрос
+        - При stream=True читает ответ LLM потоково и показывает уточняющий вопрос до конца генерации
+        - При delta=True LLM возвращает только изменившиеся поля (экономия выходных токенов)
+        - При fast_path=True однозначные ответы на вопрос о конкретном поле разбираются локально, без LLM
+        - cache — кэш ответов LLM (см. app/response_cache.py); в потоковом режиме не используется
+        - history — окно истории с бюджетом токенов (по умолчанию — бюджет из LLM_CONTEXT_BUDGET; не задан — вся история)
+        - llm_client — LLM-клиент сессии (по умолчанию — extractor.default_llm())
+        - session_log — журнал событий сессии (по умолчанию — logs/<форма>_<время>_log.jsonl
+          с политикой записи из окружения, см. app/session_log.py)
+        - checkpoint_dir — каталог контрольных точек: после каждого хода сессия дописывается
+          в <checkpoint_dir>/<session_id>.jsonl и её можно продолжить через DialogManager.resume (см. app/checkpoint.py)
+        - При pipeline=True следующий вопрос задаётся сразу, а ответ на предыдущий разбирается LLM в фоне
+          (см. app/pipeline.py); потоковый режим при этом не используется
+        - При relevant_schema=True LLM получает полные описания только полей, нужных на этом ходе:
+          не начатых, невалидных и упомянутых в ответе; остальные — как имя → значение (см. app/schema_filter.py)
+        - shard_size — для очень больших форм: ответ разбирается параллельными вызовами LLM по шардам формы
+          (по группам полей, не больше shard_size полей в шарде, см. app/sharding.py); потоковый режим при этом не используется
+        - answer_store — хранилище результатов (см. app/answer_store.py); без него результат пишется
+          в answers/<форма>_<время>_<сессия>.json
         """
-        self.form: Form = form_loader.load_form(form_path)
-        self.state: FormState = form_loader.init_state(self.form)
+        # Скомпилированные формы неизменяемы и разделяются всеми сессиями
+        self.form: Form = compile_form(form) if form is not None else get_registry().load_path(form_path)
+        # Компактное состояние с индексами по статусам (см. app/state_store.py)
+        self.state: StateStore = StateStore.from_form(self.form)
         self.messages: list[dict[str, str]] = []
+        self.stream = stream
+        self.delta = delta
+        self.relevant_schema = relevant_schema
+        self.shard_size = shard_size
+        self._early_question: Optional[str] = None
+        self.fast_path = fast_path
+        self.fast_path_counts = {"answers": 0, "fast_path": 0, "llm_calls": 0}
+        self.cache = cache
+        self.history = history or HistoryWindow.from_env()
+        self.session_id = uuid.uuid4().hex
+        self.llm_client = llm_client
+        self._llm_logged = False
+        self.pipeline = pipeline
+        self.answer_store = answer_store
+        # Уточняющие вопросы LLM, пришедшие с поздними результатами конвейера
+        self._clarifications: deque = deque()
+        # Ожидание пользователя между его ответом и следующим вопросом, секунды
+        self.turn_waits: list[float] = []
+        self._answered_at: Optional[float] = None
 
-        # Уникальное имя результата
+        # Уникальное имя результата: время с точностью до секунды не различает одновременные сессии
         timestamp = time.strftime("%Y%m%d_%H%M%S")
         form_id = self.form["id"]
-        self.output_path = os.path.join("answers", f"{form_id}_{timestamp}.json")
-        self.log_path = os.path.join("logs", f"{form_id}_{timestamp}_log.json")
-        self.log = []  # Список событий для логгирования
+        if answer_store is not None:
+            self.output_path = answer_store.location(self.session_id)
+        else:
+            self.output_path = os.path.join("answers", f"{form_id}_{timestamp}_{self.session_id[:8]}.json")
+        # События пишутся в журнал сразу, а не копятся в памяти до сохранения результата
+        self.session_log = session_log or SessionLog.from_env(os.path.join("logs", f"{form_id}_{timestamp}_log.jsonl"))
+        self.log_path = self.session_log.path
+        self.checkpoint = Checkpoint.for_session(self.session_id, checkpoint_dir) if checkpoint_dir else None
+        self._checkpoint_started = False
+        self._saved_messages: list[dict[str, str]] = []
+        self._resume_point: Optional[dict] = None
         print(f"Форма загружена: {self.form['title']}")
+        if prewarm:
+            self.prewarm_llm()
+
+    @classmethod
+    def resume(cls, session_id: str, checkpoint_dir: str = CHECKPOINT_DIR, **kwargs) -> "DialogManager":
+        """
+        Продолжает сессию из контрольной точки: state, история сообщений и последний заданный вопрос
+        восстанавливаются, журнал и файл ответа — прежние. Если форма с тех пор изменилась — ValueError.
+        Остальные параметры — как у конструктора.
+        """
+        session = load_checkpoint(find_checkpoint(session_id, checkpoint_dir))
+        header = session["header"]
+        if header.get("form") is not None:
+            form = compile_form(header["form"])
+        elif header.get("form_source") and os.path.isfile(header["form_source"]):
+            form = get_registry().load_path(header["form_source"])
+        else:
+            form = get_registry().get(header["form_id"])
+        if form.version != header["form_version"]:
+            raise ValueError(f"Форма '{header['form_id']}' изменилась после сохранения сессии — продолжить её нельзя")
+        kwargs.setdefault("session_log", SessionLog.from_env(header["log_path"]))
+        dialog = cls(form=form, checkpoint_dir=checkpoint_dir, **kwargs)
+        dialog._restore(session, checkpoint_dir)
+        return dialog
+
+    def _restore(self, session: dict, checkpoint_dir: str):
+        header = session["header"]
+        self.session_id = header["session"]
+        self.output_path = self.answer_store.location(self.session_id) if self.answer_store is not None else header["output_path"]
+        self.checkpoint = Checkpoint.for_session(self.session_id, checkpoint_dir)
+        self.checkpoint.records = session["turns"]
+        self._checkpoint_started = True
+        self.state.apply(session["state"])
+        self.state.take_changes()  # восстановленное уже есть в файле
+        self.messages = session["messages"]
+        self._saved_messages = list(self.messages)
+        self._resume_point = session
+        self.log_event("resume", json.dumps({"session": self.session_id, "turns": session["turns"]}, ensure_ascii=False))
+
+    def checkpoint_header(self) -> dict:
+        """Заголовок файла контрольных точек: сессия, форма (id, версия, путь), файлы ответа и журнала."""
+        source = getattr(self.form, "source", None)
+        return {
+            "session": self.session_id,
+            "form_id": self.form["id"],
+            "form_version": self.form.version,
+            "form_source": os.path.abspath(source) if source else None,
+            # Форма без файла сохраняется целиком, иначе сессию не восстановить
+            "form": None if source else dict(self.form),
+            "output_path": self.output_path,
+            "log_path": self.log_path,
+        }
+
+    def save_checkpoint(self, question: str, asked_field: Optional[str], correcting: bool):
+        """
+        Дописывает ход в контрольную точку: изменившиеся поля, изменения истории и заданный вопрос.
+        Без checkpoint_dir ничего не делает.
+        """
+        if self.checkpoint is None:
+            return
+        if not self._checkpoint_started:
+            self.checkpoint.start(self.checkpoint_header())
+            self._checkpoint_started = True
+        saved, messages = self._saved_messages, self.messages
+        # История только дополняется и укорачивается с конца, поэтому общий префикс проверяется по ссылкам
+        keep = min(len(saved), len(messages))
+        if keep and saved[keep - 1] is not messages[keep - 1]:
+            keep = 0
+            while keep < len(saved) and keep < len(messages) and saved[keep] is messages[keep]:
+                keep += 1
+        turn = {"state": self.state.take_changes(), "keep": keep, "messages": messages[keep:],
+                "question": question, "asked_field": asked_field, "correcting": correcting}
+        if self.checkpoint.needs_compaction():
+            turn.update(state=self.state.to_dict(), keep=0, messages=messages)
+            self.checkpoint.compact(self.checkpoint_header(), turn)
+        else:
+            self.checkpoint.append(turn)
+        self._saved_messages = list(messages)
+
+    def prewarm_llm(self):
+        """
+        В фоновом потоке создаёт клиент LLM (импорт провайдера, чтение настроек) и прогревает соединение,
+        не задерживая первый вопрос. Ошибки здесь не показываются — они проявятся при первом вызове LLM.
+        """
+        def prewarm():
+            try:
+                client = self.log_llm_client()
+                warmup = getattr(client, "warmup", None)
+                if warmup is not None:
+                    warmup()
+            except Exception:
+                pass
+        self._llm_logged = True
+        threading.Thread(target=prewarm, name="llm-warmup", daemon=True).start()
+
+    def log_llm_client(self):
+        """Логирует используемую модель LLM и возвращает клиент."""
+        client = self.llm_client or extractor.default_llm()
+        self.log_event("llm", f"Используется LLM-модель: {client.__class__.__name__} (model={getattr(client, 'model', 'unknown')})")
+        return client
 
     def log_event(self, role: str, content: str):
         """
-        Добавляет событие в лог с таймстемпом.
-        role: 'user', 'assistant', 'llm', 'error'
+        Добавляет событие в журнал сессии с таймстемпом (локальное время и монотонные микросекунды).
+        role: 'user', 'assistant', 'llm', 'llm_call', 'error', 'fast_path', 'metric'
         content: текст сообщения или JSON-ответа
         """
-        self.log.append({
-            "timestamp": datetime.now().isoformat(timespec="seconds"),
-            "role": role,
-            "content": content
-        })
+        self.session_log.log(role, content)
+
+    @property
+    def log(self) -> list:
+        """События сессии, прочитанные из журнала (в памяти они не хранятся)."""
+        return self.session_log.events()
+
+    def close(self):
+        """Сбрасывает и закрывает журнал сессии и файл контрольных точек."""
+        self.session_log.close()
+        if self.checkpoint is not None:
+            self.checkpoint.close()
+
+    def quit(self):
+        """Выход без сохранения: контрольная точка остаётся, сессию можно продолжить."""
+        print("Выход без сохранения.")
+        if self.checkpoint is not None and self._checkpoint_started:
+            print(f"Сессию можно продолжить: python main.py --resume {self.session_id}")
+        self.log_metrics()
 
     def run(self):
         """
@@ -59,71 +254,310 @@ class DialogManager:
         - Обновляет state через extractor
         - После заполнения вызывает confirm_answers
         - Если подтверждено — сохраняет результат
+        Журнал сессии закрывается при любом завершении цикла, в том числе по ошибке.
         """
-
-        # Логируем используемую модель LLM при старте диалога
         try:
-            from app.extractor import llm
-            self.log_event("llm", f"Используется LLM-модель: {llm.__class__.__name__} (model={getattr(llm, 'model', 'unknown')})")
-        except Exception as e:
-            self.log_event("error", f"Не удалось определить модель LLM: {e}")
+            if self.pipeline:
+                self._run_pipelined()
+            else:
+                self._run()
+        finally:
+            self.close()
+
+    def _run(self):
 
         print("\nНачинаем заполнение формы. Для выхода в любой момент введите 'выход'.\n")
 
         next_question = None
-        first_run = True
+        asked_field = None  # поле, о котором спросил код (а не LLM)
+        correcting = False  # последний ответ пользователя — исправление после подтверждения
+        user_input = ""
+        resume, self._resume_point = self._resume_point, None
+        first_run = resume is None
         while True:
-            if first_run:
+            if resume is not None:
+                # Продолжение сессии: повторяем вопрос, на котором она прервалась
+                next_question, asked_field, correcting = resume["question"], resume["asked_field"], resume["correcting"]
+                resume = None
+            elif first_run:
                 # Для первого вопроса: спрашиваем по get_next_field
-                self.messages = []
                 next_field = self.get_next_field()
                 if next_field is None:
                     print("\nНет полей для заполнения.")
                     break
-                next_question = f"Введите значение поля '{next_field}':"
+                next_question = field_question(next_field)
+                asked_field = next_field
                 first_run = False
+            elif self.apply_fast_path(asked_field, user_input):
+                # Ответ разобран локально — LLM не нужен, спрашиваем следующее поле
+                next_question, asked_field = next_step(self.state)
             else:
                 # После каждого ответа вызываем extract_fields
                 try:
-                    self.state, next_question = extract_fields(self.messages, self.form, self.state, log_callback=self.log_event)
+                    # Модель LLM логируется при первом обращении к ней (или фоновым прогревом)
+                    if not self._llm_logged:
+                        self._llm_logged = True
+                        self.log_llm_client()
+                    if self.stream and not self.shard_size:
+                        new_state, next_question = extract_fields_stream(
+                            self.messages, self.form, self.state,
+                            log_callback=self.log_event, llm_client=self.llm_client, on_question=self.show_early_question,
+                            delta=self.delta, history=self.history, on_response=self.record_response,
+                            relevant_schema=self.relevant_schema
+                        )
+                    else:
+                        new_state, next_question = self.extract(self.messages, self.state, focus=asked_field)
                 except Exception as e:
                     err = f"Ошибка при обработке ответа LLM: {e}"
                     print(err)
                     self.log_event("error", err)
-                    continue
+                    # Не повторяем тот же запрос в цикле: убираем неудавшийся обмен и задаём вопрос заново
+                    retry = drop_failed_exchange(self.messages, correcting)
+                    if retry is not None:
+                        next_question, asked_field = retry, None
+                else:
+                    correcting = False
+                    # Изменения применяются на месте; уточняющий вопрос LLM — только о невалидных полях, иначе вопрос кодом
+                    next_question, asked_field = apply_extraction(self.state, new_state, next_question)
+            if next_question is None:
+                print("\nВсе поля заполнены или пропущены.")
+                if self.finish():
+                    break
+                correcting = True
+                continue
 
-                # Если нет полей invalid, формируем вопрос кодом
-                invalid_fields = [name for name, field in self.state.items() if field["status"] == "invalid"]
-                if not invalid_fields:
-                    next_field = self.get_next_field()
-                    if next_field is None:
-                        print("\nВсе поля заполнены или пропущены.")
-                        if self.confirm_answers():
-                            self.save_result()
-                            print(f"\nРезультат сохранён в {self.output_path}")
-                            break
-                        else:
-                            # Пользователь хочет внести исправления
-                            correction = input("\nУточните, что нужно изменить: ")
-                            if correction.strip().lower() == "выход":
-                                print("Выход без сохранения.")
-                                break
-                            self.log_event("user", correction)
-                            self.messages.append({"role": "user", "content": correction})
-                            continue
-                    next_question = f"Введите значение поля '{next_field}':"
-                # иначе next_question уже содержит уточняющий вопрос от LLM
-
-            print(next_question)
+            # В потоковом режиме уточняющий вопрос мог быть показан ещё во время генерации
+            if next_question != self._early_question:
+                self.mark_question_shown()
+                print(next_question)
+            self._early_question = None
+            self.save_checkpoint(next_question, asked_field, correcting)
             user_input = input("> ")
             if user_input.strip().lower() == "выход":
-                print("Выход без сохранения.")
+                self.quit()
                 break
+            self._answered_at = time.perf_counter()
+
+            add_exchange(self.messages, next_question, user_input, self.log_event)
+
+    def _run_pipelined(self):
+        """
+        Цикл диалога в конвейерном режиме: вопрос о следующем поле задаётся сразу после ответа,
+        извлечение идёт в фоне (см. app/pipeline.py). Поздние результаты сводятся в state перед каждым вопросом;
+        перед подтверждением и после исправления диалог дожидается всех извлечений.
+        """
+        print("\nНачинаем заполнение формы. Для выхода в любой момент введите 'выход'.\n")
+
+        pipeline = ExtractionPipeline(self)
+        question, asked_field, correcting = None, None, False
+        resume, self._resume_point = self._resume_point, None
+        if resume is not None:
+            question, asked_field, correcting = resume["question"], resume["asked_field"], resume["correcting"]
+        elif self.get_next_field() is None:
+            print("\nНет полей для заполнения.")
+            return
+        try:
+            while True:
+                if question is None:
+                    question, asked_field = self.next_pipelined_question(pipeline)
+                if question is None:
+                    print("\nВсе поля заполнены или пропущены.")
+                    if self.finish():
+                        break
+                    question, asked_field, correcting = self.extract_correction(pipeline, self.messages[-1:])
+                    continue
+                self.mark_question_shown()
+                print(question)
+                with pipeline.lock:
+                    self.save_checkpoint(question, asked_field, correcting)
+                user_input = input("> ")
+                if user_input.strip().lower() == "выход":
+                    pipeline.cancel()
+                    self.quit()
+                    break
+                self._answered_at = time.perf_counter()
 
-            self.log_event("assistant", next_question)
-            self.log_event("user", user_input)
-            self.messages.append({"role": "assistant", "content": next_question})
-            self.messages.append({"role": "user", "content": user_input})
+                add_exchange(self.messages, question, user_input, self.log_event)
+                if correcting:
+                    question, asked_field, correcting = self.extract_correction(pipeline, self.messages[-1:])
+                    continue
+                with pipeline.lock:
+                    fast = self.apply_fast_path(asked_field, user_input)
+                    # Ответ на уточняющий вопрос LLM относится к невалидным полям
+                    fields = {asked_field} if asked_field is not None else set(self.state.with_status("invalid"))
+                if not fast:
+                    if not self._llm_logged:
+                        self._llm_logged = True
+                        self.log_llm_client()
+                    pipeline.submit(list(self.messages), self.messages[-2:], fields)
+                question = asked_field = None
+        finally:
+            pipeline.close()
+
+    def extract(self, messages: list[dict[str, str]], state, focus: Optional[str] = None, log_callback=None):
+        """
+        Один вызов извлечения с параметрами диалога: extract_fields или, при shard_size, extract_sharded.
+        focus — поле, о котором спросил код; log_callback — по умолчанию журнал сессии.
+        """
+        options = dict(
+            log_callback=log_callback or self.log_event, llm_client=self.llm_client,
+            delta=self.delta, cache=self.cache, history=self.history,
+            on_response=self.record_response, relevant_schema=self.relevant_schema
+        )
+        if self.shard_size:
+            return extract_sharded(messages, self.form, state, shard_size=self.shard_size, focus=focus, **options)
+        return extract_fields(messages, self.form, state, **options)
+
+    def next_pipelined_question(self, pipeline: ExtractionPipeline) -> tuple[Optional[str], Optional[str]]:
+        """
+        Следующий вопрос конвейерного режима: (вопрос, поле) или (None, None), если все поля обработаны.
+        Сначала — уточняющие вопросы LLM о невалидных полях, затем — первое поле, ответ на которое не разбирается в фоне.
+        Если таких нет, но извлечения ещё идут, дожидается их по одному.
+        """
+        while True:
+            self.reconcile(pipeline.poll())
+            with pipeline.lock:
+                busy = pipeline.in_flight
+                while self._clarifications:
+                    question = self._clarifications.popleft()
+                    # Вопрос устарел, если невалидных полей вне работы уже нет
+                    if any(name not in busy for name in self.state.with_status("invalid")):
+                        return question, None
+                next_field = self.state.next_pending(skip=busy)
+            if next_field is not None:
+                return field_question(next_field), next_field
+            if not pipeline:
+                return None, None
+            self.reconcile([pipeline.wait_next()])
+
+    def extract_correction(self, pipeline: ExtractionPipeline, exchange: list[dict[str, str]]) -> tuple[Optional[str], Optional[str], bool]:
+        """
+        Исправление после подтверждения разбирается сразу (его результат нужен для следующей проверки).
+        Возвращает (вопрос, поле, correcting) для цикла: при ошибке LLM — снова просьба уточнить исправление.
+        """
+        if not self._llm_logged:
+            self._llm_logged = True
+            self.log_llm_client()
+        pipeline.submit(list(self.messages), exchange, set())
+        if self.reconcile(pipeline.wait_all()):
+            return CORRECTION_QUESTION, None, True
+        return None, None, False
+
+    def reconcile(self, outcomes: list[dict]) -> int:
+        """
+        Сводит итоги фоновых извлечений (state они уже обновили): при ошибке неудавшийся обмен убирается
+        из истории — поле снова станет первым кандидатом на вопрос, уточняющие вопросы LLM ставятся в очередь.
+        Возвращает число ошибок.
+        """
+        errors = 0
+        for outcome in outcomes:
+            if outcome.get("error"):
+                errors += 1
+                print(outcome["error"])
+                self.log_event("error", outcome["error"])
+                for message in outcome["exchange"]:
+                    for i in range(len(self.messages) - 1, -1, -1):
+                        if self.messages[i] is message:
+                            del self.messages[i]
+                            break
+            elif outcome.get("question") and outcome["question"] not in self._clarifications:
+                self._clarifications.append(outcome["question"])
+        return errors
+
+    def mark_question_shown(self):
+        """Учитывает, сколько пользователь ждал следующего вопроса после своего ответа."""
+        if self._answered_at is not None:
+            self.turn_waits.append(time.perf_counter() - self._answered_at)
+            self._answered_at = None
+
+    def finish(self) -> bool:
+        """
+        Все поля обработаны: просит подтверждение и сохраняет результат.
+        Возвращает True, если диалог завершён (сохранён или выход),
+        False — если пользователь ввёл исправление и диалог продолжается через LLM.
+        """
+        if self.confirm_answers():
+            self.save_result()
+            self.log_metrics()
+            print(f"\nРезультат сохранён в {self.output_path}")
+            if self.checkpoint is not None:
+                self.checkpoint.remove()
+            return True
+        # Пользователь хочет внести исправления
+        correction = input(f"\n{CORRECTION_QUESTION} ")
+        if correction.strip().lower() == "выход":
+            self.quit()
+            return True
+        self._answered_at = time.perf_counter()
+        add_exchange(self.messages, None, correction, self.log_event)
+        return False
+
+    def apply_fast_path(self, field_name: Optional[str], answer: str) -> bool:
+        """
+        Пробует обновить state по ответу без LLM (см. app/fast_path.py).
+        Работает, только если вопрос задавал код про конкретное поле и ответ однозначен.
+        Каждый ответ учитывается в счётчиках формы и сессии: локально или через LLM.
+        """
+        fast = dialog_step.apply_fast_path(self.form, self.state, field_name, answer, self.fast_path, self.log_event)
+        self.fast_path_counts["answers"] += 1
+        self.fast_path_counts["fast_path" if fast else "llm_calls"] += 1
+        return fast
+
+    def record_response(self, result):
+        """
+        Учитывает вызов LLM в метриках сессии и формы (см. app/metrics.py) и пишет его в лог:
+        модель, токены, задержка, оценка стоимости.
+        """
+        call = metrics.record(self.form["id"], self.session_id, result)
+        self.log_event("llm_call", json.dumps(call, ensure_ascii=False))
+
+    def log_metrics(self):
+        """
+        Пишет в лог итоговые метрики сессии: вызовы LLM (токены, задержка, стоимость),
+        разбор ответов (сколько спасено исправлениями), ожидание следующего вопроса (p50/p99), быстрый путь, (если включён) кэш ответов и статистика маршрутов роутера LLM.
+        """
+        metric = {"metric": "llm_calls", "session": self.session_id}
+        metric.update(metrics.end_session(self.session_id))
+        metric["form_total"] = metrics.form(self.form["id"])
+        self.log_event("metric", json.dumps(metric, ensure_ascii=False))
+        metric = {"metric": "response_parser"}
+        metric.update(parser_stats.snapshot())
+        self.log_event("metric", json.dumps(metric, ensure_ascii=False))
+        waits = self.turn_waits
+        metric = {
+            "metric": "turn_wait", "mode": "pipeline" if self.pipeline else "sequential", "turns": len(waits),
+            "p50_ms": round(percentile(waits, 50) * 1000, 2), "p99_ms": round(percentile(waits, 99) * 1000, 2)
+        }
+        self.log_event("metric", json.dumps(metric, ensure_ascii=False))
+        self.log_fast_path_stats()
+        if self.cache is not None:
+            metric = {"metric": "response_cache"}
+            metric.update(self.cache.stats())
+            self.log_event("metric", json.dumps(metric, ensure_ascii=False))
+        # Клиент не создаётся ради метрик: форма могла быть заполнена без LLM и без настроенного провайдера
+        client = self.llm_client or extractor.existing_llm()
+        if getattr(client, "provider_name", None) == "router":
+            metric = {"metric": "llm_routes", "routes": client.stats()}
+            self.log_event("metric", json.dumps(metric, ensure_ascii=False))
+
+    def log_fast_path_stats(self):
+        """
+        Логирует долю ответов, потребовавших вызова LLM: за сессию и по форме в целом (за процесс).
+        """
+        answers = self.fast_path_counts["answers"]
+        metric = {"metric": "fast_path", "form": self.form["id"]}
+        metric.update(self.fast_path_counts)
+        metric["llm_call_rate"] = round(self.fast_path_counts["llm_calls"] / answers, 3) if answers else 0.0
+        metric["form_total"] = fast_path_stats.snapshot().get(self.form["id"])
+        self.log_event("metric", json.dumps(metric, ensure_ascii=False))
+
+    def show_early_question(self, question: str):
+        """
+        Печатает уточняющий вопрос LLM сразу, как только он получен из потока.
+        """
+        self.mark_question_shown()
+        print(question)
+        self._early_question = question
 
     def ask_user(self, field_name: str) -> str:
         """
@@ -135,6 +569,7 @@ class DialogManager:
         """
         Показывает пользователю текущие значения и просит подтверждение.
         """
+        self.mark_question_shown()
         print("\n--- Проверка заполненных данных ---")
         for name, field in self.state.items():
             if field["status"] == "filled":
@@ -148,20 +583,19 @@ class DialogManager:
 
     def save_result(self):
         """
-        Сохраняет итоговый state в JSON-файл в папке answers.
+        Сохраняет итоговый state в хранилище результатов (дожидаясь фиксации) или в JSON-файл в папке answers
+        (журнал сессии пишется по ходу диалога).
         """
-        os.makedirs("answers", exist_ok=True)
-        with open(self.output_path, "w", encoding="utf-8") as f:
-            json.dump(self.state, f, ensure_ascii=False, indent=2)
-        os.makedirs("logs", exist_ok=True)
-        with open(self.log_path, "w", encoding="utf-8") as f:
-            json.dump(self.log, f, ensure_ascii=False, indent=2)
+        if self.answer_store is not None:
+            self.answer_store.put(answer_record(self.form, self.session_id, self.state.to_dict()), wait=True)
+        else:
+            os.makedirs("answers", exist_ok=True)
+            with open(self.output_path, "w", encoding="utf-8") as f:
+                json.dump(self.state.to_dict(), f, ensure_ascii=False, indent=2)
+        self.session_log.flush()
 
     def get_next_field(self) -> Optional[str]:
         """
         Возвращает имя следующего поля для заполнения (или None, если всё заполнено/пропущено).
         """
-        for name, field in self.state.items():
-            if field["status"] in ["not_started", "invalid"]:
-                return name
-        return None
+        return self.state.next_pending()
@@ -0,0 +1,195 @@
+"""
+DialogSession — пошаговая неблокирующая версия цикла DialogManager.run для серверного режима.
+
+Вместо input() сессия получает ответы вызовами методов и возвращает следующий шаг:
+- start() — первый вопрос;
+- await answer(text) — ответ на заданный вопрос (быстрый путь или асинхронный вызов LLM);
+- await confirm(confirmed, correction) — подтверждение итоговых данных или исправление;
+- result() — текущее состояние формы.
+
+Фазы: asking (ждём ответ на question) → confirming (все поля обработаны, ждём подтверждения)
+→ done (данные подтверждены). Ошибка LLM не переводит сессию в другую фазу: тот же вопрос задаётся снова.
+Один event loop может вести тысячи таких сессий с общим асинхронным клиентом LLM.
+"""
+
+import sys
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+from app.models import Form
+from app.form_registry import compile_form
+from app.extractor import extract_fields_async
+from app.dialog_step import (
+    CORRECTION_QUESTION, add_exchange, apply_extraction, apply_fast_path, drop_failed_exchange, field_question, next_step
+)
+from app.history import HistoryWindow
+from app.metrics import metrics
+from app.response_cache import ResponseCache
+from app.state_store import StateStore
+
+ASKING = "asking"
+CONFIRMING = "confirming"
+DONE = "done"
+
+
+class DialogSession:
+    """
+    Состояние одного диалога в серверном режиме (см. описание модуля).
+
+    - llm_client — асинхронный клиент LLM (AsyncLLMBase), общий для всех сессий процесса
+    - log_callback(role, content) — куда писать события сессии (например, SessionLog.log); None — не писать
+    - delta, fast_path, cache, history, relevant_schema — как у DialogManager
+    """
+    def __init__(
+        self,
+        form: Form,
+        llm_client,
+        session_id: Optional[str] = None,
+        delta: bool = False,
+        fast_path: bool = True,
+        cache: Optional[ResponseCache] = None,
+        history: Optional[HistoryWindow] = None,
+        log_callback=None,
+        relevant_schema: bool = False
+    ):
+        self.form = compile_form(form)
+        self.llm_client = llm_client
+        self.session_id = session_id or uuid.uuid4().hex
+        self.delta = delta
+        self.relevant_schema = relevant_schema
+        self.fast_path = fast_path
+        self.cache = cache
+        self.history = history or HistoryWindow.from_env()
+        self.log_callback = log_callback
+        self.state = StateStore.from_form(self.form)
+        self.messages: List[Dict[str, str]] = []
+        self.phase = ASKING
+        self.question: Optional[str] = None
+        self.asked_field: Optional[str] = None  # поле, о котором спросил код (а не LLM)
+        self.correcting = False
+        self.turns = 0
+        self.llm_calls = 0
+        self.created_at = time.monotonic()
+
+    # --- Шаги диалога ---
+
+    def start(self) -> Dict[str, Any]:
+        """Первый вопрос (или сразу подтверждение, если полей для заполнения нет)."""
+        if self.question is None and self.phase == ASKING:
+            self._ask_next()
+        return self.view()
+
+    async def answer(self, text: str) -> Dict[str, Any]:
+        """Обрабатывает ответ на текущий вопрос и возвращает следующий шаг."""
+        if self.phase != ASKING:
+            raise ValueError(f"Сессия ждёт не ответа, а действия фазы '{self.phase}'")
+        if self.question is None:
+            self.start()
+        self.turns += 1
+        add_exchange(self.messages, self.question, text, self.log_callback)
+        if apply_fast_path(self.form, self.state, self.asked_field, text, self.fast_path, self.log_callback):
+            self.correcting = False
+            self._ask_next()
+            return self.view()
+        error = await self._call_llm()
+        if error is not None:
+            self._retry_question()
+        return self.view(error)
+
+    async def confirm(self, confirmed: bool, correction: Optional[str] = None) -> Dict[str, Any]:
+        """
+        confirmed=True — данные верны, сессия завершена.
+        Иначе correction — что исправить (уходит в LLM); без него задаётся уточняющий вопрос.
+        """
+        if self.phase != CONFIRMING:
+            raise ValueError(f"Подтверждение возможно только в фазе '{CONFIRMING}', сейчас '{self.phase}'")
+        if confirmed:
+            self.phase = DONE
+            self.question = self.asked_field = None
+            self._log("user", "подтверждено")
+            return self.view()
+        self.correcting = True
+        self.phase = ASKING
+        if not correction:
+            self.question, self.asked_field = CORRECTION_QUESTION, None
+            return self.view()
+        self.turns += 1
+        add_exchange(self.messages, None, correction, self.log_callback)
+        error = await self._call_llm()
+        if error is not None:
+            self._retry_question()
+        return self.view(error)
+
+    def result(self) -> Dict[str, Any]:
+        """Текущее состояние формы в JSON-виде (как в answers/)."""
+        return self.state.to_dict()
+
+    def view(self, error: Optional[str] = None) -> Dict[str, Any]:
+        """Шаг для клиента: фаза, вопрос, а в фазе подтверждения — сводка заполненных полей."""
+        step: Dict[str, Any] = {"session": self.session_id, "form": self.form["id"], "phase": self.phase, "question": self.question}
+        if self.asked_field is not None:
+            step["field"] = self.asked_field
+        if self.phase != ASKING:
+            step["summary"] = {
+                name: field["value"] if field["status"] == "filled" else None
+                for name, field in self.state.items()
+                if field["status"] in ("filled", "skipped")
+            }
+        if error is not None:
+            step["error"] = error
+        return step
+
+    # --- Внутреннее ---
+
+    def _ask_next(self, step=None):
+        """Следующий вопрос (по умолчанию — кодом о следующем поле); если все поля обработаны — фаза подтверждения."""
+        self.question, self.asked_field = step or next_step(self.state)
+        if self.question is None:
+            self.phase = CONFIRMING
+
+    def _retry_question(self):
+        # Неудавшийся обмен убирается из истории, вопрос задаётся заново
+        question = drop_failed_exchange(self.messages, self.correcting)
+        if question is not None:
+            self.question, self.asked_field = question, None
+
+    async def _call_llm(self) -> Optional[str]:
+        """Вызов LLM по текущей истории; возвращает текст ошибки или None."""
+        self.llm_calls += 1
+        try:
+            new_state, next_question = await extract_fields_async(
+                self.messages, self.form, self.state, llm_client=self.llm_client,
+                log_callback=self.log_callback, delta=self.delta, cache=self.cache,
+                history=self.history, on_response=self._record_response, relevant_schema=self.relevant_schema
+            )
+        except Exception as e:
+            error = f"Ошибка при обработке ответа LLM: {e}"
+            self._log("error", error)
+            return error
+        self.correcting = False
+        self._ask_next(apply_extraction(self.state, new_state, next_question))
+        return None
+
+    def _record_response(self, result):
+        metrics.record(self.form["id"], self.session_id, result)
+
+    def _log(self, role: str, content: str):
+        if self.log_callback is not None:
+            self.log_callback(role, content)
+
+    def close(self) -> Dict[str, Any]:
+        """Освобождает учёт метрик сессии и возвращает их итог."""
+        return metrics.end_session(self.session_id)
+
+    def memory_bytes(self) -> int:
+        """
+        Оценка памяти сессии: столбцы состояния и история сообщений (без общих объектов формы и клиента).
+        Считается за O(числа сообщений и полей), поэтому таблица сессий вызывает её только после шага.
+        """
+        size = sys.getsizeof(self) + sys.getsizeof(self.__dict__) + sys.getsizeof(self.messages)
+        store = self.state
+        size += sys.getsizeof(store) + sys.getsizeof(store._values) + sys.getsizeof(store._status) + sys.getsizeof(store._optional)
+        size += sum(sys.getsizeof(value) for value in store._values if value is not None)
+        for message in self.messages:
+            size += sys.getsizeof(message) + sys.getsizeof(message["content"])
+        return size
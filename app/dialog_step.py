@@ -0,0 +1,87 @@
+"""
+Общее ядро шага диалога для DialogManager (CLI) и DialogSession (сервер).
+
+Шаг устроен одинаково в обоих режимах:
+- обмен «вопрос — ответ» пишется в журнал и добавляется в историю (add_exchange);
+- ответ на вопрос кода о конкретном поле сначала пробуется разобрать без LLM (apply_fast_path);
+- если вызов LLM не удался, неудавшийся обмен убирается из истории (drop_failed_exchange),
+  чтобы тот же запрос не повторялся в цикле;
+- по результату выбирается следующий вопрос: уточняющий вопрос LLM о невалидном поле
+  или вопрос кодом о следующем поле (next_step, apply_extraction).
+Ввод-вывод (input/print, HTTP) и вызов LLM (синхронный, потоковый, асинхронный) остаются в режимах.
+"""
+
+import json
+from typing import Dict, List, Optional, Tuple
+from app.models import Form, FormState
+from app.fast_path import try_fast_path, fast_path_stats
+from app.state_store import StateStore
+
+CORRECTION_QUESTION = "Уточните, что нужно изменить:"
+
+
+def field_question(name: str) -> str:
+    """Вопрос, который код задаёт о конкретном поле."""
+    return f"Введите значение поля '{name}':"
+
+
+def add_exchange(messages: List[Dict[str, str]], question: Optional[str], answer: str, log_callback=None):
+    """Пишет вопрос и ответ в журнал и добавляет их в историю (без вопроса — только ответ, как исправление после подтверждения)."""
+    if question is not None:
+        if log_callback is not None:
+            log_callback("assistant", question)
+        messages.append({"role": "assistant", "content": question})
+    if log_callback is not None:
+        log_callback("user", answer)
+    messages.append({"role": "user", "content": answer})
+
+
+def apply_fast_path(form: Form, state: StateStore, field_name: Optional[str], answer: str, enabled: bool = True, log_callback=None) -> bool:
+    """
+    Пробует обновить state по ответу без LLM (см. app/fast_path.py).
+    Работает, только если вопрос задавал код про конкретное поле и ответ однозначен.
+    Каждый ответ учитывается в счётчиках формы: локально или через LLM.
+    """
+    value = None
+    if enabled and field_name is not None:
+        value = try_fast_path(form.field_index[field_name], answer, state.keys())
+    fast = value is not None
+    fast_path_stats.record(form["id"], fast)
+    if fast:
+        state.set(field_name, value=value, status="filled")
+        if log_callback is not None:
+            log_callback("fast_path", json.dumps({"field": field_name, "value": value}, ensure_ascii=False))
+    return fast
+
+
+def drop_failed_exchange(messages: List[Dict[str, str]], correcting: bool) -> Optional[str]:
+    """
+    Убирает из истории обмен, на котором вызов LLM не удался.
+    Возвращает вопрос, который задать вместо прежнего: после неудачного исправления — просьбу уточнить его,
+    иначе None (тот же вопрос задаётся снова).
+    """
+    messages.pop()
+    if correcting:
+        return CORRECTION_QUESTION
+    messages.pop()
+    return None
+
+
+def next_step(state: StateStore, clarification: Optional[str] = None) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Следующий вопрос и поле, о котором он задан кодом (для вопроса LLM — None).
+    clarification — уточняющий вопрос LLM; задаётся, только пока есть невалидные поля.
+    (None, None) — все поля обработаны, пора подтверждать.
+    """
+    if clarification and state.with_status("invalid"):
+        return clarification, None
+    next_field = state.next_pending()
+    if next_field is None:
+        return None, None
+    return field_question(next_field), next_field
+
+
+def apply_extraction(state: StateStore, new_state: FormState, next_question: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """Применяет результат извлечения к state на месте и возвращает следующий шаг (см. next_step)."""
+    state.apply(new_state)
+    return next_step(state, next_question)
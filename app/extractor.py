@@ -1,136 +1,373 @@
 """
 Модуль extractor отвечает за взаимодействие с LLM:
 - принимает текущую историю сообщений, форму и state,
-- формирует system prompt,
+- формирует промпт (см. prompt_builder),
 - передаёт всё в LLM,
 - получает и возвращает обновлённый state.
 """
 
+import asyncio
 import json
-import re
-from typing import List, Dict
-from app.models import Form, FormState, FieldStatus
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from app.models import Form, FormState
+from app.stream_parser import StreamingResponseParser
+from app.delta import merge_delta, delta_savings
+from app.prompt_builder import compile_prompt
+from app.form_registry import form_field_names
+from app.response_cache import ResponseCache
+from app.history import HistoryWindow
+from app.response_parser import parse_json_response
+from app.state_store import as_form_state
 from llm import get_llm  # Используем универсальный выбор LLM-провайдера
+from llm.response import LLMResponse
 
-llm = get_llm()  # Теперь провайдер выбирается через .env (LLM_PROVIDER)
+_default_llm = None
+_default_llm_lock = threading.Lock()
 
-def extract_json_from_markdown(text: str) -> str:
+def default_llm():
     """
-    Удаляет markdown-блоки ```json ... ``` или ``` ... ``` вокруг JSON-ответа LLM.
-    Возвращает чистый JSON-стринг.
+    Клиент LLM по умолчанию (провайдер выбирается через .env, LLM_PROVIDER).
+    Создаётся при первом обращении, а не при импорте модуля: запуск CLI не ждёт загрузки провайдера,
+    а ошибка конфигурации возникает, только когда LLM действительно нужен.
     """
-    match = re.search(r"```(?:json)?\s*(.*?)\s*```", text, re.DOTALL)
-    if match:
-        return match.group(1)
-    return text
+    global _default_llm
+    if _default_llm is None:
+        with _default_llm_lock:
+            if _default_llm is None:
+                _default_llm = get_llm()
+    return _default_llm
 
-def extract_fields(
+def existing_llm():
+    """Клиент LLM по умолчанию, если он уже создан, иначе None (не создаёт клиент и не требует настроек провайдера)."""
+    return _default_llm
+
+def __getattr__(name):
+    # Совместимость: app.extractor.llm — тот же клиент по умолчанию
+    if name == "llm":
+        return default_llm()
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+
+def build_llm_messages(
     messages: List[Dict[str, str]],
     form: Form,
     state: FormState,
+    question_first: bool = False,
+    delta: bool = False,
+    history: HistoryWindow = None,
+    log_callback=None,
+    relevant_schema: bool = False
+) -> List[Dict[str, str]]:
+    """
+    Собирает полный список сообщений для LLM: стабильный префикс (инструкции и форма), история, state.
+    question_first: просить модель писать 'next_question' перед 'state' (для потокового режима)
+    delta: просить модель возвращать в 'state' только изменившиеся поля
+    history: окно истории с бюджетом токенов (см. app/history.py); None — вся история целиком
+    relevant_schema: полные описания только полей, нужных на этом ходе (см. app/schema_filter.py)
+    """
+    prompt = compile_prompt(form)
+    if history is None:
+        return prompt.build_messages(messages, state, delta=delta, question_first=question_first, relevant_schema=relevant_schema)
+    full_messages = history.build_messages(
+        prompt, messages, state, delta=delta, question_first=question_first, relevant_schema=relevant_schema
+    )
+    if log_callback and (history.last["collapsed"] or history.last.get("truncated") or history.last.get("over_budget")):
+        log_callback("metric", json.dumps(dict(history.last, metric="history_window")))
+    return full_messages
+
+def parse_llm_response(
+    response: str,
+    form: Form,
+    log_callback=None,
+    state: FormState = None,
+    delta: bool = False
+) -> tuple[FormState, str]:
+    """
+    Разбирает и валидирует ответ LLM.
+    Возвращает кортеж: (обновлённый FormState, next_question).
+    В режиме delta ответ сливается с предыдущим state.
+    """
+    return apply_response(decode_llm_json(response, log_callback), response, form, state, delta, log_callback)
+
+def decode_llm_json(response: str, log_callback=None):
+    """
+    Разбирает текст ответа LLM как JSON: в том числе внутри markdown-блока или текста,
+    с исправлением типичных дефектов (см. app/response_parser.py).
+    """
+    try:
+        parsed, outcome, repairs = parse_json_response(response)
+    except ValueError:
+        if log_callback:
+            log_callback("error", f"LLM вернула не JSON: {response!r}")
+        raise ValueError(
+            f"LLM вернула не JSON, а текст: {response!r}\n"
+            "Возможно, LLM сбилась с инструкции. Попробуйте повторить ввод или перезапустить диалог."
+        )
+    if repairs and log_callback:
+        log_callback("metric", json.dumps({"metric": "response_repaired", "repairs": repairs}))
+    return parsed
+
+def apply_response(
+    parsed,
+    response: str,
+    form: Form,
+    state: FormState = None,
+    delta: bool = False,
     log_callback=None
 ) -> tuple[FormState, str]:
     """
-    Отправляет историю, форму и state в LLM.
+    Валидирует разобранный ответ и возвращает (новый FormState, next_question).
+    В режиме delta изменения сливаются с state, а в лог пишется метрика сэкономленных выходных токенов.
+    """
+    if not delta:
+        return validate_response(parsed, form)
+    changes, next_question = validate_response(parsed, form, delta=True)
+    merged = merge_delta(state, changes)
+    if log_callback:
+        metric = {"metric": "delta_output_tokens", "changed_fields": len(changes)}
+        metric.update(delta_savings(response, merged, next_question))
+        log_callback("metric", json.dumps(metric, ensure_ascii=False))
+    return merged, next_question
+
+def validate_response(parsed, form: Form, delta: bool = False) -> tuple[FormState, str]:
+    """
+    Проверяет структуру разобранного ответа LLM и состояние каждого поля.
     Возвращает кортеж: (обновлённый FormState, next_question).
-    log_callback: функция для логирования событий (role, content)
+    delta: в state допускается подмножество полей формы, а ключ 'optional' необязателен.
+    Проверка готовится один раз на форму и режим (см. app/response_schema.py).
     """
+    return compile_prompt(form).validator(delta)(parsed)
 
-    system_prompt = (
-        "Ты — ассистент, помогающий пользователю заполнить форму. "
-        "Форма описана ниже в формате JSON. "
-        "Пользователь отвечает на вопросы, иногда указывая сразу несколько значений. "
-        "Твоя задача — обновить состояния всех полей (добавить значения и статусы), которые можно заполнить по новому сообщению. "
-        "Поддерживаемые статусы: not_started, filled, invalid, skipped. "
-        "Если значение поля подходит — установи статус filled. "
-        "Если оно некорректно (например, нарушен формат или сомнительное значение) — установи статус invalid. "
-        "Нельзя менять поля со статусами filled или skipped, если пользователь явно не просит это сделать. "
-        "Если хотя бы одно поле получило статус invalid — в ключ 'next_question' запиши уточняющий вопрос, относящийся к одному из таких полей. "
-        "Если все поля валидны или нераспознаны — ключ 'next_question' должен быть null. "
-        "Если значение можно интерпретировать, но оно указано в нестандартной форме (например, '23-12-2002', '23 декабря 2002' или 'декабрь'), преобразуй его к требуемому формату из описания поля (например, '23.12.2002' или '12') и установи статус filled. "
-        "Не помечай такие значения как invalid, если их можно однозначно нормализовать. "
-        "Ответ должен строго соответствовать формату JSON — объект с двумя ключами: "
-        "'state' (словарь name → {value, status, optional}) и 'next_question' (строка или null). "
-        "Пример:\n"
-        '{"state": {"Фамилия": {"value": "Иванов", "status": "filled", "optional": false}}, "next_question": null} '
-        "Никаких пояснений, комментариев или текста вне JSON — только чистый JSON-ответ."
-    )
+def log_usage(usage: Dict[str, int], log_callback=None):
+    """
+    Пишет в лог usage вызова и долю prompt-токенов, взятых из кэша префикса провайдера.
+    """
+    if not (log_callback and usage):
+        return
+    prompt_tokens = usage.get("prompt_tokens", 0)
+    cached_tokens = usage.get("cached_tokens", 0)
+    stats = dict(usage, cache_hit_ratio=round(cached_tokens / prompt_tokens, 3) if prompt_tokens else 0.0)
+    log_callback("usage", json.dumps(stats))
 
-    full_messages = [{"role": "system", "content": system_prompt}]
-    full_messages += messages
+def cache_lookup(cache: ResponseCache, client, messages, form: Form, state: FormState, delta: bool, log_callback=None):
+    """
+    Ищет ответ в кэше. Возвращает (ключ, закэшированный ответ или None);
+    ключ None — кэш для этого вызова не применяется (например, temperature > 0).
+    """
+    if cache is None or not cache.allows(cache.temperature):
+        return None, None
+    key = cache.key_for(form, state, messages, model=getattr(client, "model", None), delta=delta)
+    cached = cache.get(key)
+    if cached is not None and log_callback:
+        log_callback("cache", json.dumps({"hit": True, "key": key[:16]}))
+    return key, cached
 
-    full_messages.append({
-        "role": "system",
-        "content": (
-            "Вот описание формы:\n"
-            f"{json.dumps(form, ensure_ascii=False, indent=2)}\n\n"
-            "Вот текущее состояние state:\n"
-            f"{json.dumps(state, ensure_ascii=False, indent=2)}"
-        )
-    })
+def llm_options(cache: ResponseCache = None, client=None, form: Form = None, delta: bool = False, question_first: bool = False) -> Dict:
+    """
+    Параметры вызова клиента: через детерминированный кэш — с temperature=0;
+    клиенту с поддержкой structured output — JSON Schema ответа по форме (см. app/response_schema.py).
+    """
+    options = {}
+    if cache is not None and cache.temperature is not None:
+        options["temperature"] = cache.temperature
+    if form is not None and getattr(client, "structured_output", None):
+        options["response_schema"] = compile_prompt(form).response_schema(delta, question_first)
+    return options
+
+def request_llm(client, full_messages: List[Dict[str, str]], cache: ResponseCache = None, form: Form = None, delta: bool = False) -> LLMResponse:
+    """
+    Вызывает клиента и возвращает LLMResponse.
+    Клиенты только с ask (например, заглушки) не сообщают usage — задержка меряется здесь.
+    form/delta — для схемы ответа, если клиент поддерживает structured output.
+    """
+    options = llm_options(cache, client, form, delta)
+    complete = getattr(client, "complete", None)
+    if complete is not None:
+        return complete(full_messages, **options)
+    started = time.perf_counter()
+    return _timed_response(client, client.ask(full_messages, **options), started)
+
+async def request_llm_async(
+    client, full_messages: List[Dict[str, str]], cache: ResponseCache = None, form: Form = None, delta: bool = False
+) -> LLMResponse:
+    """Асинхронный вариант request_llm."""
+    options = llm_options(cache, client, form, delta)
+    complete = getattr(client, "complete", None)
+    if complete is not None:
+        return await complete(full_messages, **options)
+    started = time.perf_counter()
+    return _timed_response(client, await client.ask(full_messages, **options), started)
+
+def _timed_response(client, text: str, started: float) -> LLMResponse:
+    return LLMResponse(text=text, latency=time.perf_counter() - started, model=getattr(client, "model", None))
+
+class PreparedRequest(NamedTuple):
+    """Подготовленный вызов: state и режим, ключ кэша, ответ из кэша (уже разобранный) или сообщения для LLM."""
+    state: FormState
+    delta: bool
+    key: Optional[str]
+    cached: Optional[Tuple[FormState, str]]
+    messages: Optional[List[Dict[str, str]]]
 
-    response = llm.ask(full_messages)
+def prepare_request(
+    messages: List[Dict[str, str]],
+    form: Form,
+    state: FormState,
+    client,
+    log_callback=None,
+    delta: bool = False,
+    cache: ResponseCache = None,
+    history: HistoryWindow = None,
+    relevant_schema: bool = False,
+    question_first: bool = False
+) -> PreparedRequest:
+    """
+    Всё, что предшествует вызову LLM в синхронном, асинхронном и потоковом вариантах:
+    нормализация state, режим ответа, поиск в кэше и сборка сообщений.
+    """
+    state = as_form_state(state)
+    delta = delta or relevant_schema
+    key, response = cache_lookup(cache, client, messages, form, state, delta, log_callback)
+    if response is not None:
+        return PreparedRequest(state, delta, key, parse_llm_response(response, form, log_callback, state=state, delta=delta), None)
+    full_messages = build_llm_messages(
+        messages, form, state, question_first=question_first, delta=delta, history=history,
+        log_callback=log_callback, relevant_schema=relevant_schema
+    )
+    return PreparedRequest(state, delta, key, None, full_messages)
+
+def report_response(result: LLMResponse, log_callback=None, on_response=None):
+    """Учитывает реальный вызов LLM: usage и сырой ответ — в лог, LLMResponse — в on_response."""
+    log_usage(result.usage, log_callback)
+    if on_response:
+        on_response(result)
     if log_callback:
-        log_callback("llm_raw", response)
-    
-    # First try to parse as JSON directly
+        log_callback("llm_raw", result.text)
+
+def finish_request(
+    request: PreparedRequest,
+    result: LLMResponse,
+    form: Form,
+    cache: ResponseCache = None,
+    log_callback=None,
+    on_response=None
+) -> tuple[FormState, str]:
+    """Всё, что следует за вызовом LLM: учёт вызова, разбор ответа и (после успешного разбора) запись в кэш."""
+    report_response(result, log_callback, on_response)
+    parsed = parse_llm_response(result.text, form, log_callback, state=request.state, delta=request.delta)
+    if request.key is not None:
+        cache.put(request.key, result.text)
+    return parsed
+
+def extract_fields(
+    messages: List[Dict[str, str]],
+    form: Form,
+    state: FormState,
+    log_callback=None,
+    llm_client=None,
+    delta: bool = False,
+    cache: ResponseCache = None,
+    history: HistoryWindow = None,
+    on_response=None,
+    relevant_schema: bool = False
+) -> tuple[FormState, str]:
+    """
+    Отправляет историю, форму и state в LLM.
+    Возвращает кортеж: (обновлённый FormState, next_question).
+    state: FormState или StateStore (сам не изменяется — новый state возвращается)
+    log_callback: функция для логирования событий (role, content)
+    llm_client: LLM-клиент для этого вызова (по умолчанию — default_llm())
+    delta: модель возвращает только изменившиеся поля, они сливаются с state
+    cache: кэш ответов (см. app/response_cache.py); в него попадают только успешно разобранные ответы
+    history: окно истории с бюджетом токенов (см. app/history.py)
+    on_response(result): вызывается с LLMResponse каждого реального вызова LLM (для учёта токенов и стоимости)
+    relevant_schema: в запросе полностью описаны только поля, нужные на этом ходе (см. app/schema_filter.py);
+    модель видит не все поля, поэтому отвечает изменениями, как при delta
+    """
+    client = llm_client or default_llm()
+    request = prepare_request(messages, form, state, client, log_callback, delta, cache, history, relevant_schema)
+    if request.cached is not None:
+        return request.cached
+    result = request_llm(client, request.messages, cache, form, request.delta)
+    return finish_request(request, result, form, cache, log_callback, on_response)
+
+async def extract_fields_async(
+    messages: List[Dict[str, str]],
+    form: Form,
+    state: FormState,
+    llm_client,
+    log_callback=None,
+    delta: bool = False,
+    cache: ResponseCache = None,
+    history: HistoryWindow = None,
+    on_response=None,
+    relevant_schema: bool = False
+) -> tuple[FormState, str]:
+    """
+    Асинхронный вариант extract_fields.
+    llm_client — экземпляр AsyncLLMBase; передаётся явно в каждый вызов,
+    чтобы один event loop мог вести много сессий с разными клиентами.
+    С дисковым уровнем кэша (SQLite) поиск в кэше и запись в него идут в пуле потоков, не блокируя event loop.
+    """
+    blocking = cache is not None and cache.disk is not None
+    args = (messages, form, state, llm_client, log_callback, delta, cache, history, relevant_schema)
+    request = await asyncio.to_thread(prepare_request, *args) if blocking else prepare_request(*args)
+    if request.cached is not None:
+        return request.cached
+    result = await request_llm_async(llm_client, request.messages, cache, form, request.delta)
+    args = (request, result, form, cache, log_callback, on_response)
+    return await asyncio.to_thread(finish_request, *args) if blocking else finish_request(*args)
+
+def extract_fields_stream(
+    messages: List[Dict[str, str]],
+    form: Form,
+    state: FormState,
+    log_callback=None,
+    llm_client=None,
+    on_question=None,
+    on_field=None,
+    delta: bool = False,
+    history: HistoryWindow = None,
+    on_response=None,
+    relevant_schema: bool = False
+) -> tuple[FormState, str]:
+    """
+    Потоковый вариант extract_fields: читает ответ LLM по мере генерации.
+    on_question(question): вызывается, как только 'next_question' полностью получен (если он не null)
+    on_field(name, field_state): вызывается для каждого поля state по мере готовности
+    on_response(result): LLMResponse с прочитанным текстом и временем потока (usage в потоке не приходит)
+    Как только получены все поля формы и next_question (в режиме delta — весь объект),
+    генерация прерывается — хвост ответа (закрывающие скобки, пояснения модели) не ждём.
+    """
+    client = llm_client or default_llm()
+    request = prepare_request(
+        messages, form, state, client, log_callback, delta, history=history, relevant_schema=relevant_schema, question_first=True
+    )
+    state, delta = request.state, request.delta
+    field_names = form_field_names(form)
+    parser = StreamingResponseParser()
+    complete = False
+
+    started = time.perf_counter()
+    stream = client.ask_stream(request.messages, **llm_options(client=client, form=form, delta=delta, question_first=True))
     try:
-        parsed = json.loads(response)
-    except json.JSONDecodeError:
-        # If direct parsing fails, try to extract JSON from markdown
-        cleaned = extract_json_from_markdown(response)
-        try:
-            parsed = json.loads(cleaned)
-        except json.JSONDecodeError as e:
-            if log_callback:
-                log_callback("error", f"LLM вернула не JSON: {response!r}")
-            raise ValueError(
-                f"LLM вернула не JSON, а текст: {response!r}\n"
-                "Возможно, LLM сбилась с инструкции. Попробуйте повторить ввод или перезапустить диалог."
-            )
-    
-    # Validate response structure
-    if not isinstance(parsed, dict):
-        raise ValueError("LLM вернула не объект JSON")
-        
-    if "state" not in parsed:
-        raise ValueError("В ответе LLM отсутствует ключ 'state'")
-        
-    if "next_question" not in parsed:
-        raise ValueError("В ответе LLM отсутствует ключ 'next_question'")
-        
-    if not isinstance(parsed["state"], dict):
-        raise ValueError("Ключ 'state' должен быть объектом")
-        
-    if not isinstance(parsed["next_question"], (str, type(None))):
-        raise ValueError("Ключ 'next_question' должен быть строкой или null")
-        
-    # Validate each field's state
-    updated_state: FormState = {}
-    
-    # Check that all form fields are present in the response
-    form_field_names = {field["name"] for field in form["fields"]}
-    response_field_names = set(parsed["state"].keys())
-    if not form_field_names.issubset(response_field_names):
-        missing = form_field_names - response_field_names
-        raise ValueError(f"В ответе LLM отсутствуют поля: {missing}")
-        
-    for field_name, field_state in parsed["state"].items():
-        if not isinstance(field_state, dict):
-            raise ValueError(f"Состояние поля '{field_name}' должно быть объектом")
-            
-        required_keys = {"value", "status", "optional"}
-        if not required_keys.issubset(field_state):
-            missing = required_keys - field_state.keys()
-            raise ValueError(f"В состоянии поля '{field_name}' отсутствуют ключи: {missing}")
-            
-        if not isinstance(field_state["optional"], bool):
-            raise ValueError(f"Ключ 'optional' поля '{field_name}' должен быть булевым")
-            
-        if field_state["status"] not in [status.value for status in FieldStatus]:
-            raise ValueError(f"Недопустимый статус поля '{field_name}': {field_state['status']}")
-            
-        updated_state[field_name] = field_state
-        
-    next_question: str = parsed["next_question"]
-    return updated_state, next_question
+        for chunk in stream:
+            for kind, name, value in parser.feed(chunk):
+                if kind == "next_question" and on_question and value:
+                    on_question(value)
+                elif kind == "field" and on_field:
+                    on_field(name, value)
+            if parser.done:
+                break
+            if not delta and parser.has_next_question and field_names.issubset(parser.fields):
+                complete = True
+                break
+    finally:
+        stream.close()
+
+    report_response(_timed_response(client, parser.buffer, started), log_callback, on_response)
+    if complete or parser.done:
+        return apply_response(parser.result(), parser.buffer, form, state, delta, log_callback)
+    # Поток оборвался, не дав полного объекта — пробуем разобрать то, что есть
+    return parse_llm_response(parser.buffer, form, log_callback, state=state, delta=delta)
@@ -0,0 +1,304 @@
+"""
+Локальный «быстрый путь»: нормализация и проверка ответа на один известный вопрос без LLM.
+
+Если пользователь отвечает на вопрос про конкретное поле и ответ однозначно разбирается
+по типу поля (FieldType), state обновляется сразу. Любая неоднозначность —
+несколько значений, ссылки на другие поля, отказ, спорный формат, значение вне разумного
+диапазона — означает возврат None, и ответ уходит в LLM как обычно.
+
+Ожидаемый вид ответа берётся из описания поля (и его имени), а не только из типа:
+- str: email — как email, "N цифр" — ровно N цифр, часть имени (фамилия, имя, отчество) — одно слово,
+  ФИО — два-три слова, связный текст (текст, комментарий, адрес, название) — любая фраза, остальное —
+  фраза без запятых и точек с запятой (перечисление может относиться к нескольким полям);
+- list_str: короткие элементы списка, для ссылок — каждый элемент URL;
+- date: в формате из описания (ДД.ММ.ГГГГ, ГГГГ-ММ-ДД, ...); формат, которого здесь нет, — LLM.
+"""
+
+import re
+import threading
+from datetime import date
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+from app.models import Field
+
+# Отказы и пропуски (в любом месте ответа): решение о пропуске поля остаётся LLM.
+# Для bool не применяется: там «нет» — обычный ответ
+_DEFER_RE = re.compile(
+    r"\b(?:пропус\w*|нет|нету|отсутств\w*|незнаю|потом|никак\w*|skip\w*|n/a|none"
+    r"|не\s+(?:знаю|помню|хочу|буду|могу|скажу|указ\w*|име\w*|зна\w*))\b"
+    r"|^[-—–?.]+$"
+)
+# Самая ранняя правдоподобная дата; будущие даты (дата рождения 2099 года) тоже оставляются LLM
+_MIN_YEAR = 1900
+_TRUE_WORDS = {"да", "yes", "true", "y", "д", "ага", "верно", "конечно", "1"}
+_FALSE_WORDS = {"нет", "no", "false", "n", "н", "неверно", "0"}
+_MONTHS = {
+    "январ": 1, "феврал": 2, "март": 3, "апрел": 4, "мая": 5, "май": 5, "июн": 6,
+    "июл": 7, "август": 8, "сентябр": 9, "октябр": 10, "ноябр": 11, "декабр": 12
+}
+_LIST_SEPARATORS = re.compile(r"\s*[,;\n]\s*")
+_EMAIL_RE = re.compile(r"^[^@\s,;]+@[^@\s,;]+\.[^@\s,;.]{2,}$")
+_DIGITS_HINT_RE = re.compile(r"(\d+)\s*цифр")
+_EMAIL_HINT_RE = re.compile(r"e-?mail")
+_FULL_NAME_RE = re.compile(r"\bфио\b|фамилия\s+имя")
+_NAME_PART_RE = re.compile(r"фамили|\bимя\b|отчеств")
+_PROSE_RE = re.compile(r"текст|комментар|пожелан|адрес|описан|названи")
+_NAME_WORD_RE = re.compile(r"[a-zа-яё][a-zа-яё'\-]*")
+_LINKS_RE = re.compile(r"ссылк|url|адреса\s+сайт")
+_MAX_LIST_ITEM_WORDS = 5
+# Форматы дат из описаний полей
+_DATE_FORMATS = {
+    "дд.мм.гггг": "%d.%m.%Y",
+    "гггг-мм-дд": "%Y-%m-%d",
+    "дд/мм/гггг": "%d/%m/%Y",
+    "дд-мм-гггг": "%d-%m-%Y",
+}
+_DEFAULT_DATE_FORMAT = "%d.%m.%Y"
+
+
+def _canon(text: str) -> str:
+    """Регистронезависимое сравнение вариантов: без пробелов по краям, ё = е."""
+    return text.strip().casefold().replace("ё", "е")
+
+
+def _hint(field: Field) -> str:
+    """Имя и описание поля в нижнем регистре — по ним выбирается ожидаемый вид ответа."""
+    return _canon(f"{field['name']} {field.get('description', '')}")
+
+
+def _normalize_str(field: Field, text: str) -> Optional[str]:
+    hint = _hint(field)
+    if _EMAIL_HINT_RE.search(hint):
+        return _normalize_email(field, text)
+    digits_hint = _DIGITS_HINT_RE.search(hint)
+    if digits_hint:
+        compact = re.sub(r"\s", "", text)
+        if compact.isdigit() and len(compact) == int(digits_hint.group(1)):
+            return compact
+        return None
+    if "формат" in hint:
+        # Формат задан только словами — проверку и нормализацию оставляем LLM
+        return None
+    if len(text) > 100 or "\n" in text or ":" in text:
+        return None
+    words = text.split()
+    if _FULL_NAME_RE.search(hint) or _NAME_PART_RE.search(hint):
+        # "Иванов Иван Иванович" на вопрос о фамилии и одна фамилия на вопрос о ФИО — решает LLM
+        expected = (2, 3) if _FULL_NAME_RE.search(hint) else (1,)
+        if len(words) not in expected or not all(_NAME_WORD_RE.fullmatch(_canon(word)) for word in words):
+            return None
+        return " ".join(words)
+    if not _PROSE_RE.search(hint) and _LIST_SEPARATORS.search(text):
+        return None
+    return text
+
+
+def _normalize_int(field: Field, text: str) -> Optional[int]:
+    compact = re.sub(r"[\s ]", "", text)
+    # Отрицательные значения (возраст -5) — скорее ошибка, чем ответ: проверку оставляем LLM
+    if re.fullmatch(r"\+?\d+", compact):
+        return int(compact)
+    return None
+
+
+def _normalize_float(field: Field, text: str) -> Optional[float]:
+    compact = re.sub(r"[\s ]", "", text)
+    if re.fullmatch(r"[+-]?\d+([.,]\d+)?", compact):
+        return float(compact.replace(",", "."))
+    return None
+
+
+def _normalize_bool(field: Field, text: str) -> Optional[bool]:
+    word = _canon(text).rstrip(".!")
+    if word in _TRUE_WORDS:
+        return True
+    if word in _FALSE_WORDS:
+        return False
+    return None
+
+
+def _date_format(field: Field) -> Optional[str]:
+    """strftime-формат значения: из описания поля; None — формат описан, но не известен."""
+    hint = _hint(field)
+    for pattern, strftime in _DATE_FORMATS.items():
+        if pattern in hint:
+            return strftime
+    return None if "формат" in hint else _DEFAULT_DATE_FORMAT
+
+
+def _format_date(day: int, month: int, year: int, output: str = _DEFAULT_DATE_FORMAT) -> Optional[str]:
+    try:
+        value = date(year, month, day)
+    except ValueError:
+        return None
+    if value.year < _MIN_YEAR or value > date.today():
+        return None
+    return value.strftime(output)
+
+
+def _normalize_date(field: Field, text: str) -> Optional[str]:
+    output = _date_format(field)
+    if output is None:
+        return None
+    value = text.strip().rstrip(".")
+    match = re.fullmatch(r"(\d{1,2})([.\-/])(\d{1,2})\2(\d{4})", value)
+    if match:
+        day, separator, month, year = int(match.group(1)), match.group(2), int(match.group(3)), int(match.group(4))
+        if separator == "/" and day <= 12 and month <= 12 and day != month:
+            # 01/02/2003 — то ли 1 февраля, то ли 2 января
+            return None
+        return _format_date(day, month, year, output)
+    match = re.fullmatch(r"(\d{4})-(\d{1,2})-(\d{1,2})", value)
+    if match:
+        return _format_date(int(match.group(3)), int(match.group(2)), int(match.group(1)), output)
+    match = re.fullmatch(r"(\d{1,2})\s+([а-яё]+)\s+(\d{4})(\s*г(ода?)?)?", _canon(value))
+    if match:
+        month_word = match.group(2)
+        for stem, month in _MONTHS.items():
+            if month_word.startswith(stem):
+                return _format_date(int(match.group(1)), month, int(match.group(3)), output)
+    return None
+
+
+def _normalize_email(field: Field, text: str) -> Optional[str]:
+    value = text.strip()
+    if not _EMAIL_RE.fullmatch(value):
+        return None
+    local, domain = value.rsplit("@", 1)
+    return f"{local}@{domain.lower()}"
+
+
+def _normalize_phone(field: Field, text: str) -> Optional[str]:
+    value = text.strip()
+    if not re.fullmatch(r"\+?[\d\s()\-]+", value):
+        return None
+    digits = re.sub(r"\D", "", value)
+    if value.startswith("+") and 10 <= len(digits) <= 15:
+        return "+" + digits
+    if len(digits) == 11 and digits[0] in "78":
+        return "+7" + digits[1:]
+    # 10 цифр без кода страны и прочие длины — неоднозначно
+    return None
+
+
+def _normalize_url(field: Field, text: str) -> Optional[str]:
+    value = text.strip()
+    if " " in value:
+        return None
+    if value.lower().startswith("www."):
+        value = "https://" + value
+    parts = urlsplit(value)
+    if parts.scheme in ("http", "https") and "." in parts.netloc:
+        return value
+    return None
+
+
+def _normalize_enum(field: Field, text: str) -> Optional[str]:
+    options = {_canon(option): option for option in field.get("options") or []}
+    return options.get(_canon(text).rstrip("."))
+
+
+def _split_items(text: str) -> List[str]:
+    return [item for item in _LIST_SEPARATORS.split(text.strip()) if item]
+
+
+def _normalize_multi_enum(field: Field, text: str) -> Optional[List[str]]:
+    options = {_canon(option): option for option in field.get("options") or []}
+    items = re.split(r"\s*(?:[,;\n]|\sи\s)\s*", text.strip())
+    chosen: List[str] = []
+    for item in items:
+        if not item:
+            continue
+        option = options.get(_canon(item).rstrip("."))
+        if option is None:
+            return None
+        if option not in chosen:
+            chosen.append(option)
+    return chosen or None
+
+
+def _normalize_list_str(field: Field, text: str) -> Optional[List[str]]:
+    """Короткие элементы через запятую/точку с запятой; в списке ссылок каждый элемент — URL."""
+    if ":" in text.replace("://", ""):
+        return None
+    items = _split_items(text)
+    if any(len(item.split()) > _MAX_LIST_ITEM_WORDS for item in items):
+        # Фраза, а не перечисление ("закажу что-нибудь к чаю на ваш вкус") — разбирает LLM
+        return None
+    if _LINKS_RE.search(_hint(field)):
+        urls = [_normalize_url(field, item) for item in items]
+        return urls if urls and all(urls) else None
+    return items or None
+
+
+# Нормализаторы по литералам FieldType из app.models
+NORMALIZERS: Dict[str, Callable[[Field, str], Optional[Any]]] = {
+    "str": _normalize_str,
+    "int": _normalize_int,
+    "float": _normalize_float,
+    "bool": _normalize_bool,
+    "date": _normalize_date,
+    "email": _normalize_email,
+    "phone": _normalize_phone,
+    "url": _normalize_url,
+    "enum": _normalize_enum,
+    "multi_enum": _normalize_multi_enum,
+    "list_str": _normalize_list_str,
+}
+
+
+def try_fast_path(field: Field, answer: str, other_field_names=()) -> Optional[Any]:
+    """
+    Пытается разобрать ответ на вопрос о поле field без LLM.
+    Возвращает нормализованное значение или None, если ответ неоднозначен
+    (пустой, отказ/пропуск, упоминает другие поля, не проходит проверку типа).
+    """
+    text = answer.strip()
+    if not text or (field["type"] != "bool" and _DEFER_RE.search(_canon(text))):
+        return None
+    lowered = _canon(text)
+    for name in other_field_names:
+        if name != field["name"] and _canon(name) in lowered:
+            return None
+    normalizer = NORMALIZERS.get(field["type"])
+    if normalizer is None:
+        return None
+    return normalizer(field, text)
+
+
+class FastPathStats:
+    """
+    Потокобезопасные счётчики по формам: сколько ответов обработано,
+    сколько из них — локально, и сколько раз пришлось звать LLM.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._forms: Dict[str, Dict[str, int]] = {}
+
+    def record(self, form_id: str, fast: bool):
+        with self._lock:
+            counters = self._forms.setdefault(form_id, {"answers": 0, "fast_path": 0, "llm_calls": 0})
+            counters["answers"] += 1
+            counters["fast_path" if fast else "llm_calls"] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """
+        Копия счётчиков с долей ответов, потребовавших LLM (llm_call_rate), по каждой форме.
+        """
+        with self._lock:
+            result = {}
+            for form_id, counters in self._forms.items():
+                answers = counters["answers"]
+                result[form_id] = dict(
+                    counters,
+                    llm_call_rate=round(counters["llm_calls"] / answers, 3) if answers else 0.0
+                )
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._forms.clear()
+
+
+# Общие для процесса счётчики
+fast_path_stats = FastPathStats()
@@ -12,7 +12,12 @@ def load_form(form_path: str) -> Form:
     """
     with open(form_path, encoding="utf-8") as f:
         data = json.load(f)
+    return validate_form(data)
 
+def validate_form(data) -> Form:
+    """
+    Проверяет структуру формы (ключи, типы полей, options у enum) и возвращает её.
+    """
     # Базовая проверка
     required_keys = {"id", "title", "description", "fields"}
     if not required_keys.issubset(data):
@@ -31,6 +36,9 @@ def load_form(form_path: str) -> Form:
             if "options" not in field:
                 raise ValueError(f"Поле типа {field['type']} должно содержать 'options'")
 
+        if not isinstance(field.get("group", ""), str):
+            raise ValueError(f"Группа поля '{field['name']}' должна быть строкой")
+
     return data  # тип Form
 
 def init_state(form: Form) -> FormState:
@@ -0,0 +1,222 @@
+"""
+Реестр форм: загружает JSON-формы из каталога один раз, валидирует и компилирует их
+в неизменяемые объекты, которые разделяются всеми сессиями.
+Запись перечитывается, только если у файла изменились mtime/размер и хэш содержимого.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from types import MappingProxyType
+from typing import Dict, FrozenSet, List, Mapping, Optional, Tuple
+from app.models import Form
+from app.form_loader import validate_form
+from app.prompt_builder import CompiledPrompt
+
+
+class FrozenDict(dict):
+    """
+    dict только для чтения. Остаётся настоящим dict, поэтому форма
+    по-прежнему сериализуется json.dumps и читается как form["fields"].
+    """
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("Скомпилированная форма неизменяема")
+
+    __setitem__ = __delitem__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __reduce__(self):
+        return (type(self), (dict(self),))
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return FrozenDict((key, _freeze(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+class CompiledForm(FrozenDict):
+    """
+    Провалидированная неизменяемая форма с заранее посчитанными индексами:
+    - field_order — имена полей в порядке формы
+    - field_position — имя поля → его номер в field_order (раскладка StateStore, общая для всех сессий)
+    - field_names — множество имён полей
+    - field_index — имя поля → описание поля
+    - required_fields — имена обязательных полей
+    - enum_options — имя поля → множество допустимых вариантов (для enum/multi_enum)
+    - prompt — скомпилированный промпт (см. prompt_builder)
+    - version — sha256 содержимого файла (или JSON формы), чтобы отличать редакции
+    """
+    def __init__(self, data: Form, version: Optional[str] = None, source: Optional[str] = None):
+        data = validate_form(data)
+        super().__init__((key, _freeze(value)) for key, value in data.items())
+        self.source = source
+        self.version = version or hashlib.sha256(
+            json.dumps(data, ensure_ascii=False, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+        fields = self["fields"]
+        self.field_order: Tuple[str, ...] = tuple(field["name"] for field in fields)
+        self.field_names: FrozenSet[str] = frozenset(self.field_order)
+        self.field_position: Mapping[str, int] = MappingProxyType({name: i for i, name in enumerate(self.field_order)})
+        self.field_index: Mapping[str, Mapping] = MappingProxyType({field["name"]: field for field in fields})
+        self.required_fields: FrozenSet[str] = frozenset(field["name"] for field in fields if field["required"])
+        self.enum_options: Mapping[str, FrozenSet[str]] = MappingProxyType({
+            field["name"]: frozenset(field["options"])
+            for field in fields
+            if field["type"] in ("enum", "multi_enum")
+        })
+        self.prompt = CompiledPrompt(self)
+
+    def __reduce__(self):
+        return (CompiledForm, (dict(self), self.version, self.source))
+
+
+def compile_form(data: Form, version: Optional[str] = None, source: Optional[str] = None) -> CompiledForm:
+    """Валидирует форму и компилирует её. Уже скомпилированная форма возвращается как есть."""
+    if isinstance(data, CompiledForm):
+        return data
+    return CompiledForm(data, version=version, source=source)
+
+
+def form_field_names(form: Form) -> FrozenSet[str]:
+    """Множество имён полей: у скомпилированной формы — готовое, у обычного dict — собирается."""
+    if isinstance(form, CompiledForm):
+        return form.field_names
+    return frozenset(field["name"] for field in form["fields"])
+
+
+class _Entry:
+    __slots__ = ("path", "mtime_ns", "size", "digest", "form", "checked_at")
+
+    def __init__(self, path: str, mtime_ns: int, size: int, digest: str, form: CompiledForm, checked_at: float):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.digest = digest
+        self.form = form
+        self.checked_at = checked_at
+
+
+class FormRegistry:
+    """
+    Кэш скомпилированных форм каталога forms_dir.
+
+    - get(name) — форма по имени файла ('passport.json'), его основе ('passport') или id формы
+    - load_path(path) — форма по произвольному пути (тоже кэшируется)
+    - resolve(name_or_path) — то, что нужно CLI: файл в каталоге (или абсолютный путь), иначе имя/id
+    - preload() — загрузить весь каталог разом (ошибки отдельных форм возвращаются, а не бросаются)
+
+    Файл проверяется не чаще раза в check_interval секунд: сначала по mtime и размеру,
+    и только при их изменении — по sha256 содержимого. Потокобезопасен.
+    """
+    def __init__(self, forms_dir: str = "forms", check_interval: float = 1.0):
+        self.forms_dir = forms_dir
+        self.check_interval = check_interval
+        self._entries: Dict[str, _Entry] = {}
+        self._ids: Dict[str, str] = {}
+        self._lock = threading.RLock()
+
+    def load_path(self, path: str) -> CompiledForm:
+        """
+        Возвращает скомпилированную форму по пути к файлу, перечитывая его только при изменении.
+        """
+        path = os.path.abspath(path)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and now - entry.checked_at < self.check_interval:
+                return entry.form
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                self._forget(path)
+                raise
+            if entry is not None and (entry.mtime_ns, entry.size) == (stat.st_mtime_ns, stat.st_size):
+                entry.checked_at = now
+                return entry.form
+
+            with open(path, "rb") as f:
+                raw = f.read()
+            digest = hashlib.sha256(raw).hexdigest()
+            if entry is not None and entry.digest == digest:
+                form = entry.form
+            else:
+                form = CompiledForm(json.loads(raw.decode("utf-8")), version=digest, source=path)
+            self._entries[path] = _Entry(path, stat.st_mtime_ns, stat.st_size, digest, form, now)
+            self._ids[form["id"]] = path
+            return form
+
+    def get(self, name: str) -> CompiledForm:
+        """
+        Возвращает форму каталога по имени файла, его основе или id формы.
+        Неизвестное имя — FileNotFoundError.
+        """
+        for candidate in (name, f"{name}.json"):
+            path = os.path.join(self.forms_dir, candidate)
+            if os.path.isfile(path):
+                return self.load_path(path)
+        with self._lock:
+            path = self._ids.get(name)
+        if path is None:
+            self.preload()
+            with self._lock:
+                path = self._ids.get(name)
+        if path is None:
+            raise FileNotFoundError(f"Форма '{name}' не найдена в каталоге {self.forms_dir}/")
+        return self.load_path(path)
+
+    def resolve(self, name_or_path: str) -> CompiledForm:
+        """
+        Как в CLI: имя файла берётся относительно каталога форм (абсолютный путь — как есть),
+        иначе ищется по основе имени или id формы.
+        """
+        path = os.path.join(self.forms_dir, name_or_path)
+        if os.path.isfile(path):
+            return self.load_path(path)
+        return self.get(name_or_path)
+
+    def preload(self) -> Dict[str, Exception]:
+        """
+        Загружает и компилирует все *.json каталога. Возвращает ошибки по именам файлов.
+        """
+        errors: Dict[str, Exception] = {}
+        if not os.path.isdir(self.forms_dir):
+            return errors
+        for filename in sorted(os.listdir(self.forms_dir)):
+            if not filename.endswith(".json"):
+                continue
+            try:
+                self.load_path(os.path.join(self.forms_dir, filename))
+            except (OSError, ValueError) as e:
+                errors[filename] = e
+        return errors
+
+    def forms(self) -> List[CompiledForm]:
+        """Все уже загруженные формы."""
+        with self._lock:
+            return [entry.form for entry in self._entries.values()]
+
+    def _forget(self, path: str):
+        entry = self._entries.pop(path, None)
+        if entry is not None and self._ids.get(entry.form["id"]) == path:
+            del self._ids[entry.form["id"]]
+
+
+_default_registry: Optional[FormRegistry] = None
+_default_lock = threading.Lock()
+
+
+def get_registry() -> FormRegistry:
+    """
+    Общий для процесса реестр каталога forms/ (каталог можно задать через FORMS_DIR).
+    """
+    global _default_registry
+    if _default_registry is None:
+        with _default_lock:
+            if _default_registry is None:
+                _default_registry = FormRegistry(os.getenv("FORMS_DIR", "forms"))
+    return _default_registry
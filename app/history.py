@@ -0,0 +1,117 @@
+"""
+Окно истории диалога в пределах бюджета токенов.
+
+Всё, что пользователь уже сообщил, отражено в state, который и так уходит в каждый запрос.
+Поэтому последние сообщения передаются дословно, а более ранние сворачиваются
+в одну короткую пометку. Сворачивание идёт целыми блоками, чтобы начало истории
+(а с ним и кэш префикса у провайдера) менялось не на каждом ходу.
+Перед отправкой оценивается размер всего запроса: если он не помещается в бюджет,
+сворачиваются и более свежие сообщения. Если не помещается и одно последнее сообщение, оно
+сокращается до остатка бюджета (но не короче min_message_tokens). Если не помещаются даже форма и state
+(большая форма при малом бюджете), запрос всё равно отправляется — с одним последним сообщением вместо истории:
+ход не должен ломаться там, где без окна истории он работал. Оба случая видны в last
+(truncated, over_budget) и в метрике history_window журнала.
+
+Окно включается явно: бюджетом в LLM_CONTEXT_BUDGET или переданным HistoryWindow.
+"""
+
+import os
+from typing import Dict, List, Optional
+from app.models import FormState
+from app.prompt_builder import CompiledPrompt
+from app.tokens import estimate_tokens, estimate_messages_tokens, truncate_to_tokens
+
+COLLAPSED_NOTE = "[Ранние сообщения диалога ({count}) опущены: всё, что в них сказано, уже отражено в текущем state.]"
+TRUNCATED_NOTE = " [...сообщение сокращено до бюджета контекста]"
+
+
+class HistoryWindow:
+    """
+    Собирает сообщения для LLM так, чтобы оценка размера запроса не превышала max_tokens.
+
+    - keep_recent — сколько последних сообщений всегда идут дословно (если помещаются в бюджет)
+    - block_size — старые сообщения сворачиваются блоками по столько штук
+    - min_message_tokens — короче этого последнее сообщение не сокращается, даже если бюджет исчерпан
+    - last — статистика последней сборки: messages, collapsed, estimated_tokens
+      (и truncated — если последнее сообщение пришлось сократить, over_budget — если запрос
+      всё равно не уложился в бюджет)
+    """
+    def __init__(self, max_tokens: int = 8000, keep_recent: int = 8, block_size: int = 8, min_message_tokens: int = 256):
+        if max_tokens <= 0 or keep_recent < 1 or block_size < 1 or min_message_tokens < 1:
+            raise ValueError("Некорректные параметры окна истории")
+        self.max_tokens = max_tokens
+        self.keep_recent = keep_recent
+        self.block_size = block_size
+        self.min_message_tokens = min_message_tokens
+        self.last: Dict[str, int] = {}
+
+    @classmethod
+    def from_env(cls) -> Optional["HistoryWindow"]:
+        """Бюджет из LLM_CONTEXT_BUDGET (токены), остальное — по умолчанию; переменная не задана — None (вся история)."""
+        budget = os.getenv("LLM_CONTEXT_BUDGET")
+        return cls(max_tokens=int(budget)) if budget else None
+
+    def window(self, messages: List[Dict[str, str]], budget: int) -> List[Dict[str, str]]:
+        """
+        Возвращает историю, сокращённую до budget токенов: пометка о свёрнутых сообщениях + хвост.
+        """
+        older = max(0, len(messages) - self.keep_recent)
+        collapsed = older - older % self.block_size
+        while True:
+            candidate = self._collapse(messages, collapsed)
+            tokens = estimate_messages_tokens(candidate)
+            if tokens <= budget:
+                self.last = {"messages": len(messages), "collapsed": collapsed, "estimated_tokens": tokens}
+                return candidate
+            if collapsed >= len(messages) - 1:
+                raise ValueError(
+                    f"Запрос к LLM не помещается в бюджет контекста: ~{tokens} токенов истории при доступных {budget}"
+                )
+            collapsed += 1
+
+    def build_messages(
+        self,
+        prompt: CompiledPrompt,
+        messages: List[Dict[str, str]],
+        state: FormState,
+        delta: bool = False,
+        question_first: bool = False,
+        relevant_schema: bool = False
+    ) -> List[Dict[str, str]]:
+        """
+        Полный список сообщений для LLM (как CompiledPrompt.build_messages) с историей,
+        урезанной так, чтобы весь запрос уложился в max_tokens. Если не укладывается и так,
+        история сводится к последнему сообщению (ответу пользователя), сокращённому до остатка бюджета,
+        а не бросается ошибка.
+        """
+        prefix = prompt.prefix(delta, question_first, relevant_schema)
+        # Вид формы для хода строится по полной истории — до того, как её урежут
+        tail = prompt.state_messages(state, messages, relevant_schema)
+        fixed = estimate_tokens(prefix) + sum(estimate_tokens(message["content"]) for message in tail) + 16
+        try:
+            history = self.window(messages, self.max_tokens - fixed)
+        except ValueError:
+            history = self._collapse(messages, len(messages) - 1)
+            truncated = False
+            if history:
+                room = self.max_tokens - fixed - estimate_messages_tokens(history) + estimate_tokens(history[-1]["content"])
+                limit = max(room - estimate_tokens(TRUNCATED_NOTE), self.min_message_tokens)
+                content = history[-1]["content"]
+                if estimate_tokens(content) > limit:
+                    history[-1] = dict(history[-1], content=truncate_to_tokens(content, limit) + TRUNCATED_NOTE)
+                    truncated = True
+            tokens = estimate_messages_tokens(history)
+            self.last = {
+                "messages": len(messages), "collapsed": max(0, len(messages) - 1), "estimated_tokens": tokens,
+                "truncated": truncated, "over_budget": fixed + tokens > self.max_tokens
+            }
+        full_messages = [{"role": "system", "content": prefix}] + history + tail
+        self.last["estimated_tokens"] += fixed
+        return full_messages
+
+    @staticmethod
+    def _collapse(messages: List[Dict[str, str]], count: int) -> List[Dict[str, str]]:
+        if count <= 0:
+            return list(messages)
+        return [{"role": "system", "content": COLLAPSED_NOTE.format(count=count)}] + messages[count:]
+
@@ -0,0 +1,232 @@
+"""
+Учёт вызовов LLM: токены, стоимость и задержка.
+
+Каждый LLMResponse записывается в агрегаты сессии и формы: число вызовов, токены
+(prompt / completion / cached), p50/p95 задержки и оценка стоимости по таблице цен.
+Агрегаты пишутся в лог диалога и доступны для сбора снаружи: snapshot() (JSON)
+и render_prometheus() (текстовый формат Prometheus), а также по HTTP через start_metrics_server.
+"""
+
+import json
+import math
+import os
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+# Цены в долларах за 1M токенов: prompt — обычные входные, cached — входные из кэша префикса,
+# completion — выходные. Оценка; актуальные цены задаются через LLM_PRICES_FILE.
+DEFAULT_PRICES: Dict[str, Dict[str, float]] = {
+    "gpt-4.1-nano": {"prompt": 0.10, "cached": 0.025, "completion": 0.40},
+    "gpt-4.1-mini": {"prompt": 0.40, "cached": 0.10, "completion": 1.60},
+    "gpt-4.1": {"prompt": 2.00, "cached": 0.50, "completion": 8.00},
+    "deepseek-chat": {"prompt": 0.27, "cached": 0.07, "completion": 1.10},
+}
+
+# Сколько последних задержек хранится для перцентилей
+LATENCY_WINDOW = 1024
+
+
+def load_prices(path: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+    """
+    Таблица цен: DEFAULT_PRICES, дополненная/переопределённая JSON-файлом
+    (path или переменная LLM_PRICES_FILE) вида {"model": {"prompt": .., "cached": .., "completion": ..}}.
+    """
+    prices = {model: dict(price) for model, price in DEFAULT_PRICES.items()}
+    path = path or os.getenv("LLM_PRICES_FILE")
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            for model, price in json.load(f).items():
+                prices[model] = dict(prices.get(model, {}), **price)
+    return prices
+
+
+def estimate_cost(model: Optional[str], usage: Dict[str, int], prices: Dict[str, Dict[str, float]]) -> Optional[float]:
+    """
+    Стоимость вызова в долларах или None, если модели нет в таблице цен.
+    Модель ищется точно, затем по самому длинному префиксу (ответ API может содержать дату версии).
+    """
+    if not model:
+        return None
+    price = prices.get(model)
+    if price is None:
+        candidates = [name for name in prices if model.startswith(name)]
+        if not candidates:
+            return None
+        price = prices[max(candidates, key=len)]
+    prompt_tokens = usage.get("prompt_tokens", 0)
+    cached_tokens = usage.get("cached_tokens", 0)
+    completion_tokens = usage.get("completion_tokens", 0)
+    cost = (
+        (prompt_tokens - cached_tokens) * price.get("prompt", 0.0)
+        + cached_tokens * price.get("cached", price.get("prompt", 0.0))
+        + completion_tokens * price.get("completion", 0.0)
+    )
+    return cost / 1_000_000
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Перцентиль q (0..100) методом ближайшего ранга; 0.0 для пустого списка."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+class CallStats:
+    """
+    Агрегат по набору вызовов LLM. Не потокобезопасен сам по себе — защищается владельцем.
+    """
+    __slots__ = ("calls", "prompt_tokens", "completion_tokens", "cached_tokens", "cost", "unpriced_calls", "latencies")
+
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.cost = 0.0
+        self.unpriced_calls = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def add(self, usage: Dict[str, int], latency: float, cost: Optional[float]):
+        self.calls += 1
+        self.prompt_tokens += usage.get("prompt_tokens", 0)
+        self.completion_tokens += usage.get("completion_tokens", 0)
+        self.cached_tokens += usage.get("cached_tokens", 0)
+        if cost is None:
+            self.unpriced_calls += 1
+        else:
+            self.cost += cost
+        self.latencies.append(latency)
+
+    def summary(self) -> Dict[str, Any]:
+        latencies = list(self.latencies)
+        return {
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_tokens": self.cached_tokens,
+            "cost_usd": round(self.cost, 6),
+            "unpriced_calls": self.unpriced_calls,
+            "latency_p50_ms": round(percentile(latencies, 50) * 1000, 1),
+            "latency_p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        }
+
+
+class MetricsRegistry:
+    """
+    Агрегаты вызовов LLM по формам и сессиям. Потокобезопасен.
+    Сессии хранятся, пока не вызван end_session (после этого остаются только в агрегате формы).
+    """
+    def __init__(self, prices: Optional[Dict[str, Dict[str, float]]] = None):
+        self.prices = prices if prices is not None else load_prices()
+        self._lock = threading.Lock()
+        self._forms: Dict[str, CallStats] = {}
+        self._sessions: Dict[str, CallStats] = {}
+
+    def record(self, form_id: str, session_id: Optional[str], response) -> Dict[str, Any]:
+        """
+        Учитывает один LLMResponse. Возвращает сведения о вызове для лога
+        (модель, usage, задержка в мс, стоимость).
+        """
+        usage = response.usage or {}
+        cost = estimate_cost(response.model, usage, self.prices)
+        with self._lock:
+            self._forms.setdefault(form_id, CallStats()).add(usage, response.latency, cost)
+            if session_id is not None:
+                self._sessions.setdefault(session_id, CallStats()).add(usage, response.latency, cost)
+        return dict(
+            usage,
+            model=response.model,
+            latency_ms=round(response.latency * 1000, 1),
+            cost_usd=round(cost, 6) if cost is not None else None
+        )
+
+    def session(self, session_id: str) -> Dict[str, Any]:
+        with self._lock:
+            stats = self._sessions.get(session_id)
+            return stats.summary() if stats is not None else CallStats().summary()
+
+    def form(self, form_id: str) -> Dict[str, Any]:
+        with self._lock:
+            stats = self._forms.get(form_id)
+            return stats.summary() if stats is not None else CallStats().summary()
+
+    def end_session(self, session_id: str) -> Dict[str, Any]:
+        """Итог сессии; сама сессия из реестра удаляется."""
+        with self._lock:
+            stats = self._sessions.pop(session_id, None)
+            return stats.summary() if stats is not None else CallStats().summary()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Все агрегаты: {"forms": {id: summary}, "sessions": {id: summary}}."""
+        with self._lock:
+            return {
+                "forms": {form_id: stats.summary() for form_id, stats in self._forms.items()},
+                "sessions": {session_id: stats.summary() for session_id, stats in self._sessions.items()},
+            }
+
+    def render_prometheus(self) -> str:
+        """Агрегаты по формам в текстовом формате Prometheus."""
+        metrics = [
+            ("llm_calls_total", "counter", "calls"),
+            ("llm_prompt_tokens_total", "counter", "prompt_tokens"),
+            ("llm_completion_tokens_total", "counter", "completion_tokens"),
+            ("llm_cached_tokens_total", "counter", "cached_tokens"),
+            ("llm_cost_usd_total", "counter", "cost_usd"),
+            ("llm_latency_p50_ms", "gauge", "latency_p50_ms"),
+            ("llm_latency_p95_ms", "gauge", "latency_p95_ms"),
+        ]
+        forms = self.snapshot()["forms"]
+        lines = []
+        for name, kind, key in metrics:
+            lines.append(f"# TYPE {name} {kind}")
+            for form_id, summary in sorted(forms.items()):
+                label = form_id.replace("\\", "\\\\").replace('"', '\\"')
+                lines.append(f'{name}{{form="{label}"}} {summary[key]}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._forms.clear()
+            self._sessions.clear()
+
+
+# Общий для процесса реестр
+metrics = MetricsRegistry()
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1", registry: Optional[MetricsRegistry] = None) -> "ThreadingHTTPServer":
+    """
+    Запускает в фоновом потоке HTTP-сервер метрик:
+    /metrics — формат Prometheus, /metrics.json — snapshot() в JSON.
+    """
+    # http.server импортируется только здесь: без --metrics-port он не нужен, а импорт заметно удлиняет запуск CLI
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    registry = registry or metrics
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics":
+                body = registry.render_prometheus().encode("utf-8")
+                content_type = "text/plain; version=0.0.4; charset=utf-8"
+            elif self.path == "/metrics.json":
+                body = json.dumps(registry.snapshot(), ensure_ascii=False).encode("utf-8")
+                content_type = "application/json; charset=utf-8"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
@@ -13,6 +13,18 @@ class FieldStatus(str, Enum):
     INVALID = "invalid"
     SKIPPED = "skipped"
 
+# Строковые значения статусов — для быстрой проверки ответа LLM
+STATUS_VALUES = frozenset(status.value for status in FieldStatus)
+
+# Допустимые переходы статусов за один ход: поле не может вернуться в not_started,
+# а filled и skipped меняются только по явной просьбе пользователя (исправление)
+ALLOWED_TRANSITIONS: Dict[FieldStatus, frozenset] = {
+    FieldStatus.NOT_STARTED: frozenset({FieldStatus.NOT_STARTED, FieldStatus.FILLED, FieldStatus.INVALID, FieldStatus.SKIPPED}),
+    FieldStatus.INVALID: frozenset({FieldStatus.INVALID, FieldStatus.FILLED, FieldStatus.SKIPPED}),
+    FieldStatus.FILLED: frozenset({FieldStatus.FILLED, FieldStatus.INVALID, FieldStatus.SKIPPED}),
+    FieldStatus.SKIPPED: frozenset({FieldStatus.SKIPPED, FieldStatus.FILLED, FieldStatus.INVALID}),
+}
+
 # Типы полей формы
 FieldType = Literal[
     "str", "int", "float", "bool", "date",
@@ -24,12 +36,14 @@ class Field(TypedDict):
     """
     Описание одного поля в форме.
     options — только для enum/multi_enum, иначе отсутствует.
+    group — необязательная группа полей (раздел формы): по ней большие формы делятся на шарды.
     """
     name: str
     type: FieldType
     required: bool
     description: str
     options: Optional[List[str]]  # Только для enum/multi_enum, иначе отсутствует
+    group: Optional[str]  # Необязательно, см. app/sharding.py
 
 # Описание всей формы
 class Form(TypedDict):
@@ -0,0 +1,124 @@
+"""
+Конвейерный режим диалога: извлечение полей из ответа идёт в фоне, пока пользователь отвечает на следующий вопрос.
+
+Большинство вопросов задаёт код (следующее поле в статусе not_started), поэтому ждать ответа LLM,
+чтобы показать следующий вопрос, не обязательно. ExtractionPipeline:
+- выполняет извлечения в одном фоновом потоке строго в порядке ответов — каждое видит state
+  с результатами всех предыдущих;
+- помнит поля «в работе» (ответ на них ещё разбирается), чтобы их не спросили повторно;
+- применяет к state только то, что LLM изменила относительно переданного ей снимка, — поле,
+  заполненное тем временем быстрым путём, поздний ответ не откатит;
+- отдаёт итоги основному потоку по порядку: ошибки (обмен убирается из истории, поле спрашивается заново)
+  и уточняющие вопросы LLM о невалидных полях (ставятся в очередь вопросов).
+
+state меняют оба потока, поэтому основной поток обращается к нему под pipeline.lock.
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Set
+
+
+class ExtractionPipeline:
+    """
+    Очередь фоновых извлечений одного диалога (см. описание модуля).
+    dialog — DialogManager: из него берутся форма, state, клиент LLM и параметры извлечения.
+    """
+    def __init__(self, dialog):
+        self.dialog = dialog
+        self.lock = threading.RLock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="extract")
+        # (future, обмен сообщениями, поля в работе) в порядке ответов
+        self._jobs: deque = deque()
+        self._cancelled = False
+
+    def __len__(self) -> int:
+        """Число извлечений, итоги которых ещё не забраны."""
+        return len(self._jobs)
+
+    @property
+    def in_flight(self) -> Set[str]:
+        """Поля, ответы на которые ещё разбираются."""
+        fields = set()
+        for _, _, job_fields in self._jobs:
+            fields |= job_fields
+        return fields
+
+    def submit(self, messages: List[Dict[str, str]], exchange: List[Dict[str, str]], fields: Set[str]):
+        """
+        Ставит извлечение в очередь.
+        messages — история на момент ответа (копия), exchange — сообщения этого ответа (уберутся из истории при ошибке),
+        fields — поля, о которых был ответ.
+        """
+        future = self._executor.submit(self._extract, messages, fields)
+        self._jobs.append((future, exchange, fields))
+
+    def poll(self) -> List[Dict[str, Any]]:
+        """Итоги уже завершившихся извлечений по порядку ответов (не ждёт)."""
+        outcomes = []
+        while self._jobs and self._jobs[0][0].done():
+            outcomes.append(self._collect())
+        return outcomes
+
+    def wait_next(self) -> Dict[str, Any]:
+        """Дожидается самого раннего извлечения и возвращает его итог."""
+        return self._collect()
+
+    def wait_all(self) -> List[Dict[str, Any]]:
+        """Дожидается всех извлечений; итоги — по порядку ответов."""
+        return [self._collect() for _ in range(len(self._jobs))]
+
+    def cancel(self):
+        """
+        Отменяет ещё не начатые извлечения. Уже идущий вызов LLM доработает в фоне,
+        но его результат не попадёт в state и в журнал.
+        """
+        self._cancelled = True
+        for future, _, _ in self._jobs:
+            future.cancel()
+        self._jobs.clear()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+    # --- Фоновый поток ---
+
+    def _collect(self) -> Dict[str, Any]:
+        future, exchange, fields = self._jobs.popleft()
+        outcome = dict(future.result())
+        outcome.update(exchange=exchange, fields=fields)
+        return outcome
+
+    def _log(self, role: str, content: str):
+        if not self._cancelled:
+            self.dialog.log_event(role, content)
+
+    def _extract(self, messages: List[Dict[str, str]], fields: Set[str]) -> Dict[str, Any]:
+        """Одно извлечение: снимок state → LLM → изменения относительно снимка применяются к state."""
+        dialog = self.dialog
+        if self._cancelled:
+            return {"cancelled": True}
+        with self.lock:
+            snapshot = dialog.state.to_dict()
+        started = time.perf_counter()
+        try:
+            focus = next(iter(fields)) if len(fields) == 1 else None
+            new_state, next_question = dialog.extract(messages, snapshot, focus=focus, log_callback=self._log)
+        except Exception as e:
+            return {"error": f"Ошибка при обработке ответа LLM: {e}"}
+        with self.lock:
+            if self._cancelled:
+                return {"cancelled": True}
+            changes = {name: field for name, field in new_state.items() if field != snapshot.get(name)}
+            changed = dialog.state.apply(changes)
+            invalid = bool(dialog.state.with_status("invalid"))
+        return {
+            "changed": changed,
+            # Уточняющий вопрос LLM нужен, только пока есть невалидные поля
+            "question": next_question if invalid else None,
+            "elapsed": time.perf_counter() - started,
+        }
+
@@ -0,0 +1,183 @@
+"""
+Сборка промпта для LLM с учётом кэширования префикса у провайдера.
+
+OpenAI-совместимые API кэшируют общий префикс запросов. Поэтому всё неизменное
+(инструкции и описание формы) собирается один раз на форму в стабильное system-сообщение
+в начале, дальше идёт история (она только дописывается), и лишь в самом конце —
+компактный текущий state, который меняется каждый ход.
+
+В режиме relevant_schema схема полей в префикс не входит: в конце запроса вместе со state идёт
+вид формы для этого хода — полные описания только нужных полей (см. app/schema_filter.py).
+"""
+
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from app.models import Form, FormState
+from app.schema_filter import FieldIndex, build_view, last_user_message
+from app.response_schema import ResponseValidator, response_schema
+
+SYSTEM_INSTRUCTIONS = (
+    "Ты — ассистент, помогающий пользователю заполнить форму. "
+    "Форма описана ниже в формате JSON. "
+    "Пользователь отвечает на вопросы, иногда указывая сразу несколько значений. "
+    "Твоя задача — обновить состояния всех полей (добавить значения и статусы), которые можно заполнить по новому сообщению. "
+    "Поддерживаемые статусы: not_started, filled, invalid, skipped. "
+    "Если значение поля подходит — установи статус filled. "
+    "Если оно некорректно (например, нарушен формат или сомнительное значение) — установи статус invalid. "
+    "Нельзя менять поля со статусами filled или skipped, если пользователь явно не просит это сделать. "
+    "Если хотя бы одно поле получило статус invalid — в ключ 'next_question' запиши уточняющий вопрос, относящийся к одному из таких полей. "
+    "Если все поля валидны или нераспознаны — ключ 'next_question' должен быть null. "
+    "Если значение можно интерпретировать, но оно указано в нестандартной форме (например, '23-12-2002', '23 декабря 2002' или 'декабрь'), преобразуй его к требуемому формату из описания поля (например, '23.12.2002' или '12') и установи статус filled. "
+    "Не помечай такие значения как invalid, если их можно однозначно нормализовать. "
+    "Ответ должен строго соответствовать формату JSON — объект с двумя ключами: "
+    "'state' (словарь name → {value, status, optional}) и 'next_question' (строка или null). "
+    "Пример:\n"
+    '{"state": {"Фамилия": {"value": "Иванов", "status": "filled", "optional": false}}, "next_question": null} '
+    "Никаких пояснений, комментариев или текста вне JSON — только чистый JSON-ответ."
+)
+
+DELTA_INSTRUCTIONS = (
+    " Важно: в 'state' верни только поля, значение или статус которых изменились после нового сообщения, "
+    "в виде name → {value, status}. Не повторяй неизменённые поля. Если ничего не изменилось — 'state' равен {}."
+)
+
+QUESTION_FIRST_INSTRUCTIONS = " Ключ 'next_question' пиши первым, перед 'state'."
+
+RELEVANT_INSTRUCTIONS = (
+    " В state — только нужные сейчас поля, с описанием; обработанные поля даны как имя → значение. "
+    "В 'state' ответа — только изменившиеся поля: name → {value, status}."
+)
+
+STATE_HEADER = "Текущее состояние state:\n"
+
+
+def dump_compact(data) -> str:
+    """Минифицированный JSON без лишних пробелов (кириллица — как есть, без \\u-экранирования)."""
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+class CompiledPrompt:
+    """
+    Промпт одной формы: неизменный префикс (инструкции + минифицированная схема)
+    собирается один раз на каждый вариант режима (delta, question_first, relevant_schema) и переиспользуется.
+    Лексический индекс полей для relevant_schema, JSON Schema ответа и его проверка (см. app/response_schema.py)
+    строятся при первом использовании.
+    """
+    def __init__(self, form: Form):
+        self.form = form
+        self.schema = dump_compact(form)
+        self._prefixes: Dict[Tuple[bool, bool, bool], str] = {}
+        self._field_index: Optional[FieldIndex] = None
+        self._response_schemas: Dict[Tuple[bool, bool], Dict] = {}
+        self._validators: Dict[bool, ResponseValidator] = {}
+
+    def prefix(self, delta: bool = False, question_first: bool = False, relevant_schema: bool = False) -> str:
+        """Текст стабильного system-сообщения для выбранного режима."""
+        key = (delta, question_first, relevant_schema)
+        prefix = self._prefixes.get(key)
+        if prefix is None:
+            prefix = SYSTEM_INSTRUCTIONS
+            # Вид формы для хода сам требует ответа изменениями — отдельные инструкции delta не нужны
+            if relevant_schema:
+                prefix += RELEVANT_INSTRUCTIONS
+            elif delta:
+                prefix += DELTA_INSTRUCTIONS
+            if question_first:
+                prefix += QUESTION_FIRST_INSTRUCTIONS
+            if relevant_schema:
+                # Поля описываются в конце запроса, в префиксе — только заголовок формы
+                header = {key: value for key, value in self.form.items() if key != "fields"}
+                prefix += "\n\nОписание формы:\n" + dump_compact(header)
+            else:
+                prefix += "\n\nОписание формы:\n" + self.schema
+            self._prefixes[key] = prefix
+        return prefix
+
+    def field_index(self) -> FieldIndex:
+        """Лексический индекс полей формы (см. app/schema_filter.py)."""
+        if self._field_index is None:
+            self._field_index = FieldIndex(self.form["fields"])
+        return self._field_index
+
+    def response_schema(self, delta: bool = False, question_first: bool = False) -> Dict:
+        """JSON Schema ответа для response_format провайдера."""
+        key = (delta, question_first)
+        schema = self._response_schemas.get(key)
+        if schema is None:
+            schema = self._response_schemas[key] = response_schema(self.form, delta, question_first)
+        return schema
+
+    def validator(self, delta: bool = False) -> ResponseValidator:
+        """Проверка разобранного ответа LLM для режима delta или полного state."""
+        validator = self._validators.get(delta)
+        if validator is None:
+            validator = self._validators[delta] = ResponseValidator(self.form, delta)
+        return validator
+
+    def state_messages(
+        self,
+        state: FormState,
+        messages: List[Dict[str, str]] = (),
+        relevant_schema: bool = False
+    ) -> List[Dict[str, str]]:
+        """
+        Хвост запроса, меняющийся каждый ход: state. В режиме relevant_schema — вид формы для хода:
+        обработанные поля как имя → значение и state только полей, к которым может относиться
+        последнее сообщение пользователя, вместе с их описанием.
+        """
+        if not relevant_schema:
+            return [{"role": "system", "content": STATE_HEADER + dump_compact(state)}]
+        view = build_view(self.form, state, last_user_message(messages), self.field_index())
+        tail = []
+        if view.done:
+            tail.append({"role": "system", "content": "Обработанные поля:\n" + dump_compact(view.done)})
+        tail.append({"role": "system", "content": STATE_HEADER + dump_compact(view.state)})
+        return tail
+
+    def build_messages(
+        self,
+        messages: List[Dict[str, str]],
+        state: FormState,
+        delta: bool = False,
+        question_first: bool = False,
+        relevant_schema: bool = False
+    ) -> List[Dict[str, str]]:
+        """
+        [стабильный префикс] + история + [текущий state] — порядок, при котором
+        у провайдера кэшируется всё, кроме нового хода и state.
+        """
+        full_messages = [{"role": "system", "content": self.prefix(delta, question_first, relevant_schema)}]
+        full_messages += messages
+        full_messages += self.state_messages(state, messages, relevant_schema)
+        return full_messages
+
+
+_cache: "OrderedDict[int, CompiledPrompt]" = OrderedDict()
+_cache_lock = threading.Lock()
+_CACHE_SIZE = 128
+
+
+def compile_prompt(form: Form) -> CompiledPrompt:
+    """
+    Возвращает скомпилированный промпт для формы.
+    Кэш держит ссылку на сам объект формы, поэтому повторный вызов с той же формой —
+    это поиск по id() без пересериализации. Формы после загрузки не должны изменяться.
+    У скомпилированной формы реестра (CompiledForm) промпт уже готов.
+    """
+    prompt = getattr(form, "prompt", None)
+    if isinstance(prompt, CompiledPrompt):
+        return prompt
+    key = id(form)
+    with _cache_lock:
+        compiled = _cache.get(key)
+        if compiled is not None and compiled.form is form:
+            _cache.move_to_end(key)
+            return compiled
+    compiled = CompiledPrompt(form)
+    with _cache_lock:
+        _cache[key] = compiled
+        if len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+    return compiled
@@ -0,0 +1,214 @@
+"""
+Кэш ответов LLM, адресуемый по содержимому запроса.
+
+Ключ — sha256 канонического JSON из id и версии формы, модели, режима (delta),
+нормализованного state и последних сообщений истории. Одинаковый ответ на одинаковый
+вопрос в одинаковом состоянии формы не требует повторного вызова LLM.
+
+Два уровня:
+- в памяти: LRU с ограничением по числу записей и TTL;
+- на диске (необязательно): SQLite в режиме WAL, общий для нескольких процессов.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from app.models import Form, FormState
+from app.prompt_builder import compile_prompt
+
+
+def cache_key(
+    form: Form,
+    state: FormState,
+    messages: List[Dict[str, str]],
+    window: int = 4,
+    model: Optional[str] = None,
+    delta: bool = False
+) -> str:
+    """
+    Канонический ключ запроса к LLM.
+    state сводится к (value, status) по полям в порядке имён, в сообщениях схлопываются пробелы,
+    из истории берутся только последние window сообщений.
+    """
+    version = getattr(form, "version", None)
+    if version is None:
+        version = hashlib.sha256(compile_prompt(form).schema.encode("utf-8")).hexdigest()
+    recent = messages[-window:] if window > 0 else []
+    payload = {
+        "form": form["id"],
+        "version": version,
+        "model": model,
+        "delta": delta,
+        "state": [[name, state[name].get("value"), state[name].get("status")] for name in sorted(state)],
+        "messages": [[message["role"], " ".join(message["content"].split())] for message in recent]
+    }
+    canonical = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class SQLiteCacheTier:
+    """
+    Постоянный уровень кэша в SQLite. Режим WAL позволяет нескольким процессам
+    одновременно читать и по очереди писать в один файл.
+    """
+    def __init__(self, path: str, timeout: float = 5.0):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=timeout, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def get(self, key: str, now: float) -> Optional[Tuple[str, float]]:
+        """Возвращает (value, expires_at) или None; просроченная запись удаляется."""
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                return None
+            return row[0], row[1]
+
+    def put(self, key: str, value: str, expires_at: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at)
+            )
+
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        """Удаляет просроченные записи, возвращает их число."""
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now or time.time(),))
+            return cursor.rowcount
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ResponseCache:
+    """
+    Двухуровневый кэш ответов LLM (см. описание модуля).
+
+    - max_entries, ttl — размер LRU в памяти и время жизни записи (секунды) на обоих уровнях
+    - path — файл SQLite для общего постоянного уровня (None — только память)
+    - window — сколько последних сообщений истории входит в ключ
+    - deterministic=True — запросы через кэш идут с temperature=0, поэтому ответ воспроизводим;
+      при deterministic=False и temperature > 0 кэш обходится (ответы случайны),
+      если явно не разрешено cache_sampled=True
+
+    Счётчики (stats): hits, memory_hits, disk_hits, misses, stores, evictions, expirations, bypassed.
+    Потокобезопасен.
+    """
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: float = 3600.0,
+        path: Optional[str] = None,
+        window: int = 4,
+        deterministic: bool = True,
+        cache_sampled: bool = False
+    ):
+        if max_entries <= 0:
+            raise ValueError("max_entries должен быть положительным")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.window = window
+        self.deterministic = deterministic
+        self.cache_sampled = cache_sampled
+        self.disk = SQLiteCacheTier(path) if path else None
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(
+            ("hits", "memory_hits", "disk_hits", "misses", "stores", "evictions", "expirations", "bypassed"), 0
+        )
+
+    @property
+    def temperature(self) -> Optional[float]:
+        """Температура, с которой надо звать LLM через кэш (None — по умолчанию клиента)."""
+        return 0.0 if self.deterministic else None
+
+    def allows(self, temperature: Optional[float]) -> bool:
+        """
+        Можно ли кэшировать ответ, полученный с данной температурой.
+        None — температура клиента по умолчанию (у LLMBase это 1.0).
+        """
+        if temperature is None:
+            temperature = 1.0
+        if temperature > 0 and not self.cache_sampled:
+            with self._lock:
+                self._stats["bypassed"] += 1
+            return False
+        return True
+
+    def key_for(self, form: Form, state: FormState, messages: List[Dict[str, str]], model: Optional[str] = None, delta: bool = False) -> str:
+        return cache_key(form, state, messages, window=self.window, model=model, delta=delta)
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            item = self._memory.get(key)
+            if item is not None:
+                if item[1] > now:
+                    self._memory.move_to_end(key)
+                    self._stats["hits"] += 1
+                    self._stats["memory_hits"] += 1
+                    return item[0]
+                del self._memory[key]
+                self._stats["expirations"] += 1
+        if self.disk is not None:
+            item = self.disk.get(key, now)
+            if item is not None:
+                with self._lock:
+                    self._store_memory(key, item[0], item[1])
+                    self._stats["hits"] += 1
+                    self._stats["disk_hits"] += 1
+                return item[0]
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def put(self, key: str, value: str):
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._store_memory(key, value, expires_at)
+            self._stats["stores"] += 1
+        if self.disk is not None:
+            self.disk.put(key, value, expires_at)
+
+    def _store_memory(self, key: str, value: str, expires_at: float):
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Копия счётчиков, текущий размер LRU и доля попаданий."""
+        with self._lock:
+            stats = dict(self._stats, size=len(self._memory))
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def close(self):
+        if self.disk is not None:
+            self.disk.close()
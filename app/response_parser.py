@@ -0,0 +1,271 @@
+"""
+Устойчивый разбор JSON-ответа LLM.
+
+Ответ сначала разбирается как есть. Если не вышло — за один проход по тексту находится
+первый сбалансированный JSON-объект (markdown-ограждения и текст вокруг пропускаются),
+а если и он не разбирается — исправляются типичные дефекты генерации:
+- запятые перед закрывающей скобкой;
+- литералы Python: True / False / None и строки в одинарных кавычках;
+- оборванный хвост: незавершённая пара «ключ: значение» (в том числе с оборванным числом или литералом)
+  отбрасывается, скобки закрываются.
+Исправленные («спасённые») ответы учитываются в parser_stats — так видно, как часто
+модель отвечает с дефектами и сколько ходов удалось не потерять.
+
+Для разбора используется orjson, если он установлен, иначе стандартный json.
+"""
+
+import json
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import orjson
+
+    JSON_BACKEND = "orjson"
+    JSONDecodeError = orjson.JSONDecodeError
+
+    def loads(text: str) -> Any:
+        return orjson.loads(text)
+except ImportError:  # pragma: no cover - зависит от окружения
+    JSON_BACKEND = "json"
+    JSONDecodeError = json.JSONDecodeError
+    loads = json.loads
+
+# Сколько кандидатов-объектов проверять, если первые «{...}» в тексте оказались не JSON
+MAX_CANDIDATES = 8
+
+_PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_JSON_LITERALS = ("true", "false", "null")
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def locate_object(text: str, start: int = 0) -> Optional[Tuple[int, int, bool]]:
+    """
+    Ищет первый JSON-объект, начиная с позиции start.
+    Возвращает (начало, конец, завершён ли объект) или None, если '{' в тексте нет.
+    Строки в двойных и одинарных кавычках учитываются, чтобы скобки внутри них не сбивали счёт.
+    """
+    begin = text.find("{", start)
+    if begin < 0:
+        return None
+    depth = 0
+    quote = None
+    i = begin
+    length = len(text)
+    while i < length:
+        c = text[i]
+        if quote:
+            if c == "\\":
+                i += 1
+            elif c == quote:
+                quote = None
+        elif c == '"' or c == "'":
+            quote = c
+        elif c == "{" or c == "[":
+            depth += 1
+        elif c == "}" or c == "]":
+            depth -= 1
+            if depth == 0:
+                return begin, i + 1, True
+        i += 1
+    return begin, length, False
+
+
+def repair(text: str) -> Tuple[str, List[str]]:
+    """
+    Исправляет типичные дефекты JSON от LLM. Возвращает (исправленный текст, виды исправлений):
+    trailing_comma, python_literal, single_quotes, truncated.
+    """
+    out: List[str] = []
+    repairs = set()
+    stack: List[str] = []
+    # Последняя позиция, до которой объект заведомо цел: (длина out, копия стека)
+    checkpoint: Tuple[int, List[str]] = (0, [])
+    prev = ""  # последний значимый символ вне строк
+    i = 0
+    length = len(text)
+    while i < length:
+        c = text[i]
+        if c == '"' or c == "'":
+            # Строка: копируем до закрывающей кавычки, одинарные кавычки меняем на двойные
+            quote = c
+            if quote == "'":
+                repairs.add("single_quotes")
+            j = i + 1
+            chunk = ['"']
+            closed = False
+            while j < length:
+                d = text[j]
+                if d == "\\" and j + 1 < length:
+                    if quote == "'" and text[j + 1] == "'":
+                        chunk.append("'")
+                    else:
+                        chunk.append(text[j:j + 2])
+                    j += 2
+                    continue
+                if d == quote:
+                    closed = True
+                    break
+                chunk.append('\\"' if d == '"' else d)
+                j += 1
+            if not closed:
+                break
+            out.append("".join(chunk) + '"')
+            i = j + 1
+            if prev == ":" or (stack and stack[-1] == "[" and prev in "[,"):
+                checkpoint = (len(out), list(stack))
+            prev = '"'
+            continue
+        if c.isalpha() or c == "_":
+            j = i
+            while j < length and (text[j].isalnum() or text[j] == "_"):
+                j += 1
+            word = text[i:j]
+            if word in _PYTHON_LITERALS:
+                repairs.add("python_literal")
+                word = _PYTHON_LITERALS[word]
+            if j >= length and word not in _JSON_LITERALS:
+                # Литерал оборван в конце текста
+                break
+            out.append(word)
+            i = j
+            if word in _JSON_LITERALS and (prev == ":" or (stack and stack[-1] == "[" and prev in "[,")):
+                checkpoint = (len(out), list(stack))
+            prev = "a"
+            continue
+        if c.isdigit() or c == "-":
+            # Число: оборванное в конце текста (12 из 123, 1. или 1e) отбрасывается вместе со своим ключом
+            j = i + 1
+            while j < length and (text[j].isdigit() or text[j] in ".eE+-"):
+                j += 1
+            if j >= length:
+                break
+            out.append(text[i:j])
+            i = j
+            if prev == ":" or (stack and stack[-1] == "[" and prev in "[,"):
+                checkpoint = (len(out), list(stack))
+            prev = "0"
+            continue
+        if c == ",":
+            k = i + 1
+            while k < length and text[k].isspace():
+                k += 1
+            if k < length and text[k] in "}]":
+                repairs.add("trailing_comma")
+                i += 1
+                continue
+            checkpoint = (len(out), list(stack))
+        elif c in "{[":
+            stack.append(c)
+            out.append(c)
+            if len(stack) == 1:
+                # Пустой вложенный объект на месте оборванного значения хуже, чем отсутствие пары
+                checkpoint = (len(out), list(stack))
+            prev = c
+            i += 1
+            continue
+        elif c in "}]":
+            if stack:
+                stack.pop()
+            out.append(c)
+            checkpoint = (len(out), list(stack))
+            prev = c
+            i += 1
+            continue
+        out.append(c)
+        if not c.isspace():
+            prev = c
+        i += 1
+    else:
+        if not stack:
+            return "".join(out), sorted(repairs)
+
+    # Текст оборван: откатываемся к последнему целому элементу и закрываем скобки
+    repairs.add("truncated")
+    size, open_brackets = checkpoint
+    body = "".join(out[:size]).rstrip()
+    if body.endswith(","):
+        body = body[:-1]
+    return body + "".join(_CLOSERS[b] for b in reversed(open_brackets)), sorted(repairs)
+
+
+class ParserStats:
+    """
+    Потокобезопасные счётчики разбора ответов:
+    strict — разобран как есть, extracted — вырезан из текста/markdown без исправлений,
+    repaired — спасён исправлениями (и по видам исправлений), failed — не разобран.
+    Учитывается только разбор JSON: структуру ответа затем проверяет validate_response.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[str, int] = {"strict": 0, "extracted": 0, "repaired": 0, "failed": 0}
+        self._repairs: Dict[str, int] = {}
+
+    def record(self, outcome: str, repairs: List[str] = ()):
+        with self._lock:
+            self._counts[outcome] += 1
+            for kind in repairs:
+                self._repairs[kind] = self._repairs.get(kind, 0) + 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Счётчики и доля спасённых среди ответов, которые не разобрались как есть (rescue_rate)."""
+        with self._lock:
+            counts = dict(self._counts)
+            damaged = counts["repaired"] + counts["failed"]
+            return dict(
+                counts,
+                repairs=dict(self._repairs),
+                rescue_rate=round(counts["repaired"] / damaged, 3) if damaged else 0.0,
+                backend=JSON_BACKEND
+            )
+
+    def reset(self):
+        with self._lock:
+            for key in self._counts:
+                self._counts[key] = 0
+            self._repairs.clear()
+
+
+# Общие для процесса счётчики
+parser_stats = ParserStats()
+
+
+def parse_json_response(text: str, stats: Optional[ParserStats] = None) -> Tuple[Any, str, List[str]]:
+    """
+    Разбирает ответ LLM. Возвращает (значение, исход, виды исправлений),
+    исход — 'strict', 'extracted' или 'repaired'. Если ничего не помогло — ValueError.
+    """
+    stats = stats or parser_stats
+    try:
+        value = loads(text)
+        stats.record("strict")
+        return value, "strict", []
+    except (JSONDecodeError, ValueError):
+        pass
+
+    position = 0
+    for _ in range(MAX_CANDIDATES):
+        span = locate_object(text, position)
+        if span is None:
+            break
+        begin, end, complete = span
+        candidate = text[begin:end]
+        if complete:
+            try:
+                value = loads(candidate)
+                stats.record("extracted")
+                return value, "extracted", []
+            except (JSONDecodeError, ValueError):
+                pass
+        fixed, repairs = repair(candidate)
+        try:
+            value = loads(fixed)
+        except (JSONDecodeError, ValueError):
+            position = begin + 1
+            continue
+        if isinstance(value, dict) and value:
+            stats.record("repaired", repairs)
+            return value, "repaired", repairs
+        position = begin + 1
+    stats.record("failed")
+    raise ValueError("Ответ не содержит разбираемого JSON-объекта")
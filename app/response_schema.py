@@ -0,0 +1,159 @@
+"""
+Формат ответа LLM, построенный по форме: JSON Schema для structured output провайдера
+и заранее подготовленная проверка разобранного ответа.
+
+response_schema описывает ответ {"state", "next_question"}: имена полей — обязательные ключи state,
+status — перечисление значений FieldStatus, value — по типу поля (варианты enum, массивы для multi_enum
+и list_str, числа, bool), всегда с null. Клиенты, поддерживающие structured output, передают её
+в response_format (см. llm/response.py): провайдер с json_schema сам не даёт модели отступить от формата,
+и ход не теряется из-за пропущенного поля или выдуманного статуса.
+
+ResponseValidator — проверка ответа без поэлементного построения ошибок: константы формы собраны
+заранее, корректный ответ проходит одним циклом по полям. Только если он не прошёл,
+выполняется подробная проверка (diagnose) с сообщением о первой ошибке. Типы value, как и раньше,
+не проверяются: без structured output модели часто пишут "42" вместо 42, и такой ответ остаётся годным.
+"""
+
+from typing import Any, Dict, Optional, Tuple
+from app.models import Form, FormState, STATUS_VALUES
+
+SCHEMA_NAME = "form_response"
+
+# Ограничения strict-режима OpenAI Structured Outputs: больше — схема передаётся без strict
+MAX_STRICT_PROPERTIES = 5000
+MAX_STRICT_ENUM_VALUES = 1000
+
+_STATUSES = sorted(STATUS_VALUES)
+
+_VALUE_TYPES = {
+    "int": "integer",
+    "float": "number",
+    "bool": "boolean",
+}
+
+
+def value_schema(field: Dict[str, Any]) -> Dict[str, Any]:
+    """Схема value поля: по типу поля, null — для не начатых, пропущенных и невалидных полей."""
+    kind = field["type"]
+    if kind == "enum":
+        return {"type": ["string", "null"], "enum": [*field["options"], None]}
+    if kind == "multi_enum":
+        return {"type": ["array", "null"], "items": {"type": "string", "enum": list(field["options"])}}
+    if kind == "list_str":
+        return {"type": ["array", "null"], "items": {"type": "string"}}
+    return {"type": [_VALUE_TYPES.get(kind, "string"), "null"]}
+
+
+def response_schema(form: Form, delta: bool = False, question_first: bool = False) -> Dict[str, Any]:
+    """
+    JSON Schema ответа в формате OpenAI json_schema: {"name", "strict", "schema"}.
+    delta: в state допускается подмножество полей (strict при этом невозможен — он требует все ключи)
+    question_first: 'next_question' идёт в схеме первым (strict-режим сохраняет порядок ключей)
+    """
+    required = ["value", "status"] if delta else ["value", "status", "optional"]
+    fields = {}
+    enum_values = len(_STATUSES) * len(form["fields"])
+    for field in form["fields"]:
+        value = value_schema(field)
+        enum_values += len(value.get("enum") or value.get("items", {}).get("enum") or ())
+        fields[field["name"]] = {
+            "type": "object",
+            "properties": {
+                "value": value,
+                "status": {"type": "string", "enum": _STATUSES},
+                "optional": {"type": "boolean"},
+            },
+            "required": required,
+            "additionalProperties": False,
+        }
+    state = {"type": "object", "properties": fields, "required": [] if delta else list(fields), "additionalProperties": False}
+    question = {"type": ["string", "null"]}
+    properties = {"next_question": question, "state": state} if question_first else {"state": state, "next_question": question}
+    strict = (
+        not delta
+        and 2 + 4 * len(fields) <= MAX_STRICT_PROPERTIES
+        and enum_values <= MAX_STRICT_ENUM_VALUES
+    )
+    return {
+        "name": SCHEMA_NAME,
+        "strict": strict,
+        "schema": {"type": "object", "properties": properties, "required": list(properties), "additionalProperties": False},
+    }
+
+
+class ResponseValidator:
+    """
+    Проверка разобранного ответа LLM для одной формы и режима (см. описание модуля).
+    Вызов возвращает (state, next_question) или бросает ValueError.
+    delta: в state допускается подмножество полей формы, а ключ 'optional' необязателен.
+    """
+    __slots__ = ("field_names", "delta", "required_keys", "_missing_optional")
+
+    def __init__(self, form: Form, delta: bool = False):
+        self.field_names = frozenset(field["name"] for field in form["fields"])
+        self.delta = delta
+        self.required_keys = frozenset(("value", "status") if delta else ("value", "status", "optional"))
+        # Чем заменить отсутствующий 'optional': в delta он необязателен, в полном ответе — ошибка (не bool)
+        self._missing_optional = False if delta else None
+
+    def __call__(self, parsed) -> Tuple[FormState, Optional[str]]:
+        try:
+            state = parsed["state"]
+            question = parsed["next_question"]
+            if (
+                type(state) is dict
+                and (question is None or type(question) is str)
+                and (state.keys() <= self.field_names if self.delta else state.keys() >= self.field_names)
+            ):
+                statuses, missing_optional = STATUS_VALUES, self._missing_optional
+                # Проверки по ключам, а не сравнением множеств: на ответ из сотен полей это в разы быстрее
+                for field_state in state.values():
+                    if (
+                        type(field_state) is not dict
+                        or "value" not in field_state
+                        or field_state["status"] not in statuses
+                        or field_state.get("optional", missing_optional).__class__ is not bool
+                    ):
+                        break
+                else:
+                    return dict(state), question
+        except (TypeError, KeyError):
+            pass
+        return self.diagnose(parsed)
+
+    def diagnose(self, parsed) -> Tuple[FormState, Optional[str]]:
+        """Поэлементная проверка с сообщением о первой найденной ошибке."""
+        if not isinstance(parsed, dict):
+            raise ValueError("LLM вернула не объект JSON")
+        if "state" not in parsed:
+            raise ValueError("В ответе LLM отсутствует ключ 'state'")
+        if "next_question" not in parsed:
+            raise ValueError("В ответе LLM отсутствует ключ 'next_question'")
+        if not isinstance(parsed["state"], dict):
+            raise ValueError("Ключ 'state' должен быть объектом")
+        if not isinstance(parsed["next_question"], (str, type(None))):
+            raise ValueError("Ключ 'next_question' должен быть строкой или null")
+
+        response_field_names = parsed["state"].keys()
+        if self.delta:
+            unknown = response_field_names - self.field_names
+            if unknown:
+                raise ValueError(f"В ответе LLM неизвестные поля: {unknown}")
+        elif not self.field_names <= response_field_names:
+            missing = self.field_names - response_field_names
+            raise ValueError(f"В ответе LLM отсутствуют поля: {missing}")
+
+        updated_state: FormState = {}
+        for field_name, field_state in parsed["state"].items():
+            if not isinstance(field_state, dict):
+                raise ValueError(f"Состояние поля '{field_name}' должно быть объектом")
+            if not self.required_keys.issubset(field_state):
+                missing = self.required_keys - field_state.keys()
+                raise ValueError(f"В состоянии поля '{field_name}' отсутствуют ключи: {missing}")
+            if "optional" in field_state and not isinstance(field_state["optional"], bool):
+                raise ValueError(f"Ключ 'optional' поля '{field_name}' должен быть булевым")
+            if not isinstance(field_state["status"], str) or field_state["status"] not in STATUS_VALUES:
+                raise ValueError(f"Недопустимый статус поля '{field_name}': {field_state['status']}")
+            updated_state[field_name] = field_state
+        return updated_state, parsed["next_question"]
+
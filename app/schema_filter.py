@@ -0,0 +1,117 @@
+"""
+Отбор полей формы для промпта на каждом ходе.
+
+Полная схема формы и полный state в каждом запросе — в основном повтор уже известного:
+про обработанные поля модели достаточно имени и значения. SchemaView оставляет состояние вместе с описанием
+поля (тип, описание, варианты) только у полей, к которым может относиться новое сообщение:
+- не начатых и невалидных;
+- упомянутых в сообщении пользователя — по локальному лексическому индексу FieldIndex
+  (BM25 по символьным триграммам имён, описаний и вариантов полей; триграммы терпимы к падежам —
+  «фамилию» находит поле «Фамилия»).
+Остальные поля перечисляются как имя → значение: модель может изменить и их, если пользователь явно просит.
+"""
+
+import math
+import re
+from collections import Counter
+from typing import Any, Dict, List, Mapping, Sequence
+from app.models import Form, FormState
+
+NGRAM = 3
+_WORD = re.compile(r"\w+")
+
+
+def ngrams(text: str) -> List[str]:
+    """Символьные триграммы слов текста (в нижнем регистре); короткие слова — целиком."""
+    grams = []
+    for word in _WORD.findall(text.lower()):
+        if len(word) <= NGRAM:
+            grams.append(word)
+        else:
+            grams.extend(word[i:i + NGRAM] for i in range(len(word) - NGRAM + 1))
+    return grams
+
+
+class FieldIndex:
+    """
+    BM25 по триграммам полей формы. Строится один раз на форму (см. CompiledPrompt.field_index).
+    Имя поля входит в документ дважды — совпадение с именем весит больше, чем с описанием.
+    Упомянутым считается только поле, у имени которого есть общая триграмма с текстом:
+    совпадения лишь с описанием (например, ответ «Иванов» и «выдан») не в счёт.
+    """
+    def __init__(self, fields: Sequence[Mapping[str, Any]], k1: float = 1.2, b: float = 0.75):
+        self.names = [field["name"] for field in fields]
+        self.name_grams = [frozenset(ngrams(name)) for name in self.names]
+        documents = [
+            Counter(ngrams(" ".join([field["name"], field["name"], field.get("description") or "", *(field.get("options") or ())])))
+            for field in fields
+        ]
+        average = sum(sum(document.values()) for document in documents) / len(documents) if documents else 0.0
+        frequency = Counter(gram for document in documents for gram in document)
+        count = len(documents)
+        idf = {gram: math.log(1 + (count - df + 0.5) / (df + 0.5)) for gram, df in frequency.items()}
+        # Вклад каждой триграммы в оценку поля (BM25 при единичной частоте в запросе) — считается заранее
+        self.weights: List[Dict[str, float]] = []
+        for document in documents:
+            length = sum(document.values())
+            norm = k1 * (1 - b + b * length / average) if average else k1
+            self.weights.append({gram: idf[gram] * tf * (k1 + 1) / (tf + norm) for gram, tf in document.items()})
+        # Нормировка: оценка наименее весомого слова имени, как если бы его упомянули целиком.
+        # Так «дату» находит «Дата рождения», хотя «рождения» в сообщении нет.
+        self.reference: List[float] = []
+        for name, weights in zip(self.names, self.weights):
+            words = [sum(weights.get(gram, 0.0) for gram in set(ngrams(word))) for word in _WORD.findall(name)]
+            self.reference.append(min((score for score in words if score > 0), default=0.0))
+
+    def scores(self, text: str) -> Dict[str, float]:
+        """Оценка каждого поля относительно упоминания слова его имени (1.0 — слово имени упомянуто целиком)."""
+        grams = set(ngrams(text))
+        result = {}
+        for name, name_grams, weights, reference in zip(self.names, self.name_grams, self.weights, self.reference):
+            if reference and not name_grams.isdisjoint(grams):
+                result[name] = sum(weights.get(gram, 0.0) for gram in grams) / reference
+        return result
+
+    def search(self, text: str, limit: int = 3, threshold: float = 0.5) -> List[str]:
+        """До limit полей, на которые, вероятно, ссылается текст (по убыванию оценки)."""
+        ranked = sorted(self.scores(text).items(), key=lambda item: -item[1])
+        return [name for name, score in ranked[:limit] if score >= threshold]
+
+
+def last_user_message(messages: Sequence[Mapping[str, str]]) -> str:
+    """Текст последнего сообщения пользователя (пустая строка, если его нет)."""
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            return message.get("content") or ""
+    return ""
+
+
+class SchemaView:
+    """
+    Вид формы для одного хода:
+    - state — отобранные поля (в порядке формы): состояние вместе с описанием поля (type, description, options)
+    - done — остальные поля как имя → значение (None — пропущено)
+    """
+    __slots__ = ("state", "done")
+
+    def __init__(self, state: Dict[str, Dict[str, Any]], done: Dict[str, Any]):
+        self.state = state
+        self.done = done
+
+
+def build_view(form: Form, state: FormState, text: str, index: FieldIndex, limit: int = 3, threshold: float = 0.5) -> SchemaView:
+    """Отбирает поля не начатые, невалидные и упомянутые в text (см. описание модуля)."""
+    mentioned = set(index.search(text, limit, threshold)) if text else set()
+    selected, done = {}, {}
+    for field in form["fields"]:
+        name = field["name"]
+        field_state = state[name]
+        if field_state["status"] in ("not_started", "invalid") or name in mentioned:
+            # Имя уже ключ, а required повторяет optional из state
+            entry = dict(field_state)
+            entry.update((key, value) for key, value in field.items() if key not in ("name", "required"))
+            selected[name] = entry
+        else:
+            done[name] = field_state["value"]
+    return SchemaView(selected, done)
+
@@ -0,0 +1,271 @@
+"""
+Серверный режим: много диалогов в одном процессе на asyncio.
+
+HTTP/1.1 с keep-alive и JSON в теле запросов и ответов:
+- POST   /sessions                 {"form": "email"}                        → первый шаг диалога
+- POST   /sessions/<id>/answer     {"text": "..."}                          → следующий шаг
+- POST   /sessions/<id>/confirm    {"confirmed": true} | {"confirmed": false, "correction": "..."}
+- GET    /sessions/<id>            → текущий шаг и state (result)
+- DELETE /sessions/<id>            → завершить сессию
+- GET    /stats                    → таблица сессий, задержки ходов (p50/p99)
+
+Каждая сессия — DialogSession (пошаговый неблокирующий диалог), все они лежат в SessionTable
+(вытеснение по простою, LRU и памяти) и используют общий асинхронный клиент LLM.
+Пока LLM отвечает одной сессии, event loop обслуживает остальные.
+
+Запуск:
+    python main.py --serve 8080
+"""
+
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from typing import Any, Dict, Optional, Tuple
+from app.answer_store import AnswerStore, answer_record
+from app.dialog_session import DONE, DialogSession
+from app.form_registry import FormRegistry, get_registry
+from app.metrics import percentile
+from app.response_cache import ResponseCache
+from app.session_table import SessionTable
+
+MAX_BODY = 1024 * 1024
+REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class DialogServer:
+    """
+    HTTP-сервер диалогов (см. описание модуля).
+
+    - llm_client — асинхронный клиент LLM; по умолчанию llm.get_async_llm() (создаётся при старте)
+    - table — таблица сессий; по умолчанию SessionTable.from_env()
+    - answers_dir — куда сохранять подтверждённые результаты (<форма>_<сессия>.json); None — не сохранять
+    - answer_store — хранилище результатов (см. app/answer_store.py) вместо файлов в answers_dir:
+      сессии, подтверждённые одновременно, фиксируются одной транзакцией
+    - delta, fast_path, cache, relevant_schema — как у DialogManager, для всех сессий
+    - sweep_interval — как часто (секунды) удалять простаивающие сессии
+    """
+    def __init__(
+        self,
+        llm_client=None,
+        table: Optional[SessionTable] = None,
+        registry: Optional[FormRegistry] = None,
+        answers_dir: Optional[str] = "answers",
+        delta: bool = False,
+        fast_path: bool = True,
+        cache: Optional[ResponseCache] = None,
+        sweep_interval: float = 30.0,
+        relevant_schema: bool = False,
+        answer_store: Optional[AnswerStore] = None
+    ):
+        self.llm_client = llm_client
+        self.table = table or SessionTable.from_env()
+        self.registry = registry or get_registry()
+        self.answers_dir = answers_dir
+        self.answer_store = answer_store
+        self.delta = delta
+        self.fast_path = fast_path
+        self.cache = cache
+        self.relevant_schema = relevant_schema
+        self.sweep_interval = sweep_interval
+        # Сессии, чей запрос ещё обрабатывается: второй одновременный запрос к ним — 409
+        self._busy = set()
+        self._turn_latencies: deque = deque(maxlen=10000)
+        self._requests = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._sweeper: Optional[asyncio.Task] = None
+
+    # --- Запуск ---
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8080) -> Tuple[str, int]:
+        """Начинает принимать соединения; возвращает фактический адрес (port=0 — любой свободный)."""
+        if self.llm_client is None:
+            from llm import get_async_llm
+            self.llm_client = get_async_llm()
+        self._server = await asyncio.start_server(self._connection, host, port)
+        self._sweeper = asyncio.create_task(self._sweep_loop())
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def serve_forever(self):
+        await self._server.serve_forever()
+
+    async def close(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        aclose = getattr(self.llm_client, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            self.table.sweep()
+
+    # --- Обработка запросов ---
+
+    async def handle(self, method: str, path: str, body: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        """Маршрутизация запроса; возвращает (HTTP-статус, JSON-ответ)."""
+        self._requests += 1
+        parts = [part for part in path.split("?")[0].split("/") if part]
+        try:
+            if parts == ["sessions"] and method == "POST":
+                return 201, self._create(body)
+            if parts == ["stats"] and method == "GET":
+                return 200, self.stats()
+            if len(parts) >= 2 and parts[0] == "sessions":
+                return 200, await self._session_request(method, parts[1], parts[2:], body)
+            raise HTTPError(404, f"Нет такого адреса: {method} {path}")
+        except HTTPError as e:
+            return e.status, {"error": str(e)}
+        except ValueError as e:
+            return 400, {"error": str(e)}
+
+    def _create(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        name = body.get("form")
+        if not name:
+            raise HTTPError(400, "Не указана форма (form)")
+        try:
+            form = self.registry.get(name)
+        except FileNotFoundError as e:
+            raise HTTPError(404, str(e))
+        session = DialogSession(
+            form, self.llm_client, delta=self.delta, fast_path=self.fast_path, cache=self.cache,
+            relevant_schema=self.relevant_schema
+        )
+        step = session.start()
+        self.table.add(session)
+        return step
+
+    async def _session_request(self, method: str, session_id: str, action: list, body: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            session = self.table.get(session_id)
+        except KeyError as e:
+            raise HTTPError(404, e.args[0])
+        if not action:
+            if method == "GET":
+                return dict(session.view(), state=session.result())
+            if method == "DELETE":
+                self.table.remove(session_id)
+                return {"session": session_id, "closed": True}
+            raise HTTPError(405, f"Метод {method} не поддерживается")
+        if method != "POST" or action[0] not in ("answer", "confirm") or len(action) > 1:
+            raise HTTPError(404, f"Нет такого действия: {method} /{'/'.join(action)}")
+        if session_id in self._busy:
+            raise HTTPError(409, "Сессия занята: предыдущий запрос ещё обрабатывается")
+        self._busy.add(session_id)
+        started = time.perf_counter()
+        try:
+            if action[0] == "answer":
+                text = body.get("text")
+                if not isinstance(text, str):
+                    raise HTTPError(400, "Не указан ответ (text)")
+                step = await session.answer(text)
+            else:
+                step = await session.confirm(bool(body.get("confirmed")), body.get("correction"))
+                if session.phase == DONE and (self.answer_store is not None or self.answers_dir):
+                    step["output"] = await asyncio.to_thread(self._save, session)
+        finally:
+            self._busy.discard(session_id)
+            self._turn_latencies.append(time.perf_counter() - started)
+        self.table.touch(session_id)
+        return step
+
+    def _save(self, session: DialogSession) -> str:
+        if self.answer_store is not None:
+            self.answer_store.put(answer_record(session.form, session.session_id, session.result()), wait=True)
+            return self.answer_store.location(session.session_id)
+        os.makedirs(self.answers_dir, exist_ok=True)
+        path = os.path.join(self.answers_dir, f"{session.form['id']}_{session.session_id}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(session.result(), f, ensure_ascii=False, indent=2)
+        return path
+
+    def stats(self) -> Dict[str, Any]:
+        """Таблица сессий, число запросов и задержки ходов (answer/confirm), мс."""
+        latencies = list(self._turn_latencies)
+        return {
+            "sessions": self.table.stats(),
+            "requests": self._requests,
+            "turns": len(latencies),
+            "turn_p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "turn_p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        }
+
+    # --- HTTP/1.1 ---
+
+    async def _connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Одно соединение: запросы по очереди, пока клиент держит keep-alive."""
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    return
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, path, version = lines[0].split(" ", 2)
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "Некорректная строка запроса"}, keep_alive=False)
+                    return
+                headers = {}
+                for line in lines[1:]:
+                    name, sep, value = line.partition(":")
+                    if sep:
+                        headers[name.strip().lower()] = value.strip()
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY:
+                    await self._respond(writer, 413, {"error": "Слишком большое тело запроса"}, keep_alive=False)
+                    return
+                raw = await reader.readexactly(length) if length else b""
+                try:
+                    body = json.loads(raw) if raw else {}
+                    if not isinstance(body, dict):
+                        raise ValueError
+                except ValueError:
+                    status, payload = 400, {"error": "Тело запроса должно быть JSON-объектом"}
+                else:
+                    try:
+                        status, payload = await self.handle(method.upper(), path, body)
+                    except Exception as e:
+                        status, payload = 500, {"error": f"Внутренняя ошибка: {e}"}
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    return
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return
+        finally:
+            writer.close()
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, payload: Dict[str, Any], keep_alive: bool):
+        raw = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(raw)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        ).encode("latin-1")
+        writer.write(head + raw)
+        await writer.drain()
+
+
+async def serve(host: str = "127.0.0.1", port: int = 8080, **options):
+    """Запускает DialogServer и обслуживает запросы до остановки процесса."""
+    server = DialogServer(**options)
+    address = await server.start(host, port)
+    print(f"Сервер диалогов слушает http://{address[0]}:{address[1]}")
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
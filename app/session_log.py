@@ -0,0 +1,233 @@
+"""
+Журнал сессии в формате JSONL: события дописываются в файл по мере возникновения,
+а не копятся в памяти до конца диалога. Поэтому лог прерванной или упавшей сессии
+сохраняется, а память не растёт с длиной диалога.
+
+Событие — строка JSON: {"timestamp", "mono_us", "role", "content"}.
+timestamp — локальное время (ISO, микросекунды), mono_us — монотонные часы в микросекундах:
+разности mono_us не зависят от перевода системных часов и годятся для анализа задержек.
+
+Политика записи:
+- flush_events / flush_interval — сбрасывать буфер в файл каждые N событий или раз в T секунд;
+- fsync — 'none' (файл сбрасывается в ОС, на диск — когда решит ОС), 'flush' (os.fsync при каждом сбросе);
+- max_bytes / max_age — ротация: текущий файл переименовывается в <имя>.1.jsonl, <имя>.2.jsonl, ...
+  по достижении размера (байты) или возраста (секунды);
+- background=True — запись в фоновом потоке: log() только кладёт событие в очередь
+  и не блокирует цикл диалога ни на записи, ни на fsync.
+"""
+
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+FSYNC_POLICIES = ("none", "flush")
+_CLOSE = object()
+
+
+def monotonic_us() -> int:
+    """Монотонное время в микросекундах."""
+    return time.monotonic_ns() // 1000
+
+
+class SessionLog:
+    """
+    Буферизованный журнал событий сессии в JSONL-файле (см. описание модуля).
+    Файл создаётся при первом сбросе. Потокобезопасен: события можно писать из нескольких потоков.
+    """
+    def __init__(
+        self,
+        path: str,
+        flush_events: int = 1,
+        flush_interval: float = 1.0,
+        fsync: str = "none",
+        max_bytes: Optional[int] = None,
+        max_age: Optional[float] = None,
+        background: bool = False
+    ):
+        if flush_events < 1:
+            raise ValueError("flush_events должен быть не меньше 1")
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Неизвестная политика fsync '{fsync}'. Доступные: {list(FSYNC_POLICIES)}")
+        self.path = path
+        self.flush_events = flush_events
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.background = background
+        self.segments: List[str] = []  # файлы, закрытые ротацией, по порядку
+        self._file = None
+        self._opened_at = 0.0
+        self._size = 0
+        self._buffer: List[Dict[str, Any]] = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.RLock()
+        self._closed = False
+        self._stats = dict.fromkeys(("events", "bytes", "flushes", "fsyncs", "rotations"), 0)
+        self._queue: Optional[queue.SimpleQueue] = None
+        self._writer: Optional[threading.Thread] = None
+        if background:
+            self._queue = queue.SimpleQueue()
+            self._writer = threading.Thread(target=self._drain, name="session-log", daemon=True)
+            self._writer.start()
+        # Буфер сбрасывается и при обычном завершении процесса без close()
+        atexit.register(self.close)
+
+    @classmethod
+    def from_env(cls, path: str) -> "SessionLog":
+        """
+        Политика из окружения: SESSION_LOG_FLUSH_EVENTS, SESSION_LOG_FLUSH_INTERVAL (с),
+        SESSION_LOG_FSYNC (none/flush), SESSION_LOG_MAX_BYTES, SESSION_LOG_MAX_AGE (с),
+        SESSION_LOG_BACKGROUND (1 — фоновый поток записи).
+        """
+        max_bytes = os.getenv("SESSION_LOG_MAX_BYTES")
+        max_age = os.getenv("SESSION_LOG_MAX_AGE")
+        return cls(
+            path,
+            flush_events=int(os.getenv("SESSION_LOG_FLUSH_EVENTS", "1")),
+            flush_interval=float(os.getenv("SESSION_LOG_FLUSH_INTERVAL", "1.0")),
+            fsync=os.getenv("SESSION_LOG_FSYNC", "none").lower(),
+            max_bytes=int(max_bytes) if max_bytes else None,
+            max_age=float(max_age) if max_age else None,
+            background=os.getenv("SESSION_LOG_BACKGROUND", "0").lower() in ("1", "true", "yes")
+        )
+
+    def log(self, role: str, content: str):
+        """Добавляет событие; в файл оно попадает по политике сброса."""
+        event = {
+            "timestamp": datetime.now().isoformat(timespec="microseconds"),
+            "mono_us": monotonic_us(),
+            "role": role,
+            "content": content
+        }
+        if self._closed:
+            raise ValueError("Журнал сессии закрыт")
+        if self._queue is not None:
+            self._queue.put(event)
+            return
+        with self._lock:
+            self._buffer.append(event)
+            if len(self._buffer) >= self.flush_events or time.monotonic() - self._last_flush >= self.flush_interval:
+                self._flush_locked()
+
+    def flush(self):
+        """Сбрасывает в файл всё, что уже записано через log() (в фоновом режиме — дожидается записи)."""
+        if self._queue is not None and self._writer is not None and self._writer.is_alive():
+            done = threading.Event()
+            self._queue.put(done)
+            done.wait()
+            return
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        """Сбрасывает буфер и закрывает файл. Повторный вызов ничего не делает."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        if self._writer is not None:
+            self._queue.put(_CLOSE)
+            self._writer.join()
+        with self._lock:
+            self._flush_locked()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        atexit.unregister(self.close)
+
+    def __enter__(self) -> "SessionLog":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def files(self) -> List[str]:
+        """Все файлы журнала по порядку: закрытые ротацией и текущий."""
+        with self._lock:
+            return self.segments + ([self.path] if os.path.exists(self.path) else [])
+
+    def events(self) -> List[Dict[str, Any]]:
+        """Читает все события журнала из файлов (для отладки и тестов; при записи в памяти они не хранятся)."""
+        if not self._closed:
+            self.flush()
+        events = []
+        for path in self.files():
+            with open(path, encoding="utf-8") as f:
+                events.extend(json.loads(line) for line in f if line.strip())
+        return events
+
+    def stats(self) -> Dict[str, int]:
+        """Счётчики: events, bytes, flushes, fsyncs, rotations."""
+        with self._lock:
+            return dict(self._stats)
+
+    # --- Запись ---
+
+    def _drain(self):
+        """Фоновый поток: забирает события из очереди и пишет их по той же политике сброса."""
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                with self._lock:
+                    self._flush_locked()
+                continue
+            with self._lock:
+                if item is _CLOSE:
+                    self._flush_locked()
+                    return
+                if isinstance(item, threading.Event):
+                    self._flush_locked()
+                    item.set()
+                    continue
+                self._buffer.append(item)
+                if len(self._buffer) >= self.flush_events or time.monotonic() - self._last_flush >= self.flush_interval:
+                    self._flush_locked()
+
+    def _flush_locked(self):
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+        data = "".join(json.dumps(event, ensure_ascii=False) + "\n" for event in self._buffer).encode("utf-8")
+        self._stats["events"] += len(self._buffer)
+        self._buffer.clear()
+        self._rotate_if_needed(len(data))
+        if self._file is None:
+            self._open()
+        self._file.write(data)
+        self._file.flush()
+        self._size += len(data)
+        self._stats["bytes"] += len(data)
+        self._stats["flushes"] += 1
+        if self.fsync == "flush":
+            os.fsync(self._file.fileno())
+            self._stats["fsyncs"] += 1
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, "ab")
+        self._size = self._file.tell()
+        self._opened_at = time.monotonic()
+
+    def _rotate_if_needed(self, incoming: int):
+        if self._file is None or self._size == 0:
+            return
+        too_big = self.max_bytes is not None and self._size + incoming > self.max_bytes
+        too_old = self.max_age is not None and time.monotonic() - self._opened_at >= self.max_age
+        if not (too_big or too_old):
+            return
+        self._file.close()
+        self._file = None
+        stem, ext = os.path.splitext(self.path)
+        target = f"{stem}.{len(self.segments) + 1}{ext}"
+        os.replace(self.path, target)
+        self.segments.append(target)
+        self._stats["rotations"] += 1
@@ -0,0 +1,138 @@
+"""
+Таблица сессий серверного режима: сессии по id с вытеснением
+- по простою (ttl — сколько секунд сессия может не получать запросов);
+- по числу (max_sessions — дольше всех не использованная вытесняется первой, LRU);
+- по памяти (max_memory — суммарная оценка памяти сессий, байты; см. DialogSession.memory_bytes).
+Вытесненная сессия закрывается (освобождается её учёт метрик), запросы к ней получают «не найдена».
+
+Таблицу использует один event loop, поэтому замки не нужны.
+"""
+
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+
+class SessionTable:
+    """
+    Сессии в порядке последнего использования (см. описание модуля).
+    clock — источник времени (для тестов); по умолчанию time.monotonic.
+    """
+    def __init__(
+        self,
+        ttl: float = 1800.0,
+        max_sessions: int = 10000,
+        max_memory: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        if max_sessions < 1:
+            raise ValueError("max_sessions должен быть не меньше 1")
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_memory = max_memory
+        self.clock = clock
+        # id → [сессия, время последнего обращения, оценка памяти]
+        self._entries: "OrderedDict[str, list]" = OrderedDict()
+        self.memory = 0
+        self.peak_sessions = 0
+        self._stats = dict.fromkeys(("created", "expired", "evicted_lru", "evicted_memory", "removed"), 0)
+
+    @classmethod
+    def from_env(cls) -> "SessionTable":
+        """SERVER_SESSION_TTL (с), SERVER_MAX_SESSIONS, SERVER_MAX_MEMORY_MB."""
+        max_memory = os.getenv("SERVER_MAX_MEMORY_MB")
+        return cls(
+            ttl=float(os.getenv("SERVER_SESSION_TTL", "1800")),
+            max_sessions=int(os.getenv("SERVER_MAX_SESSIONS", "10000")),
+            max_memory=int(float(max_memory) * 1024 * 1024) if max_memory else None
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._entries
+
+    def add(self, session) -> None:
+        """Добавляет сессию; при необходимости вытесняет старые."""
+        self.sweep()
+        size = session.memory_bytes()
+        self._entries[session.session_id] = [session, self.clock(), size]
+        self.memory += size
+        self._stats["created"] += 1
+        while len(self._entries) > self.max_sessions:
+            self._evict_oldest("evicted_lru")
+        self._enforce_memory(keep=session.session_id)
+        self.peak_sessions = max(self.peak_sessions, len(self._entries))
+
+    def get(self, session_id: str):
+        """Сессия по id (и отметка об использовании); просроченная или неизвестная — KeyError."""
+        entry = self._entries.get(session_id)
+        if entry is None:
+            raise KeyError(f"Сессия '{session_id}' не найдена или истекла")
+        now = self.clock()
+        if now - entry[1] > self.ttl:
+            self._drop(session_id, "expired")
+            raise KeyError(f"Сессия '{session_id}' не найдена или истекла")
+        entry[1] = now
+        self._entries.move_to_end(session_id)
+        return entry[0]
+
+    def touch(self, session_id: str) -> None:
+        """Пересчитывает оценку памяти сессии после шага и применяет лимит памяти."""
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return
+        size = entry[0].memory_bytes()
+        self.memory += size - entry[2]
+        entry[2] = size
+        self._enforce_memory(keep=session_id)
+
+    def remove(self, session_id: str) -> bool:
+        if session_id not in self._entries:
+            return False
+        self._drop(session_id, "removed")
+        return True
+
+    def sweep(self) -> int:
+        """Удаляет сессии, простаивающие дольше ttl; возвращает их число."""
+        deadline = self.clock() - self.ttl
+        expired = 0
+        # Порядок — по последнему обращению, поэтому просроченные — в начале
+        while self._entries:
+            session_id, entry = next(iter(self._entries.items()))
+            if entry[1] >= deadline:
+                break
+            self._drop(session_id, "expired")
+            expired += 1
+        return expired
+
+    def stats(self) -> Dict[str, Any]:
+        """Счётчики, число и память сессий (всего и в среднем на сессию)."""
+        count = len(self._entries)
+        return dict(
+            self._stats,
+            sessions=count,
+            peak_sessions=self.peak_sessions,
+            memory_bytes=self.memory,
+            bytes_per_session=round(self.memory / count) if count else 0,
+        )
+
+    def _enforce_memory(self, keep: str):
+        if self.max_memory is None:
+            return
+        while self.memory > self.max_memory and len(self._entries) > 1:
+            oldest = next(iter(self._entries))
+            if oldest == keep:
+                break
+            self._evict_oldest("evicted_memory")
+
+    def _evict_oldest(self, reason: str):
+        self._drop(next(iter(self._entries)), reason)
+
+    def _drop(self, session_id: str, reason: str):
+        session, _, size = self._entries.pop(session_id)
+        self.memory -= size
+        self._stats[reason] += 1
+        session.close()
@@ -0,0 +1,210 @@
+"""
+Шардированное извлечение для очень больших форм (сотни полей).
+
+Один вызов extract_fields по форме из 300+ полей читает и повторяет их все: ответ генерируется долго,
+упирается в max_tokens и не проходит проверку из-за пропущенных полей. Здесь форма делится на шарды —
+подформы по необязательному атрибуту поля "group" (поля без группы и слишком большие группы режутся
+по shard_size), и ход извлекается параллельными вызовами по шардам с тем же сообщением пользователя.
+Задержка хода определяется размером шарда, а не формы.
+
+Ответ уходит только туда, к чему он относится: в шард поля, о котором спросил код (focus), — а без focus
+(ответ на уточняющий вопрос LLM, исправление) в шарды с невалидными полями — и в шарды полей, упомянутых
+в сообщении (см. app/schema_filter.py). Если так не выбран ни один шард, ответ рассылается шардам с не начатыми
+или невалидными полями, а если и таких нет — всем.
+
+Слияние детерминировано — в порядке шардов в форме, а не в порядке завершения вызовов:
+- шард отвечает только за свои поля, чужие поля в его ответе отбрасываются;
+- если код спрашивал о конкретном поле (focus), а то же новое значение попало ещё и в не начатые поля
+  других шардов, это эхо ответа — такие записи отменяются;
+- уточняющий вопрос — от первого по порядку формы шарда с невалидным полем;
+- ошибка шарда не теряет результат остальных: его поля остаются как были; если упали все — исключение первого.
+"""
+
+import copy
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from app.models import Form, FormState
+from app.form_registry import CompiledForm, compile_form
+from app.extractor import extract_fields
+from app.prompt_builder import compile_prompt
+from app.schema_filter import last_user_message
+from app.state_store import as_form_state
+
+DEFAULT_SHARD_SIZE = 40
+
+_cache: "OrderedDict[Tuple[int, int], Tuple[Form, List[CompiledForm]]]" = OrderedDict()
+_cache_lock = threading.Lock()
+_CACHE_SIZE = 64
+
+
+def split_fields(form: Form, shard_size: int = DEFAULT_SHARD_SIZE) -> List[List[dict]]:
+    """
+    Делит поля формы на шарды: поля одной группы ("group") — вместе, в порядке первого появления группы;
+    поля без группы идут подряд своими шардами. Группа больше shard_size режется на части.
+    """
+    if shard_size < 1:
+        raise ValueError("shard_size должен быть не меньше 1")
+    groups: "OrderedDict[object, List[dict]]" = OrderedDict()
+    ungrouped = 0
+    for field in form["fields"]:
+        group = field.get("group")
+        if group is None:
+            # Подряд идущие поля без группы — один блок
+            key = ("", ungrouped)
+        else:
+            key = ("group", group)
+            ungrouped += 1
+        groups.setdefault(key, []).append(field)
+    shards = []
+    for fields in groups.values():
+        shards.extend(fields[i:i + shard_size] for i in range(0, len(fields), shard_size))
+    return shards
+
+
+def form_shards(form: Form, shard_size: int = DEFAULT_SHARD_SIZE) -> List[CompiledForm]:
+    """
+    Шарды формы как скомпилированные подформы (id — "<форма>#<номер>").
+    Кэшируются по объекту формы, как compile_prompt: формы после загрузки не изменяются.
+    """
+    key = (id(form), shard_size)
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] is form:
+            _cache.move_to_end(key)
+            return cached[1]
+    shards = [
+        compile_form({
+            "id": f"{form['id']}#{number}",
+            "title": form["title"],
+            "description": form["description"],
+            "fields": [dict(field) for field in fields],
+        })
+        for number, fields in enumerate(split_fields(form, shard_size), start=1)
+    ]
+    with _cache_lock:
+        _cache[key] = (form, shards)
+        if len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+    return shards
+
+
+def select_shards(
+    shards: List[CompiledForm],
+    form: Form,
+    state: FormState,
+    messages: List[Dict[str, str]],
+    focus: Optional[str] = None
+) -> List[int]:
+    """Номера шардов, которые нужно опросить на этом ходе (см. описание модуля)."""
+    text = last_user_message(messages)
+    mentioned = set(compile_prompt(form).field_index().search(text)) if text else set()
+    if focus is not None and focus in state:
+        targets = mentioned | {focus}
+    else:
+        targets = mentioned | {name for name, field_state in state.items() if field_state["status"] == "invalid"}
+    selected = [number for number, shard in enumerate(shards) if not targets.isdisjoint(shard.field_names)]
+    if selected:
+        return selected
+    # Ответ ни к чему не привязан — рассылка по шардам, где ещё есть что заполнять
+    selected = [
+        number for number, shard in enumerate(shards)
+        if any(state[name]["status"] in ("not_started", "invalid") for name in shard.field_order)
+    ]
+    return selected or list(range(len(shards)))
+
+
+def extract_sharded(
+    messages: List[Dict[str, str]],
+    form: Form,
+    state: FormState,
+    shard_size: int = DEFAULT_SHARD_SIZE,
+    focus: Optional[str] = None,
+    concurrency: int = 8,
+    log_callback=None,
+    llm_client=None,
+    history=None,
+    **options
+) -> tuple[FormState, Optional[str]]:
+    """
+    Как extract_fields, но по шардам формы параллельно (не больше concurrency вызовов сразу).
+    focus — поле, о котором спросил код (для отмены эха ответа в другие шарды).
+    Остальные параметры (delta, cache, on_response, relevant_schema) передаются в extract_fields каждого шарда.
+    """
+    state = as_form_state(state)
+    shards = form_shards(form, shard_size)
+    selected = select_shards(shards, form, state, messages, focus)
+    started = time.perf_counter()
+
+    def run(number: int):
+        shard = shards[number]
+        shard_state = {name: state[name] for name in shard.field_order}
+        # У каждого шарда своё окно истории: статистика последней сборки не перемешивается между потоками
+        window = copy.copy(history) if history is not None else None
+        try:
+            return extract_fields(
+                messages, shard, shard_state, log_callback=log_callback, llm_client=llm_client, history=window, **options
+            ), None
+        except Exception as e:
+            return None, e
+
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(selected)))) as pool:
+        results = list(pool.map(run, selected))
+
+    merged: FormState = dict(state)
+    questions: List[Optional[str]] = []
+    errors = []
+    dropped = 0
+    for number, (result, error) in zip(selected, results):
+        shard = shards[number]
+        if error is not None:
+            errors.append(error)
+            if log_callback:
+                log_callback("error", f"Шард {shard['id']}: {error}")
+            continue
+        shard_state, question = result
+        dropped += len(shard_state.keys() - shard.field_names)
+        for name in shard.field_order:
+            merged[name] = shard_state[name]
+        owned_invalid = any(shard_state[name]["status"] == "invalid" for name in shard.field_order)
+        questions.append(question if owned_invalid else None)
+    if len(errors) == len(selected):
+        raise errors[0]
+
+    focus_fields = next((shard.field_names for shard in shards if focus in shard.field_names), frozenset())
+    reverted = _revert_echoes(merged, state, focus, focus_fields)
+    next_question = next((question for question in questions if question), None)
+    if log_callback:
+        log_callback("metric", json.dumps({
+            "metric": "sharded_extraction", "shards": len(shards), "queried": len(selected), "failed": len(errors),
+            "dropped_foreign_fields": dropped, "reverted_echoes": reverted,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+        }, ensure_ascii=False))
+    return merged, next_question
+
+
+def _revert_echoes(merged: FormState, previous: FormState, focus: Optional[str], focus_fields=frozenset()) -> int:
+    """
+    Отменяет запись значения поля focus в не начатые поля других шардов (см. описание модуля).
+    focus_fields — поля шарда с focus: их видел тот же вызов, что и вопрос, и совпадение значения там — не эхо.
+    """
+    if focus is None or focus not in merged:
+        return 0
+    answer = merged[focus]
+    if answer["status"] != "filled" or answer["value"] in (None, "") or answer == previous[focus]:
+        return 0
+    reverted = 0
+    for name, field_state in merged.items():
+        if (
+            name not in focus_fields
+            and name != focus
+            and previous[name]["status"] == "not_started"
+            and field_state["status"] == "filled"
+            and field_state["value"] == answer["value"]
+        ):
+            merged[name] = previous[name]
+            reverted += 1
+    return reverted
@@ -0,0 +1,275 @@
+"""
+Компактное хранилище состояния формы для DialogManager.
+
+Вместо словаря на каждое поле — три столбца (значения, коды статусов в bytearray, признаки optional)
+в порядке полей формы, а также индекс невалидных полей и курсор первого не начатого поля.
+Поэтому следующее поле для вопроса и список невалидных полей находятся без просмотра всей формы,
+а изменения применяются на месте и затрагивают только изменившиеся поля.
+
+Снаружи StateStore ведёт себя как FormState: store[name]["status"], items(), присваивание
+store[name] = {...}. to_dict()/from_dict() переводят его в привычный JSON-вид
+(тот же, что в answers/) и обратно.
+"""
+
+from collections.abc import Mapping, MutableMapping
+from typing import Any, Collection, Dict, Iterator, List, Optional, Sequence
+from app.models import Form, FormState, FieldStatus
+
+# Статус поля хранится одним байтом
+STATUS_NAMES = tuple(status.value for status in FieldStatus)
+STATUS_CODES = {name: code for code, name in enumerate(STATUS_NAMES)}
+NOT_STARTED = STATUS_CODES["not_started"]
+INVALID = STATUS_CODES["invalid"]
+_KEYS = ("value", "status", "optional")
+_MISSING = object()
+
+
+def status_code(status) -> int:
+    """Код статуса по строке или FieldStatus; неизвестный статус — ValueError."""
+    code = STATUS_CODES.get(status)
+    if code is not None:
+        return code
+    try:
+        return STATUS_CODES[FieldStatus(status).value]
+    except ValueError:
+        raise ValueError(f"Недопустимый статус поля: {status}")
+
+
+class FieldRecord(MutableMapping):
+    """
+    Состояние одного поля — представление строки StateStore с ключами value, status, optional.
+    Изменение через record["status"] = ... сразу обновляет индексы хранилища.
+    """
+    __slots__ = ("_store", "_position")
+
+    def __init__(self, store: "StateStore", position: int):
+        self._store = store
+        self._position = position
+
+    def __getitem__(self, key: str) -> Any:
+        store, position = self._store, self._position
+        if key == "value":
+            return store._values[position]
+        if key == "status":
+            return STATUS_NAMES[store._status[position]]
+        if key == "optional":
+            return bool(store._optional[position])
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value: Any):
+        if key not in _KEYS:
+            raise KeyError(key)
+        self._store._update(self._position, **{key: value})
+
+    def __delitem__(self, key: str):
+        raise TypeError("У состояния поля фиксированный набор ключей: value, status, optional")
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(_KEYS)
+
+    def __len__(self) -> int:
+        return len(_KEYS)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"value": self["value"], "status": self["status"], "optional": self["optional"]}
+
+    def __repr__(self) -> str:
+        return repr(self.to_dict())
+
+
+class StateStore(MutableMapping):
+    """
+    Состояние формы: имя поля → FieldRecord, в порядке полей формы.
+    Набор полей фиксирован формой: добавлять и удалять поля нельзя.
+
+    - next_pending() — первое по порядку поле в статусе not_started или invalid
+    - with_status(status) — имена полей в статусе, по порядку формы
+    - apply(state) — применяет FormState (например, ответ LLM), меняя только отличающиеся поля
+    - to_dict() / from_dict() — перевод в обычный FormState и обратно
+    """
+    __slots__ = ("_names", "_positions", "_values", "_status", "_optional", "_counts", "_invalid", "_cursor", "_dirty")
+
+    def __init__(self, names: Sequence[str], optional: Sequence[bool] = (), positions: Optional[Mapping] = None):
+        self._names = tuple(names)
+        self._positions = positions if positions is not None else {name: i for i, name in enumerate(self._names)}
+        count = len(self._names)
+        self._values: List[Any] = [None] * count
+        self._status = bytearray(count)  # все поля — not_started (код 0)
+        self._optional = bytearray(bool(flag) for flag in optional) if optional else bytearray(count)
+        if len(self._optional) != count:
+            raise ValueError("Число признаков optional не совпадает с числом полей")
+        self._counts = [0] * len(STATUS_NAMES)
+        self._counts[NOT_STARTED] = count
+        # Невалидных полей обычно единицы — для них отдельное множество позиций
+        self._invalid = set()
+        # Все поля до _cursor уже не в статусе not_started
+        self._cursor = 0
+        # Позиции полей, изменившихся с последнего take_changes() (для контрольных точек)
+        self._dirty = set()
+
+    @classmethod
+    def from_form(cls, form: Form) -> "StateStore":
+        """Начальное состояние формы (как form_loader.init_state): value=None, not_started, optional по required."""
+        names = getattr(form, "field_order", None) or tuple(field["name"] for field in form["fields"])
+        return cls(
+            names,
+            optional=[not field["required"] for field in form["fields"]],
+            positions=getattr(form, "field_position", None)
+        )
+
+    @classmethod
+    def from_dict(cls, state: FormState, form: Optional[Form] = None) -> "StateStore":
+        """Хранилище из FormState (например, из файла answers/); порядок полей — по форме, если она дана."""
+        store = cls.from_form(form) if form is not None else cls(list(state))
+        store.apply(state)
+        return store
+
+    # --- FormState-совместимый интерфейс ---
+
+    def __getitem__(self, name: str) -> FieldRecord:
+        return FieldRecord(self, self._positions[name])
+
+    def __setitem__(self, name: str, field_state: Mapping):
+        position = self._positions.get(name)
+        if position is None:
+            raise KeyError(f"В форме нет поля '{name}'")
+        self._update(
+            position,
+            value=field_state["value"],
+            status=field_state["status"],
+            optional=field_state.get("optional", _MISSING)
+        )
+
+    def __delitem__(self, name: str):
+        raise TypeError("Набор полей состояния фиксирован формой")
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._names)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __contains__(self, name) -> bool:
+        return name in self._positions
+
+    def __repr__(self) -> str:
+        return f"StateStore({self.to_dict()!r})"
+
+    # --- Изменения ---
+
+    def _update(self, position: int, value: Any = _MISSING, status: Any = _MISSING, optional: Any = _MISSING) -> bool:
+        """Меняет поле на месте; возвращает True, если что-то изменилось."""
+        changed = False
+        if value is not _MISSING and self._values[position] != value:
+            self._values[position] = value
+            changed = True
+        if optional is not _MISSING and self._optional[position] != bool(optional):
+            self._optional[position] = bool(optional)
+            changed = True
+        if status is not _MISSING:
+            changed = self._set_status(position, status_code(status)) or changed
+        if changed:
+            self._dirty.add(position)
+        return changed
+
+    def _set_status(self, position: int, code: int) -> bool:
+        old = self._status[position]
+        if old == code:
+            return False
+        self._status[position] = code
+        self._dirty.add(position)
+        self._counts[old] -= 1
+        self._counts[code] += 1
+        if old == INVALID:
+            self._invalid.discard(position)
+        elif code == INVALID:
+            self._invalid.add(position)
+        if code == NOT_STARTED and position < self._cursor:
+            self._cursor = position
+        return True
+
+    def set(self, name: str, value: Any = _MISSING, status: Any = _MISSING, optional: Any = _MISSING) -> bool:
+        """Меняет отдельные ключи поля; возвращает True, если поле изменилось."""
+        return self._update(self._positions[name], value=value, status=status, optional=optional)
+
+    def apply(self, state: Mapping) -> List[str]:
+        """
+        Применяет FormState на месте и возвращает имена изменившихся полей.
+        Поля, которых нет в форме, пропускаются; optional можно не указывать.
+        """
+        changed = []
+        positions, values, status, optional = self._positions, self._values, self._status, self._optional
+        codes = STATUS_CODES
+        for name, field_state in state.items():
+            position = positions.get(name)
+            if position is None:
+                continue
+            value = field_state["value"]
+            code = codes.get(field_state["status"])
+            if code is None:
+                code = status_code(field_state["status"])
+            flag = field_state.get("optional", _MISSING)
+            if status[position] == code and values[position] == value and (flag is _MISSING or optional[position] == bool(flag)):
+                continue
+            self._update(position, value=value, optional=flag)
+            self._set_status(position, code)
+            changed.append(name)
+        return changed
+
+    # --- Индексы ---
+
+    def next_pending(self, skip: Collection[str] = ()) -> Optional[str]:
+        """
+        Первое по порядку формы поле в статусе not_started или invalid (None — все обработаны).
+        skip — поля, которые не предлагать (например, ответ на них ещё разбирается в фоне).
+        """
+        # Курсор только растёт, пока поля не возвращают в not_started, — амортизированно O(1)
+        cursor = self._status.find(NOT_STARTED, self._cursor) if self._counts[NOT_STARTED] else -1
+        self._cursor = cursor if cursor >= 0 else len(self._names)
+        invalid = min(self._invalid, default=-1)
+        if skip:
+            skipped = {self._positions[name] for name in skip}
+            while cursor in skipped:
+                cursor = self._status.find(NOT_STARTED, cursor + 1)
+            invalid = min((position for position in self._invalid if position not in skipped), default=-1)
+        candidates = [position for position in (cursor, invalid) if position >= 0]
+        return self._names[min(candidates)] if candidates else None
+
+    def with_status(self, status) -> List[str]:
+        """Имена полей в указанном статусе, в порядке формы."""
+        code = status_code(status)
+        if code == INVALID:
+            return [self._names[position] for position in sorted(self._invalid)]
+        names, found, position = self._names, [], self._status.find(code)
+        while position >= 0:
+            found.append(names[position])
+            position = self._status.find(code, position + 1)
+        return found
+
+    def counts(self) -> Dict[str, int]:
+        """Число полей в каждом статусе."""
+        return dict(zip(STATUS_NAMES, self._counts))
+
+    def take_changes(self) -> FormState:
+        """Поля, изменившиеся с прошлого вызова (в виде FormState, по порядку формы); счётчик изменений сбрасывается."""
+        dirty, self._dirty = self._dirty, set()
+        values, status, optional = self._values, self._status, self._optional
+        return {
+            self._names[i]: {"value": values[i], "status": STATUS_NAMES[status[i]], "optional": bool(optional[i])}
+            for i in sorted(dirty)
+        }
+
+    # --- Сериализация ---
+
+    def to_dict(self) -> FormState:
+        """Обычный FormState — тот же JSON-вид, что сохраняется в answers/."""
+        values, status, optional = self._values, self._status, self._optional
+        return {
+            name: {"value": values[i], "status": STATUS_NAMES[status[i]], "optional": bool(optional[i])}
+            for i, name in enumerate(self._names)
+        }
+
+
+def as_form_state(state) -> FormState:
+    """FormState для кода, которому нужен обычный dict (сериализация в промпт, слияние delta)."""
+    return state.to_dict() if isinstance(state, StateStore) else state
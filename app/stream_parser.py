@@ -0,0 +1,168 @@
+"""
+Инкрементальный разбор потокового JSON-ответа LLM.
+Получает текст порциями и сообщает о готовых значениях, не дожидаясь конца генерации:
+- каждое поле из 'state' — как только закрыт его объект,
+- 'next_question' — как только закрыта его строка (или прочитан null).
+"""
+
+import json
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+# Событие разбора: ("field", имя поля, состояние) или ("next_question", None, вопрос)
+ParseEvent = Tuple[str, Optional[str], Any]
+
+_WHITESPACE = " \t\r\n"
+
+
+class StreamingResponseParser:
+    """
+    Однопроходный разбор объекта {"state": {...}, "next_question": ...} по мере поступления текста.
+    Текст до первой '{' (например, ```json) пропускается. Каждый символ просматривается один раз.
+    """
+    def __init__(self):
+        self.buffer = ""
+        self.fields: Dict[str, Any] = {}
+        self.next_question: Optional[str] = None
+        self.has_next_question = False
+        self.top_keys: Set[str] = set()
+        self.done = False
+
+        self._pos = 0
+        self._stack: List[str] = []      # открытые контейнеры: '{' или '['
+        self._keys: List[Optional[str]] = []  # текущий ключ на каждом уровне
+        self._expect_key = False
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._string_is_key = False
+        self._awaiting_value = False
+        self._value_start: Optional[int] = None
+        self._value_depth = 0
+
+    def feed(self, chunk: str) -> List[ParseEvent]:
+        """
+        Добавляет очередную порцию текста и возвращает события для значений, завершённых в ней.
+        """
+        self.buffer += chunk
+        events: List[ParseEvent] = []
+        buffer = self.buffer
+        i = self._pos
+        end = len(buffer)
+
+        while i < end and not self.done:
+            c = buffer[i]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._string_is_key:
+                        self._keys[-1] = self._loads(buffer[self._string_start:i + 1])
+                        if len(self._stack) == 1 and self._keys[-1] is not None:
+                            self.top_keys.add(self._keys[-1])
+                        self._expect_key = False
+                    elif self._value_start == self._string_start:
+                        self._finish_value(buffer[self._value_start:i + 1], events)
+                i += 1
+                continue
+
+            if not self._stack:
+                # До корневого объекта — markdown, пояснения и прочий мусор
+                if c == "{":
+                    self._open(c)
+                i += 1
+                continue
+
+            if c in _WHITESPACE:
+                i += 1
+                continue
+
+            if self._awaiting_value:
+                self._awaiting_value = False
+                if self._is_tracked():
+                    self._value_start = i
+                    self._value_depth = len(self._stack)
+
+            if c == '"':
+                self._in_string = True
+                self._string_start = i
+                self._string_is_key = self._stack[-1] == "{" and self._expect_key
+            elif c in "{[":
+                self._open(c)
+            elif c in "}]":
+                self._finish_literal(buffer, i, events)
+                self._stack.pop()
+                self._keys.pop()
+                if self._value_start is not None and len(self._stack) == self._value_depth:
+                    self._finish_value(buffer[self._value_start:i + 1], events)
+                if not self._stack:
+                    self.done = True
+            elif c == ":":
+                self._awaiting_value = True
+            elif c == ",":
+                self._finish_literal(buffer, i, events)
+                if self._stack[-1] == "{":
+                    self._expect_key = True
+                else:
+                    self._awaiting_value = True
+            i += 1
+
+        self._pos = i
+        return events
+
+    def _open(self, c: str):
+        self._stack.append(c)
+        self._keys.append(None)
+        self._expect_key = c == "{"
+        self._awaiting_value = c == "["
+
+    def _is_tracked(self) -> bool:
+        """Отслеживаются значение next_question и значения полей внутри state."""
+        depth = len(self._stack)
+        if depth == 1:
+            return self._keys[0] == "next_question"
+        if depth == 2:
+            return self._keys[0] == "state" and self._stack[1] == "{"
+        return False
+
+    def _finish_literal(self, buffer: str, i: int, events: List[ParseEvent]):
+        """Закрывает отслеживаемое значение-литерал (null, true, число), которое кончается на ',' или '}'."""
+        if self._value_start is not None and len(self._stack) == self._value_depth:
+            self._finish_value(buffer[self._value_start:i].strip(), events)
+
+    def _finish_value(self, raw: str, events: List[ParseEvent]):
+        self._value_start = None
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError:
+            return
+        if self._value_depth == 1:
+            self.next_question = value
+            self.has_next_question = True
+            events.append(("next_question", None, value))
+        else:
+            name = self._keys[1]
+            self.fields[name] = value
+            events.append(("field", name, value))
+
+    @staticmethod
+    def _loads(raw: str) -> Optional[str]:
+        try:
+            return json.loads(raw)
+        except json.JSONDecodeError:
+            return None
+
+    def result(self) -> Dict[str, Any]:
+        """
+        Собранный на текущий момент ответ в форме {"state": ..., "next_question": ...}
+        (ключи включаются, только если они встретились в потоке).
+        """
+        parsed: Dict[str, Any] = {}
+        if "state" in self.top_keys:
+            parsed["state"] = dict(self.fields)
+        if self.has_next_question:
+            parsed["next_question"] = self.next_question
+        return parsed
@@ -0,0 +1,42 @@
+"""
+Грубая оценка числа токенов без обращения к токенизатору провайдера.
+Нужна для метрик и бюджетов, где точное значение из usage ещё неизвестно.
+"""
+
+import json
+from typing import Dict, List
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Оценивает число токенов в тексте.
+    Латиница, цифры и пунктуация — около 4 символов на токен,
+    кириллица и прочий не-ASCII текст — около 2 символов на токен.
+    """
+    if not text:
+        return 0
+    ascii_chars = sum(1 for c in text if c < "\x80")
+    other_chars = len(text) - ascii_chars
+    return max(1, round(ascii_chars / 4 + other_chars / 2))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Начало текста, оценка которого (см. estimate_tokens) не больше max_tokens."""
+    budget = max_tokens * 4  # в четвертях токена: символ ASCII — 1, прочий — 2
+    for i, c in enumerate(text):
+        budget -= 1 if c < "\x80" else 2
+        if budget < 0:
+            return text[:i]
+    return text
+
+
+def estimate_messages_tokens(messages: List[Dict[str, str]]) -> int:
+    """
+    Оценивает размер списка сообщений chat-completions, включая служебные токены разметки ролей.
+    """
+    return sum(estimate_tokens(message.get("content") or "") + 4 for message in messages)
+
+
+def estimate_json_tokens(data) -> int:
+    """Оценивает число токенов в компактной JSON-сериализации объекта."""
+    return estimate_tokens(json.dumps(data, ensure_ascii=False))
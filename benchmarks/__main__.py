@@ -0,0 +1,91 @@
+"""
+Запуск всех бенчмарков с сохранением результатов в JSON:
+
+    python -m benchmarks                       # все, результат в benchmarks/results/<время>.json
+    python -m benchmarks --only extract,prompt --output results.json
+    python -m benchmarks --quick               # меньше повторений, для проверки в CI
+
+Результат — {"meta": {...}, "results": {имя: отчёт}}; такие файлы удобно сравнивать между коммитами.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+from benchmarks import bench_answers, bench_ask, bench_checkpoint, bench_dialog, bench_extract, bench_prompt, bench_server, bench_session_log, bench_shard, bench_startup, bench_structured, bench_state, bench_transport
+
+BENCHMARKS = {
+    "extract": (bench_extract.run, {"repeat": 2000}, {"repeat": 100}),
+    "prompt": (bench_prompt.run, {"repeat": 2000}, {"repeat": 100}),
+    "ask": (bench_ask.run, {"requests_total": 200}, {"requests_total": 20, "concurrency": (1, 4)}),
+    "transport": (bench_transport.run, {"turns": 50}, {"turns": 5, "handshake_ms": 10.0}),
+    "dialog": (bench_dialog.run, {"sessions": 5}, {"sessions": 1, "latency": "const:0", "think": 0.0}),
+    "startup": (bench_startup.run, {"runs": 10}, {"runs": 2}),
+    "checkpoint": (bench_checkpoint.run, {"fields": 200, "turns": 200}, {"fields": 50, "turns": 30}),
+    "server": (
+        bench_server.run,
+        {"sessions": 200, "concurrency": 50, "idle_sessions": 2000},
+        {"sessions": 10, "concurrency": 5, "idle_sessions": 50, "latency": "const:0"}
+    ),
+    "shard": (bench_shard.run, {"sizes": (60, 150, 300)}, {"sizes": (60,), "repeat": 2, "token_delay": 0.00005}),
+    "structured": (bench_structured.run, {"repeat": 2000, "turns": 200}, {"repeat": 100, "turns": 20}),
+    "answers": (bench_answers.run, {"rows": 1_000_000}, {"rows": 20000, "per_commit": 200, "files": 1000, "repeat": 200}),
+    "session_log": (bench_session_log.run, {"events": 2000}, {"events": 100}),
+    "state": (bench_state.run, {"fields": 500, "sessions": 1000}, {"fields": 100, "sessions": 50, "repeat": 20}),
+}
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(names=None, quick: bool = False) -> dict:
+    results = {}
+    for name in names or BENCHMARKS:
+        if name not in BENCHMARKS:
+            raise ValueError(f"Неизвестный бенчмарк '{name}'. Доступные: {list(BENCHMARKS)}")
+        func, full_kwargs, quick_kwargs = BENCHMARKS[name]
+        start = time.perf_counter()
+        results[name] = func(**(quick_kwargs if quick else full_kwargs))
+        results[name]["wall_s"] = round(time.perf_counter() - start, 3)
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "quick": quick,
+        },
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Набор бенчмарков llm-form-filling")
+    parser.add_argument("--only", help="Имена бенчмарков через запятую: " + ", ".join(BENCHMARKS))
+    parser.add_argument("--output", help="Файл для JSON-результата (по умолчанию benchmarks/results/<время>.json, '-' — stdout)")
+    parser.add_argument("--quick", action="store_true", help="Сокращённые прогоны")
+    args = parser.parse_args()
+    report = run(args.only.split(",") if args.only else None, quick=args.quick)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output == "-":
+        print(text)
+        return
+    output = args.output or os.path.join("benchmarks", "results", time.strftime("%Y%m%d_%H%M%S") + ".json")
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        f.write(text)
+    print(f"Результаты записаны в {output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Бенчмарк хранилища результатов (app/answer_store.py) против файла answers/*.json на каждую сессию.
+
+1. Загрузка: записей в секунду при фиксации каждой записи отдельно (batch_size=1, put с ожиданием),
+   при групповой фиксации массовой загрузки и при одновременном сохранении из threads потоков с ожиданием
+   (как подтверждённые сессии сервера), а также запись отдельных JSON-файлов.
+2. Запросы к хранилищу из rows записей (forms форм, равномерно по времени): запись по session_id,
+   последние 100 записей формы за час, число записей формы — задержки p50/p95.
+3. Выгрузка: все записи одной формы в JSONL из хранилища против обхода каталога JSON-файлов
+   (glob и чтение каждого файла) — записей в секунду.
+
+Запуск:
+    python -m benchmarks.bench_answers --rows 1000000 --fields 8
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from typing import Dict, Iterator
+
+from app.answer_store import AnswerStore, answer_record, export_jsonl
+from benchmarks.common import measure, summarize
+
+START = 1_700_000_000.0
+
+
+def _records(count: int, forms: int, fields: int, offset: int = 0, span: float = 86400.0 * 365) -> Iterator[dict]:
+    """count записей forms форм с fields заполненными полями, saved_at — равномерно за span секунд."""
+    for i in range(offset, offset + count):
+        state = {f"Поле {k}": {"value": f"Значение {i}-{k}", "status": "filled", "optional": False} for k in range(fields)}
+        yield answer_record({"id": f"form_{i % forms}"}, f"session_{i}", state, saved_at=START + span * i / (offset + count))
+
+
+def _rate(count: int, seconds: float) -> float:
+    return round(count / seconds, 1) if seconds else 0.0
+
+
+def ingest(directory: str, rows: int, forms: int, fields: int, per_commit: int, threads: int, files: int) -> Dict[str, object]:
+    results = {}
+    with AnswerStore(os.path.join(directory, "per_commit.sqlite"), batch_size=1) as store:
+        started = time.perf_counter()
+        for record in _records(per_commit, forms, fields):
+            store.put(record, wait=True)
+        results["commit_per_record"] = {"records": per_commit, "records_per_s": _rate(per_commit, time.perf_counter() - started)}
+
+    per_thread = max(1, per_commit // threads)
+    with AnswerStore(os.path.join(directory, "concurrent.sqlite")) as store:
+        def save(worker: int):
+            for record in _records(per_thread, forms, fields, offset=worker * per_thread):
+                store.put(record, wait=True)
+
+        workers = [threading.Thread(target=save, args=(worker,)) for worker in range(threads)]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+        stats = store.stats()
+        results["group_commit_concurrent"] = {
+            "threads": threads, "records": stats["records"], "records_per_s": _rate(stats["records"], elapsed),
+            "records_per_commit": round(stats["records"] / stats["commits"], 1),
+        }
+
+    store = AnswerStore(os.path.join(directory, "answers.sqlite"))
+    started = time.perf_counter()
+    for record in _records(rows, forms, fields):
+        store.put(record)
+    store.flush()
+    elapsed = time.perf_counter() - started
+    stats = store.stats()
+    results["group_commit_bulk"] = {
+        "records": rows, "records_per_s": _rate(rows, elapsed), "seconds": round(elapsed, 2),
+        "records_per_commit": round(stats["records"] / stats["commits"], 1),
+        "db_mb": round(sum(os.path.getsize(path) for path in glob.glob(store.path + "*")) / 2 ** 20, 1),
+    }
+
+    answers_dir = os.path.join(directory, "answers")
+    os.makedirs(answers_dir)
+    started = time.perf_counter()
+    for record in _records(files, forms, fields):
+        with open(os.path.join(answers_dir, f"{record['form_id']}_{record['session_id']}.json"), "w", encoding="utf-8") as f:
+            json.dump(record["state"], f, ensure_ascii=False, indent=2)
+    results["json_files"] = {"records": files, "records_per_s": _rate(files, time.perf_counter() - started)}
+    return {"ingest": results, "store": store, "answers_dir": answers_dir}
+
+
+def queries(store: AnswerStore, rows: int, forms: int, repeat: int, seed: int) -> Dict[str, object]:
+    rng = random.Random(seed)
+    span = 86400.0 * 365
+
+    def by_session():
+        store.get(f"session_{rng.randrange(rows)}")
+
+    def recent_hour():
+        since = START + rng.random() * (span - 3600)
+        list(store.query(form_id=f"form_{rng.randrange(forms)}", since=since, until=since + 3600, limit=100))
+
+    def count_form():
+        store.count(f"form_{rng.randrange(forms)}")
+
+    return {
+        "get_by_session": summarize(measure(by_session, repeat)),
+        "form_hour_range": summarize(measure(recent_hour, repeat)),
+        "count_form": summarize(measure(count_form, max(1, repeat // 100))),
+    }
+
+
+def export(directory: str, store: AnswerStore, answers_dir: str) -> Dict[str, object]:
+    started = time.perf_counter()
+    with open(os.path.join(directory, "form_0.jsonl"), "w", encoding="utf-8") as out:
+        exported = export_jsonl(store.query(form_id="form_0"), out)
+    store_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    scanned = 0
+    for path in glob.glob(os.path.join(answers_dir, "form_0_*.json")):
+        with open(path, encoding="utf-8") as f:
+            json.load(f)
+        scanned += 1
+    files_elapsed = time.perf_counter() - started
+    return {
+        "store_jsonl": {"records": exported, "records_per_s": _rate(exported, store_elapsed)},
+        "json_files_scan": {"records": scanned, "records_per_s": _rate(scanned, files_elapsed)},
+    }
+
+
+def run(
+    rows: int = 1_000_000,
+    forms: int = 10,
+    fields: int = 8,
+    per_commit: int = 2000,
+    threads: int = 16,
+    files: int = 20000,
+    repeat: int = 2000,
+    seed: int = 1
+) -> Dict[str, object]:
+    with tempfile.TemporaryDirectory() as directory:
+        loaded = ingest(directory, rows, forms, fields, per_commit, threads, files)
+        store = loaded["store"]
+        try:
+            return {
+                "benchmark": "answers", "rows": rows, "forms": forms, "fields": fields,
+                "ingest": loaded["ingest"],
+                "queries": queries(store, rows, forms, repeat, seed),
+                "export": export(directory, store, loaded["answers_dir"]),
+            }
+        finally:
+            store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк хранилища результатов")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Записей в хранилище для запросов и выгрузки")
+    parser.add_argument("--forms", type=int, default=10, help="Число разных форм")
+    parser.add_argument("--fields", type=int, default=8, help="Заполненных полей в записи")
+    parser.add_argument("--per-commit", type=int, default=2000, help="Записей в прогонах с ожиданием фиксации каждой")
+    parser.add_argument("--threads", type=int, default=16, help="Потоков, одновременно сохраняющих записи")
+    parser.add_argument("--files", type=int, default=20000, help="Записей в варианте с JSON-файлом на сессию")
+    parser.add_argument("--repeat", type=int, default=2000, help="Повторений каждого запроса")
+    parser.add_argument("--seed", type=int, default=1, help="Seed случайных запросов")
+    args = parser.parse_args()
+    report = run(args.rows, args.forms, args.fields, args.per_commit, args.threads, args.files, args.repeat, args.seed)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Бенчмарк пропускной способности LLMBase.ask против заглушки со случайной задержкой
+и внедрёнными ошибками при разном числе параллельных потоков.
+Каждый уровень прогоняется дважды: без политики устойчивости и с повторами и хеджированием
+(llm/resilience.py), чтобы было видно, как они меняют долю ошибок и хвост задержек.
+
+Запуск:
+    python -m benchmarks.bench_ask --requests 200 --concurrency 1,4,16 --latency lognormal:0.02,0.5 --error-rate 0.02
+"""
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from benchmarks.common import summarize
+from benchmarks.stub_server import StubLLMServer, latency_model
+from llm.openai import OpenAILLM
+from llm.resilience import HedgePolicy, Resilience, RetryPolicy
+from llm.transport import HTTPTransport
+
+
+def _policies() -> Dict[str, Resilience]:
+    return {
+        "plain": Resilience(),
+        "resilient": Resilience(
+            retry=RetryPolicy(max_attempts=3, base_delay=0.01, max_delay=0.1),
+            hedge=HedgePolicy(percentile=95, min_samples=20)
+        ),
+    }
+
+
+def _run_level(url: str, concurrency: int, requests_total: int, resilience: Resilience) -> Dict[str, object]:
+    transport = HTTPTransport(pool_maxsize=max(concurrency, 1) * 2)
+    llm = OpenAILLM(api_key="stub", api_url=url, model="stub", transport=transport, resilience=resilience)
+    messages = [{"role": "user", "content": "Иванов"}]
+    timings: List[float] = []
+    errors = 0
+    lock = threading.Lock()
+
+    def call(_):
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            llm.ask(messages)
+            ok = True
+        except (RuntimeError, ValueError):
+            ok = False
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            timings.append(elapsed)
+            if not ok:
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(call, range(requests_total)))
+    wall = time.perf_counter() - started
+    transport.close()
+    return dict(
+        summarize(timings),
+        concurrency=concurrency,
+        throughput_per_s=round(requests_total / wall, 2),
+        errors=errors,
+        error_rate=round(errors / requests_total, 4),
+        resilience=resilience.stats(),
+    )
+
+
+def run(requests_total: int = 200, concurrency=(1, 4, 16), latency: str = "lognormal:0.02,0.5",
+        error_rate: float = 0.02, seed: int = 1) -> Dict[str, object]:
+    levels = []
+    with StubLLMServer(latency=latency_model(latency, seed=seed), error_rate=error_rate, seed=seed) as stub:
+        for level in concurrency:
+            for policy, resilience in _policies().items():
+                levels.append(dict(_run_level(stub.url, level, requests_total, resilience), policy=policy))
+        connections = stub.connections
+    return {
+        "benchmark": "ask",
+        "requests": requests_total,
+        "latency": latency,
+        "injected_error_rate": error_rate,
+        "connections": connections,
+        "levels": levels,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк пропускной способности LLMBase.ask")
+    parser.add_argument("--requests", type=int, default=200, help="Запросов на каждый уровень параллелизма")
+    parser.add_argument("--concurrency", default="1,4,16", help="Уровни параллелизма через запятую")
+    parser.add_argument("--latency", default="lognormal:0.02,0.5", help="Распределение задержки заглушки (см. latency_model)")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="Доля запросов, завершающихся ошибкой 500")
+    args = parser.parse_args()
+    levels = [int(v) for v in args.concurrency.split(",")]
+    print(json.dumps(run(args.requests, levels, args.latency, args.error_rate), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
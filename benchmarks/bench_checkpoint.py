@@ -0,0 +1,91 @@
+"""
+Бенчмарк контрольных точек диалога: стоимость сохранения одного хода
+(дозапись изменений в checkpoints/<сессия>.jsonl) в сравнении с атомарной перезаписью
+полного снимка state и истории, а также время восстановления сессии из файла.
+Ход — заполнение одного поля синтетической формы и пара сообщений в истории; LLM не вызывается.
+
+Запуск:
+    python -m benchmarks.bench_checkpoint --fields 200 --turns 200
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+from typing import Dict, List
+
+from app.checkpoint import load_checkpoint
+from app.dialog_manager import DialogManager
+from app.form_registry import compile_form
+from app.session_log import SessionLog
+from benchmarks.bench_state import synthetic_form
+from benchmarks.common import summarize
+
+
+def _play(dialog: DialogManager, turns: int, save) -> List[float]:
+    """Проходит turns ходов, после каждого вызывает save(); возвращает время сохранения, мс."""
+    timings = []
+    order = dialog.form.field_order
+    for turn in range(turns):
+        name = order[turn % len(order)]
+        question = f"Введите значение поля '{name}':"
+        dialog.messages.append({"role": "assistant", "content": question})
+        dialog.messages.append({"role": "user", "content": f"ответ {turn}"})
+        dialog.state.set(name, value=f"ответ {turn}", status="filled")
+        start = time.perf_counter()
+        save(question, name)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def _full_snapshot(dialog: DialogManager, path: str):
+    """Прежний по смыслу вариант: каждый ход переписывать всё состояние сессии целиком."""
+    def save(question, field):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"state": dialog.state.to_dict(), "messages": dialog.messages, "question": question}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    return save
+
+
+def run(fields: int = 200, turns: int = 200) -> Dict[str, object]:
+    form = compile_form(synthetic_form(fields))
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir, contextlib.redirect_stdout(io.StringIO()):
+        for name, fsync in (("append", False), ("append_fsync", True)):
+            dialog = DialogManager(
+                form=form, checkpoint_dir=os.path.join(workdir, name), llm_client=object(),
+                session_log=SessionLog(os.path.join(workdir, f"{name}_log.jsonl"))
+            )
+            dialog.checkpoint.fsync = fsync
+            timings = _play(dialog, turns, lambda question, field: dialog.save_checkpoint(question, field, False))
+            dialog.close()
+            start = time.perf_counter()
+            restored = load_checkpoint(dialog.checkpoint.path)
+            load_ms = (time.perf_counter() - start) * 1000
+            assert restored["state"] == dialog.state.to_dict()
+            results[name] = dict(
+                summarize(timings),
+                file_bytes=os.path.getsize(dialog.checkpoint.path),
+                load_ms=round(load_ms, 3)
+            )
+        dialog = DialogManager(form=form, llm_client=object(), session_log=SessionLog(os.path.join(workdir, "log.jsonl")))
+        path = os.path.join(workdir, "snapshot.json")
+        timings = _play(dialog, turns, _full_snapshot(dialog, path))
+        dialog.close()
+        results["full_snapshot"] = dict(summarize(timings), file_bytes=os.path.getsize(path))
+    return {"benchmark": "checkpoint", "fields": fields, "turns": turns, "modes": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк контрольных точек диалога")
+    parser.add_argument("--fields", type=int, default=200, help="Число полей синтетической формы")
+    parser.add_argument("--turns", type=int, default=200, help="Число ходов")
+    args = parser.parse_args()
+    print(json.dumps(run(args.fields, args.turns), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Бенчмарк сквозных сессий DialogManager по сценарию: ответы пользователя подставляются
+вместо input(), LLM — заглушка с шаблонным ответом по контракту {"state", "next_question"}.
+Сравниваются сессии с локальным быстрым путём и без него, а также последовательный и конвейерный
+режимы (pipeline=True, см. app/pipeline.py) по ожиданию пользователя между ответом и следующим вопросом.
+think — сколько «пользователь» думает над каждым ответом: пока он думает, конвейер разбирает предыдущий.
+
+Запуск:
+    python -m benchmarks.bench_dialog --sessions 5 --latency const:0.01 --think 0.05
+"""
+import argparse
+import builtins
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+from app.dialog_manager import DialogManager
+from app.metrics import percentile
+from benchmarks.common import load_forms, sample_value, summarize
+from benchmarks.stub_server import StubLLMServer, form_responder, latency_model
+from llm.openai import OpenAILLM
+from llm.transport import HTTPTransport
+
+
+def run_session(form: dict, llm, fast_path: bool, pipeline: bool = False, think: float = 0.0) -> Tuple[float, List[float]]:
+    """Проходит одну сессию по форме; возвращает её длительность и ожидания следующего вопроса (мс)."""
+    script = iter([sample_value(field) for field in form["fields"]] + ["да"])
+    original_input = builtins.input
+
+    def answer(prompt=""):
+        if think:
+            time.sleep(think)
+        # Если диалог пошёл не по сценарию — выходим, а не зависаем
+        return next(script, "выход")
+
+    builtins.input = answer
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            dialog = DialogManager(form=form, llm_client=llm, fast_path=fast_path, pipeline=pipeline)
+            dialog.run()
+            return (time.perf_counter() - start) * 1000, [wait * 1000 for wait in dialog.turn_waits]
+    finally:
+        builtins.input = original_input
+
+
+def run(sessions: int = 5, latency: str = "const:0.01", think: float = 0.05) -> Dict[str, object]:
+    results = {}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir, StubLLMServer(responder=form_responder, latency=latency_model(latency, seed=1)) as stub:
+        # Сессии сохраняют answers/ и logs/ в текущий каталог
+        os.chdir(workdir)
+        try:
+            llm = OpenAILLM(api_key="stub", api_url=stub.url, model="stub", transport=HTTPTransport())
+            for form_id, form in load_forms().items():
+                results[form_id] = {"fields": len(form["fields"])}
+                for fast_path in (False, True):
+                    requests_before = stub.requests
+                    timings = [run_session(form, llm, fast_path)[0] for _ in range(sessions)]
+                    results[form_id]["fast_path" if fast_path else "llm_only"] = dict(
+                        summarize(timings),
+                        llm_calls_per_session=round((stub.requests - requests_before) / sessions, 2)
+                    )
+                # Ожидание следующего вопроса: каждый ответ идёт в LLM, чтобы сравнение не зависело от быстрого пути
+                for pipeline in (False, True):
+                    runs = [run_session(form, llm, False, pipeline, think) for _ in range(sessions)]
+                    waits = [wait for _, session_waits in runs for wait in session_waits]
+                    results[form_id]["pipeline" if pipeline else "sequential"] = {
+                        "session_ms": summarize([duration for duration, _ in runs]),
+                        "turn_wait_p50_ms": round(percentile(waits, 50), 3),
+                        "turn_wait_p99_ms": round(percentile(waits, 99), 3),
+                        "turn_wait_max_ms": round(max(waits, default=0.0), 3),
+                    }
+        finally:
+            os.chdir(cwd)
+    return {"benchmark": "dialog", "sessions": sessions, "latency": latency, "think": think, "forms": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк сквозных сессий DialogManager")
+    parser.add_argument("--sessions", type=int, default=5, help="Сессий на каждую форму и режим")
+    parser.add_argument("--latency", default="const:0.01", help="Распределение задержки заглушки (см. latency_model)")
+    parser.add_argument("--think", type=float, default=0.05, help="Пауза «пользователя» перед каждым ответом, секунды")
+    args = parser.parse_args()
+    print(json.dumps(run(args.sessions, args.latency, args.think), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
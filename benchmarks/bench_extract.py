@@ -0,0 +1,55 @@
+"""
+Бенчмарк разбора и валидации ответа LLM (parse_llm_response) на формах проекта:
+полный ответ со всеми полями, он же в markdown-блоке и с дефектами генерации
+(текст вокруг, запятая перед скобкой, оборванный хвост), и delta-ответ с одним изменённым полем.
+
+Запуск:
+    python -m benchmarks.bench_extract --repeat 2000
+"""
+import argparse
+import json
+from typing import Dict
+
+from app.extractor import parse_llm_response
+from app.form_loader import init_state
+from app.response_parser import JSON_BACKEND
+from benchmarks.common import load_forms, measure, sample_value, summarize
+
+
+def run(repeat: int = 2000) -> Dict[str, object]:
+    results = {}
+    for form_id, form in load_forms().items():
+        state = init_state(form)
+        filled = {
+            field["name"]: {"value": sample_value(field), "status": "filled", "optional": not field["required"]}
+            for field in form["fields"]
+        }
+        full = json.dumps({"state": filled, "next_question": None}, ensure_ascii=False)
+        first = form["fields"][0]
+        delta = json.dumps(
+            {"state": {first["name"]: {"value": sample_value(first), "status": "filled"}}, "next_question": None},
+            ensure_ascii=False
+        )
+        fenced = f"```json\n{full}\n```"
+        damaged = "Вот результат: " + full[:-1] + ", " + "}\nЕсли нужно, уточните."
+        truncated = full[:-1] + ', "лишнее": "обор'
+        results[form_id] = {
+            "fields": len(form["fields"]),
+            "full": summarize(measure(lambda: parse_llm_response(full, form, state=state), repeat)),
+            "markdown_fenced": summarize(measure(lambda: parse_llm_response(fenced, form, state=state), repeat)),
+            "repaired": summarize(measure(lambda: parse_llm_response(damaged, form, state=state), repeat)),
+            "truncated": summarize(measure(lambda: parse_llm_response(truncated, form, state=state), repeat)),
+            "delta": summarize(measure(lambda: parse_llm_response(delta, form, state=state, delta=True), repeat)),
+        }
+    return {"benchmark": "extract", "repeat": repeat, "json_backend": JSON_BACKEND, "forms": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк разбора ответа LLM")
+    parser.add_argument("--repeat", type=int, default=2000, help="Повторений на каждый вариант")
+    args = parser.parse_args()
+    print(json.dumps(run(args.repeat), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
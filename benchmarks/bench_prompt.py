@@ -0,0 +1,108 @@
+"""
+Бенчмарк сборки промпта: первая сборка для формы (сериализация схемы и инструкций)
+против повторной из кэша, с историей разной длины и с окном истории по бюджету токенов.
+
+Отдельно — размер запроса по ходам сквозного диалога (поля заполняются по порядку, в конце —
+исправление первого поля): полная схема и state против вида формы relevant_schema (app/schema_filter.py).
+
+Запуск:
+    python -m benchmarks.bench_prompt --repeat 2000 --history 40
+"""
+import argparse
+import json
+from typing import Dict
+
+from app.extractor import build_llm_messages
+from app.form_loader import init_state
+from app.history import HistoryWindow
+from app.prompt_builder import SYSTEM_INSTRUCTIONS, CompiledPrompt, compile_prompt
+from app.tokens import estimate_messages_tokens, estimate_tokens
+from benchmarks.common import load_forms, measure, sample_value, summarize
+
+
+def _history(turns: int):
+    messages = []
+    for i in range(turns):
+        messages.append({"role": "assistant", "content": f"Введите значение поля 'Поле {i}':"})
+        messages.append({"role": "user", "content": f"Ответ пользователя номер {i}"})
+    return messages
+
+
+def _dialog_turns(form):
+    """(история, state) на каждом вызове LLM сквозного диалога: ответ на каждое поле, затем исправление первого."""
+    state = init_state(form)
+    messages = []
+    for field in form["fields"]:
+        value = sample_value(field)
+        messages = messages + [
+            {"role": "assistant", "content": f"Введите значение поля '{field['name']}':"},
+            {"role": "user", "content": str(value)},
+        ]
+        yield messages, state
+        state = dict(state, **{field["name"]: {"value": value, "status": "filled", "optional": not field["required"]}})
+    first = form["fields"][0]
+    yield messages + [{"role": "user", "content": f"Исправь {first['name'].lower()} на {sample_value(first)}"}], state
+
+
+def prompt_tokens_per_turn(form) -> Dict[str, object]:
+    """
+    Оценка prompt-токенов на ход: полная схема против relevant_schema.
+    total — весь запрос; schema_state — только то, что меняет режим: префикс без общих инструкций и хвост со state.
+    """
+    prompt = compile_prompt(form)
+    instructions = estimate_tokens(SYSTEM_INSTRUCTIONS)
+    totals = {"full": [], "relevant": []}
+    schema_state = {"full": [], "relevant": []}
+    for messages, state in _dialog_turns(form):
+        for mode, relevant in (("full", False), ("relevant", True)):
+            full_messages = build_llm_messages(messages, form, state, delta=relevant, relevant_schema=relevant)
+            totals[mode].append(estimate_messages_tokens(full_messages))
+            tail = prompt.state_messages(state, messages, relevant)
+            schema_state[mode].append(
+                estimate_tokens(full_messages[0]["content"]) - instructions + estimate_messages_tokens(tail)
+            )
+
+    def mean(values):
+        return round(sum(values) / len(values), 1)
+
+    return {
+        "turns": len(totals["full"]),
+        "total_full_mean": mean(totals["full"]),
+        "total_relevant_mean": mean(totals["relevant"]),
+        "total_saving_percent": round(100 * (1 - sum(totals["relevant"]) / sum(totals["full"])), 1),
+        "schema_state_full_mean": mean(schema_state["full"]),
+        "schema_state_relevant_mean": mean(schema_state["relevant"]),
+        "schema_state_saving_percent": round(100 * (1 - sum(schema_state["relevant"]) / sum(schema_state["full"])), 1),
+    }
+
+
+def run(repeat: int = 2000, history: int = 40) -> Dict[str, object]:
+    messages = _history(history // 2)
+    window = HistoryWindow(max_tokens=4000)
+    results = {}
+    for form_id, form in load_forms().items():
+        state = init_state(form)
+        build_llm_messages(messages, form, state)
+        windowed = build_llm_messages(messages, form, state, history=window)
+        results[form_id] = {
+            "cold": summarize(measure(lambda: CompiledPrompt(form).build_messages(messages, state), repeat)),
+            "warm": summarize(measure(lambda: build_llm_messages(messages, form, state), repeat)),
+            "windowed": summarize(measure(lambda: build_llm_messages(messages, form, state, history=window), repeat)),
+            "estimated_tokens": estimate_messages_tokens(build_llm_messages(messages, form, state)),
+            "estimated_tokens_windowed": estimate_messages_tokens(windowed),
+            "relevant": summarize(measure(lambda: build_llm_messages(messages, form, state, delta=True, relevant_schema=True), repeat)),
+            "prompt_tokens_per_turn": prompt_tokens_per_turn(form),
+        }
+    return {"benchmark": "prompt", "repeat": repeat, "history_messages": len(messages), "forms": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк сборки промпта")
+    parser.add_argument("--repeat", type=int, default=2000, help="Повторений на каждый вариант")
+    parser.add_argument("--history", type=int, default=40, help="Сообщений в истории диалога")
+    args = parser.parse_args()
+    print(json.dumps(run(args.repeat, args.history), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Нагрузочный тест серверного режима (app/server.py) с локальной заглушкой LLM.
+
+Сервер работает в отдельном потоке со своим event loop, клиенты — виртуальные пользователи
+в основном потоке, каждый со своим keep-alive соединением: создаёт сессию, отвечает на все вопросы
+формы и подтверждает данные. Клиент HTTP — минимальный, на asyncio-потоках, чтобы нагрузка
+не тратила процессор процесса на пул соединений клиентской библиотеки.
+Одновременно открыто concurrency диалогов, ещё idle_sessions сессий создаются и остаются
+висеть без ответов — так видно, сколько сессий держит один процесс.
+
+Отчёт: задержка хода глазами клиента (p50/p99), ходов в секунду, оценка памяти на сессию
+и число сессий на гигабайт, пиковое число сессий в таблице, RSS процесса.
+
+Запуск:
+    python -m benchmarks.bench_server --sessions 200 --concurrency 50 --idle-sessions 2000
+"""
+import argparse
+import asyncio
+import json
+import resource
+import threading
+import time
+from typing import Dict, List
+
+from app.form_registry import FormRegistry
+from app.metrics import percentile
+from app.server import DialogServer
+from app.session_table import SessionTable
+from benchmarks.common import FORMS_DIR, load_forms, sample_value
+from benchmarks.stub_server import StubLLMServer, form_responder, latency_model
+from llm.async_base import AsyncHTTPTransport
+from llm.openai import AsyncOpenAILLM
+
+
+class _ServerThread:
+    """DialogServer в фоновом потоке со своим event loop."""
+    def __init__(self, llm_url: str, fast_path: bool, pool_size: int):
+        self.llm_url = llm_url
+        self.pool_size = pool_size
+        self.fast_path = fast_path
+        self.loop = asyncio.new_event_loop()
+        self.ready = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="dialog-server", daemon=True)
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        llm = AsyncOpenAILLM(api_key="stub", api_url=self.llm_url, model="stub", transport=AsyncHTTPTransport(pool_maxsize=self.pool_size))
+        self.server = DialogServer(
+            llm_client=llm, table=SessionTable(max_sessions=1_000_000), registry=FormRegistry(FORMS_DIR),
+            answers_dir=None, fast_path=self.fast_path
+        )
+        self.address = self.loop.run_until_complete(self.server.start("127.0.0.1", 0))
+        self.ready.set()
+        self.loop.run_forever()
+
+    def __enter__(self) -> "_ServerThread":
+        self.thread.start()
+        self.ready.wait()
+        return self
+
+    def call(self, coroutine_function):
+        return asyncio.run_coroutine_threadsafe(coroutine_function(), self.loop).result()
+
+    def __exit__(self, *exc):
+        self.call(self.server.close)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+
+class _Client:
+    """Одно keep-alive соединение с сервером диалогов: JSON-запрос → JSON-ответ."""
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def post(self, path: str, body: dict) -> dict:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        raw = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.writer.write(
+            f"POST {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(raw)}\r\n\r\n".encode("latin-1") + raw
+        )
+        head = (await self.reader.readuntil(b"\r\n\r\n")).decode("latin-1")
+        length = next(int(line.split(":", 1)[1]) for line in head.split("\r\n") if line.lower().startswith("content-length:"))
+        return json.loads(await self.reader.readexactly(length))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+async def _user(client: _Client, form: dict, turns: List[float]) -> bool:
+    """Один пользователь проходит форму до конца; True — данные подтверждены."""
+    answers = {field["name"]: sample_value(field) for field in form["fields"]}
+    step = await client.post("/sessions", {"form": form["id"]})
+    session = step["session"]
+    for _ in range(len(answers) * 3):
+        if step["phase"] != "asking":
+            break
+        text = answers.get(step.get("field"), "первый")
+        start = time.perf_counter()
+        step = await client.post(f"/sessions/{session}/answer", {"text": text})
+        turns.append(time.perf_counter() - start)
+    if step["phase"] != "confirming":
+        return False
+    start = time.perf_counter()
+    step = await client.post(f"/sessions/{session}/confirm", {"confirmed": True})
+    turns.append(time.perf_counter() - start)
+    return step["phase"] == "done"
+
+
+async def _load(host: str, port: int, forms: List[dict], sessions: int, concurrency: int, idle_sessions: int) -> Dict[str, object]:
+    setup = _Client(host, port)
+    for i in range(idle_sessions):
+        await setup.post("/sessions", {"form": forms[i % len(forms)]["id"]})
+    setup.close()
+    turns: List[float] = []
+    queue = list(range(sessions))
+
+    async def worker() -> int:
+        client = _Client(host, port)
+        completed = 0
+        try:
+            while queue:
+                completed += await _user(client, forms[queue.pop() % len(forms)], turns)
+        finally:
+            client.close()
+        return completed
+
+    start = time.perf_counter()
+    completed = await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "completed": sum(completed),
+        "elapsed_s": round(elapsed, 3),
+        "turns": len(turns),
+        "turns_per_s": round(len(turns) / elapsed, 1) if elapsed else 0.0,
+        "turn_p50_ms": round(percentile(turns, 50) * 1000, 2),
+        "turn_p99_ms": round(percentile(turns, 99) * 1000, 2),
+    }
+
+
+def run(
+    sessions: int = 200,
+    concurrency: int = 50,
+    idle_sessions: int = 2000,
+    latency: str = "lognormal:0.05,0.5",
+    fast_path: bool = False
+) -> Dict[str, object]:
+    forms = list(load_forms().values())
+    with StubLLMServer(responder=form_responder, latency=latency_model(latency, seed=1)) as stub, _ServerThread(stub.url, fast_path, concurrency) as server:
+        host, port = server.address
+        result = asyncio.run(_load(host, port, forms, sessions, concurrency, idle_sessions))
+        table = server.call(lambda: asyncio.sleep(0, server.server.table.stats()))
+        llm_requests = stub.requests
+    bytes_per_session = table["bytes_per_session"]
+    return dict(
+        result,
+        benchmark="server",
+        sessions=sessions,
+        concurrency=concurrency,
+        idle_sessions=idle_sessions,
+        latency=latency,
+        fast_path=fast_path,
+        llm_requests=llm_requests,
+        peak_sessions=table["peak_sessions"],
+        bytes_per_session=bytes_per_session,
+        sessions_per_gb=int(2 ** 30 / bytes_per_session) if bytes_per_session else None,
+        max_rss_mb=round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест серверного режима")
+    parser.add_argument("--sessions", type=int, default=200, help="Сколько диалогов пройти до конца")
+    parser.add_argument("--concurrency", type=int, default=50, help="Сколько диалогов идёт одновременно")
+    parser.add_argument("--idle-sessions", type=int, default=2000, help="Сколько сессий создать и оставить без ответов")
+    parser.add_argument("--latency", default="lognormal:0.05,0.5", help="Задержка заглушки LLM (см. latency_model)")
+    parser.add_argument("--fast-path", action="store_true", help="Разбирать однозначные ответы локально, без LLM")
+    args = parser.parse_args()
+    print(json.dumps(run(args.sessions, args.concurrency, args.idle_sessions, args.latency, args.fast_path), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Бенчмарк журнала сессии: сколько стоит запись одного события для цикла диалога
+при разных политиках SessionLog — сброс каждого события, буфер, fsync, фоновый поток —
+в сравнении с прежним списком в памяти. Событие по размеру похоже на llm_raw (ответ LLM).
+
+Запуск:
+    python -m benchmarks.bench_session_log --events 2000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict
+
+from app.session_log import SessionLog
+from benchmarks.common import summarize
+
+POLICIES = {
+    "flush_each": {},
+    "buffered_64": {"flush_events": 64},
+    "fsync_each": {"fsync": "flush"},
+    "background": {"flush_events": 64, "background": True},
+    "background_fsync": {"flush_events": 64, "fsync": "flush", "background": True},
+}
+
+
+def _payload(size: int) -> str:
+    return json.dumps({"Поле": "значение " * (size // 16)}, ensure_ascii=False)
+
+
+def _measure(log_event, events: int, content: str):
+    timings = []
+    for _ in range(events):
+        start = time.perf_counter()
+        log_event("llm_raw", content)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def run(events: int = 2000, size: int = 1024) -> Dict[str, object]:
+    content = _payload(size)
+    results = {}
+
+    memory = []
+    results["memory_list"] = summarize(_measure(
+        lambda role, text: memory.append({"timestamp": datetime.now().isoformat(timespec="microseconds"), "role": role, "content": text}),
+        events, content
+    ))
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, options in POLICIES.items():
+            log = SessionLog(os.path.join(workdir, f"{name}.jsonl"), **options)
+            timings = _measure(log.log, events, content)
+            start = time.perf_counter()
+            log.close()
+            results[name] = dict(summarize(timings), close_ms=round((time.perf_counter() - start) * 1000, 3), **log.stats())
+    return {"benchmark": "session_log", "events": events, "event_bytes": len(content.encode("utf-8")), "policies": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк журнала сессии")
+    parser.add_argument("--events", type=int, default=2000, help="Число событий на политику")
+    parser.add_argument("--size", type=int, default=1024, help="Примерный размер события, байты")
+    args = parser.parse_args()
+    print(json.dumps(run(args.events, args.size), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
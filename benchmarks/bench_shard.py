@@ -0,0 +1,106 @@
+"""
+Бенчмарк шардированного извлечения (app/sharding.py) на синтетических больших формах с локальной заглушкой LLM.
+
+Форма из fields текстовых полей, разбитых на разделы по group_size полей (атрибут "group").
+Ход — середина диалога: первая половина полей заполнена, пользователь отвечает на вопрос о следующем поле.
+Заглушка отвечает через form_responder, а время генерации растёт с длиной ответа (token_delay на токен),
+как у настоящей модели, — поэтому задержка одного вызова по всей форме растёт с числом полей,
+а шардированного хода — определяется размером шарда.
+
+Отчёт по каждому размеру формы: задержка хода без шардов и с шардами (p50/p95), число шардов
+и опрошенных шардов, ускорение и проверка, что ответ попал только в нужное поле.
+
+Запуск:
+    python -m benchmarks.bench_shard --sizes 60,150,300 --repeat 5
+"""
+import argparse
+import json
+from typing import Dict, Sequence
+
+from app.extractor import extract_fields
+from app.form_loader import init_state
+from app.sharding import extract_sharded, form_shards
+from benchmarks.common import measure, summarize
+from benchmarks.stub_server import StubLLMServer, form_responder
+from llm.openai import OpenAILLM
+from llm.transport import HTTPTransport
+
+
+def synthetic_form(fields: int, group_size: int) -> dict:
+    """Форма из fields текстовых полей в разделах по group_size полей."""
+    return {
+        "id": f"synthetic_{fields}",
+        "title": f"Синтетическая форма из {fields} полей",
+        "description": "Большая форма для бенчмарка шардирования",
+        "fields": [
+            {
+                "name": f"Поле {i}", "type": "str", "required": True,
+                "description": f"Значение номер {i}", "group": f"Раздел {i // group_size + 1}"
+            }
+            for i in range(fields)
+        ],
+    }
+
+
+def _turn(form: dict):
+    """(история, state, поле вопроса) хода в середине диалога."""
+    state = init_state(form)
+    half = len(form["fields"]) // 2
+    for field in form["fields"][:half]:
+        state[field["name"]] = {"value": f"Ответ {field['name']}", "status": "filled", "optional": False}
+    focus = form["fields"][half]["name"]
+    messages = [{"role": "assistant", "content": f"Введите значение поля '{focus}':"}, {"role": "user", "content": "Новое значение"}]
+    return messages, state, focus
+
+
+def run(
+    sizes: Sequence[int] = (60, 150, 300),
+    group_size: int = 30,
+    repeat: int = 5,
+    token_delay: float = 0.0002,
+    latency: float = 0.02
+) -> Dict[str, object]:
+    results = {}
+    with StubLLMServer(responder=form_responder, latency=latency, token_delay=token_delay) as stub:
+        llm = OpenAILLM(api_key="stub", api_url=stub.url, model="stub", transport=HTTPTransport(pool_maxsize=32))
+        for size in sizes:
+            form = synthetic_form(size, group_size)
+            messages, state, focus = _turn(form)
+            single, _ = extract_fields(messages, form, state, llm_client=llm)
+            sharded, _ = extract_sharded(messages, form, state, shard_size=group_size, focus=focus, llm_client=llm)
+            changed = {name for name in state if sharded[name] != state[name]}
+            requests_before = stub.requests
+            single_ms = measure(lambda: extract_fields(messages, form, state, llm_client=llm), repeat)
+            requests_single = stub.requests - requests_before
+            sharded_ms = measure(
+                lambda: extract_sharded(messages, form, state, shard_size=group_size, focus=focus, llm_client=llm), repeat
+            )
+            single_summary, sharded_summary = summarize(single_ms), summarize(sharded_ms)
+            results[str(size)] = {
+                "shards": len(form_shards(form, group_size)),
+                "requests_per_turn_sharded": (stub.requests - requests_before - requests_single) // repeat,
+                "single": single_summary,
+                "sharded": sharded_summary,
+                "speedup_p50": round(single_summary["p50_ms"] / sharded_summary["p50_ms"], 2),
+                "same_result": changed == {focus} and sharded[focus] == single[focus],
+            }
+    return {
+        "benchmark": "shard", "group_size": group_size, "repeat": repeat,
+        "token_delay": token_delay, "latency": latency, "sizes": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк шардированного извлечения")
+    parser.add_argument("--sizes", default="60,150,300", help="Размеры форм (число полей) через запятую")
+    parser.add_argument("--group-size", type=int, default=30, help="Полей в разделе формы (и в шарде)")
+    parser.add_argument("--repeat", type=int, default=5, help="Ходов на каждый вариант")
+    parser.add_argument("--token-delay", type=float, default=0.0002, help="Время генерации токена заглушкой, секунды")
+    parser.add_argument("--latency", type=float, default=0.02, help="Задержка заглушки на запрос, секунды")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+    print(json.dumps(run(sizes, args.group_size, args.repeat, args.token_delay, args.latency), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Бенчмарк запуска CLI: время импорта main и время до первого вопроса пользователю.
+Каждый замер — отдельный процесс python, как при настоящем запуске; LLM — локальная заглушка.
+Заодно проверяется, что до первого вопроса не загружаются HTTP-библиотеки провайдеров.
+
+Запуск:
+    python -m benchmarks.bench_startup --runs 10 --form passport.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict
+
+from benchmarks.common import summarize
+from benchmarks.stub_server import StubLLMServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SCRIPT = (
+    "import sys, time; start = time.perf_counter(); import main; "
+    "print((time.perf_counter() - start) * 1000, 'requests' in sys.modules, 'httpx' in sys.modules)"
+)
+
+
+def _env(url: str) -> Dict[str, str]:
+    env = dict(os.environ, LLM_PROVIDER="openai", OPENAI_API_KEY="stub", OPENAI_API_URL=url, PYTHONUNBUFFERED="1")
+    env.pop("LLM_ROUTES", None)
+    return env
+
+
+def measure_import(env: Dict[str, str]) -> Dict[str, object]:
+    """Время импорта main внутри процесса и полное время процесса 'python -c import main', мс."""
+    start = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SCRIPT], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout.split()
+    return {
+        "import_ms": float(output[0]),
+        "process_ms": (time.perf_counter() - start) * 1000,
+        "http_loaded": output[1] == "True" or output[2] == "True",
+    }
+
+
+def measure_first_prompt(env: Dict[str, str], form: str, timeout: float = 30.0) -> float:
+    """Время от запуска 'python main.py -f form' до появления первого вопроса в stdout, мс."""
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "main.py", "-f", form, "--no-prewarm"], cwd=ROOT, env=env,
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            line = process.stdout.readline()
+            if not line:
+                raise RuntimeError(f"CLI завершился, не задав вопрос (код {process.wait()})")
+            if line.startswith("Введите значение"):
+                return (time.perf_counter() - start) * 1000
+        raise RuntimeError("CLI не задал вопрос за отведённое время")
+    finally:
+        process.kill()
+        process.wait()
+
+
+def run(runs: int = 10, form: str = "passport.json") -> Dict[str, object]:
+    imports, processes, prompts = [], [], []
+    http_loaded = False
+    with StubLLMServer() as stub:
+        env = _env(stub.url)
+        for _ in range(runs):
+            result = measure_import(env)
+            imports.append(result["import_ms"])
+            processes.append(result["process_ms"])
+            http_loaded = http_loaded or result["http_loaded"]
+            prompts.append(measure_first_prompt(env, form))
+    return {
+        "benchmark": "startup",
+        "runs": runs,
+        "form": form,
+        "import_main": summarize(imports),
+        "process_import_main": summarize(processes),
+        "first_prompt": summarize(prompts),
+        "http_loaded_on_import": http_loaded,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк запуска CLI")
+    parser.add_argument("--runs", type=int, default=10, help="Число запусков")
+    parser.add_argument("--form", default="passport.json", help="Форма из каталога forms/")
+    args = parser.parse_args()
+    print(json.dumps(run(args.runs, args.form), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Бенчмарк состояния формы: словарь словарей (FormState) против StateStore
+на синтетической форме с большим числом полей и множеством сессий в памяти.
+Меряются память на сессию, поиск следующего поля и невалидных полей, применение ответа LLM.
+
+Запуск:
+    python -m benchmarks.bench_state --fields 500 --sessions 1000
+"""
+import argparse
+import json
+import tracemalloc
+from typing import Dict
+
+from app.form_loader import init_state
+from app.form_registry import compile_form
+from app.state_store import StateStore
+from benchmarks.common import measure, summarize
+
+
+def synthetic_form(fields: int) -> dict:
+    return {
+        "id": f"synthetic_{fields}",
+        "title": "Синтетическая форма",
+        "description": "Форма для бенчмарка",
+        "fields": [
+            {"name": f"Поле {i}", "type": "str", "required": i % 3 != 0, "description": f"Значение поля {i}"}
+            for i in range(fields)
+        ],
+    }
+
+
+def _memory_per_session(factory, sessions: int) -> float:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [factory() for _ in range(sessions)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return (after - before) / sessions
+
+
+def _next_field_dict(state) -> object:
+    for name, field in state.items():
+        if field["status"] in ("not_started", "invalid"):
+            return name
+    return None
+
+
+def run(fields: int = 500, sessions: int = 1000, repeat: int = 200) -> Dict[str, object]:
+    form = compile_form(synthetic_form(fields))
+    # Состояние на середине диалога: первая половина полей заполнена, одно невалидно
+    response = init_state(form)
+    for i, name in enumerate(form.field_order[: fields // 2]):
+        response[name] = {"value": f"значение {i}", "status": "filled", "optional": response[name]["optional"]}
+    response[form.field_order[fields // 4]]["status"] = "invalid"
+    response = json.loads(json.dumps(response))
+
+    state = json.loads(json.dumps(response))
+    store = StateStore.from_dict(response, form)
+    changed = dict(response)
+    last = form.field_order[fields // 2]
+    changed[last] = {"value": "новое", "status": "filled", "optional": False}
+
+    def apply_dict():
+        # Прежний путь: state целиком заменяется новым словарём из ответа
+        return {name: dict(field) for name, field in changed.items()}
+
+    return {
+        "benchmark": "state",
+        "fields": fields,
+        "sessions": sessions,
+        "bytes_per_session": {
+            "dict": round(_memory_per_session(lambda: init_state(form), sessions)),
+            "state_store": round(_memory_per_session(lambda: StateStore.from_form(form), sessions)),
+        },
+        "next_field": {
+            "dict": summarize(measure(lambda: _next_field_dict(state), repeat)),
+            "state_store": summarize(measure(store.next_pending, repeat)),
+        },
+        "invalid_fields": {
+            "dict": summarize(measure(lambda: [n for n, f in state.items() if f["status"] == "invalid"], repeat)),
+            "state_store": summarize(measure(lambda: store.with_status("invalid"), repeat)),
+        },
+        "apply_response": {
+            "dict": summarize(measure(apply_dict, repeat)),
+            "state_store": summarize(measure(lambda: store.apply(changed), repeat)),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк состояния формы")
+    parser.add_argument("--fields", type=int, default=500, help="Число полей синтетической формы")
+    parser.add_argument("--sessions", type=int, default=1000, help="Число сессий для замера памяти")
+    parser.add_argument("--repeat", type=int, default=200, help="Повторений каждого замера времени")
+    args = parser.parse_args()
+    print(json.dumps(run(args.fields, args.sessions, args.repeat), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
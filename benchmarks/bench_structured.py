@@ -0,0 +1,104 @@
+"""
+Бенчмарк формата ответа по схеме формы (app/response_schema.py).
+
+1. Время проверки разобранного ответа на формах проекта и синтетической форме из 300 полей:
+   готовый ResponseValidator против прежней поэлементной проверки (ResponseValidator.diagnose) —
+   полный ответ и delta-ответ.
+2. Доля ходов, потерянных из-за ответа не по формату (их приходится переспрашивать), на заглушке LLM,
+   которая портит malformed_rate ответов так же, как модель без structured output:
+   без response_format, с json_object (как у DeepSeek) и с json_schema (как у OpenAI).
+
+Запуск:
+    python -m benchmarks.bench_structured --repeat 2000 --turns 200 --malformed-rate 0.1
+"""
+import argparse
+import json
+from typing import Dict
+
+from app.extractor import extract_fields
+from app.form_loader import init_state
+from app.prompt_builder import compile_prompt
+from benchmarks.bench_shard import synthetic_form
+from benchmarks.common import load_forms, measure, sample_value, summarize
+from benchmarks.stub_server import StubLLMServer, form_responder
+from llm.openai import OpenAILLM
+from llm.transport import HTTPTransport
+
+
+def validation_time(repeat: int) -> Dict[str, object]:
+    results = {}
+    forms = dict(load_forms())
+    large = synthetic_form(300, 30)
+    forms[large["id"]] = large
+    for form_id, form in forms.items():
+        full = {
+            "state": {
+                field["name"]: {"value": sample_value(field), "status": "filled", "optional": not field["required"]}
+                for field in form["fields"]
+            },
+            "next_question": None,
+        }
+        first = form["fields"][0]["name"]
+        delta = {"state": {first: {"value": "x", "status": "filled"}}, "next_question": None}
+        prompt = compile_prompt(form)
+        validator, delta_validator = prompt.validator(), prompt.validator(delta=True)
+        results[form_id] = {
+            "fields": len(form["fields"]),
+            "full_compiled": summarize(measure(lambda: validator(full), repeat)),
+            "full_per_key": summarize(measure(lambda: validator.diagnose(full), repeat)),
+            "delta_compiled": summarize(measure(lambda: delta_validator(delta), repeat)),
+            "delta_per_key": summarize(measure(lambda: delta_validator.diagnose(delta), repeat)),
+            "schema_bytes": len(json.dumps(prompt.response_schema(), ensure_ascii=False).encode("utf-8")),
+        }
+    return results
+
+
+def failed_turns(turns: int, malformed_rate: float, seed: int) -> Dict[str, object]:
+    form = load_forms()["passport"]
+    results = {}
+    for mode in (None, "json_object", "json_schema"):
+        with StubLLMServer(responder=form_responder, malformed_rate=malformed_rate, seed=seed) as stub:
+            llm = OpenAILLM(api_key="stub", api_url=stub.url, model="stub", transport=HTTPTransport())
+            llm.structured_output = mode
+            failed = 0
+            for turn in range(turns):
+                field = form["fields"][turn % len(form["fields"])]
+                messages = [
+                    {"role": "assistant", "content": f"Введите значение поля '{field['name']}':"},
+                    {"role": "user", "content": str(sample_value(field))},
+                ]
+                try:
+                    extract_fields(messages, form, init_state(form), llm_client=llm)
+                except ValueError:
+                    failed += 1
+            results[mode or "off"] = {
+                "turns": turns,
+                "failed_turns": failed,
+                "retry_rate": round(failed / turns, 3),
+                "structured_requests": stub.structured_requests,
+            }
+    return results
+
+
+def run(repeat: int = 2000, turns: int = 200, malformed_rate: float = 0.1, seed: int = 1) -> Dict[str, object]:
+    return {
+        "benchmark": "structured",
+        "repeat": repeat,
+        "malformed_rate": malformed_rate,
+        "validation": validation_time(repeat),
+        "retries": failed_turns(turns, malformed_rate, seed),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк формата ответа по схеме формы")
+    parser.add_argument("--repeat", type=int, default=2000, help="Повторений проверки ответа")
+    parser.add_argument("--turns", type=int, default=200, help="Ходов на каждый режим response_format")
+    parser.add_argument("--malformed-rate", type=float, default=0.1, help="Доля испорченных ответов заглушки")
+    parser.add_argument("--seed", type=int, default=1, help="Seed дефектов заглушки")
+    args = parser.parse_args()
+    print(json.dumps(run(args.repeat, args.turns, args.malformed_rate, args.seed), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
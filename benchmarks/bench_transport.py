@@ -0,0 +1,79 @@
+"""
+Бенчмарк транспорта: сколько стоит ход диалога с новым соединением на каждый запрос
+(как было с голым requests.post) и с пулом keep-alive соединений HTTPTransport.
+
+Запуск:
+    python -m benchmarks.bench_transport --turns 50 --handshake-ms 50
+"""
+import argparse
+import json
+from typing import Dict
+
+import requests
+
+from benchmarks.common import measure, summarize
+from benchmarks.stub_server import StubLLMServer
+from llm.base import LLMBase
+from llm.transport import HTTPTransport
+
+
+class _BareRequestsLLM(LLMBase):
+    """Поведение до пула: отдельный requests.post и новое соединение на каждый вызов."""
+    def ask(self, messages, temperature=1.0, max_tokens=1024):
+        payload = self.build_payload(messages, temperature, max_tokens)
+        response = requests.post(self.api_url, json=payload, headers=self.build_headers(), timeout=60)
+        response.raise_for_status()
+        return self.parse_response(response.json())
+
+    def build_payload(self, messages, temperature, max_tokens):
+        return {"model": self.model, "messages": messages, "temperature": temperature, "max_tokens": max_tokens}
+
+    def build_headers(self):
+        return {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
+
+    def parse_response(self, data):
+        return data["choices"][0]["message"]["content"]
+
+
+class _PooledLLM(_BareRequestsLLM):
+    """Тот же провайдер, но через LLMBase.ask и общий пул соединений."""
+    ask = LLMBase.ask
+
+
+def run(turns: int = 50, handshake_ms: float = 50.0) -> Dict[str, object]:
+    messages = [{"role": "user", "content": "Иванов"}]
+    with StubLLMServer(handshake_delay=handshake_ms / 1000) as stub:
+        bare = _BareRequestsLLM(api_url=stub.url, api_key="stub", model="stub")
+        bare_timings = measure(lambda: bare.ask(messages), turns)
+        bare_connections = stub.connections
+
+        transport = HTTPTransport()
+        pooled = _PooledLLM(api_url=stub.url, api_key="stub", model="stub", transport=transport)
+        pooled.warmup()
+        pooled_timings = measure(lambda: pooled.ask(messages), turns)
+        pooled_connections = stub.connections - bare_connections
+        transport.close()
+
+    bare_stats = summarize(bare_timings)
+    pooled_stats = summarize(pooled_timings)
+    return {
+        "benchmark": "transport",
+        "turns": turns,
+        "handshake_ms": handshake_ms,
+        "bare": dict(bare_stats, connections=bare_connections),
+        "pooled": dict(pooled_stats, connections=pooled_connections),
+        "saved_per_turn_ms": round(bare_stats["mean_ms"] - pooled_stats["mean_ms"], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк пула соединений LLMBase")
+    parser.add_argument("--turns", type=int, default=50, help="Количество ходов диалога")
+    parser.add_argument("--handshake-ms", type=float, default=50.0,
+                        help="Имитируемая стоимость нового соединения (DNS + TCP + TLS), мс")
+    args = parser.parse_args()
+    print(json.dumps(run(args.turns, args.handshake_ms), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
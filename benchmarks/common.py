@@ -0,0 +1,62 @@
+"""
+Общие помощники бенчмарков: сводка по замерам и загрузка форм проекта.
+"""
+import json
+import os
+import statistics
+import time
+from typing import Callable, Dict, List
+
+FORMS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "forms")
+
+
+def summarize(timings_ms: List[float]) -> Dict[str, float]:
+    """Среднее, p50, p95 и максимум по списку замеров в миллисекундах."""
+    if not timings_ms:
+        return {"count": 0, "mean_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0}
+    ordered = sorted(timings_ms)
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered), 4),
+        "p50_ms": round(ordered[len(ordered) // 2], 4),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 4),
+        "max_ms": round(ordered[-1], 4),
+    }
+
+
+def measure(call: Callable[[], object], repeat: int) -> List[float]:
+    """Время каждого из repeat вызовов call, миллисекунды."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def load_forms() -> Dict[str, dict]:
+    """Все формы каталога forms/ проекта: id → форма."""
+    forms = {}
+    for filename in sorted(os.listdir(FORMS_DIR)):
+        if filename.endswith(".json"):
+            with open(os.path.join(FORMS_DIR, filename), "r", encoding="utf-8") as f:
+                form = json.load(f)
+            forms[form["id"]] = form
+    return forms
+
+
+def sample_value(field: dict) -> str:
+    """Правдоподобный ответ пользователя для поля заданного типа."""
+    samples = {
+        "int": "42",
+        "float": "3.5",
+        "bool": "да",
+        "date": "23.12.2002",
+        "email": "user@example.com",
+        "phone": "+79123456789",
+        "url": "https://example.com",
+        "list_str": "первый, второй",
+    }
+    if field["type"] in ("enum", "multi_enum"):
+        return field["options"][0]
+    return samples.get(field["type"], "Тестовое значение")
@@ -0,0 +1,321 @@
+"""
+Локальный OpenAI-совместимый сервер-заглушка для тестов и бенчмарков.
+Отвечает на POST /v1/chat/completions заранее заданным (или вычисленным по запросу) ответом,
+не обращаясь к платному API. При "stream": true отдаёт ответ порциями в формате
+server-sent events, как OpenAI и DeepSeek.
+
+Задержка может быть случайной (см. latency_model), часть запросов — завершаться ошибкой (error_rate).
+"""
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional, Sequence, Union
+
+DEFAULT_CONTENT = '{"state": {}, "next_question": null}'
+STATE_PREFIX = "Текущее состояние state:\n"
+
+Latency = Union[float, Callable[[], float]]
+
+
+def latency_model(spec: str, seed: Optional[int] = None) -> Callable[[], float]:
+    """
+    Распределение задержки по строковому описанию (секунды):
+    - "0.05" или "const:0.05" — постоянная
+    - "uniform:0.01,0.1" — равномерная
+    - "lognormal:0.2,0.5" — логнормальная с медианой 0.2 и sigma 0.5 (тяжёлый хвост, как у реальных API)
+    - "exp:0.1" — экспоненциальная со средним 0.1
+    """
+    rng = random.Random(seed)
+    kind, _, args = spec.partition(":")
+    if not args:
+        kind, args = "const", kind
+    values = [float(v) for v in args.split(",")]
+    if kind == "const":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: rng.uniform(values[0], values[1])
+    if kind == "lognormal":
+        mu = math.log(values[0])
+        return lambda: rng.lognormvariate(mu, values[1])
+    if kind == "exp":
+        return lambda: rng.expovariate(1 / values[0])
+    raise ValueError(f"Неизвестное распределение задержки: {spec}")
+
+
+def form_responder(payload: dict) -> str:
+    """
+    Шаблонный ответ по контракту {"state", "next_question"}: берёт текущий state
+    из последнего system-сообщения запроса и записывает последний ответ пользователя
+    в первое незаполненное поле. Так заглушка ведёт сквозной диалог по любой форме.
+    """
+    messages = payload.get("messages") or []
+    state = {}
+    for message in reversed(messages):
+        content = message.get("content") or ""
+        if message.get("role") == "system" and content.startswith(STATE_PREFIX):
+            state = json.loads(content[len(STATE_PREFIX):])
+            break
+    answer = next((m.get("content") for m in reversed(messages) if m.get("role") == "user"), None)
+    for name, entry in state.items():
+        if answer is not None and entry.get("status") in ("not_started", "invalid"):
+            state[name] = {"value": answer, "status": "filled", "optional": entry.get("optional", False)}
+            break
+    return json.dumps({"state": state, "next_question": None}, ensure_ascii=False)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # HTTP/1.1 — чтобы клиент мог переиспользовать соединение (keep-alive)
+    protocol_version = "HTTP/1.1"
+    # Заголовки и тело уходят отдельными write — без TCP_NODELAY Nagle добавляет ~40 мс
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        stub: "StubLLMServer" = self.server.stub
+        stub._count("connections")
+        # Имитация стоимости DNS + TCP + TLS: платится один раз на новое соединение
+        if stub.handshake_delay:
+            time.sleep(stub.handshake_delay)
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        stub: "StubLLMServer" = self.server.stub
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length) if length else b""
+        stub._count("requests")
+        try:
+            payload = json.loads(body or b"{}")
+        except json.JSONDecodeError:
+            payload = {}
+        delay = stub._delay()
+        if delay:
+            time.sleep(delay)
+        status = stub._injected_error()
+        if status:
+            self._send_error(stub, status)
+            return
+        content = stub._malform(payload, stub._content(payload))
+        if stub.token_delay and not payload.get("stream"):
+            # Генерация: время растёт с длиной ответа (~4 символа на токен)
+            time.sleep(stub.token_delay * (len(content) // 4))
+        if payload.get("stream"):
+            self._send_stream(stub, payload, content)
+            return
+        data = {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "model": payload.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": stub._usage(payload.get("messages") or [], content)
+        }
+        raw = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def _send_error(self, stub: "StubLLMServer", status: int):
+        raw = json.dumps({"error": {"message": "injected error", "type": "stub_error", "code": status}}).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        if stub.retry_after is not None:
+            self.send_header("Retry-After", str(stub.retry_after))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def _send_stream(self, stub: "StubLLMServer", payload: dict, content: str):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        size = max(1, stub.stream_chunk_size)
+        pieces = [content[i:i + size] for i in range(0, len(content), size)]
+        try:
+            for piece in pieces:
+                chunk = {
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion.chunk",
+                    "model": payload.get("model", "stub"),
+                    "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]
+                }
+                self._write_chunk(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n")
+                stub._count("stream_chunks")
+                if stub.chunk_delay:
+                    time.sleep(stub.chunk_delay)
+            self._write_chunk("data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # Клиент закрыл соединение раньше времени — генерация отменена
+            stub._count("streams_cancelled")
+            self.close_connection = True
+
+    def _write_chunk(self, text: str):
+        raw = text.encode("utf-8")
+        self.wfile.write(f"{len(raw):x}\r\n".encode("ascii") + raw + b"\r\n")
+        self.wfile.flush()
+
+
+class StubLLMServer:
+    """
+    Сервер-заглушка в фоновом потоке.
+
+    - content — текст ответа модели (choices[0].message.content)
+    - responder — функция payload → текст ответа (например, form_responder); если задана, content не используется
+    - latency — задержка ответа на каждый запрос: секунды или функция без аргументов (см. latency_model)
+    - handshake_delay — задержка на каждое новое соединение, секунды
+    - stream_chunk_size / chunk_delay — размер порции (в символах) и пауза между порциями в режиме stream
+    - token_delay — время генерации одного токена ответа без stream, секунды (задержка растёт с длиной ответа)
+    - malformed_rate — доля ответов с дефектами формата, как у модели без structured output: пропущенное поле state,
+      недопустимый статус или текст вместо JSON. С response_format json_schema дефектов нет (ответ ограничен схемой),
+      с json_object — только структурные (JSON гарантирован, схема — нет)
+    - error_rate — доля запросов, завершающихся HTTP-ошибкой со статусом из error_statuses
+      (с заголовком Retry-After, если задан retry_after); seed делает последовательность ошибок воспроизводимой
+
+    Счётчики connections и requests позволяют проверить переиспользование соединений,
+    errors — число внедрённых ошибок, stream_chunks и streams_cancelled — досрочную отмену потоковой генерации,
+    malformed — число испорченных ответов, structured_requests — запросов с response_format.
+    """
+    def __init__(
+        self,
+        content: str = DEFAULT_CONTENT,
+        latency: Latency = 0.0,
+        handshake_delay: float = 0.0,
+        stream_chunk_size: int = 8,
+        chunk_delay: float = 0.0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        responder: Optional[Callable[[dict], str]] = None,
+        error_rate: float = 0.0,
+        error_statuses: Sequence[int] = (500,),
+        retry_after: Optional[float] = None,
+        seed: Optional[int] = None,
+        token_delay: float = 0.0,
+        malformed_rate: float = 0.0
+    ):
+        self.content = content
+        self.responder = responder
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_statuses = tuple(error_statuses)
+        self.retry_after = retry_after
+        self._random = random.Random(seed)
+        self.handshake_delay = handshake_delay
+        self.stream_chunk_size = stream_chunk_size
+        self.chunk_delay = chunk_delay
+        self.token_delay = token_delay
+        self.malformed_rate = malformed_rate
+        self.malformed = 0
+        self.structured_requests = 0
+        self.connections = 0
+        self.requests = 0
+        self.stream_chunks = 0
+        self.streams_cancelled = 0
+        self.errors = 0
+        self._last_prompt = ""
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.stub = self
+        self._thread: Optional[threading.Thread] = None
+
+    def _count(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _delay(self) -> float:
+        return self.latency() if callable(self.latency) else self.latency
+
+    def _injected_error(self) -> Optional[int]:
+        if not self.error_rate:
+            return None
+        with self._lock:
+            if self._random.random() >= self.error_rate:
+                return None
+            self.errors += 1
+            return self._random.choice(self.error_statuses)
+
+    def _malform(self, payload: dict, content: str) -> str:
+        """Портит ответ с вероятностью malformed_rate с учётом response_format запроса."""
+        response_format = (payload.get("response_format") or {}).get("type")
+        if response_format:
+            self._count("structured_requests")
+        if not self.malformed_rate or response_format == "json_schema":
+            return content
+        with self._lock:
+            if self._random.random() >= self.malformed_rate:
+                return content
+            defect = self._random.choice(("missing_field", "bad_status") if response_format else ("missing_field", "bad_status", "prose"))
+            self.malformed += 1
+        try:
+            parsed = json.loads(content)
+            state = parsed["state"]
+        except (ValueError, KeyError, TypeError):
+            return content
+        if defect == "prose" or not state:
+            return "Извините, не удалось разобрать ответ. Уточните, пожалуйста."
+        name = next(iter(state))
+        if defect == "missing_field":
+            del state[name]
+        else:
+            state[name] = dict(state[name], status="completed")
+        return json.dumps(parsed, ensure_ascii=False)
+
+    def _content(self, payload: dict) -> str:
+        return self.responder(payload) if self.responder else self.content
+
+    def _usage(self, messages: list, content: str) -> dict:
+        """
+        Usage в формате OpenAI с имитацией кэша префикса: закэшированной считается
+        общая с предыдущим запросом начальная часть промпта (~4 символа на токен).
+        """
+        prompt = "".join(f"{m.get('role')}:{m.get('content')}\n" for m in messages)
+        with self._lock:
+            previous, self._last_prompt = self._last_prompt, prompt
+        common = 0
+        for a, b in zip(previous, prompt):
+            if a != b:
+                break
+            common += 1
+        return {
+            "prompt_tokens": len(prompt) // 4,
+            "completion_tokens": len(content) // 4,
+            "total_tokens": len(prompt) // 4 + len(content) // 4,
+            "prompt_tokens_details": {"cached_tokens": common // 4}
+        }
+
+    @property
+    def url(self) -> str:
+        """Адрес chat-completions эндпоинта заглушки."""
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1/chat/completions"
+
+    def start(self) -> "StubLLMServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="stub-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "StubLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
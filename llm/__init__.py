@@ -1,31 +1,92 @@
+"""
+Реестр LLM-провайдеров. Модули провайдеров (а с ними requests/httpx) импортируются
+при первом обращении к провайдеру, .env читается один раз — при первом выборе провайдера,
+а не при импорте пакета (llm/settings.py), ошибка конфигурации возникает только
+для провайдера, который действительно выбран.
+"""
+import importlib
 import os
-from dotenv import load_dotenv
+from llm.settings import load_env
 
-load_dotenv()
+# Имя провайдера -> (модуль, синхронный класс, асинхронный класс).
+# Можно легко добавить новых провайдеров в этот словарь
+PROVIDERS = {
+    "openai": ("llm.openai", "OpenAILLM", "AsyncOpenAILLM"),
+    "deepseek": ("llm.deepseek", "DeepSeekLLM", "AsyncDeepSeekLLM"),
+}
 
-from llm.openai import OpenAILLM
-from llm.deepseek import DeepSeekLLM
+# Классы, которые раньше импортировались из llm напрямую: отдаются лениво через __getattr__
+_LAZY_EXPORTS = {
+    "OpenAILLM": "llm.openai",
+    "AsyncOpenAILLM": "llm.openai",
+    "DeepSeekLLM": "llm.deepseek",
+    "AsyncDeepSeekLLM": "llm.deepseek",
+    "OpenAICompatibleLLM": "llm.compatible",
+    "LLMRouter": "llm.router",
+    "Route": "llm.router",
+}
+
+
+def __getattr__(name):
+    module = _LAZY_EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module 'llm' has no attribute '{name}'")
+    return getattr(importlib.import_module(module), name)
+
+
+def provider_class(provider: str, asynchronous: bool = False):
+    """Класс клиента встроенного провайдера; модуль провайдера импортируется только здесь."""
+    module, sync_class, async_class = PROVIDERS[provider]
+    return getattr(importlib.import_module(module), async_class if asynchronous else sync_class)
+
+
+def create_llm(provider: str, model: str = None):
+    """
+    Клиент провайдера по имени: встроенный ('openai', 'deepseek') или эндпоинт из LLM_ENDPOINTS_FILE.
+    model — переопределяет модель провайдера по умолчанию.
+    """
+    load_env()
+    provider = provider.lower()
+    if provider in PROVIDERS:
+        return provider_class(provider)(model=model)
+
+    from llm.compatible import create_endpoint, load_endpoints
+    endpoints = load_endpoints()
+    if provider in endpoints:
+        config = dict(endpoints[provider])
+        if model:
+            config["model"] = model
+        return create_endpoint(provider, config)
+
+    raise ValueError(
+        f"LLM_PROVIDER '{provider}' не поддерживается. Доступные: {list(PROVIDERS.keys()) + list(endpoints.keys()) + ['router']}"
+    )
 
 
 def get_llm():
     """
     Возвращает экземпляр LLM-класса в зависимости от переменной окружения LLM_PROVIDER.
-    Поддерживаемые значения: 'openai', 'deepseek'.
+    Поддерживаемые значения: 'openai', 'deepseek', имена эндпоинтов из LLM_ENDPOINTS_FILE
+    и 'router' — маршрутизация между несколькими провайдерами по LLM_ROUTES (см. llm/router.py).
     """
+    load_env()
     provider = os.getenv("LLM_PROVIDER", "openai").lower()
+    if provider == "router":
+        from llm.router import router_from_env
+        return router_from_env(create_llm)
+    return create_llm(provider)
 
-    # Можно легко добавить новых провайдеров в этот словарь
-    providers = {
-        "openai": OpenAILLM,
-        "deepseek": DeepSeekLLM,
-    }
-
-    if provider not in providers:
-        raise ValueError(f"LLM_PROVIDER '{provider}' не поддерживается. Доступные: {list(providers.keys())}")
 
-    # Возвращаем экземпляр выбранного LLM
-    return providers[provider]()
+def get_async_llm():
+    """
+    Возвращает асинхронный клиент того же провайдера, что и get_llm (по LLM_PROVIDER).
+    """
+    load_env()
+    provider = os.getenv("LLM_PROVIDER", "openai").lower()
+    if provider not in PROVIDERS:
+        raise ValueError(f"LLM_PROVIDER '{provider}' не поддерживается. Доступные: {list(PROVIDERS.keys())}")
+    return provider_class(provider, asynchronous=True)()
 
 # Пример использования:
 # llm = get_llm()
-# response = llm.generate(messages=[...]) 
\ No newline at end of file
+# response = llm.generate(messages=[...])
@@ -0,0 +1,240 @@
+"""
+Асинхронный базовый класс для LLM-провайдеров.
+Повторяет контракт LLMBase (build_payload, build_headers, parse_response),
+но отправляет запросы через httpx.AsyncClient, так что один event loop
+может держать сотни запросов к LLM одновременно.
+"""
+import json
+import os
+import time
+from typing import Any, AsyncIterator, List, Dict, Optional
+from abc import ABC, abstractmethod
+from urllib.parse import urlsplit
+import httpx
+from llm.response import SSE_DONE, LLMResponse, apply_response_format, parse_openai_usage, parse_sse_line, structured_output_mode
+from llm.resilience import LLMAPIError, Resilience, parse_retry_after
+
+
+class AsyncHTTPTransport:
+    """
+    Асинхронный аналог HTTPTransport: ограниченный пул keep-alive соединений
+    и раздельные таймауты connect/read.
+
+    httpx.AsyncClient привязан к event loop, в котором впервые использован,
+    поэтому клиент создаётся лениво и должен закрываться через aclose().
+    """
+    def __init__(
+        self,
+        pool_maxsize: int = 100,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 60.0
+    ):
+        self.pool_maxsize = pool_maxsize
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @classmethod
+    def from_env(cls) -> "AsyncHTTPTransport":
+        """
+        Создаёт транспорт по переменным окружения:
+        LLM_ASYNC_POOL_MAXSIZE, LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT.
+        """
+        return cls(
+            pool_maxsize=int(os.getenv("LLM_ASYNC_POOL_MAXSIZE", "100")),
+            connect_timeout=float(os.getenv("LLM_CONNECT_TIMEOUT", "5")),
+            read_timeout=float(os.getenv("LLM_READ_TIMEOUT", "60"))
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.pool_maxsize,
+                    max_keepalive_connections=self.pool_maxsize
+                ),
+                timeout=httpx.Timeout(
+                    connect=self.connect_timeout,
+                    read=self.read_timeout,
+                    write=self.read_timeout,
+                    pool=self.read_timeout
+                )
+            )
+        return self._client
+
+    async def post(self, url: str, json: Dict, headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+        return await self.client.post(url, json=json, headers=headers)
+
+    def stream(self, url: str, json: Dict, headers: Optional[Dict[str, str]] = None):
+        return self.client.stream("POST", url, json=json, headers=headers)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+def async_api_error(e: httpx.HTTPError) -> LLMAPIError:
+    """Приводит ошибку httpx к LLMAPIError с HTTP-статусом и Retry-After (если сервер ответил)."""
+    if isinstance(e, httpx.HTTPStatusError):
+        return LLMAPIError(
+            f"Ошибка при обращении к LLM API: {e}",
+            status=e.response.status_code,
+            retry_after=parse_retry_after(e.response.headers.get("Retry-After"))
+        )
+    return LLMAPIError(f"Ошибка при обращении к LLM API: {e}")
+
+
+class AsyncLLMBase(ABC):
+    # Имя провайдера: префикс переменных окружения политики устойчивости (см. llm/resilience.py)
+    provider_name = "llm"
+    # Поддерживаемый режим structured output (см. llm/response.py); None — схема ответа провайдеру не передаётся
+    structured_output: Optional[str] = None
+
+    def __init__(
+        self,
+        api_url: str,
+        api_key: str,
+        model: str = None,
+        transport: Optional[AsyncHTTPTransport] = None,
+        resilience: Optional[Resilience] = None
+    ):
+        self.api_url = api_url
+        self.api_key = api_key
+        self.model = model
+        self.transport = transport or AsyncHTTPTransport.from_env()
+        self.resilience = resilience or Resilience.from_env(
+            self.provider_name, breaker_name=f"{self.provider_name}:{urlsplit(api_url or '').netloc}"
+        )
+        self.structured_output = structured_output_mode(self.provider_name, self.structured_output)
+
+    async def ask(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 1.0,
+        max_tokens: int = 1024,
+        response_schema: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """
+        Асинхронно отправляет сообщения в LLM и возвращает текст ответа.
+        Ошибки приводятся к тем же исключениям, что и в LLMBase.ask.
+        """
+        return (await self.complete(messages, temperature, max_tokens, response_schema)).text
+
+    async def complete(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 1.0,
+        max_tokens: int = 1024,
+        response_schema: Optional[Dict[str, Any]] = None
+    ) -> LLMResponse:
+        """
+        Асинхронный LLMBase.complete: текст ответа вместе с usage, с той же политикой устойчивости.
+        """
+        payload = self.build_payload(messages, temperature, max_tokens)
+        apply_response_format(payload, self.structured_output, response_schema)
+        headers = self.build_headers()
+        started = time.perf_counter()
+        data = await self.resilience.call_async(lambda: self._post_json(payload, headers))
+        try:
+            return LLMResponse(
+                text=self.parse_response(data),
+                usage=self.parse_usage(data),
+                latency=time.perf_counter() - started,
+                model=data.get("model") or self.model
+            )
+        except (KeyError, IndexError):
+            raise ValueError("Ответ от LLM некорректен или неполон")
+
+    async def _post_json(self, payload: Dict, headers: Dict[str, str]) -> Dict:
+        """Одна попытка запроса: JSON ответа или LLMAPIError."""
+        try:
+            response = await self.transport.post(self.api_url, json=payload, headers=headers)
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPError as e:
+            raise async_api_error(e)
+        except json.JSONDecodeError:
+            raise ValueError("Ответ от LLM некорректен или неполон")
+
+    async def ask_stream(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 1.0,
+        max_tokens: int = 1024,
+        response_schema: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[str]:
+        """
+        Асинхронный потоковый вариант ask: отдаёт текст ответа порциями по мере генерации.
+        Досрочный выход из async for (или aclose() генератора) обрывает генерацию.
+        """
+        payload = self.build_payload(messages, temperature, max_tokens)
+        apply_response_format(payload, self.structured_output, response_schema)
+        payload["stream"] = True
+        headers = self.build_headers()
+        try:
+            async with self.transport.stream(self.api_url, json=payload, headers=headers) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    data = parse_sse_line(line)
+                    if data is None:
+                        continue
+                    if data == SSE_DONE:
+                        break
+                    text = self.parse_stream_chunk(json.loads(data))
+                    if text:
+                        yield text
+        except httpx.HTTPError as e:
+            raise async_api_error(e)
+        except (KeyError, IndexError, json.JSONDecodeError):
+            raise ValueError("Ответ от LLM некорректен или неполон")
+
+    def parse_usage(self, data) -> Dict[str, int]:
+        """
+        Извлекает usage из ответа API (OpenAI-совместимый формат).
+        """
+        return parse_openai_usage(data)
+
+    def parse_stream_chunk(self, data) -> Optional[str]:
+        """
+        Извлекает приращение текста из одной SSE-порции (OpenAI-совместимый формат).
+        """
+        choices = data.get("choices") or []
+        if not choices:
+            return None
+        return choices[0].get("delta", {}).get("content")
+
+    async def aclose(self):
+        """Закрывает соединения пула."""
+        await self.transport.aclose()
+
+    async def __aenter__(self) -> "AsyncLLMBase":
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    @abstractmethod
+    def build_payload(self, messages, temperature, max_tokens):
+        """
+        Формирует payload для конкретного API.
+        Должен быть реализован в наследнике.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def build_headers(self):
+        """
+        Формирует headers для конкретного API.
+        Должен быть реализован в наследнике.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def parse_response(self, data):
+        """
+        Извлекает текст ответа из данных API.
+        Должен быть реализован в наследнике.
+        """
+        raise NotImplementedError
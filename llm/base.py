@@ -3,36 +3,171 @@
 Содержит общую логику отправки запроса и обработки ошибок.
 Провайдеры должны реализовать методы build_payload, build_headers, parse_response.
 """
-from typing import List, Dict, Any
+import json
+import time
+from typing import List, Dict, Any, Iterator, Optional
 from abc import ABC, abstractmethod
+from urllib.parse import urlsplit
 import requests
+from llm.transport import HTTPTransport, get_default_transport
+from llm.resilience import LLMAPIError, Resilience, parse_retry_after
+from llm.response import SSE_DONE, LLMResponse, apply_response_format, parse_openai_usage, parse_sse_line, structured_output_mode
+
+def api_error(e: requests.RequestException) -> LLMAPIError:
+    """
+    Приводит ошибку requests к LLMAPIError с HTTP-статусом и Retry-After (если сервер ответил).
+    """
+    response = getattr(e, "response", None)
+    if response is None:
+        return LLMAPIError(f"Ошибка при обращении к LLM API: {e}")
+    return LLMAPIError(
+        f"Ошибка при обращении к LLM API: {e}",
+        status=response.status_code,
+        retry_after=parse_retry_after(response.headers.get("Retry-After"))
+    )
 
 class LLMBase(ABC):
-    def __init__(self, api_url: str, api_key: str, model: str = None):
+    # Имя провайдера: префикс переменных окружения политики устойчивости (см. llm/resilience.py)
+    provider_name = "llm"
+    # Поддерживаемый режим structured output (см. llm/response.py); None — схема ответа провайдеру не передаётся
+    structured_output: Optional[str] = None
+
+    def __init__(
+        self,
+        api_url: str,
+        api_key: str,
+        model: str = None,
+        transport: Optional[HTTPTransport] = None,
+        resilience: Optional[Resilience] = None
+    ):
         self.api_url = api_url
         self.api_key = api_key
         self.model = model
+        # По умолчанию все провайдеры делят один пул keep-alive соединений
+        self.transport = transport or get_default_transport()
+        # Повторы, хеджирование и предохранитель — свои для каждого провайдера и хоста
+        self.resilience = resilience or Resilience.from_env(
+            self.provider_name, breaker_name=f"{self.provider_name}:{urlsplit(api_url or '').netloc}"
+        )
+        self.structured_output = structured_output_mode(self.provider_name, self.structured_output)
 
     def ask(
         self,
         messages: List[Dict[str, str]],
         temperature: float = 1.0,
-        max_tokens: int = 1024
+        max_tokens: int = 1024,
+        response_schema: Optional[Dict[str, Any]] = None
     ) -> str:
         """
         Общий метод для отправки сообщений в LLM и получения ответа.
         """
+        return self.complete(messages, temperature, max_tokens, response_schema).text
+
+    def complete(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 1.0,
+        max_tokens: int = 1024,
+        response_schema: Optional[Dict[str, Any]] = None
+    ) -> LLMResponse:
+        """
+        То же, что ask, но вместе с текстом возвращает usage (в т.ч. попадания в кэш префикса).
+        Сбои API повторяются по политике self.resilience; latency включает повторы.
+        Ошибки API — LLMAPIError (подкласс RuntimeError), некорректный ответ — ValueError.
+        response_schema — JSON Schema ответа (см. app/response_schema.py): передаётся в response_format,
+        если клиент поддерживает structured output (self.structured_output), иначе не используется.
+        """
         payload = self.build_payload(messages, temperature, max_tokens)
+        apply_response_format(payload, self.structured_output, response_schema)
         headers = self.build_headers()
+        started = time.perf_counter()
+        data = self.resilience.call(lambda: self._post_json(payload, headers))
         try:
-            response = requests.post(self.api_url, json=payload, headers=headers, timeout=60)
+            return LLMResponse(
+                text=self.parse_response(data),
+                usage=self.parse_usage(data),
+                latency=time.perf_counter() - started,
+                model=data.get("model") or self.model
+            )
+        except (KeyError, IndexError):
+            raise ValueError("Ответ от LLM некорректен или неполон")
+
+    def _post_json(self, payload: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+        """Одна попытка запроса: JSON ответа или LLMAPIError."""
+        try:
+            response = self.transport.post(self.api_url, json=payload, headers=headers)
             response.raise_for_status()
-            data = response.json()
-            return self.parse_response(data)
+            return response.json()
         except requests.RequestException as e:
-            raise RuntimeError(f"Ошибка при обращении к LLM API: {e}")
-        except (KeyError, IndexError):
+            raise api_error(e)
+
+    def _open_stream(self, payload: Dict[str, Any], headers: Dict[str, str]) -> requests.Response:
+        """Одна попытка открыть потоковый ответ."""
+        try:
+            response = self.transport.post(self.api_url, json=payload, headers=headers, stream=True)
+            response.raise_for_status()
+            return response
+        except requests.RequestException as e:
+            raise api_error(e)
+
+    def ask_stream(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 1.0,
+        max_tokens: int = 1024,
+        response_schema: Optional[Dict[str, Any]] = None
+    ) -> Iterator[str]:
+        """
+        Потоковый вариант ask: отдаёт текст ответа порциями по мере генерации ("stream": true, SSE).
+        Если закрыть генератор досрочно, соединение рвётся и провайдер прекращает генерацию.
+        """
+        payload = self.build_payload(messages, temperature, max_tokens)
+        apply_response_format(payload, self.structured_output, response_schema)
+        payload["stream"] = True
+        headers = self.build_headers()
+        # Повторяется только установка потока; дублировать потоковые запросы нет смысла
+        response = self.resilience.call(lambda: self._open_stream(payload, headers), hedge=False)
+        # SSE всегда в UTF-8, даже если сервер не указал charset
+        response.encoding = "utf-8"
+        try:
+            for line in response.iter_lines(decode_unicode=True):
+                data = parse_sse_line(line)
+                if data is None:
+                    continue
+                if data == SSE_DONE:
+                    break
+                text = self.parse_stream_chunk(json.loads(data))
+                if text:
+                    yield text
+        except requests.RequestException as e:
+            # Та же ошибка, что при установке потока: роутер по ней переключает маршрут и учитывает сбой
+            raise api_error(e)
+        except (KeyError, IndexError, json.JSONDecodeError):
             raise ValueError("Ответ от LLM некорректен или неполон")
+        finally:
+            response.close()
+
+    def parse_usage(self, data) -> Dict[str, int]:
+        """
+        Извлекает usage из ответа API. По умолчанию — OpenAI-совместимый формат.
+        """
+        return parse_openai_usage(data)
+
+    def parse_stream_chunk(self, data) -> Optional[str]:
+        """
+        Извлекает приращение текста из одной SSE-порции.
+        По умолчанию — OpenAI-совместимый формат (choices[0].delta.content).
+        """
+        choices = data.get("choices") or []
+        if not choices:
+            return None
+        return choices[0].get("delta", {}).get("content")
+
+    def warmup(self) -> bool:
+        """
+        Заранее устанавливает соединение с API, чтобы первый ход диалога не ждал рукопожатия.
+        """
+        return self.transport.warmup(self.api_url)
 
     @abstractmethod
     def build_payload(self, messages, temperature, max_tokens):
@@ -0,0 +1,82 @@
+"""
+Произвольный OpenAI-совместимый эндпоинт (локальный сервер инференса, прокси, другой облачный провайдер).
+Описывается в конфигурации, а не в коде: см. load_endpoints.
+"""
+import json
+import os
+from typing import Any, Dict, Optional
+from llm.base import LLMBase
+from llm.transport import HTTPTransport
+from llm.resilience import Resilience
+
+
+class OpenAICompatibleLLM(LLMBase):
+    """
+    Клиент OpenAI-совместимого API по адресу api_url.
+    name — имя эндпоинта: им называются маршрут в роутере и префикс переменных политики устойчивости.
+    Ключ необязателен: локальные серверы обычно работают без авторизации.
+    structured_output — режим response_format, если сервер его поддерживает (json_schema или json_object, см. llm/response.py).
+    """
+    def __init__(
+        self,
+        name: str,
+        api_url: str,
+        model: str,
+        api_key: Optional[str] = None,
+        transport: Optional[HTTPTransport] = None,
+        resilience: Optional[Resilience] = None,
+        structured_output: Optional[str] = None
+    ):
+        if not api_url or not model:
+            raise ValueError(f"Эндпоинт '{name}': нужно задать api_url и model")
+        self.provider_name = name
+        self.structured_output = structured_output
+        super().__init__(api_url=api_url, api_key=api_key, model=model, transport=transport, resilience=resilience)
+
+    def build_payload(self, messages, temperature, max_tokens):
+        return {
+            "model": self.model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens
+        }
+
+    def build_headers(self):
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return headers
+
+    def parse_response(self, data):
+        return data["choices"][0]["message"]["content"]
+
+
+def load_endpoints(path: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Дополнительные эндпоинты из JSON-файла (path или переменная LLM_ENDPOINTS_FILE):
+    {"local": {"api_url": "http://localhost:8000/v1/chat/completions", "model": "qwen2.5-7b",
+               "api_key_env": "LOCAL_API_KEY", "structured_output": "json_schema"}}
+    api_key_env — имя переменной окружения с ключом (сам ключ в файл не пишется);
+    structured_output — необязательный режим response_format.
+    """
+    path = path or os.getenv("LLM_ENDPOINTS_FILE")
+    if not path:
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        endpoints = json.load(f)
+    if not isinstance(endpoints, dict):
+        raise ValueError(f"{path}: ожидается объект вида {{имя: {{api_url, model, ...}}}}")
+    return endpoints
+
+
+def create_endpoint(name: str, config: Dict[str, Any], transport: Optional[HTTPTransport] = None) -> OpenAICompatibleLLM:
+    """Клиент эндпоинта по его описанию из load_endpoints."""
+    api_key_env = config.get("api_key_env")
+    return OpenAICompatibleLLM(
+        name=name,
+        api_url=config.get("api_url"),
+        model=config.get("model"),
+        api_key=os.getenv(api_key_env) if api_key_env else config.get("api_key"),
+        transport=transport,
+        structured_output=config.get("structured_output")
+    )
@@ -2,31 +2,45 @@
 Реализация LLM-провайдера для DeepSeek.
 Максимально использует универсальный базовый класс LLMBase.
 """
-import os
+import threading
 from typing import List, Dict, Any, Optional
-from dotenv import load_dotenv
+from llm.settings import env, require
 from llm.base import LLMBase
+from llm.transport import HTTPTransport
+from llm.resilience import Resilience
 
-# Загружаем переменные окружения для DeepSeek
-load_dotenv()
-DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
-DEEPSEEK_API_URL = os.getenv("DEEPSEEK_API_URL")
-DEEPSEEK_MODEL = os.getenv("DEEPSEEK_MODEL", "deepseek-chat")
 
-if not (DEEPSEEK_API_KEY and DEEPSEEK_API_URL):
-    raise RuntimeError("Ошибка конфигурации: проверьте, что DEEPSEEK_API_KEY и DEEPSEEK_API_URL заданы в .env")
+def deepseek_config(api_key: Optional[str], api_url: Optional[str], model: Optional[str]) -> Dict[str, str]:
+    """
+    Настройки DeepSeek: явные аргументы или DEEPSEEK_API_KEY / DEEPSEEK_API_URL / DEEPSEEK_MODEL из окружения.
+    Проверяются только при создании клиента — конфигурация других провайдеров не нужна.
+    """
+    config = {
+        "api_key": api_key or env("DEEPSEEK_API_KEY"),
+        "api_url": api_url or env("DEEPSEEK_API_URL"),
+        "model": model or env("DEEPSEEK_MODEL", "deepseek-chat")
+    }
+    require(DEEPSEEK_API_KEY=config["api_key"], DEEPSEEK_API_URL=config["api_url"])
+    return config
 
 class DeepSeekLLM(LLMBase):
     """
     Класс для работы с DeepSeek LLM через API.
     Реализует только специфичные методы.
     """
-    def __init__(self, api_key: Optional[str] = None, api_url: Optional[str] = None, model: Optional[str] = None):
-        super().__init__(
-            api_url=api_url or DEEPSEEK_API_URL,
-            api_key=api_key or DEEPSEEK_API_KEY,
-            model=model or DEEPSEEK_MODEL
-        )
+    provider_name = "deepseek"
+    # JSON mode: гарантированно JSON, но без проверки по схеме
+    structured_output = "json_object"
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        api_url: Optional[str] = None,
+        model: Optional[str] = None,
+        transport: Optional[HTTPTransport] = None,
+        resilience: Optional[Resilience] = None
+    ):
+        super().__init__(**deepseek_config(api_key, api_url, model), transport=transport, resilience=resilience)
 
     def build_payload(self, messages: List[Dict[str, str]], temperature: float, max_tokens: int) -> Dict[str, Any]:
         return {
@@ -44,4 +58,62 @@ class DeepSeekLLM(LLMBase):
 
     def parse_response(self, data: Dict[str, Any]) -> str:
         # DeepSeek возвращает OpenAI-совместимый формат
-        return data["choices"][0]["message"]["content"] 
\ No newline at end of file
+        return data["choices"][0]["message"]["content"]
+
+    def parse_usage(self, data: Dict[str, Any]) -> Dict[str, int]:
+        # DeepSeek сообщает попадания в кэш контекста отдельными полями
+        usage = data.get("usage") or {}
+        if not usage:
+            return {}
+        return {
+            "prompt_tokens": usage.get("prompt_tokens", 0),
+            "completion_tokens": usage.get("completion_tokens", 0),
+            "cached_tokens": usage.get("prompt_cache_hit_tokens", 0)
+        }
+
+
+_async_lock = threading.Lock()
+
+
+def _async_class():
+    """
+    Асинхронный клиент создаётся при первом обращении к AsyncDeepSeekLLM:
+    llm.async_base (а с ним httpx) нужен только серверному режиму, а не синхронному CLI.
+    """
+    with _async_lock:
+        cls = globals().get("AsyncDeepSeekLLM")
+        if cls is not None:
+            return cls
+        from llm.async_base import AsyncHTTPTransport, AsyncLLMBase
+
+        class AsyncDeepSeekLLM(AsyncLLMBase):
+            """
+            Асинхронный клиент DeepSeek. Формат запроса и ответа тот же, что у DeepSeekLLM.
+            """
+            __qualname__ = "AsyncDeepSeekLLM"
+            provider_name = "deepseek"
+
+            def __init__(
+                self,
+                api_key: Optional[str] = None,
+                api_url: Optional[str] = None,
+                model: Optional[str] = None,
+                transport: Optional[AsyncHTTPTransport] = None,
+                resilience: Optional[Resilience] = None
+            ):
+                super().__init__(**deepseek_config(api_key, api_url, model), transport=transport, resilience=resilience)
+
+            structured_output = DeepSeekLLM.structured_output
+            build_payload = DeepSeekLLM.build_payload
+            build_headers = DeepSeekLLM.build_headers
+            parse_response = DeepSeekLLM.parse_response
+            parse_usage = DeepSeekLLM.parse_usage
+
+        globals()["AsyncDeepSeekLLM"] = AsyncDeepSeekLLM
+        return AsyncDeepSeekLLM
+
+
+def __getattr__(name):
+    if name == "AsyncDeepSeekLLM":
+        return _async_class()
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
@@ -2,31 +2,45 @@
 Реализация LLM-провайдера для OpenAI.
 Максимально использует универсальный базовый класс LLMBase.
 """
-import os
+import threading
 from typing import List, Dict, Any, Optional
-from dotenv import load_dotenv
+from llm.settings import env, require
 from llm.base import LLMBase
+from llm.transport import HTTPTransport
+from llm.resilience import Resilience
 
-# Загружаем переменные окружения для OpenAI
-load_dotenv()
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-OPENAI_API_URL = os.getenv("OPENAI_API_URL")
-OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4.1-nano")
 
-if not (OPENAI_API_KEY and OPENAI_API_URL):
-    raise RuntimeError("Ошибка конфигурации: проверьте, что OPENAI_API_KEY и OPENAI_API_URL заданы в .env")
+def openai_config(api_key: Optional[str], api_url: Optional[str], model: Optional[str]) -> Dict[str, str]:
+    """
+    Настройки OpenAI: явные аргументы или OPENAI_API_KEY / OPENAI_API_URL / OPENAI_MODEL из окружения.
+    Проверяются только при создании клиента — конфигурация других провайдеров не нужна.
+    """
+    config = {
+        "api_key": api_key or env("OPENAI_API_KEY"),
+        "api_url": api_url or env("OPENAI_API_URL"),
+        "model": model or env("OPENAI_MODEL", "gpt-4.1-nano")
+    }
+    require(OPENAI_API_KEY=config["api_key"], OPENAI_API_URL=config["api_url"])
+    return config
 
 class OpenAILLM(LLMBase):
     """
     Класс для работы с OpenAI LLM через API.
     Реализует только специфичные методы.
     """
-    def __init__(self, api_key: Optional[str] = None, api_url: Optional[str] = None, model: Optional[str] = None):
-        super().__init__(
-            api_url=api_url or OPENAI_API_URL,
-            api_key=api_key or OPENAI_API_KEY,
-            model=model or OPENAI_MODEL
-        )
+    provider_name = "openai"
+    # Structured Outputs: ответ строго по JSON Schema
+    structured_output = "json_schema"
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        api_url: Optional[str] = None,
+        model: Optional[str] = None,
+        transport: Optional[HTTPTransport] = None,
+        resilience: Optional[Resilience] = None
+    ):
+        super().__init__(**openai_config(api_key, api_url, model), transport=transport, resilience=resilience)
 
     def build_payload(self, messages, temperature, max_tokens):
         return {
@@ -44,4 +58,50 @@ class OpenAILLM(LLMBase):
 
     def parse_response(self, data):
         # OpenAI возвращает OpenAI-совместимый формат
-        return data["choices"][0]["message"]["content"] 
\ No newline at end of file
+        return data["choices"][0]["message"]["content"]
+
+
+_async_lock = threading.Lock()
+
+
+def _async_class():
+    """
+    Асинхронный клиент создаётся при первом обращении к AsyncOpenAILLM:
+    llm.async_base (а с ним httpx) нужен только серверному режиму, а не синхронному CLI.
+    """
+    with _async_lock:
+        cls = globals().get("AsyncOpenAILLM")
+        if cls is not None:
+            return cls
+        from llm.async_base import AsyncHTTPTransport, AsyncLLMBase
+
+        class AsyncOpenAILLM(AsyncLLMBase):
+            """
+            Асинхронный клиент OpenAI. Формат запроса и ответа тот же, что у OpenAILLM.
+            """
+            __qualname__ = "AsyncOpenAILLM"
+            provider_name = "openai"
+
+            def __init__(
+                self,
+                api_key: Optional[str] = None,
+                api_url: Optional[str] = None,
+                model: Optional[str] = None,
+                transport: Optional[AsyncHTTPTransport] = None,
+                resilience: Optional[Resilience] = None
+            ):
+                super().__init__(**openai_config(api_key, api_url, model), transport=transport, resilience=resilience)
+
+            structured_output = OpenAILLM.structured_output
+            build_payload = OpenAILLM.build_payload
+            build_headers = OpenAILLM.build_headers
+            parse_response = OpenAILLM.parse_response
+
+        globals()["AsyncOpenAILLM"] = AsyncOpenAILLM
+        return AsyncOpenAILLM
+
+
+def __getattr__(name):
+    if name == "AsyncOpenAILLM":
+        return _async_class()
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
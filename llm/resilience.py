@@ -0,0 +1,389 @@
+"""
+Устойчивость вызовов LLM: повторы с экспоненциальной задержкой и джиттером (с учётом Retry-After),
+дублирующие («хеджированные») запросы для борьбы с хвостом задержек и предохранитель
+(circuit breaker), который при недоступности провайдера сразу отказывает, не дожидаясь таймаутов.
+
+Настраивается для каждого провайдера отдельно через переменные окружения с префиксом
+провайдера (OPENAI_MAX_ATTEMPTS, DEEPSEEK_HEDGE, ...) или общим префиксом LLM_.
+"""
+import asyncio
+import math
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError, wait
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Статусы, при которых запрос имеет смысл повторить
+RETRY_STATUSES = frozenset({408, 409, 429, 500, 502, 503, 504})
+
+
+class LLMAPIError(RuntimeError):
+    """
+    Ошибка обращения к LLM API. status — HTTP-статус (None для сетевых ошибок и таймаутов),
+    retry_after — пауза из заголовка Retry-After, секунды.
+    """
+    def __init__(self, message: str, status: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        return self.status is None or self.status in RETRY_STATUSES
+
+
+class CircuitOpenError(RuntimeError):
+    """Предохранитель разомкнут: провайдер считается недоступным, запрос не отправлялся."""
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After в секундах: число секунд или HTTP-дата. None, если заголовка нет или он некорректен."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return max(0.0, (moment - datetime.now(timezone.utc)).total_seconds())
+
+
+def _env(prefix: str, name: str, default: str) -> str:
+    return os.getenv(f"{prefix}_{name}", os.getenv(f"LLM_{name}", default))
+
+
+class RetryPolicy:
+    """
+    Повторы с экспоненциальной задержкой и «полным» джиттером:
+    пауза перед попыткой n — случайная в [0, min(max_delay, base_delay * 2**n)].
+    Если сервер прислал Retry-After, ждём столько, сколько он просит (но не больше max_retry_after).
+    """
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 8.0, max_retry_after: float = 30.0):
+        if max_attempts < 1:
+            raise ValueError("max_attempts должен быть не меньше 1")
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self._random = random.Random()
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Пауза перед повтором после неудачной попытки номер attempt (с нуля)."""
+        if retry_after is not None:
+            return min(retry_after, self.max_retry_after)
+        return self._random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """
+    Предохранитель провайдера:
+    - closed — запросы идут, подряд идущие сбои считаются;
+    - open — после failure_threshold сбоев подряд запросы сразу отклоняются recovery_timeout секунд;
+    - half_open — затем пропускается один пробный запрос: успех замыкает цепь, сбой снова размыкает.
+    Потокобезопасен.
+    """
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.failures = 0
+        self.rejected = 0
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self):
+        """Пропускает запрос или бросает CircuitOpenError."""
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+                self._state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self._state == self.CLOSED:
+                return
+            if self._state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            self.rejected += 1
+        raise CircuitOpenError(f"LLM-провайдер {self.name} временно недоступен, повторите позже")
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._state = self.CLOSED
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def release_probe(self):
+        """Пробный запрос завершился без вердикта о провайдере (ошибка разбора, отмена): можно пробовать снова."""
+        with self._lock:
+            self._probe_in_flight = False
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(name: str, failure_threshold: int = 5, recovery_timeout: float = 30.0) -> CircuitBreaker:
+    """Общий для процесса предохранитель провайдера по имени (например, 'openai:api.openai.com')."""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name, failure_threshold, recovery_timeout)
+        return breaker
+
+
+class HedgePolicy:
+    """
+    Дублирующий запрос: если ответ не пришёл за p-й перцентиль (по умолчанию p95) недавних задержек,
+    отправляется второй такой же запрос и берётся первый успешный ответ.
+    Пока замеров меньше min_samples, порогом служит initial_delay (None — не дублировать).
+    Второй запрос стоит денег, поэтому по умолчанию хеджирование выключено.
+    """
+    def __init__(self, percentile: float = 95.0, min_samples: int = 20, initial_delay: Optional[float] = None,
+                 min_delay: float = 0.05, window: int = 200):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float):
+        with self._lock:
+            self._latencies.append(latency)
+
+    def threshold(self) -> Optional[float]:
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return self.initial_delay
+            ordered = sorted(self._latencies)
+        rank = min(len(ordered) - 1, max(0, math.ceil(len(ordered) * self.percentile / 100) - 1))
+        return max(self.min_delay, ordered[rank])
+
+
+class Resilience:
+    """
+    Политика вызовов одного провайдера: повторы, хеджирование (необязательно) и предохранитель.
+    call(attempt) выполняет attempt() — одну попытку запроса — по этой политике.
+    attempt должен бросать LLMAPIError для ошибок API; прочие исключения не повторяются.
+    """
+    def __init__(self, retry: Optional[RetryPolicy] = None, breaker: Optional[CircuitBreaker] = None,
+                 hedge: Optional[HedgePolicy] = None, sleep: Callable[[float], None] = time.sleep):
+        self.retry = retry or RetryPolicy(max_attempts=1)
+        self.breaker = breaker
+        self.hedge = hedge
+        self._sleep = sleep
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self._stats = dict.fromkeys(("calls", "attempts", "retries", "failures", "hedged", "hedge_wins", "rejected"), 0)
+        self._stats_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, provider: str, breaker_name: Optional[str] = None) -> "Resilience":
+        """
+        Политика провайдера по переменным окружения (PREFIX — имя провайдера в верхнем регистре, иначе LLM):
+        PREFIX_MAX_ATTEMPTS (3), PREFIX_BACKOFF_BASE (0.5), PREFIX_BACKOFF_MAX (8),
+        PREFIX_HEDGE (0 — выкл.), PREFIX_HEDGE_PERCENTILE (95), PREFIX_HEDGE_INITIAL_DELAY (нет),
+        PREFIX_BREAKER_THRESHOLD (5, 0 — выкл.), PREFIX_BREAKER_RECOVERY (30).
+        """
+        prefix = provider.upper()
+        retry = RetryPolicy(
+            max_attempts=int(_env(prefix, "MAX_ATTEMPTS", "3")),
+            base_delay=float(_env(prefix, "BACKOFF_BASE", "0.5")),
+            max_delay=float(_env(prefix, "BACKOFF_MAX", "8"))
+        )
+        hedge = None
+        if _env(prefix, "HEDGE", "0").lower() in ("1", "true", "yes"):
+            initial = _env(prefix, "HEDGE_INITIAL_DELAY", "")
+            hedge = HedgePolicy(
+                percentile=float(_env(prefix, "HEDGE_PERCENTILE", "95")),
+                initial_delay=float(initial) if initial else None
+            )
+        breaker = None
+        threshold = int(_env(prefix, "BREAKER_THRESHOLD", "5"))
+        if threshold > 0:
+            breaker = get_circuit_breaker(
+                breaker_name or provider, threshold, float(_env(prefix, "BREAKER_RECOVERY", "30"))
+            )
+        return cls(retry=retry, breaker=breaker, hedge=hedge)
+
+    def _count(self, name: str, value: int = 1):
+        with self._stats_lock:
+            self._stats[name] += value
+
+    def stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def _attempt(self, attempt: Callable[[], T]) -> T:
+        """Одна попытка через предохранитель, с замером задержки для хеджирования."""
+        if self.breaker is not None:
+            try:
+                self.breaker.allow()
+            except CircuitOpenError:
+                self._count("rejected")
+                raise
+        self._count("attempts")
+        started = time.perf_counter()
+        try:
+            result = attempt()
+        except BaseException as e:
+            self._settle(e)
+            raise
+        self._settle(None)
+        if self.hedge is not None:
+            self.hedge.record(time.perf_counter() - started)
+        return result
+
+    def _settle(self, error: Optional[BaseException]):
+        """
+        Итог попытки для предохранителя. Сбой — только повторяемая ошибка API; неповторяемый HTTP-ответ (4xx)
+        значит, что провайдер отвечает. Любой другой исход (ошибка разбора, отмена) лишь освобождает пробный запрос,
+        иначе предохранитель навсегда остался бы в half_open.
+        """
+        if self.breaker is None:
+            return
+        if error is None or (isinstance(error, LLMAPIError) and not error.retryable):
+            self.breaker.record_success()
+        elif isinstance(error, LLMAPIError):
+            self.breaker.record_failure()
+        else:
+            self.breaker.release_probe()
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="llm-hedge")
+            return self._executor
+
+    def _hedged(self, attempt: Callable[[], T]) -> T:
+        threshold = self.hedge.threshold() if self.hedge is not None else None
+        if threshold is None:
+            return self._attempt(attempt)
+        pool = self._pool()
+        first = pool.submit(self._attempt, attempt)
+        try:
+            return first.result(timeout=threshold)
+        except FuturesTimeoutError:
+            pass
+        self._count("hedged")
+        second = pool.submit(self._attempt, attempt)
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        self._count("hedge_wins")
+                    # Проигравший запрос доработает в фоне: отменить уже отправленный HTTP-запрос нельзя
+                    return future.result()
+                error = error or future.exception()
+        raise error
+
+    def call(self, attempt: Callable[[], T], hedge: bool = True) -> T:
+        """
+        Выполняет attempt по политике. hedge=False — без дублирования (например, для потоковых запросов).
+        """
+        self._count("calls")
+        for number in range(self.retry.max_attempts):
+            try:
+                return self._hedged(attempt) if hedge else self._attempt(attempt)
+            except LLMAPIError as e:
+                if not e.retryable or number + 1 >= self.retry.max_attempts:
+                    self._count("failures")
+                    raise
+                self._count("retries")
+                self._sleep(self.retry.delay(number, e.retry_after))
+        raise AssertionError("unreachable")
+
+    async def call_async(self, attempt: Callable[[], "asyncio.Future"]):
+        """
+        Асинхронный вариант call: attempt — функция, возвращающая корутину одной попытки.
+        Дублирующий запрос отправляется в том же event loop, проигравший отменяется.
+        """
+        self._count("calls")
+        for number in range(self.retry.max_attempts):
+            try:
+                return await self._hedged_async(attempt)
+            except LLMAPIError as e:
+                if not e.retryable or number + 1 >= self.retry.max_attempts:
+                    self._count("failures")
+                    raise
+                self._count("retries")
+                await asyncio.sleep(self.retry.delay(number, e.retry_after))
+        raise AssertionError("unreachable")
+
+    async def _attempt_async(self, attempt):
+        if self.breaker is not None:
+            try:
+                self.breaker.allow()
+            except CircuitOpenError:
+                self._count("rejected")
+                raise
+        self._count("attempts")
+        started = time.perf_counter()
+        try:
+            result = await attempt()
+        except BaseException as e:
+            self._settle(e)
+            raise
+        self._settle(None)
+        if self.hedge is not None:
+            self.hedge.record(time.perf_counter() - started)
+        return result
+
+    async def _hedged_async(self, attempt):
+        threshold = self.hedge.threshold() if self.hedge is not None else None
+        if threshold is None:
+            return await self._attempt_async(attempt)
+        first = asyncio.ensure_future(self._attempt_async(attempt))
+        done, _ = await asyncio.wait({first}, timeout=threshold)
+        if done:
+            return first.result()
+        self._count("hedged")
+        second = asyncio.ensure_future(self._attempt_async(attempt))
+        pending = {first, second}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self._count("hedge_wins")
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
@@ -0,0 +1,74 @@
+"""
+Ответ LLM и разбор OpenAI-совместимого формата, общие для синхронных и асинхронных клиентов.
+Модуль не тянет HTTP-библиотек, поэтому его можно импортировать, не загружая провайдеров.
+"""
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+# Маркер конца потока в server-sent events OpenAI-совместимых API
+SSE_DONE = "[DONE]"
+
+# Режимы structured output (response_format OpenAI-совместимых API):
+# json_schema — ответ строго по JSON Schema (OpenAI), json_object — только гарантированно JSON (DeepSeek)
+STRUCTURED_OUTPUT_MODES = ("json_schema", "json_object")
+
+def structured_output_mode(provider: str, default: Optional[str]) -> Optional[str]:
+    """
+    Режим structured output клиента: PREFIX_STRUCTURED_OUTPUT (PREFIX — имя провайдера в верхнем регистре, иначе LLM)
+    со значением json_schema, json_object или off; без переменной — default провайдера.
+    """
+    value = os.getenv(f"{provider.upper()}_STRUCTURED_OUTPUT", os.getenv("LLM_STRUCTURED_OUTPUT", default or "off"))
+    value = value.strip().lower()
+    if value in ("", "0", "off", "none", "false", "no"):
+        return None
+    if value not in STRUCTURED_OUTPUT_MODES:
+        raise ValueError(f"Неизвестный режим structured output '{value}': ожидается {', '.join(STRUCTURED_OUTPUT_MODES)} или off")
+    return value
+
+def apply_response_format(payload: Dict[str, Any], mode: Optional[str], response_schema: Optional[Dict[str, Any]]):
+    """
+    Добавляет в payload response_format по режиму клиента.
+    response_schema — схема ответа в формате OpenAI json_schema ({"name", "strict", "schema"}).
+    """
+    if not (mode and response_schema):
+        return
+    if mode == "json_schema":
+        payload["response_format"] = {"type": "json_schema", "json_schema": response_schema}
+    else:
+        payload["response_format"] = {"type": "json_object"}
+
+def parse_sse_line(line: str) -> Optional[str]:
+    """
+    Возвращает содержимое строки 'data: ...' из SSE-потока или None для пустых и служебных строк.
+    """
+    if not line or not line.startswith("data:"):
+        return None
+    return line[len("data:"):].strip()
+
+@dataclass
+class LLMResponse:
+    """
+    Ответ LLM: текст и нормализованный блок usage
+    (prompt_tokens, completion_tokens, cached_tokens — если провайдер их сообщил),
+    время запроса по настенным часам (latency, секунды) и модель, ответившая на запрос.
+    """
+    text: str
+    usage: Dict[str, int] = field(default_factory=dict)
+    latency: float = 0.0
+    model: Optional[str] = None
+
+def parse_openai_usage(data: Dict[str, Any]) -> Dict[str, int]:
+    """
+    Нормализует usage OpenAI-совместимого ответа.
+    Закэшированные токены префикса OpenAI отдаёт в prompt_tokens_details.cached_tokens.
+    """
+    usage = data.get("usage") or {}
+    if not usage:
+        return {}
+    details = usage.get("prompt_tokens_details") or {}
+    return {
+        "prompt_tokens": usage.get("prompt_tokens", 0),
+        "completion_tokens": usage.get("completion_tokens", 0),
+        "cached_tokens": details.get("cached_tokens", 0)
+    }
@@ -0,0 +1,279 @@
+"""
+Маршрутизатор запросов между несколькими провайдерами и моделями.
+
+LLMRouter реализует тот же интерфейс, что и LLMBase (ask, complete, ask_stream, warmup),
+и для каждого запроса выбирает маршрут — клиента конкретного провайдера/модели.
+Выбор случайный с вероятностью, пропорциональной
+    weight * (1 - ewma ошибок) / ewma задержки,
+так что быстрые и надёжные маршруты получают больше запросов, а остальные продолжают
+получать немного трафика и их оценки не устаревают. Маршрут с исчерпанным лимитом
+одновременных запросов или разомкнутым предохранителем пропускается.
+При ошибке API запрос автоматически уходит на следующий маршрут.
+"""
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+from llm.base import LLMBase, LLMResponse
+from llm.resilience import CircuitBreaker, CircuitOpenError, LLMAPIError
+
+# Ошибки, при которых запрос переотправляется на другой маршрут
+FAILOVER_ERRORS = (LLMAPIError, CircuitOpenError)
+
+
+def _schema_options(route: "Route", response_schema: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Схема ответа уходит только клиентам с поддержкой structured output — остальные о ней не знают."""
+    if response_schema and getattr(route.client, "structured_output", None):
+        return {"response_schema": response_schema}
+    return {}
+
+
+class Route:
+    """
+    Маршрут: клиент LLM, его вес и лимит одновременных запросов (None — без лимита),
+    а также живые оценки — экспоненциальные скользящие средние задержки и доли ошибок.
+    Счётчики меняются только под замком роутера.
+    """
+    __slots__ = ("name", "client", "weight", "max_concurrency", "latency", "error_rate",
+                 "in_flight", "calls", "failures", "failovers")
+
+    def __init__(self, name: str, client, weight: float = 1.0, max_concurrency: Optional[int] = None):
+        if weight <= 0:
+            raise ValueError(f"Маршрут '{name}': вес должен быть положительным")
+        if max_concurrency is not None and max_concurrency < 1:
+            raise ValueError(f"Маршрут '{name}': max_concurrency должен быть не меньше 1")
+        self.name = name
+        self.client = client
+        self.weight = weight
+        self.max_concurrency = max_concurrency
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.in_flight = 0
+        self.calls = 0
+        self.failures = 0
+        self.failovers = 0
+
+    @property
+    def saturated(self) -> bool:
+        return self.max_concurrency is not None and self.in_flight >= self.max_concurrency
+
+    @property
+    def circuit_open(self) -> bool:
+        breaker = getattr(getattr(self.client, "resilience", None), "breaker", None)
+        return breaker is not None and breaker.state == CircuitBreaker.OPEN
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "model": getattr(self.client, "model", None),
+            "weight": self.weight,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "calls": self.calls,
+            "failures": self.failures,
+            "failovers": self.failovers,
+            "latency_ewma_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+            "error_rate_ewma": round(self.error_rate, 4),
+            "circuit_open": self.circuit_open,
+        }
+
+
+class LLMRouter(LLMBase):
+    """
+    Роутер поверх нескольких клиентов LLM.
+
+    - alpha — коэффициент сглаживания EWMA (доля последнего замера)
+    - queue_timeout — сколько ждать, если все маршруты заняты до лимита; затем RuntimeError
+    - model — общее имя для ключей кэша и логов; фактическая модель приходит в LLMResponse.model
+    """
+    provider_name = "router"
+
+    def __init__(self, routes: List[Route], alpha: float = 0.2, queue_timeout: float = 30.0, seed: Optional[int] = None):
+        if not routes:
+            raise ValueError("Роутеру нужен хотя бы один маршрут")
+        names = [route.name for route in routes]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Имена маршрутов должны быть уникальны: {names}")
+        self.routes = list(routes)
+        self.alpha = alpha
+        self.queue_timeout = queue_timeout
+        self.model = "router:" + ",".join(names)
+        self._random = random.Random(seed)
+        self._cond = threading.Condition()
+
+    def _score(self, route: Route, default_latency: float) -> float:
+        latency = route.latency if route.latency is not None else default_latency
+        return route.weight * max(1.0 - route.error_rate, 0.05) / max(latency, 1e-3)
+
+    def _acquire(self, tried: List[Route]) -> Route:
+        """Выбирает маршрут среди ещё не опробованных и занимает в нём слот."""
+        deadline = time.monotonic() + self.queue_timeout
+        with self._cond:
+            while True:
+                candidates = [route for route in self.routes if route not in tried and not route.saturated]
+                if not candidates and all(route in tried for route in self.routes):
+                    raise RuntimeError("Все маршруты LLM опробованы, ответа нет")
+                if candidates:
+                    # Маршруты с разомкнутым предохранителем — только если других нет (получим быстрый отказ)
+                    candidates = [route for route in candidates if not route.circuit_open] or candidates
+                    measured = [route.latency for route in self.routes if route.latency is not None]
+                    default_latency = sum(measured) / len(measured) if measured else 1.0
+                    scores = [self._score(route, default_latency) for route in candidates]
+                    route = self._random.choices(candidates, weights=scores)[0]
+                    route.in_flight += 1
+                    route.calls += 1
+                    return route
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise RuntimeError("Все маршруты LLM заняты: превышен лимит одновременных запросов")
+                self._cond.wait(remaining)
+
+    def _release(self, route: Route, latency: Optional[float], failed: bool):
+        with self._cond:
+            route.in_flight -= 1
+            route.error_rate += self.alpha * ((1.0 if failed else 0.0) - route.error_rate)
+            if failed:
+                route.failures += 1
+            elif latency is not None:
+                route.latency = latency if route.latency is None else route.latency + self.alpha * (latency - route.latency)
+            self._cond.notify()
+
+    @property
+    def structured_output(self) -> Optional[str]:
+        """Режим structured output первого маршрута, который его поддерживает (None — ни один)."""
+        return next((mode for mode in (getattr(route.client, "structured_output", None) for route in self.routes) if mode), None)
+
+    def complete(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 1.0,
+        max_tokens: int = 1024,
+        response_schema: Optional[Dict[str, Any]] = None
+    ) -> LLMResponse:
+        """
+        Отправляет запрос по выбранному маршруту; при ошибке API — по следующему.
+        Если отказали все маршруты, пробрасывается последняя ошибка. Прочие ошибки (например, некорректный ответ)
+        учитываются как сбой маршрута, но пробрасываются сразу.
+        response_schema получают только маршруты с поддержкой structured output.
+        """
+        tried: List[Route] = []
+        while True:
+            route = self._acquire(tried)
+            tried.append(route)
+            started = time.perf_counter()
+            try:
+                response = route.client.complete(messages, temperature, max_tokens, **_schema_options(route, response_schema))
+            except FAILOVER_ERRORS:
+                self._release(route, None, failed=True)
+                if len(tried) == len(self.routes):
+                    raise
+                with self._cond:
+                    route.failovers += 1
+                continue
+            except BaseException as e:
+                # Любая ошибка маршрута — сбой в его оценке, но переключаются только по ошибкам API;
+                # отмена (KeyboardInterrupt, CancelledError и т.п.) сбоем не считается
+                self._release(route, None, failed=isinstance(e, Exception))
+                raise
+            self._release(route, time.perf_counter() - started, failed=False)
+            return response
+
+    def ask_stream(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 1.0,
+        max_tokens: int = 1024,
+        response_schema: Optional[Dict[str, Any]] = None
+    ) -> Iterator[str]:
+        """
+        Потоковый запрос по выбранному маршруту. Переключение на другой маршрут возможно,
+        только пока пользователю не отдано ни одной порции текста. Досрочное закрытие потока сбоем не считается.
+        """
+        tried: List[Route] = []
+        while True:
+            route = self._acquire(tried)
+            tried.append(route)
+            started = time.perf_counter()
+            yielded = False
+            failed = False
+            try:
+                for chunk in route.client.ask_stream(messages, temperature, max_tokens, **_schema_options(route, response_schema)):
+                    yielded = True
+                    yield chunk
+            except FAILOVER_ERRORS:
+                failed = True
+                if yielded or len(tried) == len(self.routes):
+                    raise
+                with self._cond:
+                    route.failovers += 1
+                continue
+            except Exception:
+                failed = True
+                raise
+            finally:
+                self._release(route, None if failed else time.perf_counter() - started, failed)
+            return
+
+    def warmup(self) -> bool:
+        """Прогревает соединения всех маршрутов; True, если удалось хотя бы для одного."""
+        results = [route.client.warmup() for route in self.routes if hasattr(route.client, "warmup")]
+        return any(results)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Статистика по маршрутам: вызовы, ошибки, переключения, EWMA задержки и ошибок, занятость."""
+        with self._cond:
+            return {route.name: route.stats() for route in self.routes}
+
+    def build_payload(self, messages, temperature, max_tokens):
+        raise NotImplementedError("Роутер сам запросов не формирует — это делают клиенты маршрутов")
+
+    build_headers = build_payload
+    parse_response = build_payload
+
+
+def parse_routes(spec: str) -> List[Dict[str, Any]]:
+    """
+    Разбирает LLM_ROUTES: маршруты через запятую, каждый — 'провайдер[/модель][:вес[:лимит]]',
+    например 'openai/gpt-4.1-mini:3:16,deepseek:1,local:1:2'.
+    """
+    routes = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        parts = item.split(":")
+        if len(parts) > 3:
+            raise ValueError(f"LLM_ROUTES: некорректный маршрут '{item}'")
+        provider, _, model = parts[0].partition("/")
+        try:
+            weight = float(parts[1]) if len(parts) > 1 and parts[1] else 1.0
+            max_concurrency = int(parts[2]) if len(parts) > 2 and parts[2] else None
+        except ValueError:
+            raise ValueError(f"LLM_ROUTES: некорректный вес или лимит в '{item}'")
+        routes.append({
+            "name": item.split(":")[0],
+            "provider": provider.lower(),
+            "model": model or None,
+            "weight": weight,
+            "max_concurrency": max_concurrency,
+        })
+    if not routes:
+        raise ValueError("LLM_ROUTES не содержит ни одного маршрута")
+    return routes
+
+
+def router_from_env(create_client) -> LLMRouter:
+    """
+    Роутер по LLM_ROUTES (см. parse_routes). create_client(provider, model) создаёт клиента маршрута.
+    LLM_ROUTER_ALPHA — сглаживание EWMA, LLM_ROUTER_QUEUE_TIMEOUT — ожидание свободного слота, секунды.
+    """
+    spec = os.getenv("LLM_ROUTES", "")
+    routes = [
+        Route(item["name"], create_client(item["provider"], item["model"]), item["weight"], item["max_concurrency"])
+        for item in parse_routes(spec)
+    ]
+    return LLMRouter(
+        routes,
+        alpha=float(os.getenv("LLM_ROUTER_ALPHA", "0.2")),
+        queue_timeout=float(os.getenv("LLM_ROUTER_QUEUE_TIMEOUT", "30"))
+    )
@@ -0,0 +1,38 @@
+"""
+Настройки LLM из окружения. Файл .env читается один раз на процесс — при первом обращении;
+переменные, уже заданные в окружении, он не переопределяет.
+"""
+import os
+import threading
+from typing import Optional
+
+_env_loaded = False
+_env_lock = threading.Lock()
+
+
+def load_env():
+    """Загружает .env (однократно)."""
+    global _env_loaded
+    if _env_loaded:
+        return
+    with _env_lock:
+        if not _env_loaded:
+            from dotenv import load_dotenv
+            load_dotenv()
+            _env_loaded = True
+
+
+def env(name: str, default: Optional[str] = None) -> Optional[str]:
+    """Значение переменной окружения с учётом .env."""
+    load_env()
+    return os.getenv(name, default)
+
+
+def require(**values: Optional[str]):
+    """
+    Проверяет, что обязательные настройки провайдера заданы; иначе RuntimeError с их именами.
+    Вызывается при создании клиента, поэтому ошибка касается только выбранного провайдера.
+    """
+    missing = [name for name, value in values.items() if not value]
+    if missing:
+        raise RuntimeError(f"Ошибка конфигурации: проверьте, что {' и '.join(missing)} заданы в .env")
@@ -0,0 +1,123 @@
+"""
+Общий HTTP-транспорт для LLM-провайдеров.
+Держит постоянную сессию requests с ограниченным пулом keep-alive соединений,
+чтобы каждый ход диалога не платил заново за DNS, TCP и TLS.
+"""
+import os
+import threading
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class HTTPTransport:
+    """
+    Постоянная HTTP-сессия с ограниченным пулом соединений.
+
+    - pool_connections — сколько разных хостов держать в пуле
+    - pool_maxsize — максимум одновременных соединений к одному хосту;
+      при pool_block=True лишние запросы ждут свободное соединение, а не открывают новое
+    - connect_timeout / read_timeout — раздельные таймауты установки соединения и чтения ответа
+
+    Экземпляр можно разделять между потоками и диалогами: после создания
+    состояние сессии не меняется, а пул urllib3 потокобезопасен.
+    """
+    def __init__(
+        self,
+        pool_connections: int = 4,
+        pool_maxsize: int = 16,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 60.0,
+        pool_block: bool = True
+    ):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+
+        self._session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+            max_retries=0
+        )
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+    @classmethod
+    def from_env(cls) -> "HTTPTransport":
+        """
+        Создаёт транспорт по переменным окружения:
+        LLM_POOL_CONNECTIONS, LLM_POOL_MAXSIZE, LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT.
+        """
+        return cls(
+            pool_connections=int(os.getenv("LLM_POOL_CONNECTIONS", "4")),
+            pool_maxsize=int(os.getenv("LLM_POOL_MAXSIZE", "16")),
+            connect_timeout=float(os.getenv("LLM_CONNECT_TIMEOUT", "5")),
+            read_timeout=float(os.getenv("LLM_READ_TIMEOUT", "60"))
+        )
+
+    @property
+    def timeout(self) -> Tuple[float, float]:
+        """Пара (connect, read) в формате, который понимает requests."""
+        return (self.connect_timeout, self.read_timeout)
+
+    def post(
+        self,
+        url: str,
+        json: Dict[str, Any],
+        headers: Optional[Dict[str, str]] = None,
+        stream: bool = False
+    ) -> requests.Response:
+        """
+        Отправляет POST через общий пул соединений.
+        """
+        return self._session.post(url, json=json, headers=headers, timeout=self.timeout, stream=stream)
+
+    def warmup(self, url: str) -> bool:
+        """
+        Заранее открывает соединение к хосту url (DNS + TCP + TLS), чтобы первый
+        запрос к LLM не ждал рукопожатия. Ошибки не пробрасываются: прогрев —
+        только оптимизация. Возвращает True, если соединение удалось установить.
+        """
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}/"
+        try:
+            response = self._session.head(origin, timeout=self.timeout, allow_redirects=False)
+            response.close()
+            return True
+        except requests.RequestException:
+            return False
+
+    def close(self):
+        """Закрывает все соединения пула."""
+        self._session.close()
+
+
+_default_transport: Optional[HTTPTransport] = None
+_default_lock = threading.Lock()
+
+
+def get_default_transport() -> HTTPTransport:
+    """
+    Возвращает общий для процесса транспорт (создаётся при первом обращении).
+    """
+    global _default_transport
+    if _default_transport is None:
+        with _default_lock:
+            if _default_transport is None:
+                _default_transport = HTTPTransport.from_env()
+    return _default_transport
+
+
+def set_default_transport(transport: Optional[HTTPTransport]):
+    """
+    Подменяет общий транспорт (например, с другими лимитами пула).
+    None сбрасывает его — следующий вызов get_default_transport создаст новый.
+    """
+    global _default_transport
+    with _default_lock:
+        _default_transport = transport
@@ -2,27 +2,163 @@
 CLI-интерфейс для запуска диалогового заполнения форм.
 """
 import argparse
+import json
+import os
 import sys
-from pathlib import Path
+from contextlib import nullcontext
+from app.checkpoint import CHECKPOINT_DIR
 from app.dialog_manager import DialogManager
+from app.form_registry import get_registry
+from app.response_cache import ResponseCache
+from app.metrics import start_metrics_server
+from app.batch import run_batch
+from app.answer_store import AnswerStore, export_csv, export_jsonl
+from llm.settings import load_env
 
 
 def main():
     parser = argparse.ArgumentParser(description="LLM-форма заполнения")
-    parser.add_argument("-f", "--form", required=True, help="Имя JSON-файла формы (в папке forms/)")
+    parser.add_argument("-f", "--form", help="Имя JSON-файла формы (в папке forms/)")
+    parser.add_argument("--resume", metavar="SESSION", help="Продолжить прерванную сессию по её id (форма берётся из контрольной точки)")
+    parser.add_argument("--no-checkpoint", action="store_true", help="Не сохранять контрольные точки диалога в checkpoints/")
+    parser.add_argument("--serve", type=int, metavar="PORT", help="Серверный режим: много диалогов по HTTP в одном процессе (см. app/server.py)")
+    parser.add_argument("--host", default="127.0.0.1", help="Адрес, на котором слушает сервер (--serve)")
+    parser.add_argument("--stream", action="store_true", help="Получать ответ LLM потоково (SSE)")
+    parser.add_argument("--pipeline", action="store_true", help="Задавать следующий вопрос сразу, разбирая предыдущий ответ в фоне")
+    parser.add_argument("--relevant-schema", action="store_true", help="Описывать LLM только поля, нужные на этом ходе (короче промпт)")
+    parser.add_argument("--shard-size", type=int, metavar="N", help="Большие формы: разбирать ответ параллельно по шардам до N полей (по группам полей)")
+    parser.add_argument("--delta", action="store_true", help="LLM возвращает только изменившиеся поля")
+    parser.add_argument("--no-prewarm", action="store_true", help="Не открывать соединение с LLM заранее")
+    parser.add_argument("--no-fast-path", action="store_true", help="Отправлять в LLM каждый ответ, даже однозначный")
+    parser.add_argument("--cache", action="store_true", help="Кэшировать ответы LLM в памяти (запросы идут с temperature=0)")
+    parser.add_argument("--cache-db", metavar="PATH", help="Файл SQLite для кэша ответов, общего для нескольких процессов (включает --cache)")
+    parser.add_argument("--answers-db", metavar="PATH", help="Сохранять результаты в SQLite-хранилище вместо файлов answers/*.json")
+    parser.add_argument("--export", choices=("jsonl", "csv"), help="Выгрузить результаты из --answers-db (формы --form, если задана) в --output или stdout")
+    parser.add_argument("--metrics-port", type=int, help="Отдавать метрики вызовов LLM по HTTP (/metrics, /metrics.json)")
+    parser.add_argument("--batch", metavar="INPUT", help="Пакетный режим: JSONL с документами {\"id\", \"text\"} вместо диалога")
+    parser.add_argument("--output", metavar="PATH", help="Куда писать результаты пакетного режима (по умолчанию answers/<форма>_batch.jsonl) или выгрузки --export")
+    parser.add_argument("--concurrency", type=int, default=8, help="Число одновременных запросов к LLM в пакетном режиме")
+    parser.add_argument("--unordered", action="store_true", help="Писать результаты пакетного режима по мере готовности, а не в порядке входа")
     args = parser.parse_args()
+    # Настройки приложения (журнал, окно истории, сервер) тоже могут лежать в .env
+    load_env()
+    if args.shard_size is not None and args.shard_size < 1:
+        parser.error("--shard-size должен быть не меньше 1")
+    if args.shard_size and (args.serve or args.stream):
+        parser.error("--shard-size не сочетается с --serve и --stream")
+    if args.answers_db and args.batch:
+        parser.error("--answers-db не сочетается с --batch (результаты пакетного режима пишутся в --output)")
+    if args.export:
+        if not args.answers_db:
+            parser.error("--export требует --answers-db")
+        export_answers(args)
+        return
+    if args.serve:
+        # asyncio и серверный модуль нужны только в этом режиме — CLI-диалог их не импортирует
+        import asyncio
+        from app.server import serve
+        cache = ResponseCache(path=args.cache_db) if (args.cache or args.cache_db) else None
+        if args.metrics_port:
+            start_metrics_server(args.metrics_port)
+        try:
+            with open_answer_store(args.answers_db) as answer_store:
+                asyncio.run(serve(
+                    args.host, args.serve, delta=args.delta, fast_path=not args.no_fast_path, cache=cache,
+                    relevant_schema=args.relevant_schema, answer_store=answer_store
+                ))
+        except KeyboardInterrupt:
+            pass
+        return
+    if not args.form and not args.resume:
+        parser.error("нужна форма (-f/--form) или сессия для продолжения (--resume)")
+    if args.resume and args.batch:
+        parser.error("--resume не сочетается с --batch")
+    if args.pipeline and args.stream:
+        parser.error("--pipeline не сочетается с --stream")
 
-    form_path = Path("forms") / args.form
-    if not form_path.exists():
-        print(f"Форма '{args.form}' не найдена в каталоге forms/.")
-        sys.exit(1)
+    form = None
+    if not args.resume:
+        try:
+            form = get_registry().resolve(args.form)
+        except FileNotFoundError:
+            print(f"Форма '{args.form}' не найдена в каталоге forms/.")
+            sys.exit(1)
+        except Exception as e:
+            print(f"Ошибка при запуске диалога: {e}")
+            sys.exit(1)
 
     try:
-        dialog = DialogManager(str(form_path))
-        dialog.run()
+        if args.metrics_port:
+            start_metrics_server(args.metrics_port)
+        cache = ResponseCache(path=args.cache_db) if (args.cache or args.cache_db) else None
+        if args.batch:
+            output = args.output or os.path.join("answers", f"{form['id']}_batch.jsonl")
+            report = run_batch(
+                form, args.batch, output,
+                concurrency=args.concurrency, ordered=not args.unordered, delta=args.delta, cache=cache,
+                shard_size=args.shard_size
+            )
+            print(json.dumps(report.summary(), ensure_ascii=False, indent=2))
+            print(f"Результаты записаны в {output}")
+            return
+        with open_answer_store(args.answers_db) as answer_store:
+            dialog_options = dict(
+                prewarm=not args.no_prewarm,
+                stream=args.stream,
+                pipeline=args.pipeline,
+                relevant_schema=args.relevant_schema,
+                shard_size=args.shard_size,
+                delta=args.delta,
+                fast_path=not args.no_fast_path,
+                cache=cache,
+                answer_store=answer_store
+            )
+            if args.resume:
+                # Продолжение сессии: state, история и вопрос восстанавливаются из checkpoints/<сессия>.jsonl
+                dialog = DialogManager.resume(args.resume, checkpoint_dir=CHECKPOINT_DIR, **dialog_options)
+            else:
+                dialog = DialogManager(
+                    form=form,
+                    checkpoint_dir=None if args.no_checkpoint else CHECKPOINT_DIR,
+                    **dialog_options
+                )
+            dialog.run()
+    except FileNotFoundError as e:
+        print(e)
+        sys.exit(1)
     except Exception as e:
         print(f"Ошибка при запуске диалога: {e}")
         sys.exit(1)
 
+
+def open_answer_store(path):
+    """Хранилище результатов по --answers-db для with-блока режима (без пути — None)."""
+    return AnswerStore(path) if path else nullcontext()
+
+
+def export_answers(args):
+    """--export: потоковая выгрузка результатов из хранилища в JSONL или CSV."""
+    form = None
+    if args.form:
+        try:
+            form = get_registry().resolve(args.form)
+        except FileNotFoundError:
+            print(f"Форма '{args.form}' не найдена в каталоге forms/.")
+            sys.exit(1)
+    with AnswerStore(args.answers_db) as store:
+        records = store.query(form_id=form["id"] if form else None)
+        out = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+        try:
+            if args.export == "csv":
+                fields = form.field_order if form else None
+                count = export_csv(records, out, fields)
+            else:
+                count = export_jsonl(records, out)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+    print(f"Выгружено записей: {count}", file=sys.stderr)
+
+
 if __name__ == "__main__":
     main()
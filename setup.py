@@ -6,6 +6,7 @@ setup(
     packages=find_packages(),
     install_requires=[
         "requests>=2.31.0",
+        "httpx>=0.27.0",
         "python-dotenv>=1.0.0",
         "pytest>=7.4.0",
         "pytest-cov>=4.1.0"
@@ -5,7 +5,7 @@ import os
 import shutil
 from pathlib import Path
 import pytest
-from app.extractor import extract_fields, extract_json_from_markdown
+from app.extractor import extract_fields
 from llm import get_llm
 
 @pytest.fixture
@@ -47,13 +47,13 @@ def mock_llm(monkeypatch):
                 raise ValueError(f"Unknown response key: {response_key}")
             self.current_response = response_key
             
-        def ask(self, messages):
+        def ask(self, messages, **kwargs):
             """Return the current predefined response."""
             return self.responses[self.current_response]
     
     mock = MockLLM()
-    # Mock the get_llm function to return our mock LLM
-    monkeypatch.setattr("llm.get_llm", lambda: mock)
+    # The extractor uses its shared default client, so replace that instead of the provider factory
+    monkeypatch.setattr("app.extractor._default_llm", mock)
     return mock
 
 @pytest.fixture
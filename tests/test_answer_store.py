@@ -0,0 +1,105 @@
+import csv
+import io
+import json
+import threading
+
+import pytest
+
+from app.answer_store import AnswerStore, answer_record, export_csv, export_jsonl
+from app.dialog_manager import DialogManager
+
+
+def filled(value):
+    return {"value": value, "status": "filled", "optional": False}
+
+
+def test_group_commit_and_indexed_queries(tmp_path):
+    """Concurrent waiting writers share transactions; re-saving a session replaces it; queries filter by form and time."""
+    store = AnswerStore(str(tmp_path / "answers.sqlite"))
+    form = {"id": "email"}
+
+    def save(worker):
+        for i in range(20):
+            store.put(answer_record(form, f"s{worker}_{i}", {"A": filled(i)}, saved_at=1000 + i), wait=True)
+
+    threads = [threading.Thread(target=save, args=(worker,)) for worker in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    store.put(answer_record({"id": "order"}, "s0_0", {"B": filled("x")}, saved_at=2000))
+    store.flush()
+
+    stats = store.stats()
+    assert stats["records"] == 161 and stats["commits"] < 161
+    assert store.count() == 160 and store.count("email") == 159
+    assert store.get("s0_0")["form_id"] == "order"
+    assert store.get("missing") is None
+    window = list(store.query(form_id="email", since=1005, until=1010))
+    assert len(window) == 40 and all(1005 <= record["saved_at"] < 1010 for record in window)
+    assert [record["saved_at"] for record in store.query(limit=3)] == [1000, 1000, 1000]
+    store.close()
+
+    reopened = AnswerStore(str(tmp_path / "answers.sqlite"))
+    assert reopened.get("s7_19")["state"] == {"A": filled(19)}
+    reopened.close()
+
+
+def test_export_jsonl_and_csv(tmp_path):
+    """Exports stream records in time order; CSV has one column per field with empty cells for unfilled ones."""
+    with AnswerStore(str(tmp_path / "answers.sqlite")) as store:
+        store.put(answer_record({"id": "f"}, "b", {"A": filled(["x", "y"]), "B": filled(2)}, saved_at=20))
+        store.put(answer_record({"id": "f"}, "a", {"A": filled("z"), "B": {"value": None, "status": "skipped", "optional": True}}, saved_at=10))
+        store.flush()
+        lines = io.StringIO()
+        assert export_jsonl(store.query(form_id="f"), lines) == 2
+        assert [json.loads(line)["session_id"] for line in lines.getvalue().splitlines()] == ["a", "b"]
+        table = io.StringIO()
+        assert export_csv(store.query(form_id="f"), table) == 2
+
+    rows = list(csv.reader(io.StringIO(table.getvalue())))
+    assert rows[0] == ["session_id", "form_id", "saved_at", "A", "B"]
+    assert rows[1][0:2] == ["a", "f"] and rows[1][3:] == ["z", ""]
+    assert rows[2][3:] == ["x; y", "2"]
+
+
+def test_dialog_saves_into_store(tmp_path, forms_dir):
+    """With an answer store the dialog result goes into it instead of answers/*.json."""
+    with AnswerStore(str(tmp_path / "answers.sqlite")) as store:
+        dialog = DialogManager(form_path=str(forms_dir / "email.json"), answer_store=store)
+        name = dialog.form["fields"][0]["name"]
+        dialog.state[name] = filled("test@example.com")
+        dialog.save_result()
+        record = store.get(dialog.session_id)
+    assert dialog.output_path == f"{store.path}#{dialog.session_id}"
+    assert record["form_id"] == "email" and record["form_version"] == dialog.form.version
+    assert record["state"][name]["value"] == "test@example.com"
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_writer_failure_releases_waiting_puts(tmp_path, monkeypatch):
+    """If the writer thread dies, waiting puts and flush get its error instead of blocking; later puts are refused."""
+    store = AnswerStore(str(tmp_path / "answers.sqlite"))
+
+    def broken(batch):
+        raise RuntimeError("диск отвалился")
+
+    monkeypatch.setattr(store, "_commit", broken)
+    errors = []
+
+    def save():
+        try:
+            store.put(answer_record({"id": "f"}, "a", {"A": filled(1)}), wait=True)
+        except Exception as e:
+            errors.append(e)
+
+    writer = threading.Thread(target=save)
+    writer.start()
+    writer.join(5)
+    assert not writer.is_alive()
+    assert isinstance(errors[0], RuntimeError)
+    with pytest.raises(ValueError):
+        store.put(answer_record({"id": "f"}, "b", {"A": filled(2)}))
+    store.close()
+    with pytest.raises(ValueError):
+        store.put(answer_record({"id": "f"}, "c", {"A": filled(3)}), wait=True)
@@ -0,0 +1,113 @@
+import asyncio
+import json
+import threading
+import time
+import pytest
+from benchmarks.stub_server import StubLLMServer
+from app.extractor import extract_fields_async
+from app.response_cache import ResponseCache
+from llm.async_base import AsyncHTTPTransport
+from llm.openai import AsyncOpenAILLM
+
+@pytest.fixture
+def sample_form():
+    """Return a minimal form for testing."""
+    return {
+        "id": "test_form",
+        "title": "Test Form",
+        "description": "A test form",
+        "fields": [
+            {
+                "name": "Фамилия",
+                "type": "str",
+                "required": True,
+                "description": "Введите фамилию"
+            }
+        ]
+    }
+
+FILLED = '{"state": {"Фамилия": {"value": "Иванов", "status": "filled", "optional": false}}, "next_question": null}'
+
+class FakeAsyncLLM:
+    """Async client that records the prompts it was given."""
+    def __init__(self, response):
+        self.response = response
+        self.calls = []
+
+    async def ask(self, messages, **options):
+        self.calls.append(messages)
+        await asyncio.sleep(0)
+        return self.response
+
+def test_extract_fields_async_uses_given_client(sample_form):
+    """extract_fields_async talks only to the client passed in."""
+    client = FakeAsyncLLM(FILLED)
+    state = {"Фамилия": {"value": None, "status": "not_started", "optional": False}}
+
+    new_state, next_question = asyncio.run(extract_fields_async(
+        [{"role": "user", "content": "Иванов"}], sample_form, state, llm_client=client
+    ))
+
+    assert new_state["Фамилия"]["value"] == "Иванов"
+    assert next_question is None
+    assert len(client.calls) == 1
+
+def test_disk_cache_stays_off_the_event_loop(sample_form, tmp_path):
+    """With a SQLite cache tier, lookups and stores run in worker threads; a repeated turn is served from the cache."""
+    client = FakeAsyncLLM(FILLED)
+    cache = ResponseCache(path=str(tmp_path / "cache.sqlite"))
+    disk_threads = []
+    for name in ("get", "put"):
+        method = getattr(cache.disk, name)
+        setattr(cache.disk, name, lambda *args, method=method: disk_threads.append(threading.get_ident()) or method(*args))
+    state = {"Фамилия": {"value": None, "status": "not_started", "optional": False}}
+    messages = [{"role": "user", "content": "Иванов"}]
+
+    async def scenario():
+        first = await extract_fields_async(messages, sample_form, state, llm_client=client, cache=cache)
+        cache._memory.clear()
+        second = await extract_fields_async(messages, sample_form, state, llm_client=client, cache=cache)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    cache.close()
+
+    assert first == second and len(client.calls) == 1
+    assert cache.stats()["disk_hits"] == 1
+    assert len(disk_threads) == 3 and threading.get_ident() not in disk_threads
+
+def test_async_openai_llm_against_stub_server():
+    """AsyncOpenAILLM parses an OpenAI-compatible response."""
+    async def scenario(url):
+        async with AsyncOpenAILLM(api_key="x", api_url=url, model="stub") as client:
+            return await client.ask([{"role": "user", "content": "hi"}])
+
+    with StubLLMServer(content=FILLED) as server:
+        response = asyncio.run(scenario(server.url))
+
+    assert json.loads(response)["state"]["Фамилия"]["status"] == "filled"
+
+def test_async_calls_run_concurrently():
+    """Many in-flight calls on one event loop overlap instead of queueing."""
+    async def scenario(url):
+        transport = AsyncHTTPTransport(pool_maxsize=50)
+        async with AsyncOpenAILLM(api_key="x", api_url=url, model="stub", transport=transport) as client:
+            return await asyncio.gather(*(client.ask([{"role": "user", "content": str(i)}]) for i in range(20)))
+
+    with StubLLMServer(content=FILLED, latency=0.2) as server:
+        start = time.perf_counter()
+        results = asyncio.run(scenario(server.url))
+        elapsed = time.perf_counter() - start
+
+    assert len(results) == 20
+    # Sequential execution would take 20 * 0.2 = 4 seconds
+    assert elapsed < 2.0
+
+def test_async_llm_connection_error_is_runtime_error():
+    """Transport failures surface as RuntimeError, like the sync client."""
+    async def scenario():
+        async with AsyncOpenAILLM(api_key="x", api_url="http://127.0.0.1:9/v1/chat/completions") as client:
+            await client.ask([{"role": "user", "content": "hi"}])
+
+    with pytest.raises(RuntimeError, match="Ошибка при обращении к LLM API"):
+        asyncio.run(scenario())
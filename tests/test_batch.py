@@ -0,0 +1,85 @@
+import json
+import random
+import threading
+import time
+import pytest
+from app.batch import run_batch, completed_ids
+
+@pytest.fixture
+def form():
+    """Return a single-field form."""
+    return {
+        "id": "test_form",
+        "title": "Test Form",
+        "description": "A test form",
+        "fields": [{"name": "Фамилия", "type": "str", "required": True, "description": "Введите фамилию"}]
+    }
+
+class EchoLLM:
+    """Thread-safe stub that fills the field with the document text after a random delay."""
+    def __init__(self, fail_on=()):
+        self.fail_on = set(fail_on)
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def ask(self, messages):
+        with self.lock:
+            self.calls += 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(random.uniform(0, 0.01))
+            text = [m for m in messages if m["role"] == "user"][-1]["content"]
+            if text in self.fail_on:
+                return "not json"
+            state = {"Фамилия": {"value": text, "status": "filled", "optional": False}}
+            return json.dumps({"state": state, "next_question": None}, ensure_ascii=False)
+        finally:
+            with self.lock:
+                self.active -= 1
+
+def write_input(path, texts):
+    path.write_text("\n".join(json.dumps({"id": f"doc{i}", "text": t}, ensure_ascii=False) for i, t in enumerate(texts)), encoding="utf-8")
+
+def read_output(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines() if line.strip()]
+
+def test_ordered_output_and_bounded_concurrency(form, tmp_path):
+    """Results follow input order and no more than `concurrency` calls run at once."""
+    texts = [f"Фамилия{i}" for i in range(30)]
+    write_input(tmp_path / "in.jsonl", texts)
+    llm = EchoLLM()
+    report = run_batch(form, str(tmp_path / "in.jsonl"), str(tmp_path / "out.jsonl"), llm_client=llm, concurrency=4)
+
+    records = read_output(tmp_path / "out.jsonl")
+    assert [r["id"] for r in records] == [f"doc{i}" for i in range(30)]
+    assert records[5]["state"]["Фамилия"]["value"] == "Фамилия5"
+    assert llm.max_active <= 4
+    summary = report.summary()
+    assert summary["succeeded"] == 30
+    assert summary["error_rate"] == 0.0
+
+def test_errors_are_reported_and_retried_on_resume(form, tmp_path):
+    """Failed items are recorded; a second run skips successes and retries failures."""
+    write_input(tmp_path / "in.jsonl", ["Иванов", "плохой", "Петров"])
+    out = tmp_path / "out.jsonl"
+    report = run_batch(form, str(tmp_path / "in.jsonl"), str(out), llm_client=EchoLLM(fail_on={"плохой"}), ordered=False)
+    assert report.failed == 1
+    assert completed_ids(str(out)) == {"doc0", "doc2"}
+
+    # Simulate a crash that left a truncated line behind
+    with open(out, "a", encoding="utf-8") as f:
+        f.write('{"id": "doc1", "sta')
+    llm = EchoLLM()
+    report = run_batch(form, str(tmp_path / "in.jsonl"), str(out), llm_client=llm)
+    assert report.skipped == 2
+    assert llm.calls == 1
+    assert completed_ids(str(out)) == {"doc0", "doc1", "doc2"}
+
+def test_malformed_input_lines_become_errors(form, tmp_path):
+    """A broken input line does not stop the batch."""
+    (tmp_path / "in.jsonl").write_text('{"id": "a", "text": "Иванов"}\nnot json\n{"id": "c"}\n', encoding="utf-8")
+    report = run_batch(form, str(tmp_path / "in.jsonl"), str(tmp_path / "out.jsonl"), llm_client=EchoLLM())
+    assert (report.succeeded, report.failed) == (1, 2)
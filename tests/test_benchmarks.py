@@ -0,0 +1,47 @@
+import pytest
+from benchmarks import bench_extract, bench_startup
+from benchmarks.stub_server import StubLLMServer, form_responder, latency_model
+from app.extractor import extract_fields
+from llm.openai import OpenAILLM
+from llm.transport import HTTPTransport
+
+def test_latency_model_specs():
+    """Latency specs produce the expected kinds of samplers."""
+    assert latency_model("0.05")() == 0.05
+    assert 0.01 <= latency_model("uniform:0.01,0.02", seed=1)() <= 0.02
+    assert latency_model("lognormal:0.2,0.5", seed=1)() > 0
+    with pytest.raises(ValueError):
+        latency_model("weird:1")
+
+def test_stub_injects_errors_with_retry_after():
+    """With error_rate=1 every request fails with the configured status and Retry-After."""
+    with StubLLMServer(error_rate=1.0, error_statuses=(429,), retry_after=2) as server:
+        transport = HTTPTransport()
+        response = transport.post(server.url, json={"messages": []})
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "2"
+        assert server.errors == 1
+        transport.close()
+
+def test_form_responder_follows_contract(sample_form_json):
+    """The templated responder fills the next pending field with the user's answer."""
+    with StubLLMServer(responder=form_responder) as server:
+        llm = OpenAILLM(api_key="x", api_url=server.url, model="stub", transport=HTTPTransport())
+        state = {name: {"value": None, "status": "not_started", "optional": False} for name in ("Фамилия", "Имя")}
+        messages = [{"role": "assistant", "content": "Фамилия?"}, {"role": "user", "content": "Иванов"}]
+        state, question = extract_fields(messages, sample_form_json, state, llm_client=llm)
+    assert state["Фамилия"] == {"value": "Иванов", "status": "filled", "optional": False}
+    assert state["Имя"]["status"] == "not_started"
+    assert question is None
+
+def test_extract_benchmark_reports_json():
+    """The extract benchmark covers every bundled form."""
+    report = bench_extract.run(repeat=3)
+    assert report["benchmark"] == "extract"
+    assert report["forms"]["passport"]["full"]["count"] == 3
+
+def test_startup_benchmark_measures_first_prompt():
+    """The startup benchmark reaches the first question without loading HTTP libraries on import."""
+    report = bench_startup.run(runs=1)
+    assert report["first_prompt"]["count"] == 1
+    assert report["http_loaded_on_import"] is False
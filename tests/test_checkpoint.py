@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+from app.checkpoint import Checkpoint, load_checkpoint
+from app.dialog_manager import DialogManager
+
+
+def _no_llm(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("LLM must not be called")
+    monkeypatch.setattr("app.dialog_manager.extract_fields", fail)
+
+
+def test_checkpoint_replays_deltas_and_ignores_torn_tail(tmp_path):
+    """Turns are replayed in order; a half-written last line from a crash is skipped; compaction keeps the result."""
+    checkpoint = Checkpoint(str(tmp_path / "s.jsonl"), compact_every=3)
+    checkpoint.start({"session": "s", "form_id": "f", "form_version": "v"})
+    filled = {"value": "a", "status": "filled", "optional": False}
+    checkpoint.append({"state": {"A": filled}, "keep": 0, "messages": [{"role": "assistant", "content": "q1"}], "question": "q1"})
+    checkpoint.append({"state": {}, "keep": 1, "messages": [{"role": "user", "content": "a1"}], "question": "q2"})
+    checkpoint.append({"state": {}, "keep": 1, "messages": [{"role": "user", "content": "a1'"}], "question": "q3"})
+    checkpoint.close()
+    with open(checkpoint.path, "a", encoding="utf-8") as f:
+        f.write('{"kind": "turn", "state": {"B"')
+
+    session = load_checkpoint(checkpoint.path)
+    assert session["turns"] == 3
+    assert session["state"] == {"A": filled}
+    assert [m["content"] for m in session["messages"]] == ["q1", "a1'"]
+    assert session["question"] == "q3"
+
+    assert checkpoint.needs_compaction()
+    checkpoint.compact(session["header"], {"state": session["state"], "keep": 0, "messages": session["messages"], "question": "q3"})
+    assert len(open(checkpoint.path, encoding="utf-8").readlines()) == 2
+    compacted = load_checkpoint(checkpoint.path)
+    assert (compacted["state"], compacted["messages"]) == (session["state"], session["messages"])
+
+
+def test_quit_and_resume_dialog(monkeypatch, tmp_path, forms_dir):
+    """A session quit halfway is resumed by id: earlier answers are kept and the interrupted question is repeated."""
+    monkeypatch.chdir(tmp_path)
+    _no_llm(monkeypatch)
+    checkpoints = str(tmp_path / "checkpoints")
+    answers = iter(["test@example.com", "выход"])
+    monkeypatch.setattr("builtins.input", lambda _="": next(answers))
+    first = DialogManager(form_path=str(forms_dir / "email.json"), checkpoint_dir=checkpoints)
+    first.run()
+    assert first.state["Адрес получателя"]["status"] == "filled"
+
+    answers = iter(["Тестовая тема", "Текст письма", "да"])
+    monkeypatch.setattr("builtins.input", lambda _="": next(answers))
+    printed = []
+    monkeypatch.setattr("builtins.print", lambda *args, **kwargs: printed.append(" ".join(map(str, args))))
+    resumed = DialogManager.resume(first.session_id, checkpoint_dir=checkpoints)
+    assert resumed.state["Адрес получателя"]["value"] == "test@example.com"
+    assert [m["content"] for m in resumed.messages] == ["Введите значение поля 'Адрес получателя':", "test@example.com"]
+    resumed.run()
+
+    assert "Введите значение поля 'Тема':" in printed
+    saved = json.loads((tmp_path / resumed.output_path).read_text(encoding="utf-8"))
+    assert all(field["status"] == "filled" for field in saved.values())
+    assert not (tmp_path / "checkpoints" / f"{first.session_id}.jsonl").exists()
+    roles = [event["role"] for event in resumed.log]
+    assert roles.count("resume") == 1 and roles.index("resume") > roles.index("user")
+
+
+def test_resume_rejects_changed_form(monkeypatch, tmp_path, forms_dir):
+    """A checkpoint made for another version of the form cannot be resumed."""
+    monkeypatch.chdir(tmp_path)
+    _no_llm(monkeypatch)
+    form = json.loads((forms_dir / "email.json").read_text(encoding="utf-8"))
+    answers = iter(["test@example.com", "выход"])
+    monkeypatch.setattr("builtins.input", lambda _="": next(answers))
+    dm = DialogManager(form=form, checkpoint_dir="checkpoints")
+    dm.run()
+
+    path = tmp_path / "checkpoints" / f"{dm.session_id}.jsonl"
+    lines = path.read_text(encoding="utf-8").splitlines()
+    header = json.loads(lines[0])
+    header["form"]["title"] = "Другая редакция"
+    path.write_text("\n".join([json.dumps(header, ensure_ascii=False)] + lines[1:]) + "\n", encoding="utf-8")
+    with pytest.raises(ValueError):
+        DialogManager.resume(dm.session_id)
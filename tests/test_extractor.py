@@ -1,5 +1,7 @@
+import json
 import pytest
-from app.extractor import extract_json_from_markdown, extract_fields
+from app.extractor import extract_fields
+from app.response_parser import parse_json_response
 from app.models import Form
 
 @pytest.fixture
@@ -27,7 +29,7 @@ def sample_form():
 ])
 def test_strip_markdown(raw, expected):
     """Test JSON extraction from markdown and raw JSON."""
-    assert extract_json_from_markdown(raw) == expected
+    assert parse_json_response(raw)[0] == json.loads(expected)
 
 def test_extract_fields_next_question_none(mock_llm, sample_form):
     """Test that next_question is None when all fields are filled."""
@@ -47,4 +49,67 @@ def test_extract_fields_next_question_none(mock_llm, sample_form):
     )
     
     # Verify next_question is None
-    assert next_question is None 
\ No newline at end of file
+    assert next_question is None
+
+
+class FakeLLM:
+    """LLM stub that returns a fixed response."""
+    def __init__(self, response):
+        self.response = response
+
+    def ask(self, messages):
+        return self.response
+
+@pytest.fixture
+def two_field_form():
+    """Return a form with two fields for delta tests."""
+    return {
+        "id": "test_form",
+        "title": "Test Form",
+        "description": "A test form",
+        "fields": [
+            {"name": "Фамилия", "type": "str", "required": True, "description": "Введите фамилию"},
+            {"name": "Имя", "type": "str", "required": True, "description": "Введите имя"}
+        ]
+    }
+
+def test_extract_fields_delta_merges_changes(two_field_form):
+    """Delta responses update only the changed fields and keep the rest."""
+    state = {
+        "Фамилия": {"value": "Иванов", "status": "filled", "optional": False},
+        "Имя": {"value": None, "status": "not_started", "optional": False}
+    }
+    events = []
+    llm = FakeLLM('{"state": {"Имя": {"value": "Иван", "status": "filled"}}, "next_question": null}')
+
+    new_state, next_question = extract_fields(
+        [{"role": "user", "content": "Иван"}], two_field_form, state,
+        log_callback=lambda role, content: events.append((role, content)),
+        llm_client=llm, delta=True
+    )
+
+    assert new_state["Фамилия"] == state["Фамилия"]
+    assert new_state["Имя"] == {"value": "Иван", "status": "filled", "optional": False}
+    assert next_question is None
+    metric = json.loads(next(content for role, content in events if role == "metric"))
+    assert metric["metric"] == "delta_output_tokens"
+    assert metric["saved_tokens"] > 0
+
+def test_extract_fields_delta_rejects_bad_transition(two_field_form):
+    """A filled field cannot be reset to not_started."""
+    state = {
+        "Фамилия": {"value": "Иванов", "status": "filled", "optional": False},
+        "Имя": {"value": None, "status": "not_started", "optional": False}
+    }
+    llm = FakeLLM('{"state": {"Фамилия": {"value": null, "status": "not_started"}}, "next_question": null}')
+
+    with pytest.raises(ValueError, match="Недопустимый переход статуса"):
+        extract_fields([], two_field_form, state, llm_client=llm, delta=True)
+
+def test_extract_fields_delta_rejects_unknown_field(two_field_form):
+    """Delta entries must refer to fields of the form."""
+    state = {name: {"value": None, "status": "not_started", "optional": False} for name in ("Фамилия", "Имя")}
+    llm = FakeLLM('{"state": {"Отчество": {"value": "Иванович", "status": "filled"}}, "next_question": null}')
+
+    with pytest.raises(ValueError, match="неизвестные поля"):
+        extract_fields([], two_field_form, state, llm_client=llm, delta=True)
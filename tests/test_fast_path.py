@@ -0,0 +1,146 @@
+import json
+import pytest
+from app.dialog_manager import DialogManager
+from app.fast_path import try_fast_path, FastPathStats
+
+def field(type_, **extra):
+    """Build a field description of the given type."""
+    return dict({"name": "Поле", "type": type_, "required": True, "description": ""}, **extra)
+
+@pytest.mark.parametrize("type_, answer, expected", [
+    ("int", "42", 42),
+    ("int", "1 000", 1000),
+    ("float", "3,14", 3.14),
+    ("bool", "Да", True),
+    ("bool", "no", False),
+    ("date", "23-12-2002", "23.12.2002"),
+    ("date", "2002-12-23", "23.12.2002"),
+    ("date", "23 декабря 2002", "23.12.2002"),
+    ("date", "1 мая 2020 г.", "01.05.2020"),
+    ("email", "User@Example.COM", "User@example.com"),
+    ("phone", "8 (912) 345-67-89", "+79123456789"),
+    ("url", "www.example.com", "https://www.example.com"),
+    ("list_str", "python, go; rust", ["python", "go", "rust"]),
+    ("str", "Иванов", "Иванов"),
+])
+def test_unambiguous_answers_are_normalized(type_, answer, expected):
+    """Answers that validate unambiguously are normalized locally."""
+    assert try_fast_path(field(type_), answer) == expected
+
+@pytest.mark.parametrize("type_, answer", [
+    ("int", "сорок два"),
+    ("date", "01/02/2003"),
+    ("date", "31.02.2003"),
+    ("phone", "9123456789"),
+    ("email", "not an email"),
+    ("url", "example"),
+    ("str", "Иванов, Иван"),
+    ("str", "пропустить"),
+    ("bool", "может быть"),
+])
+def test_ambiguous_answers_fall_back(type_, answer):
+    """Ambiguous or invalid answers are left to the LLM."""
+    assert try_fast_path(field(type_), answer) is None
+
+@pytest.mark.parametrize("type_, answer", [
+    ("str", "пропустите"),
+    ("str", "нету"),
+    ("str", "Отсутствует"),
+    ("str", "не хочу указывать"),
+    ("str", "—"),
+    ("int", "-5"),
+    ("date", "01.02.2099"),
+    ("date", "01.02.1812"),
+])
+def test_refusals_and_out_of_range_values_fall_back(type_, answer):
+    """Refusals anywhere in the answer, multi-word free text and implausible numbers or dates go to the LLM."""
+    assert try_fast_path(field(type_), answer) is None
+
+def test_str_follows_field_description():
+    """Name parts take one word and ФИО two or three; other text may be a phrase, prose may contain commas."""
+    surname = field("str", name="Фамилия", description="Фамилия как указано в паспорте.")
+    full_name = field("str", name="ФИО", description="Фамилия Имя Отчество получателя.")
+    assert try_fast_path(surname, "Петров-Водкин") == "Петров-Водкин"
+    assert try_fast_path(surname, "Иванов Иван Иванович") is None
+    assert try_fast_path(full_name, "Иванов Иван Иванович") == "Иванов Иван Иванович"
+    assert try_fast_path(full_name, "Иванов") is None
+    assert try_fast_path(field("str", name="Тема", description="Тема письма."), "Тестовая тема") == "Тестовая тема"
+    assert try_fast_path(field("str", name="Город", description="Город проживания."), "Москва, Казань") is None
+    address = field("str", name="Адрес доставки", description="Полный адрес для доставки.")
+    assert try_fast_path(address, "г. Москва, ул. Ленина, д. 1") == "г. Москва, ул. Ленина, д. 1"
+    recipient = field("str", name="Адрес получателя", description="Email-адрес получателя письма.")
+    assert try_fast_path(recipient, "User@Example.com") == "User@example.com"
+    assert try_fast_path(recipient, "Иван Петров") is None
+
+def test_bool_accepts_no():
+    """'нет' is a regular answer to a yes/no question, not a refusal."""
+    assert try_fast_path(field("bool"), "нет") is False
+    assert try_fast_path(field("bool"), "Нет.") is False
+    assert try_fast_path(field("bool"), "не знаю") is None
+
+def test_list_str_and_date_follow_description():
+    """Link lists take only URLs, phrases are not lists, dates are written in the format the description asks for."""
+    links = field("list_str", description="Ссылки на скриншоты (если есть).")
+    assert try_fast_path(links, "https://a.ru/1.png, www.b.ru") == ["https://a.ru/1.png", "https://www.b.ru"]
+    assert try_fast_path(links, "https://a.ru/1.png, скриншот") is None
+    goods = field("list_str", description="Перечислите товары для заказа (через запятую).")
+    assert try_fast_path(goods, "хлеб, молоко") == ["хлеб", "молоко"]
+    assert try_fast_path(goods, "что-нибудь к чаю на ваш вкус и немного фруктов") is None
+    assert try_fast_path(field("date", description="Дата в формате ГГГГ-ММ-ДД."), "23.12.2002") == "2002-12-23"
+    assert try_fast_path(field("date", description="Дата в формате ДД.ММ.ГГГГ."), "2002-12-23") == "23.12.2002"
+    assert try_fast_path(field("date", description="Дата в формате ММ.ГГ."), "23.12.2002") is None
+
+def test_enum_and_multi_enum_match_options():
+    """Options match case-insensitively and are returned in their canonical spelling."""
+    enum = field("enum", options=["Россия", "Казахстан"])
+    assert try_fast_path(enum, "россия") == "Россия"
+    assert try_fast_path(enum, "Франция") is None
+
+    multi = field("multi_enum", options=["Python", "Go", "Rust"])
+    assert try_fast_path(multi, "go, python и rust") == ["Go", "Python", "Rust"]
+    assert try_fast_path(multi, "go, java") is None
+
+def test_str_respects_digit_count_in_description():
+    """A str field described as 'N цифр' only accepts exactly N digits."""
+    series = field("str", description="Серия паспорта, 4 цифры")
+    assert try_fast_path(series, "45 10") == "4510"
+    assert try_fast_path(series, "451") is None
+    assert try_fast_path(field("str", description="Дата в формате ДД.ММ"), "12.05") is None
+
+def test_answer_mentioning_other_fields_falls_back():
+    """An answer that names another field may span several fields."""
+    assert try_fast_path(field("str"), "Иванов а Имя Иван", ["Поле", "Имя"]) is None
+
+def test_stats_report_llm_call_rate():
+    """Per-form counters report the share of answers that needed the LLM."""
+    stats = FastPathStats()
+    stats.record("email", True)
+    stats.record("email", True)
+    stats.record("email", False)
+    snapshot = stats.snapshot()["email"]
+    assert snapshot["answers"] == 3
+    assert snapshot["llm_calls"] == 1
+    assert snapshot["llm_call_rate"] == 0.333
+
+def test_dialog_fills_form_without_llm(monkeypatch, tmp_path, forms_dir):
+    """Unambiguous answers complete and save the dialog without a single LLM call or a configured provider."""
+    monkeypatch.chdir(tmp_path)
+    for name in ("LLM_PROVIDER", "OPENAI_API_KEY", "OPENAI_API_URL"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setattr("app.extractor._default_llm", None)
+    answers = iter(["test@example.com", "Тестовая тема", "Текст письма", "да"])
+    monkeypatch.setattr("builtins.input", lambda _="": next(answers))
+
+    def fail(*args, **kwargs):
+        raise AssertionError("LLM must not be called")
+    monkeypatch.setattr("app.dialog_manager.extract_fields", fail)
+
+    dm = DialogManager(form_path=str(forms_dir / "email.json"))
+    dm.run()
+
+    assert all(entry["status"] == "filled" for entry in dm.state.values())
+    assert dm.state["Тема"]["value"] == "Тестовая тема"
+    assert json.loads((tmp_path / dm.output_path).read_text(encoding="utf-8"))["Тема"]["value"] == "Тестовая тема"
+    metric = [json.loads(e["content"]) for e in dm.log if e["role"] == "metric"][-1]
+    assert metric["llm_calls"] == 0
+    assert metric["fast_path"] == 3
@@ -0,0 +1,74 @@
+import json
+import os
+import pickle
+import pytest
+from app.form_registry import FormRegistry, CompiledForm, compile_form
+from app.form_loader import init_state
+
+@pytest.fixture
+def registry(forms_dir):
+    """Registry over the copied forms directory that re-checks files on every access."""
+    return FormRegistry(str(forms_dir), check_interval=0)
+
+def test_get_by_file_name_stem_and_id(registry):
+    """A form can be addressed by file name, stem or form id, and is shared."""
+    form = registry.get("passport.json")
+    assert registry.get("passport") is form
+    assert registry.get(form["id"]) is form
+    assert isinstance(form, CompiledForm)
+
+def test_compiled_form_indexes(registry):
+    """Compiled forms expose precomputed field indexes."""
+    form = registry.get("passport.json")
+    assert form.field_order[0] == "Фамилия"
+    assert form.field_names == {field["name"] for field in form["fields"]}
+    assert "Отчество" not in form.required_fields
+    assert form.field_index["Серия"]["type"] == "str"
+    assert form.prompt.prefix() is form.prompt.prefix()
+
+def test_compiled_form_is_immutable(registry):
+    """Shared forms cannot be modified by a session."""
+    form = registry.get("email.json")
+    with pytest.raises(TypeError):
+        form["title"] = "x"
+    with pytest.raises(TypeError):
+        form["fields"][0]["name"] = "x"
+
+def test_compiled_form_serializes_like_source(forms_dir, registry):
+    """JSON dumps, pickling and init_state behave as with the plain dict."""
+    source = json.loads((forms_dir / "email.json").read_text(encoding="utf-8"))
+    form = registry.get("email.json")
+    assert json.loads(json.dumps(form, ensure_ascii=False)) == source
+    assert pickle.loads(pickle.dumps(form)).version == form.version
+    assert list(init_state(form)) == [field["name"] for field in source["fields"]]
+
+def test_hot_reload_on_content_change(forms_dir, registry):
+    """Changing the file recompiles the form; touching it without changes does not."""
+    path = forms_dir / "email.json"
+    first = registry.get("email.json")
+
+    touched_ns = path.stat().st_mtime_ns + 10**9
+    os.utime(path, ns=(touched_ns, touched_ns))
+    assert registry.get("email.json") is first
+
+    data = json.loads(path.read_text(encoding="utf-8"))
+    data["title"] = "Новое письмо"
+    path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    os.utime(path, ns=(touched_ns + 10**9, touched_ns + 10**9))
+
+    reloaded = registry.get("email.json")
+    assert reloaded is not first
+    assert reloaded["title"] == "Новое письмо"
+    assert reloaded.version != first.version
+
+def test_unknown_form_raises(registry):
+    """Unknown names are reported as FileNotFoundError."""
+    with pytest.raises(FileNotFoundError):
+        registry.resolve("nonexistent.json")
+
+def test_compile_form_validates(sample_form_json):
+    """compile_form applies the same validation as load_form."""
+    assert compile_form(sample_form_json).required_fields == {"Фамилия", "Имя"}
+    sample_form_json["fields"][0]["type"] = "invalid_type"
+    with pytest.raises(ValueError, match="Недопустимый тип поля"):
+        compile_form(sample_form_json)
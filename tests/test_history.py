@@ -0,0 +1,75 @@
+import pytest
+from app.history import HistoryWindow
+from app.prompt_builder import compile_prompt
+from app.tokens import estimate_messages_tokens
+
+def make_history(turns):
+    """Build a dialog of the given number of question/answer turns."""
+    messages = []
+    for i in range(turns):
+        messages.append({"role": "assistant", "content": f"Введите значение поля 'Поле {i}':"})
+        messages.append({"role": "user", "content": f"ответ номер {i}"})
+    return messages
+
+def test_short_history_is_sent_verbatim():
+    """Nothing is collapsed while the dialog fits in keep_recent."""
+    messages = make_history(3)
+    assert HistoryWindow(keep_recent=8).window(messages, budget=10_000) == messages
+
+def test_older_turns_collapse_in_blocks():
+    """Older messages are collapsed in whole blocks; recent ones stay verbatim."""
+    window = HistoryWindow(keep_recent=4, block_size=6)
+    messages = make_history(5)  # 10 messages: 6 older, one full block collapsed
+    result = window.window(messages, budget=10_000)
+    assert result[0]["role"] == "system"
+    assert "(6)" in result[0]["content"]
+    assert result[1:] == messages[6:]
+
+    # One more turn does not move the block boundary, so the head of the history stays identical
+    longer = window.window(make_history(6), budget=10_000)
+    assert longer[:len(result)] == result
+
+def test_budget_forces_extra_collapsing(sample_form_json):
+    """Under a tight budget recent messages are collapsed too, and the request fits."""
+    window = HistoryWindow(max_tokens=850, keep_recent=8)
+    messages = make_history(20)
+    state = {"Фамилия": {"value": None, "status": "not_started", "optional": False}}
+    full = window.build_messages(compile_prompt(sample_form_json), messages, state)
+    assert estimate_messages_tokens(full) <= 850
+    assert full[-2] == messages[-1]
+    assert window.last["collapsed"] > len(messages) - 8
+
+def test_preflight_rejects_oversized_request():
+    """A single message that does not fit is reported before calling the API."""
+    window = HistoryWindow(max_tokens=100)
+    with pytest.raises(ValueError, match="бюджет"):
+        window.window([{"role": "user", "content": "а" * 1000}], budget=50)
+
+def test_form_over_budget_degrades_to_last_message(sample_form_json):
+    """When the form and state alone exceed the budget, only the last message is sent instead of failing."""
+    window = HistoryWindow(max_tokens=50)
+    messages = make_history(5)
+    state = {"Фамилия": {"value": None, "status": "not_started", "optional": False}}
+    full = window.build_messages(compile_prompt(sample_form_json), messages, state)
+    assert full[0]["role"] == "system" and full[-2] == messages[-1]
+    assert messages[-2] not in full
+    assert window.last["over_budget"] is True
+
+def test_oversized_last_message_is_truncated_to_budget(sample_form_json):
+    """A last message that alone exceeds the budget is cut to fit instead of being sent whole."""
+    window = HistoryWindow(max_tokens=900, min_message_tokens=16)
+    messages = make_history(2) + [{"role": "user", "content": "Иванов " + "очень длинный ответ " * 300}]
+    state = {"Фамилия": {"value": None, "status": "not_started", "optional": False}}
+    full = window.build_messages(compile_prompt(sample_form_json), messages, state)
+    sent = full[-2]["content"]
+    assert sent.startswith("Иванов ") and sent.endswith("сокращено до бюджета контекста]")
+    assert len(sent) < len(messages[-1]["content"])
+    assert estimate_messages_tokens(full) <= 900
+    assert window.last["truncated"] is True and window.last["over_budget"] is False
+
+def test_window_is_opt_in(monkeypatch):
+    """Without LLM_CONTEXT_BUDGET the whole history is sent."""
+    monkeypatch.delenv("LLM_CONTEXT_BUDGET", raising=False)
+    assert HistoryWindow.from_env() is None
+    monkeypatch.setenv("LLM_CONTEXT_BUDGET", "4000")
+    assert HistoryWindow.from_env().max_tokens == 4000
@@ -0,0 +1,39 @@
+import os
+import subprocess
+import sys
+import pytest
+import llm
+from llm import create_llm, get_llm
+
+def test_import_does_not_load_providers():
+    """Importing the CLI neither needs provider settings nor loads HTTP libraries."""
+    env = {name: value for name, value in os.environ.items() if not name.startswith(("OPENAI_", "DEEPSEEK_"))}
+    script = "import sys, main; print('requests' in sys.modules, 'httpx' in sys.modules, 'llm.openai' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True, check=True)
+    assert result.stdout.split() == ["False", "False", "False"]
+
+def test_config_error_only_for_selected_provider(monkeypatch):
+    """A missing DeepSeek key does not affect OpenAI, and the error names the missing variables."""
+    monkeypatch.delenv("DEEPSEEK_API_KEY", raising=False)
+    monkeypatch.setenv("OPENAI_API_KEY", "x")
+    monkeypatch.setenv("OPENAI_API_URL", "http://127.0.0.1:9/v1/chat/completions")
+    monkeypatch.setenv("LLM_PROVIDER", "openai")
+    assert get_llm().provider_name == "openai"
+    with pytest.raises(RuntimeError, match="DEEPSEEK_API_KEY"):
+        create_llm("deepseek")
+
+def test_lazy_exports():
+    """Provider classes are still importable from the package."""
+    from llm.openai import OpenAILLM
+    assert llm.OpenAILLM is OpenAILLM
+    with pytest.raises(AttributeError):
+        llm.Missing
+
+def test_llm_import_is_side_effect_free():
+    """Importing llm neither reads .env nor loads httpx; the async client class is built on first use."""
+    script = (
+        "import sys, llm, llm.settings, llm.openai; print(llm.settings._env_loaded, 'httpx' in sys.modules); "
+        "from llm.openai import AsyncOpenAILLM; print('httpx' in sys.modules, AsyncOpenAILLM is llm.AsyncOpenAILLM)"
+    )
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True)
+    assert result.stdout.split() == ["False", "False", "True", "True"]
@@ -4,20 +4,25 @@ from pathlib import Path
 import os
 import sys
 
+from benchmarks.stub_server import StubLLMServer, form_responder
+
 # Определяем абсолютный путь к main.py (в корне проекта) для запуска тестов CLI
 MAIN_PY = str(Path(__file__).parent.parent / "main.py")
 
 def test_main_with_existing_form(forms_dir):
     """Test that main.py exits with code 0 when form exists."""
     form_path = forms_dir / "email.json"
-    result = subprocess.run(
-        [sys.executable, MAIN_PY, "-f", str(form_path)],
-        cwd=str(forms_dir.parent),
-        input="test@example.com\nТестовая тема\nТекст письма\nда\n",
-        capture_output=True,
-        text=True,
-        encoding='utf-8'
-    )
+    with StubLLMServer(responder=form_responder) as server:
+        env = dict(os.environ, LLM_PROVIDER="openai", OPENAI_API_KEY="test", OPENAI_API_URL=server.url)
+        result = subprocess.run(
+            [sys.executable, MAIN_PY, "-f", str(form_path)],
+            cwd=str(forms_dir.parent),
+            input="test@example.com\nТестовая тема\nТекст письма\nда\n",
+            capture_output=True,
+            text=True,
+            encoding='utf-8',
+            env=env
+        )
     assert result.returncode == 0
 
 def test_main_with_nonexistent_form(forms_dir):
@@ -45,4 +50,16 @@ def test_main_with_invalid_form(forms_dir, tmp_path):
         encoding='utf-8'
     )
     assert result.returncode != 0
-    assert "ошибка" in result.stdout.lower() 
\ No newline at end of file
+    assert "ошибка" in result.stdout.lower() 
+def test_main_rejects_answers_db_with_batch(forms_dir, tmp_path):
+    """--answers-db is not silently ignored in batch mode."""
+    result = subprocess.run(
+        [sys.executable, MAIN_PY, "-f", str(forms_dir / "email.json"), "--batch", str(tmp_path / "in.jsonl"),
+         "--answers-db", str(tmp_path / "answers.sqlite")],
+        cwd=str(forms_dir.parent),
+        capture_output=True,
+        text=True,
+        encoding='utf-8'
+    )
+    assert result.returncode == 2
+    assert "--answers-db не сочетается с --batch" in result.stderr
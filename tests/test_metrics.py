@@ -0,0 +1,59 @@
+import json
+import urllib.request
+import pytest
+from benchmarks.stub_server import StubLLMServer
+from app.metrics import MetricsRegistry, estimate_cost, percentile, start_metrics_server
+from llm.base import LLMResponse
+from llm.openai import OpenAILLM
+from llm.transport import HTTPTransport
+
+PRICES = {"gpt-4.1-nano": {"prompt": 0.10, "cached": 0.025, "completion": 0.40}}
+
+def test_estimate_cost_uses_cached_price():
+    """Cached prompt tokens are billed at the cached rate; dated model names match by prefix."""
+    usage = {"prompt_tokens": 1_000_000, "cached_tokens": 500_000, "completion_tokens": 1_000_000}
+    assert estimate_cost("gpt-4.1-nano-2025-04-14", usage, PRICES) == pytest.approx(0.05 + 0.0125 + 0.40)
+    assert estimate_cost("unknown", usage, PRICES) is None
+
+def test_percentile_nearest_rank():
+    """p50/p95 follow the nearest-rank definition."""
+    values = [i / 100 for i in range(1, 101)]
+    assert percentile(values, 50) == 0.50
+    assert percentile(values, 95) == 0.95
+    assert percentile([], 95) == 0.0
+
+def test_registry_aggregates_per_form_and_session():
+    """Calls are aggregated per form and per session; Prometheus text lists forms."""
+    registry = MetricsRegistry(prices=PRICES)
+    response = LLMResponse(text="{}", usage={"prompt_tokens": 100, "completion_tokens": 10, "cached_tokens": 0}, latency=0.2, model="gpt-4.1-nano")
+    call = registry.record("email", "s1", response)
+    registry.record("email", "s2", response)
+    assert call["latency_ms"] == 200.0
+    assert registry.form("email")["calls"] == 2
+    assert registry.end_session("s1")["prompt_tokens"] == 100
+    assert "s1" not in registry.snapshot()["sessions"]
+    assert 'llm_calls_total{form="email"} 2' in registry.render_prometheus()
+
+def test_complete_reports_latency_and_model():
+    """LLMBase.complete returns wall-clock latency and the model name from the response."""
+    with StubLLMServer(content="ok", latency=0.02) as server:
+        llm = OpenAILLM(api_key="x", api_url=server.url, model="stub-model", transport=HTTPTransport())
+        result = llm.complete([{"role": "user", "content": "hi"}])
+    assert result.latency >= 0.02
+    assert result.model == "stub-model"
+    assert result.usage["prompt_tokens"] > 0
+
+def test_metrics_server_is_scrapeable():
+    """The metrics HTTP endpoint serves Prometheus text and JSON."""
+    registry = MetricsRegistry(prices=PRICES)
+    registry.record("passport", None, LLMResponse(text="{}", latency=0.1, model="gpt-4.1-nano"))
+    server = start_metrics_server(0, registry=registry)
+    try:
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        text = urllib.request.urlopen(base + "/metrics").read().decode("utf-8")
+        data = json.loads(urllib.request.urlopen(base + "/metrics.json").read())
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert 'llm_calls_total{form="passport"} 1' in text
+    assert data["forms"]["passport"]["calls"] == 1
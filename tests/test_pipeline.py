@@ -0,0 +1,86 @@
+import json
+import threading
+
+import pytest
+
+from app.dialog_manager import DialogManager
+from app.dialog_session import field_question
+from app.pipeline import ExtractionPipeline
+from benchmarks.stub_server import form_responder
+
+
+class GatedLLM:
+    """Answers like the stub LLM server, but only after `release` is set; replies may be overridden per call."""
+    def __init__(self, *overrides):
+        self.release = threading.Event()
+        self.overrides = list(overrides)
+        self.finished = 0
+
+    def ask(self, messages, **kwargs):
+        assert self.release.wait(5)
+        override = self.overrides.pop(0) if self.overrides else None
+        reply = form_responder({"messages": messages})
+        self.finished += 1
+        if isinstance(override, Exception):
+            raise override
+        return override(reply) if override else reply
+
+
+@pytest.fixture
+def email_form(forms_dir):
+    return json.loads((forms_dir / "email.json").read_text(encoding="utf-8"))
+
+
+def test_pipelined_run_asks_next_field_before_extraction_finishes(monkeypatch, tmp_path, email_form):
+    """The second question is shown while the first answer is still being extracted; results land in answer order."""
+    monkeypatch.chdir(tmp_path)
+    llm = GatedLLM()
+    answers = ["test@example.com", "Тема", "Текст", "да"]
+    finished_at_prompt = []
+
+    def fake_input(prompt=""):
+        finished_at_prompt.append(llm.finished)
+        if len(finished_at_prompt) == 2:
+            llm.release.set()
+        return answers.pop(0)
+
+    monkeypatch.setattr("builtins.input", fake_input)
+    dialog = DialogManager(form=email_form, llm_client=llm, fast_path=False, pipeline=True)
+    dialog.run()
+
+    assert finished_at_prompt[:2] == [0, 0]
+    assert llm.finished == 3
+    saved = json.loads(open(dialog.output_path, encoding="utf-8").read())
+    assert [saved[name]["value"] for name in ("Адрес получателя", "Тема", "Содержание")] == ["test@example.com", "Тема", "Текст"]
+    # Ожидания: второй и третий вопрос, затем проверка данных
+    assert len(dialog.turn_waits) == 3
+
+
+def test_late_invalid_result_and_error_are_reconciled(email_form):
+    """A late invalid status queues the LLM's clarification; a failed extraction drops its exchange and re-asks the field."""
+    def invalid_address(reply):
+        parsed = json.loads(reply)
+        parsed["state"]["Адрес получателя"]["status"] = "invalid"
+        parsed["next_question"] = "Адрес некорректен, повторите:"
+        return json.dumps(parsed, ensure_ascii=False)
+
+    llm = GatedLLM(invalid_address, RuntimeError("таймаут"))
+    dialog = DialogManager(form=email_form, llm_client=llm, fast_path=False, pipeline=True)
+    pipeline = ExtractionPipeline(dialog)
+    try:
+        for field, answer in (("Адрес получателя", "не адрес"), ("Тема", "Тема")):
+            question = dialog.next_pipelined_question(pipeline)
+            assert question == (field_question(field), field)
+            dialog.messages += [{"role": "assistant", "content": question[0]}, {"role": "user", "content": answer}]
+            pipeline.submit(list(dialog.messages), dialog.messages[-2:], {field})
+        assert pipeline.in_flight == {"Адрес получателя", "Тема"}
+        llm.release.set()
+
+        assert dialog.reconcile(pipeline.wait_all()) == 1
+        assert [m["content"] for m in dialog.messages] == [field_question("Адрес получателя"), "не адрес"]
+        assert dialog.state["Адрес получателя"]["status"] == "invalid"
+        assert dialog.next_pipelined_question(pipeline) == ("Адрес некорректен, повторите:", None)
+        assert dialog.state.next_pending(skip={"Адрес получателя"}) == "Тема"
+    finally:
+        pipeline.close()
+        dialog.close()
@@ -0,0 +1,56 @@
+import json
+import pytest
+from benchmarks.stub_server import StubLLMServer
+from app.extractor import extract_fields
+from app.prompt_builder import compile_prompt
+from llm.openai import OpenAILLM
+from llm.transport import HTTPTransport
+
+@pytest.fixture
+def sample_form():
+    """Return a minimal form for testing."""
+    return {
+        "id": "test_form",
+        "title": "Test Form",
+        "description": "A test form",
+        "fields": [
+            {"name": "Фамилия", "type": "str", "required": True, "description": "Введите фамилию"}
+        ]
+    }
+
+def test_compile_prompt_is_cached_per_form(sample_form):
+    """The same form object compiles once; the prefix string is reused."""
+    first = compile_prompt(sample_form)
+    assert compile_prompt(sample_form) is first
+    assert first.prefix() is first.prefix()
+    assert '"name":"Фамилия"' in first.prefix()
+
+def test_prefix_is_stable_and_state_goes_last(sample_form):
+    """Only the trailing state message differs between turns."""
+    prompt = compile_prompt(sample_form)
+    history = [{"role": "assistant", "content": "Фамилия?"}, {"role": "user", "content": "Иванов"}]
+    before = prompt.build_messages(history, {"Фамилия": {"value": None, "status": "not_started", "optional": False}})
+    after = prompt.build_messages(history, {"Фамилия": {"value": "Иванов", "status": "filled", "optional": False}})
+
+    assert before[:-1] == after[:-1]
+    assert before[0]["role"] == "system"
+    assert after[-1]["content"].endswith('{"Фамилия":{"value":"Иванов","status":"filled","optional":false}}')
+
+def test_cache_hits_are_logged(sample_form):
+    """Provider-reported cached tokens end up in a 'usage' log event."""
+    content = '{"state": {"Фамилия": {"value": "Иванов", "status": "filled", "optional": false}}, "next_question": null}'
+    events = []
+    state = {"Фамилия": {"value": None, "status": "not_started", "optional": False}}
+    messages = [{"role": "assistant", "content": "Фамилия?"}, {"role": "user", "content": "Иванов"}]
+
+    with StubLLMServer(content=content) as server:
+        llm = OpenAILLM(api_key="x", api_url=server.url, model="stub", transport=HTTPTransport())
+        log = lambda role, text: events.append((role, text))
+        state, _ = extract_fields(messages, sample_form, state, log_callback=log, llm_client=llm)
+        messages += [{"role": "assistant", "content": "Имя?"}, {"role": "user", "content": "Иван"}]
+        extract_fields(messages, sample_form, state, log_callback=log, llm_client=llm)
+
+    usage = [json.loads(text) for role, text in events if role == "usage"]
+    assert len(usage) == 2
+    assert usage[0]["cached_tokens"] == 0
+    assert usage[1]["cache_hit_ratio"] > 0.5
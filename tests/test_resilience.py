@@ -0,0 +1,124 @@
+import asyncio
+import time
+import pytest
+from benchmarks.stub_server import StubLLMServer
+from llm.async_base import AsyncHTTPTransport
+from llm.openai import AsyncOpenAILLM, OpenAILLM
+from llm.resilience import CircuitBreaker, CircuitOpenError, HedgePolicy, LLMAPIError, Resilience, RetryPolicy, parse_retry_after
+from llm.transport import HTTPTransport
+
+MESSAGES = [{"role": "user", "content": "привет"}]
+
+def make_llm(server, resilience):
+    return OpenAILLM(api_key="x", api_url=server.url, model="stub", transport=HTTPTransport(), resilience=resilience)
+
+def test_parse_retry_after():
+    """Retry-After is accepted as seconds or as an HTTP date."""
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
+
+def test_retries_honour_retry_after():
+    """A 429 is retried after the delay the server asked for; the last error is raised."""
+    sleeps = []
+    resilience = Resilience(retry=RetryPolicy(max_attempts=3), sleep=sleeps.append)
+    with StubLLMServer(error_rate=1.0, error_statuses=(429,), retry_after=2) as server:
+        with pytest.raises(LLMAPIError) as error:
+            make_llm(server, resilience).ask(MESSAGES)
+        assert server.errors == 3
+    assert error.value.status == 429
+    assert sleeps == [2.0, 2.0]
+    assert resilience.stats()["retries"] == 2
+
+def test_client_errors_are_not_retried():
+    """A 400 is not retryable and does not trip the breaker."""
+    breaker = CircuitBreaker("test-400", failure_threshold=1)
+    resilience = Resilience(retry=RetryPolicy(max_attempts=3), breaker=breaker, sleep=lambda _: None)
+    with StubLLMServer(error_rate=1.0, error_statuses=(400,)) as server:
+        with pytest.raises(LLMAPIError):
+            make_llm(server, resilience).ask(MESSAGES)
+        assert server.errors == 1
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_breaker_opens_and_fails_fast():
+    """After the threshold the breaker rejects calls without touching the server, then recovers."""
+    breaker = CircuitBreaker("test-open", failure_threshold=2, recovery_timeout=0.3)
+    resilience = Resilience(retry=RetryPolicy(max_attempts=1), breaker=breaker)
+    with StubLLMServer(error_rate=1.0, error_statuses=(503,)) as server:
+        llm = make_llm(server, resilience)
+        for _ in range(2):
+            with pytest.raises(LLMAPIError):
+                llm.ask(MESSAGES)
+        with pytest.raises(CircuitOpenError):
+            llm.ask(MESSAGES)
+        assert server.requests == 2
+        assert breaker.state == CircuitBreaker.OPEN
+    time.sleep(0.3)
+    with StubLLMServer() as server:
+        assert make_llm(server, resilience).ask(MESSAGES)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_half_open_probe_is_settled_by_any_outcome():
+    """A 400 probe closes the breaker; a probe failing otherwise frees the probe slot instead of wedging half_open."""
+    breaker = CircuitBreaker("test-probe", failure_threshold=1, recovery_timeout=0.05)
+    resilience = Resilience(retry=RetryPolicy(max_attempts=1), breaker=breaker)
+
+    def fail(error):
+        def attempt():
+            raise error
+        return attempt
+
+    def trip():
+        with pytest.raises(LLMAPIError):
+            resilience.call(fail(LLMAPIError("недоступен", status=503)), hedge=False)
+        time.sleep(0.05)
+
+    trip()
+    with pytest.raises(LLMAPIError):
+        resilience.call(fail(LLMAPIError("плохой запрос", status=400)), hedge=False)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert resilience.call(lambda: "ok", hedge=False) == "ok"
+
+    trip()
+    with pytest.raises(ValueError):
+        resilience.call(fail(ValueError("не JSON")), hedge=False)
+    assert resilience.call(lambda: "ok", hedge=False) == "ok"
+
+    async def broken():
+        raise ValueError("не JSON")
+
+    async def ok():
+        return "ok"
+
+    trip()
+    with pytest.raises(ValueError):
+        asyncio.run(resilience.call_async(broken))
+    assert asyncio.run(resilience.call_async(ok)) == "ok"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_hedging_sends_duplicate_for_slow_request():
+    """A request slower than the hedge threshold gets a duplicate; the first answer wins."""
+    delays = iter([0.5, 0.0])
+    resilience = Resilience(hedge=HedgePolicy(initial_delay=0.05))
+    with StubLLMServer(latency=lambda: next(delays, 0.0)) as server:
+        started = time.perf_counter()
+        assert make_llm(server, resilience).ask(MESSAGES)
+        elapsed = time.perf_counter() - started
+    stats = resilience.stats()
+    assert (stats["hedged"], stats["hedge_wins"]) == (1, 1)
+    assert elapsed < 0.5
+
+def test_async_client_retries():
+    """The async client follows the same retry policy."""
+    resilience = Resilience(retry=RetryPolicy(max_attempts=2, base_delay=0.0))
+    with StubLLMServer(error_rate=1.0, error_statuses=(500,)) as server:
+        async def run():
+            llm = AsyncOpenAILLM(api_key="x", api_url=server.url, model="stub", transport=AsyncHTTPTransport(), resilience=resilience)
+            try:
+                await llm.ask(MESSAGES)
+            finally:
+                await llm.transport.aclose()
+        with pytest.raises(LLMAPIError):
+            asyncio.run(run())
+        assert server.errors == 2
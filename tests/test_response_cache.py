@@ -0,0 +1,92 @@
+import time
+import pytest
+from app.extractor import extract_fields
+from app.response_cache import ResponseCache, cache_key
+
+RESPONSE = '{"state": {"Фамилия": {"value": "Иванов", "status": "filled", "optional": false}}, "next_question": null}'
+
+class CountingLLM:
+    """LLM stub that counts calls and records the temperature it was asked with."""
+    model = "stub"
+
+    def __init__(self):
+        self.calls = 0
+        self.temperatures = []
+
+    def ask(self, messages, temperature=1.0, max_tokens=1024):
+        self.calls += 1
+        self.temperatures.append(temperature)
+        return RESPONSE
+
+@pytest.fixture
+def form():
+    """Return a single-field form matching RESPONSE."""
+    return {
+        "id": "test_form",
+        "title": "Test Form",
+        "description": "A test form",
+        "fields": [{"name": "Фамилия", "type": "str", "required": True, "description": "Введите фамилию"}]
+    }
+
+@pytest.fixture
+def state():
+    return {"Фамилия": {"value": None, "status": "not_started", "optional": False}}
+
+@pytest.fixture
+def messages():
+    return [{"role": "assistant", "content": "Фамилия?"}, {"role": "user", "content": "Иванов"}]
+
+def test_key_is_canonical(form, state, messages):
+    """Whitespace in messages and older history outside the window do not change the key."""
+    spaced = [{"role": "assistant", "content": "Фамилия? "}, {"role": "user", "content": " Иванов"}]
+    longer = [{"role": "user", "content": "привет"}] + messages
+    key = cache_key(form, state, messages, window=2)
+    assert cache_key(form, state, spaced, window=2) == key
+    assert cache_key(form, state, longer, window=2) == key
+    assert cache_key(form, state, messages, window=2, delta=True) != key
+
+def test_identical_requests_hit_cache(form, state, messages):
+    """The second identical extraction is served from the cache at temperature 0."""
+    cache = ResponseCache()
+    llm = CountingLLM()
+    first = extract_fields(messages, form, state, llm_client=llm, cache=cache)
+    second = extract_fields(messages, form, state, llm_client=llm, cache=cache)
+    assert first == second
+    assert llm.calls == 1
+    assert llm.temperatures == [0.0]
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["stores"]) == (1, 1, 1)
+
+def test_sampled_requests_bypass_cache(form, state, messages):
+    """Without forced determinism, temperature > 0 disables caching."""
+    cache = ResponseCache(deterministic=False)
+    llm = CountingLLM()
+    extract_fields(messages, form, state, llm_client=llm, cache=cache)
+    extract_fields(messages, form, state, llm_client=llm, cache=cache)
+    assert llm.calls == 2
+    assert cache.stats()["bypassed"] == 2
+
+def test_lru_eviction_and_ttl():
+    """Entries are evicted beyond max_entries and expire after ttl."""
+    cache = ResponseCache(max_entries=2, ttl=0.05)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    cache.get("a")
+    cache.put("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.stats()["evictions"] == 1
+    time.sleep(0.06)
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+def test_sqlite_tier_is_shared(tmp_path):
+    """A second cache over the same SQLite file sees entries written by the first."""
+    path = str(tmp_path / "cache.db")
+    writer = ResponseCache(path=path)
+    writer.put("key", RESPONSE)
+    reader = ResponseCache(path=path)
+    assert reader.get("key") == RESPONSE
+    assert reader.stats()["disk_hits"] == 1
+    writer.close()
+    reader.close()
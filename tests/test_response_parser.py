@@ -0,0 +1,79 @@
+import pytest
+from app.extractor import extract_fields
+from app.response_parser import ParserStats, locate_object, parse_json_response, repair
+
+def test_locate_object_skips_braces_in_strings():
+    """Braces inside strings do not end the object; text around it is ignored."""
+    text = 'Ответ: {"a": "}{", "b": [1, {"c": 2}]} — готово'
+    begin, end, complete = locate_object(text)
+    assert complete
+    assert text[begin:end] == '{"a": "}{", "b": [1, {"c": 2}]}'
+    assert locate_object('{"a": [1, 2') == (0, 11, False)
+
+@pytest.mark.parametrize("raw,expected,repairs", [
+    ('{"a": 1, "b": [1, 2,],}', {"a": 1, "b": [1, 2]}, ["trailing_comma"]),
+    ("{'a': 'it\\'s \"ok\"', 'b': None, 'c': True}", {"a": "it's \"ok\"", "b": None, "c": True}, ["python_literal", "single_quotes"]),
+    ('{"a": "x", "b": {"c": "y"}, "d": "обор', {"a": "x", "b": {"c": "y"}}, ["truncated"]),
+    ('{"a": {"b": 1}, "q": "Как вас зовут?"', {"a": {"b": 1}, "q": "Как вас зовут?"}, ["truncated"]),
+])
+def test_repairs(raw, expected, repairs):
+    """Common generation defects are repaired and reported."""
+    stats = ParserStats()
+    value, outcome, applied = parse_json_response(raw, stats)
+    assert value == expected
+    assert outcome == "repaired"
+    assert applied == repairs
+    assert stats.snapshot()["repairs"] == {kind: 1 for kind in repairs}
+
+def test_truncated_pair_is_dropped_not_kept_half():
+    """A key whose value was cut off is dropped together with its partial value."""
+    fixed, _ = repair('{"state": {"x": {"value": "1"}, "y": {"value": "Ив')
+    assert fixed == '{"state": {"x": {"value": "1"}}}'
+
+@pytest.mark.parametrize("raw,expected", [
+    ('{"state": {"a": {"value": 12', '{}'),
+    ('{"state": {"a": {"value": tr', '{}'),
+    ('{"state": {"a": {"value": 1, "status": "filled"}, "b": {"value": 12', '{"state": {"a": {"value": 1, "status": "filled"}}}'),
+    ('{"state": {"a": {"value": "x", "status": "filled", "optional": fa', '{"state": {"a": {"value": "x", "status": "filled"}}}'),
+    ('{"a": "x", "b": [1, 2, 3', '{"a": "x", "b": [1, 2]}'),
+    ('{"a": "x", "b": -2.5e', '{"a": "x"}'),
+    ('{"a": "x", "n": 12 ', '{"a": "x", "n": 12}'),
+])
+def test_truncated_scalar_is_dropped(raw, expected):
+    """A number or literal cut off at the end is dropped with its key; a number followed by whitespace is complete."""
+    assert repair(raw) == (expected, ["truncated"])
+
+def test_truncated_scalar_keeps_complete_fields():
+    """A response cut inside a scalar still yields the fields that were complete."""
+    value, outcome, _ = parse_json_response('{"next_question": null, "state": {"a": {"value": 1, "status": "filled"}, "b": {"value": 4')
+    assert outcome == "repaired"
+    assert value == {"next_question": None, "state": {"a": {"value": 1, "status": "filled"}}}
+    with pytest.raises(ValueError):
+        parse_json_response('{"state": {"a": {"value": 12', ParserStats())
+
+def test_outcomes_and_rescue_rate():
+    """Strict, extracted, repaired and failed responses are counted separately."""
+    stats = ParserStats()
+    parse_json_response('{"a": 1}', stats)
+    parse_json_response('```json\n{"a": 1}\n```', stats)
+    parse_json_response('Вот: {"a": 1,}', stats)
+    with pytest.raises(ValueError):
+        parse_json_response("просто текст", stats)
+    snapshot = stats.snapshot()
+    assert (snapshot["strict"], snapshot["extracted"], snapshot["repaired"], snapshot["failed"]) == (1, 1, 1, 1)
+    assert snapshot["rescue_rate"] == 0.5
+
+def test_extract_fields_rescues_prose_wrapped_response():
+    """A response with prose around it and Python literals no longer costs a turn."""
+    form = {"id": "f", "title": "F", "description": "", "fields": [{"name": "Фамилия", "type": "str", "required": True, "description": ""}]}
+    state = {"Фамилия": {"value": None, "status": "not_started", "optional": False}}
+
+    class ChattyLLM:
+        def ask(self, messages):
+            return "Конечно! {'state': {'Фамилия': {'value': 'Иванов', 'status': 'filled', 'optional': False}}, 'next_question': None} Обращайтесь."
+
+    events = []
+    new_state, question = extract_fields([], form, state, llm_client=ChattyLLM(), log_callback=lambda role, text: events.append((role, text)))
+    assert new_state["Фамилия"]["value"] == "Иванов"
+    assert question is None
+    assert any(role == "metric" and "response_repaired" in text for role, text in events)
@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+from app.extractor import extract_fields, validate_response
+from app.form_loader import init_state
+from app.response_schema import response_schema
+from benchmarks.stub_server import StubLLMServer, form_responder
+from llm.deepseek import DeepSeekLLM
+from llm.openai import OpenAILLM
+from llm.transport import HTTPTransport
+
+
+@pytest.fixture
+def order_form(forms_dir):
+    return json.loads((forms_dir / "order.json").read_text(encoding="utf-8"))
+
+
+def test_schema_follows_form(order_form):
+    """Field names are required keys, statuses and enum options are enumerated; delta drops strictness."""
+    schema = response_schema(order_form)
+    state = schema["schema"]["properties"]["state"]
+    names = [field["name"] for field in order_form["fields"]]
+    assert schema["strict"] is True
+    assert state["required"] == names and state["additionalProperties"] is False
+    entry = state["properties"][names[0]]
+    assert entry["properties"]["status"]["enum"] == ["filled", "invalid", "not_started", "skipped"]
+    for field in order_form["fields"]:
+        value = state["properties"][field["name"]]["properties"]["value"]
+        if field["type"] == "enum":
+            assert value["enum"] == [*field["options"], None]
+        assert "null" in value["type"]
+
+    delta = response_schema(order_form, delta=True, question_first=True)
+    assert delta["strict"] is False
+    assert delta["schema"]["properties"]["state"]["required"] == []
+    assert list(delta["schema"]["properties"]) == ["next_question", "state"]
+
+
+@pytest.mark.parametrize("client_class, expected", [(OpenAILLM, "json_schema"), (DeepSeekLLM, "json_object")])
+def test_clients_pass_response_format(monkeypatch, order_form, client_class, expected):
+    """Providers put the form's schema into response_format; PREFIX_STRUCTURED_OUTPUT=off disables it."""
+    payloads = []
+
+    def responder(payload):
+        payloads.append(payload)
+        return form_responder(payload)
+
+    messages = [{"role": "user", "content": "Ответ"}]
+    with StubLLMServer(responder=responder) as server:
+        llm = client_class(api_key="x", api_url=server.url, model="stub", transport=HTTPTransport())
+        extract_fields(messages, order_form, init_state(order_form), llm_client=llm)
+        monkeypatch.setenv(f"{client_class.provider_name.upper()}_STRUCTURED_OUTPUT", "off")
+        plain = client_class(api_key="x", api_url=server.url, model="stub", transport=HTTPTransport())
+        extract_fields(messages, order_form, init_state(order_form), llm_client=plain)
+
+    response_format = payloads[0]["response_format"]
+    assert response_format["type"] == expected
+    if expected == "json_schema":
+        assert response_format["json_schema"] == response_schema(order_form)
+    assert "response_format" not in payloads[1]
+
+
+def test_validator_fast_path_and_errors(order_form):
+    """Valid answers pass unchanged; malformed ones fail with the same messages as the per-key check."""
+    state = init_state(order_form)
+    valid = {"state": state, "next_question": None}
+    assert validate_response(valid, order_form) == (state, None)
+    first = order_form["fields"][0]["name"]
+
+    missing = {"state": {name: value for name, value in state.items() if name != first}, "next_question": None}
+    with pytest.raises(ValueError, match="отсутствуют поля"):
+        validate_response(missing, order_form)
+    bad_status = {"state": dict(state, **{first: {"value": None, "status": "done", "optional": False}}), "next_question": None}
+    with pytest.raises(ValueError, match="Недопустимый статус"):
+        validate_response(bad_status, order_form)
+    no_optional = {"state": {first: {"value": 1, "status": "filled"}}, "next_question": None}
+    with pytest.raises(ValueError, match="отсутствуют ключи"):
+        validate_response(dict(no_optional, state=dict(state, **no_optional["state"])), order_form)
+    assert validate_response(no_optional, order_form, delta=True)[0] == no_optional["state"]
+    with pytest.raises(ValueError, match="строкой или null"):
+        validate_response({"state": state, "next_question": 5}, order_form)
@@ -0,0 +1,149 @@
+import json
+import threading
+import time
+import pytest
+import requests
+from benchmarks.stub_server import StubLLMServer
+from llm import create_llm
+from llm.base import LLMResponse
+from llm.compatible import OpenAICompatibleLLM
+from llm.resilience import LLMAPIError, Resilience
+from llm.router import LLMRouter, Route, parse_routes
+from llm.transport import HTTPTransport
+
+MESSAGES = [{"role": "user", "content": "привет"}]
+
+def endpoint(name, server):
+    return OpenAICompatibleLLM(name, api_url=server.url, model=name, transport=HTTPTransport(), resilience=Resilience())
+
+def test_parse_routes():
+    """Route specs carry provider, optional model, weight and concurrency cap."""
+    routes = parse_routes("openai/gpt-4.1-mini:3:16, deepseek ,local::2")
+    assert routes[0] == {"name": "openai/gpt-4.1-mini", "provider": "openai", "model": "gpt-4.1-mini", "weight": 3.0, "max_concurrency": 16}
+    assert (routes[1]["provider"], routes[1]["weight"], routes[1]["max_concurrency"]) == ("deepseek", 1.0, None)
+    assert (routes[2]["weight"], routes[2]["max_concurrency"]) == (1.0, 2)
+    with pytest.raises(ValueError):
+        parse_routes("openai:heavy")
+
+def test_failover_to_healthy_route():
+    """A failing route is skipped transparently and its error rate goes up."""
+    with StubLLMServer(error_rate=1.0, error_statuses=(503,)) as bad, StubLLMServer(content="ok") as good:
+        router = LLMRouter([Route("bad", endpoint("bad", bad), weight=100), Route("good", endpoint("good", good))], seed=1)
+        responses = [router.complete(MESSAGES) for _ in range(5)]
+    assert all(response.text == "ok" and response.model == "good" for response in responses)
+    stats = router.stats()
+    assert stats["bad"]["failovers"] >= 1
+    assert stats["bad"]["error_rate_ewma"] > 0
+    assert stats["good"]["failures"] == 0
+
+def test_all_routes_failing_raises_last_error():
+    """When every route fails the API error is propagated."""
+    with StubLLMServer(error_rate=1.0, error_statuses=(500,)) as server:
+        router = LLMRouter([Route("a", endpoint("a", server)), Route("b", endpoint("b", server))])
+        with pytest.raises(LLMAPIError):
+            router.ask(MESSAGES)
+    assert sum(route["failures"] for route in router.stats().values()) == 2
+
+class BrokenStreamTransport:
+    """Opens the stream, then loses the connection before the first chunk."""
+    class Response:
+        encoding = None
+
+        def raise_for_status(self):
+            pass
+
+        def iter_lines(self, decode_unicode=False):
+            raise requests.ConnectionError("connection reset")
+            yield
+
+        def close(self):
+            pass
+
+    def post(self, url, json=None, headers=None, stream=False):
+        return self.Response()
+
+def test_stream_transport_error_fails_over():
+    """A connection lost mid-stream is an LLMAPIError: the router counts it and switches routes."""
+    with StubLLMServer(content="ok") as good:
+        broken = OpenAICompatibleLLM("bad", api_url=good.url, model="bad", transport=BrokenStreamTransport(), resilience=Resilience())
+        with pytest.raises(LLMAPIError):
+            list(broken.ask_stream(MESSAGES))
+        router = LLMRouter([Route("bad", broken, weight=100), Route("good", endpoint("good", good))], seed=1)
+        assert "".join(router.ask_stream(MESSAGES)) == "ok"
+    stats = router.stats()
+    assert stats["bad"]["failures"] == 1 and stats["bad"]["failovers"] == 1
+
+class RaisingClient:
+    """Client whose every call raises the given exception."""
+    def __init__(self, error):
+        self.error = error
+
+    def complete(self, messages, temperature=1.0, max_tokens=1024):
+        raise self.error
+
+def test_non_api_errors_count_as_failures_without_failover():
+    """A malformed response is a route failure but is not retried elsewhere; a cancellation is neither."""
+    with StubLLMServer(content="ok") as good:
+        router = LLMRouter([Route("bad", RaisingClient(ValueError("broken")), weight=1000), Route("good", endpoint("good", good))], seed=1)
+        with pytest.raises(ValueError):
+            router.complete(MESSAGES)
+        stats = router.stats()
+        assert (stats["bad"]["failures"], stats["bad"]["failovers"], stats["good"]["calls"]) == (1, 0, 0)
+
+        router = LLMRouter([Route("bad", RaisingClient(KeyboardInterrupt()))])
+        with pytest.raises(KeyboardInterrupt):
+            router.complete(MESSAGES)
+        assert router.stats()["bad"]["failures"] == 0
+
+def test_latency_shifts_traffic_to_faster_route():
+    """Once latencies are measured most requests go to the faster route."""
+    with StubLLMServer(latency=0.05) as slow, StubLLMServer() as fast:
+        router = LLMRouter([Route("slow", endpoint("slow", slow)), Route("fast", endpoint("fast", fast))], seed=3)
+        for _ in range(40):
+            router.ask(MESSAGES)
+        stats = router.stats()
+    assert stats["fast"]["calls"] > stats["slow"]["calls"] * 2
+    assert stats["slow"]["latency_ewma_ms"] > stats["fast"]["latency_ewma_ms"]
+
+class SlowClient:
+    """Client stub that records how many of its calls overlap."""
+    model = "slow"
+
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def complete(self, messages, temperature=1.0, max_tokens=1024):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(0.01)
+        with self.lock:
+            self.active -= 1
+        return LLMResponse(text="ok")
+
+def test_concurrency_cap_is_respected():
+    """A route never has more requests in flight than its cap; the rest wait for a slot."""
+    client = SlowClient()
+    router = LLMRouter([Route("capped", client, max_concurrency=2)])
+    threads = [threading.Thread(target=router.ask, args=(MESSAGES,)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert client.peak == 2
+    assert router.stats()["capped"]["calls"] == 8
+
+def test_endpoints_from_config(tmp_path, monkeypatch):
+    """Extra OpenAI-compatible endpoints are created from LLM_ENDPOINTS_FILE."""
+    path = tmp_path / "endpoints.json"
+    path.write_text(json.dumps({"local": {"api_url": "http://127.0.0.1:8000/v1/chat/completions", "model": "qwen", "api_key_env": "LOCAL_KEY"}}))
+    monkeypatch.setenv("LLM_ENDPOINTS_FILE", str(path))
+    monkeypatch.setenv("LOCAL_KEY", "secret")
+    client = create_llm("local")
+    assert isinstance(client, OpenAICompatibleLLM)
+    assert client.model == "qwen"
+    assert client.build_headers()["Authorization"] == "Bearer secret"
+    with pytest.raises(ValueError):
+        create_llm("missing")
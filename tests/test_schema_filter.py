@@ -0,0 +1,53 @@
+import json
+
+import pytest
+
+from app.extractor import build_llm_messages, extract_fields
+from app.form_loader import init_state
+from app.schema_filter import FieldIndex
+from benchmarks.stub_server import StubLLMServer, form_responder
+from llm.openai import OpenAILLM
+from llm.transport import HTTPTransport
+
+
+@pytest.fixture
+def passport_form(forms_dir):
+    return json.loads((forms_dir / "passport.json").read_text(encoding="utf-8"))
+
+
+def test_field_index_matches_inflected_names(passport_form):
+    """Trigram BM25 finds fields named in another case and ignores matches against descriptions only."""
+    index = FieldIndex(passport_form["fields"])
+    assert index.search("поменяй фамилию на Петров") == ["Фамилия"]
+    assert set(index.search("серия 4510, номер 123456")) == {"Серия", "Номер"}
+    assert index.search("Иванов") == []
+
+
+def test_relevant_view_keeps_pending_and_mentioned_fields(passport_form):
+    """Pending and mentioned fields carry their description; other processed fields are reduced to name → value."""
+    state = init_state(passport_form)
+    for name in ("Фамилия", "Имя", "Отчество"):
+        state[name] = {"value": name.upper(), "status": "filled", "optional": False}
+    messages = [{"role": "user", "content": "Отчество поправьте на Петрович"}]
+
+    full_messages = build_llm_messages(messages, passport_form, state, delta=True, relevant_schema=True)
+    assert "Кем выдан" not in full_messages[0]["content"]
+    done = json.loads(full_messages[-2]["content"].split("\n", 1)[1])
+    view = json.loads(full_messages[-1]["content"].split("\n", 1)[1])
+    assert done == {"Фамилия": "ФАМИЛИЯ", "Имя": "ИМЯ"}
+    assert list(view)[0] == "Отчество" and view["Отчество"]["status"] == "filled"
+    assert view["Кем выдан"]["description"]
+    assert len(view) == len(passport_form["fields"]) - 2
+
+
+def test_extract_fields_merges_partial_answer(passport_form):
+    """With the filtered view the model answers with changes only; they are merged into the full state."""
+    state = init_state(passport_form)
+    state["Фамилия"] = {"value": "Иванов", "status": "filled", "optional": False}
+    messages = [{"role": "assistant", "content": "Введите значение поля 'Имя':"}, {"role": "user", "content": "Иван"}]
+    with StubLLMServer(responder=form_responder) as server:
+        llm = OpenAILLM(api_key="x", api_url=server.url, model="stub", transport=HTTPTransport())
+        new_state, _ = extract_fields(messages, passport_form, state, llm_client=llm, relevant_schema=True)
+    assert new_state["Фамилия"]["value"] == "Иванов"
+    assert new_state["Имя"] == {"value": "Иван", "status": "filled", "optional": False}
+    assert len(new_state) == len(passport_form["fields"])
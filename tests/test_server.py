@@ -0,0 +1,122 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.dialog_session import CONFIRMING, DONE, DialogSession
+from app.form_registry import FormRegistry
+from app.server import DialogServer
+from app.session_table import SessionTable
+from benchmarks.stub_server import StubLLMServer, form_responder
+from llm.async_base import AsyncHTTPTransport
+from llm.openai import AsyncOpenAILLM
+
+
+class FailingAsyncLLM:
+    async def ask(self, messages):
+        raise RuntimeError("LLM недоступна")
+
+
+class FakeSession:
+    def __init__(self, session_id, size=100):
+        self.session_id = session_id
+        self.size = size
+        self.closed = False
+
+    def memory_bytes(self):
+        return self.size
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def email_form(forms_dir):
+    return json.loads((forms_dir / "email.json").read_text(encoding="utf-8"))
+
+
+def test_dialog_session_steps_without_blocking(email_form):
+    """The step API walks the same states as DialogManager.run: questions, confirmation, done."""
+    async def scenario():
+        session = DialogSession(email_form, FailingAsyncLLM())
+        step = session.start()
+        assert step["phase"] == "asking" and step["field"] == "Адрес получателя"
+
+        failed = await session.answer("не знаю")
+        assert "error" in failed and failed["question"] == step["question"]
+        assert session.messages == []
+
+        for text in ("test@example.com", "Тема", "Текст"):
+            step = await session.answer(text)
+        assert step["phase"] == CONFIRMING
+        assert step["summary"]["Адрес получателя"] == "test@example.com"
+        with pytest.raises(ValueError):
+            await session.answer("ещё")
+        assert (await session.confirm(True))["phase"] == DONE
+        assert session.result()["Тема"]["status"] == "filled"
+    asyncio.run(scenario())
+
+
+def test_session_table_ttl_lru_and_memory():
+    """Idle sessions expire, the least recently used go first, and the memory cap evicts old sessions."""
+    now = [0.0]
+    table = SessionTable(ttl=10, max_sessions=2, max_memory=250, clock=lambda: now[0])
+    a, b, c = FakeSession("a"), FakeSession("b"), FakeSession("c")
+    table.add(a)
+    table.add(b)
+    table.get("a")
+    table.add(c)
+    assert "b" not in table and b.closed
+    assert table.stats()["evicted_lru"] == 1
+
+    c.size = 200
+    table.touch("c")
+    assert "a" not in table and table.stats()["evicted_memory"] == 1
+
+    now[0] = 11
+    with pytest.raises(KeyError):
+        table.get("c")
+    assert len(table) == 0 and table.stats()["expired"] == 1
+
+
+def test_server_runs_dialogs_over_http(tmp_path, forms_dir):
+    """Sessions are created, answered and confirmed over HTTP against the local stand-in LLM."""
+    async def scenario(url):
+        llm = AsyncOpenAILLM(api_key="stub", api_url=url, model="stub", transport=AsyncHTTPTransport())
+        server = DialogServer(
+            llm_client=llm, table=SessionTable(), registry=FormRegistry(str(forms_dir)),
+            answers_dir=str(tmp_path / "answers"), fast_path=False
+        )
+        host, port = await server.start("127.0.0.1", 0)
+        try:
+            async with httpx.AsyncClient(base_url=f"http://{host}:{port}") as client:
+                first, second = await asyncio.gather(
+                    client.post("/sessions", json={"form": "email"}),
+                    client.post("/sessions", json={"form": "email"})
+                )
+                assert first.status_code == 201
+                session_id = first.json()["session"]
+                assert session_id != second.json()["session"]
+
+                step = first.json()
+                for text in ("test@example.com", "Тема", "Текст"):
+                    step = (await client.post(f"/sessions/{session_id}/answer", json={"text": text})).json()
+                assert step["phase"] == "confirming"
+                done = (await client.post(f"/sessions/{session_id}/confirm", json={"confirmed": True})).json()
+                assert done["phase"] == "done"
+                saved = json.loads(open(done["output"], encoding="utf-8").read())
+                assert saved["Тема"]["value"] == "Тема"
+
+                result = (await client.get(f"/sessions/{session_id}")).json()
+                assert result["state"]["Содержание"]["status"] == "filled"
+                assert (await client.post("/sessions/missing/answer", json={"text": "x"})).status_code == 404
+                assert (await client.post("/sessions", json={"form": "nope"})).status_code == 404
+                stats = (await client.get("/stats")).json()
+                assert stats["sessions"]["sessions"] == 2
+                assert stats["turns"] == 4 and stats["turn_p99_ms"] > 0
+        finally:
+            await server.close()
+
+    with StubLLMServer(responder=form_responder) as stub:
+        asyncio.run(scenario(stub.url))
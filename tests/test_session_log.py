@@ -0,0 +1,81 @@
+import json
+
+import pytest
+
+from app.dialog_manager import DialogManager
+from app.session_log import SessionLog
+
+
+def _lines(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_events_are_appended_as_they_happen(tmp_path):
+    """With the default policy every event is in the file before close, with monotonic µs timestamps."""
+    path = tmp_path / "logs" / "session_log.jsonl"
+    log = SessionLog(str(path))
+    log.log("user", "привет")
+    log.log("assistant", "Введите значение поля 'Имя':")
+
+    events = _lines(path)
+    assert [e["role"] for e in events] == ["user", "assistant"]
+    assert events[0]["content"] == "привет"
+    assert events[0]["mono_us"] <= events[1]["mono_us"]
+    assert set(events[0]) == {"timestamp", "mono_us", "role", "content"}
+    log.close()
+
+
+def test_buffered_policy_flushes_by_count_and_on_close(tmp_path):
+    """Events are held in the buffer until flush_events is reached; close writes the rest."""
+    path = tmp_path / "log.jsonl"
+    log = SessionLog(str(path), flush_events=3, flush_interval=60, fsync="flush")
+    log.log("user", "1")
+    log.log("user", "2")
+    assert not path.exists()
+    log.log("user", "3")
+    assert len(_lines(path)) == 3
+    log.log("user", "4")
+    log.close()
+    assert [e["content"] for e in _lines(path)] == ["1", "2", "3", "4"]
+    assert log.stats()["fsyncs"] == log.stats()["flushes"] == 2
+    with pytest.raises(ValueError):
+        log.log("user", "5")
+
+
+def test_rotation_by_size_keeps_all_events(tmp_path):
+    """Size-based rotation moves full files to numbered segments without losing events."""
+    path = tmp_path / "log.jsonl"
+    log = SessionLog(str(path), max_bytes=200)
+    for i in range(10):
+        log.log("user", f"сообщение {i}")
+    log.close()
+
+    assert log.stats()["rotations"] >= 2
+    assert log.segments[0] == str(tmp_path / "log.1.jsonl")
+    assert all((tmp_path / name).stat().st_size <= 200 for name in ("log.1.jsonl", "log.2.jsonl"))
+    assert [e["content"] for e in log.events()] == [f"сообщение {i}" for i in range(10)]
+
+
+def test_background_writer_preserves_order(tmp_path):
+    """The background thread writes events in order; flush waits for them to reach the file."""
+    path = tmp_path / "log.jsonl"
+    log = SessionLog(str(path), flush_events=50, background=True)
+    for i in range(120):
+        log.log("user", str(i))
+    log.flush()
+    assert [e["content"] for e in _lines(path)] == [str(i) for i in range(120)]
+    log.close()
+    assert not log._writer.is_alive()
+
+
+def test_aborted_dialog_keeps_log(monkeypatch, tmp_path, forms_dir):
+    """A session that exits without saving still leaves its log on disk."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr("builtins.input", lambda _="": "выход")
+    dm = DialogManager(form_path=str(forms_dir / "email.json"), fast_path=False)
+    dm.run()
+
+    events = _lines(tmp_path / dm.log_path)
+    assert dm.log_path.endswith("_log.jsonl")
+    assert any(e["role"] == "metric" for e in events)
+    assert not (tmp_path / "answers").exists()
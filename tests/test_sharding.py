@@ -0,0 +1,137 @@
+import json
+import threading
+
+import pytest
+
+from app.form_loader import init_state
+from app.sharding import extract_sharded, form_shards, split_fields
+from benchmarks.stub_server import form_responder
+
+
+def make_form(groups):
+    """Form with fields named <group><n>; group None leaves the fields ungrouped."""
+    fields = []
+    for group, count in groups:
+        for i in range(1, count + 1):
+            field = {"name": f"{group or 'x'}{i}", "type": "str", "required": True, "description": ""}
+            if group:
+                field["group"] = group
+            fields.append(field)
+    return {"id": "big", "title": "Big", "description": "", "fields": fields}
+
+
+class ShardLLM:
+    """Answers like the stub LLM server; `tweak(reply_state, names)` edits the reply of the shard owning `names`."""
+    def __init__(self, tweak=None):
+        self.tweak = tweak
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def ask(self, messages, **kwargs):
+        reply = json.loads(form_responder({"messages": messages}))
+        names = frozenset(reply["state"])
+        with self.lock:
+            self.calls.append(names)
+        if self.tweak:
+            self.tweak(reply, names)
+        return json.dumps(reply, ensure_ascii=False)
+
+
+def test_split_fields_by_group_and_size():
+    """Groups stay together, an oversized group is chunked, ungrouped runs are chunked by size."""
+    form = make_form([("a", 3), (None, 5), ("b", 2)])
+    form["fields"].append({"name": "a4", "type": "str", "required": True, "description": "", "group": "a"})
+    shards = [[field["name"] for field in fields] for fields in split_fields(form, shard_size=3)]
+    assert shards == [["a1", "a2", "a3"], ["a4"], ["x1", "x2", "x3"], ["x4", "x5"], ["b1", "b2"]]
+    compiled = form_shards(form, 3)
+    assert [shard["id"] for shard in compiled] == [f"big#{i}" for i in range(1, 6)]
+    assert form_shards(form, 3) is compiled
+
+
+def test_sharded_merge_is_deterministic():
+    """The focus shard and mentioned shards are queried; foreign fields and echoes of the answer are dropped; one question wins."""
+    form = make_form([("a", 2), ("b", 2), ("c", 2)])
+    state = init_state(form)
+    for name in ("a1", "a2"):
+        state[name] = {"value": name.upper(), "status": "filled", "optional": False}
+
+    def tweak(reply, names):
+        if "c1" in names:
+            reply["state"]["a1"] = {"value": "чужое", "status": "filled", "optional": False}
+            reply["state"]["c2"] = {"value": "плохо", "status": "invalid", "optional": False}
+            reply["next_question"] = "Уточните c2"
+
+    llm = ShardLLM(tweak)
+    events = []
+    answer = "Ответ, а c2 потом"
+    messages = [{"role": "assistant", "content": "Введите значение поля 'b1':"}, {"role": "user", "content": answer}]
+    new_state, question = extract_sharded(
+        messages, form, state, shard_size=2, focus="b1", llm_client=llm, log_callback=lambda role, content: events.append((role, content))
+    )
+
+    assert sorted(map(sorted, llm.calls)) == [["b1", "b2"], ["c1", "c2"]]
+    assert new_state["a1"]["value"] == "A1"
+    assert new_state["b1"] == {"value": answer, "status": "filled", "optional": False}
+    assert new_state["c1"]["status"] == "not_started"
+    assert new_state["c2"]["status"] == "invalid"
+    assert question == "Уточните c2"
+    metric = json.loads([content for role, content in events if role == "metric"][-1])
+    assert metric["metric"] == "sharded_extraction"
+    assert (metric["queried"], metric["dropped_foreign_fields"], metric["reverted_echoes"]) == (2, 1, 1)
+
+
+def test_answer_is_routed_to_its_shard():
+    """A focused answer goes to its own shard; an answer to an LLM question goes to shards with invalid fields; otherwise fan out."""
+    form = make_form([("a", 2), ("b", 2), ("c", 2)])
+    state = init_state(form)
+    messages = [{"role": "assistant", "content": "Введите значение поля 'c1':"}, {"role": "user", "content": "Ответ"}]
+    llm = ShardLLM()
+    extract_sharded(messages, form, state, shard_size=2, focus="c1", llm_client=llm)
+    assert llm.calls == [frozenset({"c1", "c2"})]
+
+    state["b2"] = {"value": "плохо", "status": "invalid", "optional": False}
+    llm = ShardLLM()
+    extract_sharded([{"role": "user", "content": "Ответ"}], form, state, shard_size=2, llm_client=llm)
+    assert llm.calls == [frozenset({"b1", "b2"})]
+
+    state["b2"] = {"value": "B2", "status": "filled", "optional": False}
+    state["c2"] = {"value": "C2", "status": "filled", "optional": False}
+    llm = ShardLLM()
+    extract_sharded([{"role": "user", "content": "Ответ"}], form, state, shard_size=2, llm_client=llm)
+    assert sorted(map(sorted, llm.calls)) == [["a1", "a2"], ["b1", "b2"], ["c1", "c2"]]
+
+
+def test_same_value_in_focus_shard_is_kept():
+    """Only other shards' copies of the answer are echoes; a field of the focus shard may share the value."""
+    form = make_form([("a", 2), ("b", 2)])
+    state = init_state(form)
+
+    def tweak(reply, names):
+        reply["state"]["a2" if "a1" in names else "b1"] = {"value": "Ответ", "status": "filled", "optional": False}
+
+    messages = [{"role": "assistant", "content": "Введите значение поля 'a1':"}, {"role": "user", "content": "Ответ"}]
+    new_state, _ = extract_sharded(messages, form, state, shard_size=2, focus="a1", llm_client=ShardLLM(tweak))
+    assert new_state["a1"]["value"] == "Ответ"
+    assert new_state["a2"] == {"value": "Ответ", "status": "filled", "optional": False}
+    assert new_state["b1"]["status"] == "not_started"
+
+
+def test_failed_shard_keeps_previous_state():
+    """A failed shard leaves its fields untouched; when every shard fails the error is raised."""
+    form = make_form([("a", 2), ("b", 2)])
+    state = init_state(form)
+
+    def fail_b(reply, names):
+        if "b1" in names:
+            raise RuntimeError("таймаут")
+
+    messages = [{"role": "user", "content": "Ответ"}]
+    new_state, _ = extract_sharded(messages, form, state, shard_size=2, focus="a1", llm_client=ShardLLM(fail_b))
+    assert new_state["a1"]["value"] == "Ответ"
+    assert new_state["b1"] == state["b1"]
+
+    def fail_all(reply, names):
+        raise RuntimeError("таймаут")
+
+    with pytest.raises(RuntimeError):
+        extract_sharded(messages, form, state, shard_size=2, llm_client=ShardLLM(fail_all))
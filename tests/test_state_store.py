@@ -0,0 +1,55 @@
+import json
+import pytest
+from app.form_loader import init_state
+from app.form_registry import compile_form
+from app.state_store import StateStore
+
+@pytest.fixture
+def form(sample_form_json):
+    return compile_form(dict(sample_form_json, fields=sample_form_json["fields"] + [
+        {"name": "Отчество", "type": "str", "required": False, "description": "Введите отчество"}
+    ]))
+
+def test_initial_state_matches_init_state(form):
+    """A fresh store serialises exactly like form_loader.init_state."""
+    store = StateStore.from_form(form)
+    assert store.to_dict() == json.loads(json.dumps(init_state(form)))
+    assert store == init_state(form)
+    assert store.next_pending() == "Фамилия"
+
+def test_status_indexes_follow_changes(form):
+    """next_pending and with_status reflect in-place changes, including via record views."""
+    store = StateStore.from_form(form)
+    store["Фамилия"]["status"] = "filled"
+    store.set("Имя", value="x", status="invalid")
+    assert store.next_pending() == "Имя"
+    assert store.with_status("invalid") == ["Имя"]
+    store["Имя"] = {"value": "Иван", "status": "filled", "optional": False}
+    store.set("Отчество", status="skipped")
+    assert store.next_pending() is None
+    assert store.counts() == {"not_started": 0, "filled": 2, "invalid": 0, "skipped": 1}
+    store["Фамилия"]["status"] = "invalid"
+    assert store.next_pending() == "Фамилия"
+
+def test_apply_reports_only_changed_fields(form):
+    """apply updates in place and returns the names that actually changed."""
+    store = StateStore.from_form(form)
+    state = store.to_dict()
+    state["Имя"] = {"value": "Иван", "status": "filled", "optional": False}
+    state["Лишнее"] = {"value": 1, "status": "filled", "optional": False}
+    assert store.apply(state) == ["Имя"]
+    assert store.apply(state) == []
+    assert store["Имя"]["value"] == "Иван"
+
+def test_round_trip_and_fixed_shape(form):
+    """The JSON shape round-trips; unknown statuses and adding fields are rejected."""
+    store = StateStore.from_form(form)
+    store.set("Фамилия", value="Иванов", status="filled")
+    restored = StateStore.from_dict(json.loads(json.dumps(store.to_dict())), form)
+    assert restored.to_dict() == store.to_dict()
+    with pytest.raises(ValueError):
+        store.set("Имя", status="done")
+    with pytest.raises(KeyError):
+        store["Новое"] = {"value": None, "status": "filled"}
+    with pytest.raises(TypeError):
+        del store["Имя"]
@@ -0,0 +1,112 @@
+import json
+import time
+import pytest
+from benchmarks.stub_server import StubLLMServer
+from app.extractor import extract_fields_stream
+from app.stream_parser import StreamingResponseParser
+from llm.base import LLMBase
+from llm.transport import HTTPTransport
+
+RESPONSE = (
+    '{"next_question": "Уточните дату рождения", '
+    '"state": {"Фамилия": {"value": "Иванов", "status": "filled", "optional": false}, '
+    '"Дата рождения": {"value": "32.13.2000", "status": "invalid", "optional": false}}}'
+)
+
+@pytest.fixture
+def sample_form():
+    """Return a two-field form for streaming tests."""
+    return {
+        "id": "test_form",
+        "title": "Test Form",
+        "description": "A test form",
+        "fields": [
+            {"name": "Фамилия", "type": "str", "required": True, "description": "Фамилия"},
+            {"name": "Дата рождения", "type": "date", "required": True, "description": "ДД.ММ.ГГГГ"}
+        ]
+    }
+
+class StubLLM(LLMBase):
+    """OpenAI-compatible provider pointed at the stub server."""
+    def build_payload(self, messages, temperature, max_tokens):
+        return {"model": self.model, "messages": messages}
+
+    def build_headers(self):
+        return {"Content-Type": "application/json"}
+
+    def parse_response(self, data):
+        return data["choices"][0]["message"]["content"]
+
+def test_parser_emits_values_char_by_char():
+    """Fields and next_question are surfaced as soon as each value is closed."""
+    parser = StreamingResponseParser()
+    events = []
+    for c in "```json\n" + RESPONSE + "\n```":
+        events.extend(parser.feed(c))
+
+    assert events[0] == ("next_question", None, "Уточните дату рождения")
+    assert [name for kind, name, _ in events if kind == "field"] == ["Фамилия", "Дата рождения"]
+    assert parser.done
+    assert parser.result()["state"]["Дата рождения"]["status"] == "invalid"
+
+def test_parser_question_available_before_state_finishes():
+    """next_question is known while state is still being generated."""
+    parser = StreamingResponseParser()
+    cut = RESPONSE.index('"Дата рождения"')
+    parser.feed(RESPONSE[:cut])
+
+    assert parser.has_next_question
+    assert parser.next_question == "Уточните дату рождения"
+    assert list(parser.fields) == ["Фамилия"]
+    assert not parser.done
+
+def test_parser_handles_null_and_escapes():
+    """Literal null and escaped quotes inside strings do not confuse the scanner."""
+    parser = StreamingResponseParser()
+    text = '{"state": {"A": {"value": "say \\"hi\\", {ok}", "status": "filled", "optional": true}}, "next_question": null}'
+    for i in range(0, len(text), 3):
+        parser.feed(text[i:i + 3])
+
+    assert parser.has_next_question and parser.next_question is None
+    assert parser.fields["A"]["value"] == 'say "hi", {ok}'
+
+def test_extract_fields_stream_against_sse_server(sample_form):
+    """Streaming extraction surfaces the question early and returns a validated state."""
+    questions, fields = [], []
+    with StubLLMServer(content=RESPONSE, stream_chunk_size=5) as server:
+        llm = StubLLM(api_url=server.url, api_key="x", model="stub", transport=HTTPTransport())
+        state, next_question = extract_fields_stream(
+            [{"role": "user", "content": "Иванов, 32.13.2000"}], sample_form, {},
+            llm_client=llm,
+            on_question=questions.append,
+            on_field=lambda name, value: fields.append(name)
+        )
+
+    assert questions == ["Уточните дату рождения"]
+    assert fields == ["Фамилия", "Дата рождения"]
+    assert next_question == "Уточните дату рождения"
+    assert state["Фамилия"]["value"] == "Иванов"
+
+def test_extract_fields_stream_cancels_after_required_keys(sample_form):
+    """Generation is cut off once every field and next_question are parsed."""
+    trailing = " Пояснение: значения извлечены из сообщения пользователя." * 10
+    with StubLLMServer(content=RESPONSE + trailing, stream_chunk_size=10, chunk_delay=0.02) as server:
+        llm = StubLLM(api_url=server.url, api_key="x", model="stub", transport=HTTPTransport())
+        start = time.perf_counter()
+        state, _ = extract_fields_stream([{"role": "user", "content": "x"}], sample_form, {}, llm_client=llm)
+        elapsed = time.perf_counter() - start
+        total_chunks = len(RESPONSE + trailing) // 10
+
+        assert state["Дата рождения"]["status"] == "invalid"
+        assert server.stream_chunks < total_chunks
+        # The full stream would take total_chunks * chunk_delay
+        assert elapsed < total_chunks * 0.02
+
+def test_ask_stream_yields_content_pieces():
+    """ask_stream reassembles the SSE deltas into the original text."""
+    with StubLLMServer(content=RESPONSE, stream_chunk_size=7) as server:
+        llm = StubLLM(api_url=server.url, api_key="x", model="stub", transport=HTTPTransport())
+        pieces = list(llm.ask_stream([{"role": "user", "content": "x"}]))
+
+    assert len(pieces) > 1
+    assert json.loads("".join(pieces))["next_question"] == "Уточните дату рождения"
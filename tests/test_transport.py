@@ -0,0 +1,69 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from benchmarks.stub_server import StubLLMServer
+from llm.base import LLMBase
+from llm.transport import HTTPTransport, get_default_transport
+
+class StubLLM(LLMBase):
+    """Minimal OpenAI-compatible provider for transport tests."""
+    def build_payload(self, messages, temperature, max_tokens):
+        return {"model": self.model, "messages": messages}
+
+    def build_headers(self):
+        return {"Content-Type": "application/json"}
+
+    def parse_response(self, data):
+        return data["choices"][0]["message"]["content"]
+
+@pytest.fixture
+def stub_server():
+    with StubLLMServer(content='{"state": {}, "next_question": null}') as server:
+        yield server
+
+def test_transport_reuses_connection(stub_server):
+    """Sequential calls through one transport share a single keep-alive connection."""
+    transport = HTTPTransport()
+    llm = StubLLM(api_url=stub_server.url, api_key="x", model="stub", transport=transport)
+
+    for _ in range(5):
+        assert json.loads(llm.ask([{"role": "user", "content": "hi"}]))["state"] == {}
+
+    assert stub_server.requests == 5
+    assert stub_server.connections == 1
+    transport.close()
+
+def test_transport_pool_is_bounded_across_threads(stub_server):
+    """Concurrent dialogs never open more connections than pool_maxsize."""
+    transport = HTTPTransport(pool_maxsize=2)
+    llm = StubLLM(api_url=stub_server.url, api_key="x", model="stub", transport=transport)
+    stub_server.latency = 0.01
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: llm.ask([{"role": "user", "content": "hi"}]), range(16)))
+
+    assert len(results) == 16
+    assert stub_server.connections <= 2
+    transport.close()
+
+def test_warmup_opens_connection(stub_server):
+    """warmup establishes the connection that the first ask then reuses."""
+    transport = HTTPTransport()
+    llm = StubLLM(api_url=stub_server.url, api_key="x", model="stub", transport=transport)
+
+    assert llm.warmup() is True
+    llm.ask([{"role": "user", "content": "hi"}])
+    assert stub_server.connections == 1
+    transport.close()
+
+def test_warmup_unreachable_host_does_not_raise():
+    """A failed warmup is reported, not raised."""
+    transport = HTTPTransport(connect_timeout=0.5)
+    assert transport.warmup("http://127.0.0.1:9/v1/chat/completions") is False
+
+def test_default_transport_is_shared():
+    """Providers created without a transport share the process-wide pool."""
+    first = StubLLM(api_url="http://127.0.0.1:9", api_key="x")
+    second = StubLLM(api_url="http://127.0.0.1:9", api_key="x")
+    assert first.transport is second.transport is get_default_transport()
+    assert first.transport.timeout == (first.transport.connect_timeout, first.transport.read_timeout)